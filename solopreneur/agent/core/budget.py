@@ -0,0 +1,219 @@
+"""请求级预算：Token、墙钟时间与工具执行时间，主 Agent、子 Agent 与工作流步骤共享。"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+# 预算耗尽原因
+REASON_TOKENS = "tokens"
+REASON_TIME = "time"
+REASON_TOOL_TIME = "tool_time"
+
+
+class BudgetExceededError(Exception):
+    """预算耗尽（在调用前检测到，或在途的 LLM / 工具调用被取消）。"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class Budget:
+    """
+    单次请求的预算。
+
+    - max_tokens: 累计 Token 上限（含子 Agent）
+    - max_seconds: 墙钟时间上限；在途调用按剩余时间设置超时，到点即取消
+    - max_tool_seconds: 工具累计执行时间上限
+    各项为 0 表示不限。通过 child() 派生的子预算把消耗记到整条链上，
+    任一层级耗尽即视为耗尽。剩余比例低于 degrade_at 时切换到 fallback_model，
+    并把 max_tokens 收紧到剩余 Token（不低于 min_output_tokens）。
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 0,
+        max_seconds: float = 0,
+        max_tool_seconds: float = 0,
+        *,
+        fallback_model: str = "",
+        degrade_at: float = 0.2,
+        min_output_tokens: int = 1024,
+        parent: "Budget | None" = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.max_tool_seconds = max_tool_seconds
+        self.fallback_model = fallback_model
+        self.degrade_at = degrade_at
+        self.min_output_tokens = min_output_tokens
+        self.parent = parent
+        self._clock = clock
+        self.start = clock()
+        self.used_tokens = 0
+        self.tool_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, config: Any, max_seconds: float = 0) -> "Budget":
+        """根据 BudgetConfig 创建（墙钟上限沿用 agent_timeout）。"""
+        return cls(
+            max_tokens=config.max_tokens,
+            max_seconds=max_seconds,
+            max_tool_seconds=config.max_tool_seconds,
+            fallback_model=config.fallback_model,
+            degrade_at=config.degrade_at,
+            min_output_tokens=config.min_output_tokens,
+        )
+
+    def child(self, max_tokens: int = 0, max_seconds: float = 0, max_tool_seconds: float = 0) -> "Budget":
+        """派生子预算（可附加更严格的限制），消耗同时计入父预算。"""
+        return Budget(
+            max_tokens=max_tokens,
+            max_seconds=max_seconds,
+            max_tool_seconds=max_tool_seconds,
+            fallback_model=self.fallback_model,
+            degrade_at=self.degrade_at,
+            min_output_tokens=self.min_output_tokens,
+            parent=self,
+            clock=self._clock,
+        )
+
+    def _chain(self):
+        budget = self
+        while budget is not None:
+            yield budget
+            budget = budget.parent
+
+    @property
+    def elapsed(self) -> float:
+        return self._clock() - self.start
+
+    # ── 剩余额度（取整条链上最紧的一项，不限时为 inf）──────────────────
+
+    def remaining_tokens(self) -> float:
+        return min((b.max_tokens - b.used_tokens for b in self._chain() if b.max_tokens), default=math.inf)
+
+    def remaining_seconds(self) -> float:
+        return min((b.max_seconds - b.elapsed for b in self._chain() if b.max_seconds), default=math.inf)
+
+    def remaining_tool_seconds(self) -> float:
+        return min(
+            (b.max_tool_seconds - b.tool_seconds for b in self._chain() if b.max_tool_seconds),
+            default=math.inf,
+        )
+
+    def fraction_left(self) -> float:
+        """各项限制中剩余比例的最小值（无限制时为 1.0）。"""
+        fractions = [1.0]
+        for b in self._chain():
+            if b.max_tokens:
+                fractions.append((b.max_tokens - b.used_tokens) / b.max_tokens)
+            if b.max_seconds:
+                fractions.append((b.max_seconds - b.elapsed) / b.max_seconds)
+            if b.max_tool_seconds:
+                fractions.append((b.max_tool_seconds - b.tool_seconds) / b.max_tool_seconds)
+        return max(0.0, min(fractions))
+
+    def exceeded(self) -> str | None:
+        """返回耗尽原因；未耗尽时返回 None。"""
+        if self.remaining_seconds() <= 0:
+            return REASON_TIME
+        if self.remaining_tokens() <= 0:
+            return REASON_TOKENS
+        if self.remaining_tool_seconds() <= 0:
+            return REASON_TOOL_TIME
+        return None
+
+    # ── 记账 ─────────────────────────────────────────────────────────
+
+    def charge_tokens(self, tokens: int) -> None:
+        for b in self._chain():
+            b.used_tokens += tokens
+
+    def charge_tool_time(self, seconds: float) -> None:
+        for b in self._chain():
+            b.tool_seconds += seconds
+
+    # ── 降级 ─────────────────────────────────────────────────────────
+
+    @property
+    def degraded(self) -> bool:
+        return self.fraction_left() <= self.degrade_at
+
+    def choose_model(self, model: str) -> str:
+        """预算将尽时改用低成本模型。"""
+        if self.fallback_model and self.degraded:
+            return self.fallback_model
+        return model
+
+    def output_cap(self, max_tokens: int | None) -> int | None:
+        """把单次输出上限收紧到剩余 Token（不低于 min_output_tokens）。"""
+        remaining = self.remaining_tokens()
+        if math.isinf(remaining):
+            return max_tokens
+        cap = max(self.min_output_tokens, int(remaining))
+        return min(max_tokens, cap) if max_tokens else cap
+
+    # ── 抢占式执行 ───────────────────────────────────────────────────
+
+    def describe(self, reason: str) -> str:
+        if reason == REASON_TIME:
+            limit = min(b.max_seconds for b in self._chain() if b.max_seconds)
+            return f"执行时间已超过 {int(limit) // 60} 分钟上限"
+        if reason == REASON_TOKENS:
+            limit = min(b.max_tokens for b in self._chain() if b.max_tokens)
+            return f"本次请求 Token 预算（{limit}）已用尽"
+        limit = min(b.max_tool_seconds for b in self._chain() if b.max_tool_seconds)
+        return f"工具累计执行时间已超过 {int(limit)} 秒上限"
+
+    async def run(self, awaitable: Awaitable[T], tool: bool = False) -> T:
+        """
+        在剩余预算内等待 awaitable；到时取消并抛出 BudgetExceededError。
+
+        tool=True 时同时受工具时间限制，并把耗时计入工具时间。
+        """
+        reason = self.exceeded()
+        if reason:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise BudgetExceededError(reason, self.describe(reason))
+
+        timeout = self.remaining_seconds()
+        if tool:
+            timeout = min(timeout, self.remaining_tool_seconds())
+        started = self._clock()
+        try:
+            if math.isinf(timeout):
+                return await awaitable
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            # 区分预算到期与调用自身的超时
+            reason = self.exceeded() or (REASON_TOOL_TIME if tool and self._tool_time_up(started) else None)
+            if reason is None:
+                raise
+            raise BudgetExceededError(reason, self.describe(reason)) from None
+        finally:
+            if tool:
+                self.charge_tool_time(self._clock() - started)
+
+    def _tool_time_up(self, started: float) -> bool:
+        return self.remaining_tool_seconds() - (self._clock() - started) <= 0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "used_tokens": self.used_tokens,
+            "elapsed_seconds": round(self.elapsed, 2),
+            "tool_seconds": round(self.tool_seconds, 2),
+            "fraction_left": round(self.fraction_left(), 3),
+        }
+
+
+# 当前任务的预算（子 Agent、工作流步骤据此派生子预算）
+current_budget: ContextVar[Budget | None] = ContextVar("current_budget", default=None)
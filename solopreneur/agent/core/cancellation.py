@@ -0,0 +1,74 @@
+"""回合取消：按会话登记进行中的回合，支持外部取消与新消息抢占。"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, TypeVar
+
+T = TypeVar("T")
+
+
+class TurnCancelledError(Exception):
+    """回合被取消（用户取消、被新消息抢占或连接关闭）。"""
+
+    def __init__(self, session_key: str, reason: str):
+        super().__init__(f"会话 {session_key} 的回合已取消: {reason}")
+        self.session_key = session_key
+        self.reason = reason
+
+
+class TurnRegistry:
+    """
+    进行中回合的登记表（session_key -> 回合任务集合）。
+
+    同一会话可能同时有多个回合（如调度队列中的回合与 process_direct 直接发起的回合），
+    全部登记，cancel() 一并取消，不会有回合脱离登记继续运行。
+
+    每个回合在独立任务中运行，cancel() 取消该任务：CancelledError 沿 LLM 调用、
+    工具执行（exec 子进程、MCP 请求）和同步委派的子 Agent 传播。等待方收到
+    TurnCancelledError 而非 CancelledError，因此会话 worker 等调用方不会被连带取消；
+    等待方自身被取消时，回合任务也随之取消。
+    """
+
+    def __init__(self):
+        self._turns: dict[str, set[asyncio.Task]] = {}
+        self._reasons: dict[asyncio.Task, str] = {}
+
+    async def run(self, session_key: str, awaitable: Awaitable[T], preempt: bool = False) -> T:
+        """
+        在登记的任务中运行回合并等待结果。
+
+        preempt=True 时先取消同一会话仍在进行的全部回合（新消息抢占旧回合）。
+        """
+        if preempt:
+            self.cancel(session_key, "superseded")
+        task = asyncio.ensure_future(awaitable)
+        self._turns.setdefault(session_key, set()).add(task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            current = asyncio.current_task()
+            if task.cancelled() and task in self._reasons and not (current and current.cancelling()):
+                raise TurnCancelledError(session_key, self._reasons[task]) from None
+            raise
+        finally:
+            tasks = self._turns.get(session_key)
+            if tasks is not None:
+                tasks.discard(task)
+                if not tasks:
+                    del self._turns[session_key]
+            self._reasons.pop(task, None)
+
+    def cancel(self, session_key: str, reason: str = "user") -> bool:
+        """取消会话进行中的全部回合；没有进行中的回合时返回 False。"""
+        cancelled = False
+        for task in list(self._turns.get(session_key, ())):
+            if task.done():
+                continue
+            self._reasons[task] = reason
+            task.cancel(reason)
+            cancelled = True
+        return cancelled
+
+    def active(self) -> list[str]:
+        return [key for key, tasks in self._turns.items() if any(not t.done() for t in tasks)]
@@ -2,26 +2,37 @@
 上下文压缩引擎 — 仿 Claude Code 三层压缩策略。
 
 三层设计:
-1. Microcompaction (微压缩) — 对大型工具输出即时落盘，仅保留热尾部引用
+1. Microcompaction (微压缩) — 对大型工具输出即时落盘（按内容哈希去重的溢出存储），仅保留热尾部引用
 2. Auto-compaction (自动压缩) — token 累计超阈值时，用 LLM 生成结构化摘要替换旧消息
 3. Manual-compaction (手动压缩) — 未来可接入 /compact 命令
 
 核心理念:
 - 压缩 ≠ 简单截断。是"摘要 + 恢复"：生成结构化工作状态，然后重新注入续接指令。
 - 保留意图、决策、错误、待办和下一步，确保 LLM 能无缝继续工作。
+- 滚动摘要：按会话保留上次摘要与水位（已摘要消息的指纹），再次压缩时只把
+  水位之后的新消息合并进摘要，不重复总结整段历史；摘要持久化，重启后延续。
 """
 
 from __future__ import annotations
 
+import hashlib
 import json
 import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, TYPE_CHECKING
 
 from loguru import logger
 
+from solopreneur.agent.core.media_store import content_text
+from solopreneur.agent.core.spill_store import SpillRef, SpillStore, get_spill_store
+from solopreneur.agent.core.tokenizer import MessageTokenCounter, Tokenizer, get_tokenizer
+from solopreneur.agent.core.tool_summarizers import summarize_tool_output
+
 if TYPE_CHECKING:
     from solopreneur.providers.base import LLMProvider
+    from solopreneur.storage.services import CompactionSummaryPersistence
 
 
 # ── 常量 ───────────────────────────────────────────────────────────────
@@ -30,10 +41,14 @@ if TYPE_CHECKING:
 MICRO_COMPACT_THRESHOLD = 8000
 # 微压缩：热尾部保留的最近工具结果数（不压缩）
 MICRO_HOT_TAIL = 6
+# 微压缩：保留扫描进度的消息列表数
+MICRO_MAX_CURSORS = 16
 # 自动压缩：保留最近的消息数量不被替换
 AUTO_KEEP_RECENT = 4
-# 字符→token 粗估比例 (中英混合约 1 token ≈ 2-3 字符)
-CHARS_PER_TOKEN = 2.5
+# 滚动摘要：每个会话保留的已摘要消息指纹数（水位）
+ROLLING_MAX_COVERED = 1024
+# 滚动摘要：内存中保留的会话状态数
+ROLLING_MAX_SESSIONS = 256
 
 
 # ── 结构化摘要提示词（核心） ──────────────────────────────────────────
@@ -86,6 +101,109 @@ CONTINUATION_MESSAGE = """\
 
 请根据摘要中的"下一步行动"继续工作，不要向用户确认，直接执行。"""
 
+CONTINUATION_ACK = (
+    "好的，我已阅读之前的工作摘要，了解当前进度。"
+    "我将根据摘要中的待办事项和下一步行动继续工作。"
+)
+
+ROLLING_UPDATE_PROMPT = """以下是此前对话的结构化工作状态摘要，以及该摘要之后新增的对话。
+请把新增内容合并进摘要，输出更新后的完整摘要（仍按 9 个章节）：
+已完成的待办移出"待完成事项"，新的决策、文件改动与错误补充到对应章节，
+并根据最新进展重写"当前任务状态"与"下一步行动"。
+
+## 之前的摘要
+
+{summary}
+
+## 新增对话
+
+{conversation}"""
+
+
+def message_fingerprint(msg: dict[str, Any]) -> str:
+    """消息指纹（角色 + 内容 + 工具调用），用于在重建的消息列表中定位滚动摘要水位。"""
+    content = msg.get("content")
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+    calls = [
+        (tc.get("id"), tc.get("function", {}).get("name"))
+        for tc in msg.get("tool_calls") or []
+        if isinstance(tc, dict)
+    ]
+    raw = json.dumps([msg.get("role"), content, msg.get("tool_call_id"), calls], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+_CONTINUATION_PREFIX = CONTINUATION_MESSAGE.split("{summary}", 1)[0]
+
+
+def _is_continuation(msg: dict) -> bool:
+    """压缩时插入的续接消息或确认消息（不在会话历史中，内容已在摘要里）。"""
+    content = msg.get("content")
+    if not isinstance(content, str):
+        return False
+    if msg.get("role") == "user":
+        return content.startswith(_CONTINUATION_PREFIX)
+    return msg.get("role") == "assistant" and content == CONTINUATION_ACK
+
+
+@dataclass
+class RollingSummary:
+    """会话的滚动摘要状态：摘要文本 + 水位（已纳入摘要的消息指纹序列，按时间顺序，可重复）。"""
+
+    summary: str
+    covered: list[str] = field(default_factory=list)
+    compactions: int = 0
+
+    def _split(self, messages: list[dict]) -> int:
+        """已纳入摘要的开头消息数。
+
+        - 以续接消息开头（同一回合内再次压缩）：续接消息之前的内容都在摘要里，其后全部为新消息
+        - 否则（按会话历史重建）：开头与水位序列中最长的连续匹配段视为已摘要。
+          按整段序列匹配而不是按单条指纹查找，重复的消息（如再次出现的“继续”）不会误判水位
+        """
+        start = 0
+        while start < len(messages) and _is_continuation(messages[start]):
+            start += 1
+        if start:
+            return start
+        covered = self.covered
+        fingerprints = [message_fingerprint(m) for m in messages]
+        best = 0
+        for j, fp in enumerate(covered):
+            if not fingerprints or fp != fingerprints[0]:
+                continue
+            k = 1
+            while k < len(fingerprints) and j + k < len(covered) and covered[j + k] == fingerprints[k]:
+                k += 1
+            best = max(best, k)
+        return best
+
+    def pending(self, messages: list[dict]) -> list[dict]:
+        """返回水位之后尚未纳入摘要的消息。"""
+        return messages[self._split(messages):]
+
+    def advance(self, summary: str, messages: list[dict]) -> None:
+        """更新摘要并把消息推进到水位之内（续接消息不计入水位）。"""
+        self.summary = summary
+        self.compactions += 1
+        self.covered.extend(
+            message_fingerprint(msg) for msg in messages[self._split(messages):]
+            if not _is_continuation(msg)
+        )
+        if len(self.covered) > ROLLING_MAX_COVERED:
+            del self.covered[:-ROLLING_MAX_COVERED]
+
+
+@dataclass
+class _MicroCursor:
+    """单个消息列表的微压缩进度。"""
+    messages: list[dict]
+    scanned: int = 0  # 已扫描的消息数
+    tool_indices: list[int] = field(default_factory=list)  # 工具结果消息的位置
+    cold: int = 0  # 已检查（移出热尾部）的工具结果数
+    call_args: dict[str, Any] = field(default_factory=dict)  # tool_call_id -> 调用参数（JSON 字符串）
+
 
 class CompactionEngine:
     """
@@ -94,7 +212,10 @@ class CompactionEngine:
     层级:
     1. microcompact() — 即时处理大型工具输出，落盘 + 保留引用
     2. auto_compact() — LLM 驱动的结构化摘要压缩
-    3. estimate_tokens() — token 估算，决定何时触发压缩
+    3. estimate_tokens() — token 计数（分词器 + 按消息缓存），决定何时触发压缩
+
+    传入 session_key 且 rolling=True 时，auto_compact 使用滚动摘要：
+    只把上次水位之后的消息合并进该会话已有的摘要；配置 summary_store 时摘要持久化。
 
     Usage:
         engine = CompactionEngine(provider, workspace)
@@ -104,7 +225,7 @@ class CompactionEngine:
 
         # token 超限时：
         if engine.estimate_tokens(messages) > threshold:
-            messages = await engine.auto_compact(messages)
+            messages = await engine.auto_compact(messages, session_key=key)
     """
 
     def __init__(
@@ -112,24 +233,42 @@ class CompactionEngine:
         provider: LLMProvider,
         workspace: Path,
         model: str | None = None,
+        tokenizer: Tokenizer | str | None = None,
+        rolling: bool = True,
+        summary_store: CompactionSummaryPersistence | None = None,
+        spill_store: SpillStore | None = None,
     ):
         self.provider = provider
         self.workspace = workspace
         self.model = model
+        self.rolling = rolling
+        self.summary_store = summary_store
+        # 会话 -> 滚动摘要状态（LRU，未命中时从 summary_store 加载）
+        self._rolling: OrderedDict[str, RollingSummary] = OrderedDict()
+        if tokenizer is None or isinstance(tokenizer, str):
+            tokenizer = get_tokenizer(tokenizer or "auto")
+        # 按消息缓存的 token 计数：每轮迭代只对新增 / 变化的消息分词
+        self.token_counter = MessageTokenCounter(tokenizer)
         self._compaction_count = 0
         self._compaction_dir = workspace / ".compaction"
-        self._tool_result_index = 0  # 全局工具结果计数，用于文件名
+        # 大型工具结果的溢出存储（同一工作空间的主 Agent 与子 Agent 共享）
+        self.spill_store = spill_store or get_spill_store(workspace)
+        # 消息列表 id -> 微压缩扫描进度
+        self._micro_cursors: OrderedDict[int, _MicroCursor] = OrderedDict()
 
     # ── 1. Microcompaction ──────────────────────────────────────────
 
     def microcompact(self, messages: list[dict]) -> list[dict]:
         """
-        微压缩：将大型工具结果落盘，上下文中只保留引用。
+        微压缩：将大型工具结果落盘，上下文中只保留引用与按工具类型生成的摘要。
 
         策略：
         - 最近 MICRO_HOT_TAIL 个工具结果保持内联（热尾部）
         - 更早的工具结果，如果超过 MICRO_COMPACT_THRESHOLD 字符，
-          则保存到磁盘并替换为引用
+          则保存到溢出存储并替换为引用 + 结构化摘要（见 tool_summarizers）
+
+        增量处理：按消息列表记录扫描位置，每次只扫描新追加的消息，
+        每个工具结果只在移出热尾部时检查一次。
 
         Args:
             messages: 当前消息列表
@@ -137,64 +276,81 @@ class CompactionEngine:
         Returns:
             微压缩后的消息列表
         """
-        # 找出所有 tool result 的索引
-        tool_indices = [
-            i for i, m in enumerate(messages) if m.get("role") == "tool"
-        ]
+        cursor = self._micro_cursor(messages)
 
-        if len(tool_indices) <= MICRO_HOT_TAIL:
-            return messages  # 工具结果太少，无需微压缩
-
-        # 需要检查的旧工具结果（排除热尾部）
-        cold_indices = set(tool_indices[:-MICRO_HOT_TAIL])
-        compacted = False
-
-        for i in cold_indices:
+        # 只扫描上次之后追加的消息
+        for i in range(cursor.scanned, len(messages)):
             msg = messages[i]
+            role = msg.get("role")
+            if role == "tool":
+                cursor.tool_indices.append(i)
+            elif role == "assistant":
+                for tc in msg.get("tool_calls") or []:
+                    if isinstance(tc, dict) and tc.get("id"):
+                        cursor.call_args[tc["id"]] = tc.get("function", {}).get("arguments")
+        cursor.scanned = len(messages)
+
+        # 本次新移出热尾部的工具结果
+        cold_end = len(cursor.tool_indices) - MICRO_HOT_TAIL
+        checked = compacted = 0
+        while cursor.cold < cold_end:
+            i = cursor.tool_indices[cursor.cold]
+            cursor.cold += 1
+            checked += 1
+            msg = messages[i]
+            raw_args = cursor.call_args.pop(msg.get("tool_call_id"), None)
             content = msg.get("content", "")
-            if len(content) > MICRO_COMPACT_THRESHOLD:
-                # 落盘
-                saved_path = self._save_tool_result_to_disk(
-                    tool_name=msg.get("name", "unknown"),
-                    content=content,
-                )
-                # 替换为引用
+            if isinstance(content, str) and len(content) > MICRO_COMPACT_THRESHOLD:
+                # 落盘（相同内容只存一份）并替换为引用
+                ref = self.spill_store.put(content)
                 summary = self._make_tool_reference(
                     tool_name=msg.get("name", "unknown"),
                     content=content,
-                    saved_path=saved_path,
+                    ref=ref,
+                    args=self._parse_args(raw_args),
                 )
                 messages[i] = {**msg, "content": summary}
-                compacted = True
+                compacted += 1
 
         if compacted:
-            logger.info(f"微压缩完成: {len(cold_indices)} 个旧工具结果已检查")
+            logger.info(f"微压缩完成: 检查 {checked} 个旧工具结果，移出 {compacted} 个")
 
         return messages
 
-    def _save_tool_result_to_disk(self, tool_name: str, content: str) -> str:
-        """将工具结果保存到磁盘，返回文件路径。"""
-        self._compaction_dir.mkdir(parents=True, exist_ok=True)
-        self._tool_result_index += 1
-        filename = f"tool_{self._tool_result_index}_{tool_name}_{int(time.time())}.txt"
-        filepath = self._compaction_dir / filename
-        filepath.write_text(content, encoding="utf-8")
-        return str(filepath)
+    def _micro_cursor(self, messages: list[dict]) -> _MicroCursor:
+        """取得消息列表的微压缩进度；列表被替换或截短时重新开始。"""
+        cursors = self._micro_cursors
+        cursor = cursors.get(id(messages))
+        if cursor is None or cursor.messages is not messages or cursor.scanned > len(messages):
+            cursor = _MicroCursor(messages)
+            cursors[id(messages)] = cursor
+        cursors.move_to_end(id(messages))
+        while len(cursors) > MICRO_MAX_CURSORS:
+            cursors.popitem(last=False)
+        return cursor
+
+    @staticmethod
+    def _parse_args(raw: Any) -> dict[str, Any]:
+        if isinstance(raw, dict):
+            return raw
+        try:
+            args = json.loads(raw or "{}")
+        except (json.JSONDecodeError, TypeError):
+            return {}
+        return args if isinstance(args, dict) else {}
 
     @staticmethod
-    def _make_tool_reference(tool_name: str, content: str, saved_path: str) -> str:
-        """生成工具结果的简短引用摘要。"""
-        # 保留前 500 字符作为预览
-        preview = content[:500]
-        total_chars = len(content)
+    def _make_tool_reference(tool_name: str, content: str, ref: SpillRef, args: dict[str, Any] | None = None) -> str:
+        """生成工具结果的引用：spill key + 按工具类型生成的摘要。"""
+        summary = summarize_tool_output(tool_name, content, args)
 
         return (
-            f"[工具 `{tool_name}` 输出已保存到磁盘]\n"
-            f"路径: {saved_path}\n"
-            f"大小: {total_chars} 字符\n"
-            f"预览:\n{preview}\n"
+            f"[工具 `{tool_name}` 输出已移出上下文]\n"
+            f"spill key: {ref.key}\n"
+            f"大小: {ref.size} 字符，{ref.lines} 行\n"
+            f"摘要:\n{summary}\n"
             f"...\n"
-            f"如需完整内容，请使用 read_file 读取上述路径。"
+            f"如需查看其余内容，请使用 read_spill(key=\"{ref.key}\", offset=行号) 分段读取。"
         )
 
     # ── 2. Auto-compaction (LLM 驱动) ──────────────────────────────
@@ -203,19 +359,22 @@ class CompactionEngine:
         self,
         messages: list[dict],
         focus_hint: str = "",
+        session_key: str | None = None,
     ) -> list[dict]:
         """
         自动压缩：使用 LLM 生成结构化摘要，替换旧消息。
 
         流程：
         1. 提取 system prompt（保留）
-        2. 将旧消息发给 LLM 生成 9 段式结构化摘要
+        2. 将旧消息发给 LLM 生成 9 段式结构化摘要；该会话已有滚动摘要时，
+           只发送水位之后的新消息与上次摘要，由 LLM 合并为更新后的摘要
         3. 用 [system, continuation_message, recent_messages] 替换整个消息列表
         4. 重新注入最近访问的文件内容（如果在摘要中提到）
 
         Args:
             messages: 当前消息列表
             focus_hint: 可选的焦点提示，类似 /compact 的参数
+            session_key: 会话标识，用于滚动摘要（为空时每次完整摘要）
 
         Returns:
             压缩后的新消息列表
@@ -245,7 +404,16 @@ class CompactionEngine:
             return messages
 
         # 构建摘要请求
-        summary = await self._generate_summary(old_messages, focus_hint)
+        state = self._get_rolling(session_key) if self.rolling and session_key else None
+        if state is None:
+            summary = await self._generate_summary(old_messages, focus_hint)
+        else:
+            pending = state.pending(old_messages)
+            logger.info(f"滚动摘要: 合并 {len(pending)}/{len(old_messages)} 条新消息")
+            summary = (
+                await self._update_summary(state.summary, pending, focus_hint)
+                if pending else state.summary
+            )
 
         # 组装新消息列表
         compacted: list[dict] = []
@@ -255,24 +423,30 @@ class CompactionEngine:
             compacted.append(system_msg)
 
         # 2. 插入续接消息（包含压缩摘要）
-        continuation = CONTINUATION_MESSAGE.format(summary=summary)
-        compacted.append({
+        continuation = {
             "role": "user",
-            "content": continuation,
-        })
+            "content": CONTINUATION_MESSAGE.format(summary=summary),
+        }
+        compacted.append(continuation)
 
         # 3. 插入一条 assistant 确认消息
-        compacted.append({
+        acknowledgement = {
             "role": "assistant",
-            "content": (
-                "好的，我已阅读之前的工作摘要，了解当前进度。"
-                "我将根据摘要中的待办事项和下一步行动继续工作。"
-            ),
-        })
+            "content": CONTINUATION_ACK,
+        }
+        compacted.append(acknowledgement)
 
         # 4. 附加最近的完整消息
         compacted.extend(recent_messages)
 
+        # 推进水位：只记录会话中的真实消息，续接 / 确认消息由开头识别
+        if self.rolling and session_key:
+            if state is None:
+                state = RollingSummary(summary)
+                self._remember_rolling(session_key, state)
+            state.advance(summary, old_messages)
+            self._persist_rolling(session_key, state)
+
         # 保存摘要到磁盘（便于调试和审计）
         self._save_compaction_summary(summary)
 
@@ -331,6 +505,86 @@ class CompactionEngine:
             # 回退到简单截断
             return self._fallback_summary(old_messages)
 
+    async def _update_summary(
+        self,
+        prev_summary: str,
+        new_messages: list[dict],
+        focus_hint: str = "",
+    ) -> str:
+        """
+        滚动摘要：把上次摘要与水位之后的新消息合并为更新后的结构化摘要。
+
+        与 delta_summarize 同样只处理增量，但输出完整的 9 段式工作状态。
+        LLM 失败时把新消息的回退摘要追加到上次摘要之后。
+        """
+        user_prompt = ROLLING_UPDATE_PROMPT.format(
+            summary=prev_summary,
+            conversation=self._serialize_messages(new_messages),
+        )
+        if focus_hint:
+            user_prompt += f"\n\n特别关注: {focus_hint}"
+
+        try:
+            response = await self.provider.chat(
+                messages=[
+                    {"role": "system", "content": COMPACTION_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt},
+                ],
+                tools=None,
+                model=self.model,
+                max_tokens=4096,
+                temperature=0.2,
+            )
+            if response.content:
+                logger.info(f"滚动摘要更新成功: {len(response.content)} 字符")
+                return response.content
+        except Exception as e:
+            logger.error(f"滚动摘要更新失败: {e}")
+        return f"{prev_summary}\n\n{self._fallback_summary(new_messages)}"
+
+    # ── 滚动摘要状态 ────────────────────────────────────────────────
+
+    def _get_rolling(self, session_key: str) -> RollingSummary | None:
+        state = self._rolling.get(session_key)
+        if state is not None:
+            self._rolling.move_to_end(session_key)
+            return state
+        if self.summary_store is None:
+            return None
+        try:
+            data = self.summary_store.load(session_key)
+        except Exception as e:
+            logger.warning(f"加载滚动摘要失败 ({session_key}): {e}")
+            return None
+        if not data:
+            return None
+        state = RollingSummary(data["summary"], list(data.get("covered") or []), data.get("compactions", 0))
+        self._remember_rolling(session_key, state)
+        return state
+
+    def _remember_rolling(self, session_key: str, state: RollingSummary) -> None:
+        self._rolling[session_key] = state
+        self._rolling.move_to_end(session_key)
+        while len(self._rolling) > ROLLING_MAX_SESSIONS:
+            self._rolling.popitem(last=False)
+
+    def _persist_rolling(self, session_key: str, state: RollingSummary) -> None:
+        if self.summary_store is None:
+            return
+        try:
+            self.summary_store.save(session_key, state.summary, state.covered, state.compactions)
+        except Exception as e:
+            logger.warning(f"保存滚动摘要失败 ({session_key}): {e}")
+
+    def forget_session(self, session_key: str) -> None:
+        """丢弃会话的滚动摘要（会话被清空或删除时调用）。"""
+        self._rolling.pop(session_key, None)
+        if self.summary_store is not None:
+            try:
+                self.summary_store.delete(session_key)
+            except Exception as e:
+                logger.warning(f"删除滚动摘要失败 ({session_key}): {e}")
+
     @staticmethod
     def _serialize_messages(messages: list[dict]) -> str:
         """将消息列表序列化为可读文本。"""
@@ -363,7 +617,9 @@ class CompactionEngine:
                 parts.append(f"[Tool: {name}] {text}")
 
             elif role == "user":
-                text = content[:2000] if isinstance(content, str) and len(content) > 2000 else content
+                # 多模态内容只保留文字与图片说明
+                text = content_text(content)
+                text = text[:2000] if len(text) > 2000 else text
                 parts.append(f"[User] {text}")
 
             elif role == "system":
@@ -382,8 +638,8 @@ class CompactionEngine:
             role = msg.get("role", "")
             content = msg.get("content", "")
 
-            if role == "user" and isinstance(content, str):
-                user_messages.append(content[:200])
+            if role == "user":
+                user_messages.append(content_text(content)[:200])
 
             if role == "assistant":
                 for tc in msg.get("tool_calls", []):
@@ -431,38 +687,20 @@ class CompactionEngine:
 
     # ── 3. Token 估算 ───────────────────────────────────────────────
 
-    @staticmethod
-    def estimate_tokens(messages: list[dict]) -> int:
+    def estimate_tokens(self, messages: list[dict]) -> int:
         """
-        粗估消息列表的 token 数量。
+        计算消息列表的 token 数量。
 
-        使用 字符数 / CHARS_PER_TOKEN 的简单估算。
-        对于中英混合文本，1 token ≈ 2-3 个字符。
+        使用配置的分词器（tiktoken BPE，不可用时为按字符类别校准的估算），
+        计数按消息缓存，重复调用只对新增或内容变化的消息分词。
 
         Args:
             messages: 消息列表
 
         Returns:
-            估算的 token 数
+            token 数
         """
-        total_chars = 0
-        for msg in messages:
-            content = msg.get("content", "")
-            if isinstance(content, str):
-                total_chars += len(content)
-            elif isinstance(content, list):
-                # vision 格式
-                for item in content:
-                    if isinstance(item, dict) and item.get("type") == "text":
-                        total_chars += len(item.get("text", ""))
-
-            # tool_calls 中的参数也计入
-            for tc in msg.get("tool_calls", []):
-                func = tc.get("function", {})
-                total_chars += len(func.get("arguments", ""))
-                total_chars += len(func.get("name", ""))
-
-        return int(total_chars / CHARS_PER_TOKEN)
+        return self.token_counter.count(messages)
 
     # ── 4. 子代理增量摘要 ──────────────────────────────────────────
 
@@ -1,12 +1,26 @@
 """Context builder for assembling agent prompts."""
 
-import base64
-import mimetypes
+import asyncio
 from pathlib import Path
-from typing import Any
+from typing import Any, NamedTuple
 
+from solopreneur.agent.core.media_store import IMAGE_REF_TYPE, caption_text, get_media_store
 from solopreneur.agent.core.memory import MemoryStore
+from solopreneur.agent.core.prompt_cache import (
+    PromptFragmentCache,
+    content_hash,
+    file_signature,
+)
 from solopreneur.agent.core.skills import SkillsLoader
+from solopreneur.providers.base import CACHE_BREAKPOINTS_KEY
+
+
+class PromptSections(NamedTuple):
+    """System prompt sections grouped from most to least stable."""
+
+    static: list[str]
+    session: list[str]
+    turn: list[str]
 
 
 class ContextBuilder:
@@ -18,17 +32,23 @@ class ContextBuilder:
     """
     
     BOOTSTRAP_FILES = ["AGENTS.md", "SOUL.md", "USER.md", "TOOLS.md", "IDENTITY.md"]
+    SECTION_SEPARATOR = "\n\n---\n\n"
     
     def __init__(self, workspace: Path, memory_search_config: dict | None = None):
         self.workspace = workspace
         self._memory_search_config = memory_search_config
         self.memory = MemoryStore(workspace, memory_search_config=memory_search_config)
         self.skills = SkillsLoader(workspace)
+        self.media = get_media_store()
         self._memory_indexed: bool = False  # 是否已触发过全局自动索引
         # 每个项目独立的 MemoryStore 缓存 {project_id -> MemoryStore}
         self._project_memories: dict[str, MemoryStore] = {}
         # 已触发过自动索引的项目 ID 集合
         self._project_indexed: set[str] = set()
+        # 超过检索时限后仍在后台运行的记忆检索任务（保持引用直至完成）
+        self._background_tasks: set[asyncio.Task] = set()
+        # System prompt 片段缓存（按输入文件 mtime / 内容哈希失效）
+        self._prompt_cache = PromptFragmentCache()
 
     def _get_or_create_project_memory(self, project_info: dict) -> MemoryStore | None:
         """
@@ -57,10 +77,16 @@ class ContextBuilder:
             )
         return self._project_memories[project_id]
 
+    @property
+    def memory_timeout(self) -> float:
+        """语义记忆检索时限（秒），0 表示不限。"""
+        return float((self._memory_search_config or {}).get("retrieval_timeout", 0) or 0)
+
     async def fetch_semantic_memory(
         self,
         query: str,
         project_info: dict | None = None,
+        timeout: float | None = None,
     ) -> str:
         """
         用当前用户消息作为 query 检索语义记忆。
@@ -70,10 +96,35 @@ class ContextBuilder:
         - 若提供了 project_info，额外搜索项目目录的记忆 ({project.path}/memory/)
         - 两处结果合并后返回
 
+        Args:
+            timeout: 检索时限（秒），超时返回空字符串，检索在后台继续完成（如首次索引）。
+
         Returns:
             格式化的记忆片段字符串，可直接注入 system prompt。
             若搜索引擎未启用或无结果，返回空字符串。
         """
+        if not timeout:
+            return await self._fetch_semantic_memory(query, project_info)
+        task = asyncio.create_task(self._fetch_semantic_memory(query, project_info))
+        return await self.await_semantic_memory(task, timeout)
+
+    async def await_semantic_memory(self, task: asyncio.Task, timeout: float | None) -> str:
+        """等待已启动的记忆检索，超过时限返回空字符串（任务不取消）。"""
+        from loguru import logger
+
+        done, _ = await asyncio.wait({task}, timeout=timeout or None)
+        if not done:
+            logger.info(f"语义记忆检索超过 {timeout}s 时限，本轮跳过记忆注入")
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+            return ""
+        try:
+            return task.result()
+        except Exception as e:
+            logger.debug(f"Semantic memory fetch failed: {e}")
+            return ""
+
+    async def _fetch_semantic_memory(self, query: str, project_info: dict | None) -> str:
         from loguru import logger
 
         # 确保索引已建立
@@ -156,6 +207,7 @@ class ContextBuilder:
         skill_names: list[str] | None = None,
         project_info: dict | None = None,
         semantic_memory: str | None = None,
+        prompt_sections: PromptSections | None = None,
     ) -> str:
         """
         Build the system prompt from bootstrap files, memory, and skills.
@@ -163,36 +215,136 @@ class ContextBuilder:
         Args:
             skill_names: Optional list of skills to include.
             project_info: Optional project information (id, name, path, etc.)
+            semantic_memory: Optional pre-fetched semantic memory for current query.
+            prompt_sections: Optional result of build_prompt_sections (e.g. prepared
+                in a worker thread while memory is being fetched).
         
         Returns:
             Complete system prompt.
         """
-        parts = []
+        prompt, _ = self._compose_system_prompt(skill_names, project_info, semantic_memory, prompt_sections)
+        return prompt
+
+    def _compose_system_prompt(
+        self,
+        skill_names: list[str] | None,
+        project_info: dict | None,
+        semantic_memory: str | None,
+        prompt_sections: PromptSections | None,
+    ) -> tuple[str, list[int]]:
+        """
+        Join the sections from most to least stable.
+
+        Returns:
+            (system prompt, offsets where the static and per-session prefixes end).
+        """
+        sections = prompt_sections or self.build_prompt_sections(skill_names, project_info)
+        turn = list(sections.turn)
+        # Semantic memory (向量+关键词搜索召回，按当前用户 query 检索) — 每轮都变，放在最后
+        if semantic_memory:
+            turn.append(f"# 相关记忆（语义搜索）\n\n{semantic_memory}")
+
+        prompt = ""
+        breakpoints: list[int] = []
+        for group, cacheable in ((sections.static, True), (sections.session, True), (turn, False)):
+            if not group:
+                continue
+            text = self.SECTION_SEPARATOR.join(group)
+            prompt = f"{prompt}{self.SECTION_SEPARATOR}{text}" if prompt else text
+            if cacheable:
+                breakpoints.append(len(prompt))
+        return prompt, breakpoints
+
+    def build_prompt_sections(
+        self,
+        skill_names: list[str] | None = None,
+        project_info: dict | None = None,
+    ) -> PromptSections:
+        """
+        Assemble the query-independent prompt sections (file reads only).
+
+        Sections are grouped by how often they change so that the prompt
+        prefix stays byte-identical across turns and provider-side prefix
+        caching can reuse it: static (identity, bootstrap files, skills,
+        agent roster), per-session (long-term memory, project context) and
+        per-turn (current time, today's note).
+
+        Each section is cached against the signature of its inputs, so a
+        build with unchanged inputs only stats files; the static and
+        per-session groups are cached per project.
+        """
+        keys = self._section_keys(project_info)
+        project_id = (project_info or {}).get("id", "")
+        # 整体缓存：所有片段签名均未变化时直接复用上次组装结果（按项目）
+        static, session = self._prompt_cache.get(
+            ("sections", project_id), keys, lambda: self._assemble_sections(keys, project_info)
+        )
+        return PromptSections(list(static), list(session), self._turn_sections())
+
+    def _section_keys(self, project_info: dict | None) -> dict[str, Any]:
+        """Signatures of every static / per-session section's inputs (stat calls only, no reads)."""
+        return {
+            "identity": file_signature([self._config_path()]),
+            "bootstrap": file_signature(self.workspace / name for name in self.BOOTSTRAP_FILES),
+            # 技能索引版本 + 可用性（PATH 上的二进制文件检查按 TTL 缓存）
+            "skills": self.skills.signature(),
+            "agents": self._agents_signature(),
+            "long_term": file_signature([self.memory.memory_file]),
+            "project": content_hash(project_info) if project_info else None,
+        }
+
+    def _assemble_sections(
+        self, keys: dict[str, Any], project_info: dict | None
+    ) -> tuple[list[str], list[str]]:
+        """Assemble the static and per-session groups, rebuilding only changed fragments."""
+        cache = self._prompt_cache
+        static = []
         
         # Core identity
-        parts.append(self._get_identity())
-        
-        # Current project context (if available)
-        if project_info:
-            project_context = self._build_project_context(project_info)
-            if project_context:
-                parts.append(project_context)
+        static.append(cache.get("identity", keys["identity"], self._get_identity))
         
         # Bootstrap files
-        bootstrap = self._load_bootstrap_files()
+        bootstrap = cache.get("bootstrap", keys["bootstrap"], self._load_bootstrap_files)
         if bootstrap:
-            parts.append(bootstrap)
+            static.append(bootstrap)
+
+        static.extend(cache.get("skills", keys["skills"], self._build_skills_sections))
         
-        # Memory context (传统文件读取)
-        memory = self.memory.get_memory_context()
-        if memory:
-            parts.append(f"# Memory\n\n{memory}")
+        # 3. Agent 团队系统 - 让主 Agent 知道可以委派任务
+        agents_summary = cache.get("agents", keys["agents"], self._build_agents_summary)
+        if agents_summary:
+            static.append(agents_summary)
 
-        # Semantic memory (向量+关键词搜索召回，按当前用户 query 检索)
-        if semantic_memory:
-            parts.append(f"# 相关记忆（语义搜索）\n\n{semantic_memory}")
+        session = []
+
+        # Memory context (传统文件读取；今日笔记每轮可能变化，放在 per-turn 分段)
+        long_term = cache.get("long_term", keys["long_term"], self.memory.read_long_term)
+        if long_term:
+            session.append(f"# Memory\n\n## 长期记忆\n{long_term}")
         
-        # Skills - progressive loading
+        # Current project context (if available)
+        if project_info:
+            project_context = cache.get(
+                "project", keys["project"], lambda: self._build_project_context(project_info)
+            )
+            if project_context:
+                session.append(project_context)
+        
+        return static, session
+
+    def _turn_sections(self) -> list[str]:
+        """Per-turn sections: current time and today's note."""
+        parts = [f"# Current Time\n\n{self._current_time()}"]
+        today_file = self.memory.get_today_file()
+        today = self._prompt_cache.get("today", file_signature([today_file]), self.memory.read_today)
+        if today:
+            parts.append(f"# Memory (today)\n\n## 今日笔记\n{today}")
+        return parts
+
+    def _build_skills_sections(self) -> list[str]:
+        """Skills sections - progressive loading."""
+        parts = []
+
         # 1. Always-loaded skills: include full content
         always_skills = self.skills.get_always_skills()
         if always_skills:
@@ -209,23 +361,37 @@ The following skills extend your capabilities. To use a skill, read its SKILL.md
 Skills with available="false" need dependencies installed first - you can try installing them with apt/brew.
 
 {skills_summary}""")
-        
-        # 3. Agent 团队系统 - 让主 Agent 知道可以委派任务
+        return parts
+
+    def _build_agents_summary(self) -> str:
+        """Agent roster summary (memoized by the shared registry until a definition changes)."""
         try:
             from solopreneur.agent.definitions.manager import AgentManager
-            agent_mgr = AgentManager(self.workspace, self.skills)
-            agents_summary = agent_mgr.build_agent_summary()
-            if agents_summary:
-                parts.append(agents_summary)
+            return AgentManager(self.workspace, self.skills).build_agent_summary()
         except Exception:
-            pass  # Agent 系统加载失败时静默跳过
-        
-        return "\n\n---\n\n".join(parts)
+            return ""  # Agent 系统加载失败时静默跳过
+
+    def _agents_signature(self) -> tuple | None:
+        # 共享注册表按文件 mtime 热重载，版本号变化即 Agent 定义变化
+        try:
+            from solopreneur.agent.definitions.registry import get_agent_registry
+            registry = get_agent_registry(self.workspace)
+            return (id(registry), registry.version)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _current_time() -> str:
+        from datetime import datetime
+        return datetime.now().strftime("%Y-%m-%d %H:%M (%A)")
+
+    @staticmethod
+    def _config_path() -> Path:
+        from solopreneur.config.loader import get_config_path
+        return get_config_path()
     
     def _get_identity(self) -> str:
-        """Get the core identity section."""
-        from datetime import datetime
-        now = datetime.now().strftime("%Y-%m-%d %H:%M (%A)")
+        """Get the core identity section (static: the current time is a per-turn section)."""
         workspace_path = str(self.workspace.expanduser().resolve())
         review_mode = self._get_review_mode()
         approval_policy = self._get_approval_policy_text(review_mode)
@@ -279,9 +445,6 @@ Skills with available="false" need dependencies installed first - you can try in
 - 用户说"按完整流程开发" → 使用 `run_workflow(mode=\"auto\")`
 - 用户问简单问题 → 直接回答，不需要委派
 
-## Current Time
-{now}
-
 ## Workspace
 Your workspace is at: {workspace_path}
 - Memory files: {workspace_path}/memory/MEMORY.md
@@ -435,6 +598,7 @@ When remembering something, write to {workspace_path}/memory/MEMORY.md"""
         media: list[str] | None = None,
         project_info: dict | None = None,
         semantic_memory: str | None = None,
+        prompt_sections: PromptSections | None = None,
     ) -> list[dict[str, Any]]:
         """
         Build the complete message list for an LLM call.
@@ -446,15 +610,19 @@ When remembering something, write to {workspace_path}/memory/MEMORY.md"""
             media: Optional list of local file paths for images/media.
             project_info: Optional project information to include in system prompt.
             semantic_memory: Optional pre-fetched semantic memory for current query.
+            prompt_sections: Optional pre-built result of build_prompt_sections.
 
         Returns:
             List of messages including system prompt.
         """
         messages = []
 
-        # System prompt (with project context and semantic memory)
-        system_prompt = self.build_system_prompt(skill_names, project_info, semantic_memory)
-        messages.append({"role": "system", "content": system_prompt})
+        # System prompt (with project context and semantic memory)；稳定前缀的结束位置
+        # 作为缓存断点提示交给 Provider
+        system_prompt, breakpoints = self._compose_system_prompt(
+            skill_names, project_info, semantic_memory, prompt_sections
+        )
+        messages.append({"role": "system", "content": system_prompt, CACHE_BREAKPOINTS_KEY: breakpoints})
 
         # History
         messages.extend(history)
@@ -466,22 +634,28 @@ When remembering something, write to {workspace_path}/memory/MEMORY.md"""
         return messages
 
     def _build_user_content(self, text: str, media: list[str] | None) -> str | list[dict[str, Any]]:
-        """Build user message content with optional base64-encoded images."""
+        """Build user message content with image references (encoded lazily at send time)."""
         if not media:
             return text
         
-        images = []
-        for path in media:
-            p = Path(path)
-            mime, _ = mimetypes.guess_type(path)
-            if not p.is_file() or not mime or not mime.startswith("image/"):
-                continue
-            b64 = base64.b64encode(p.read_bytes()).decode()
-            images.append({"type": "image_url", "image_url": {"url": f"data:{mime};base64,{b64}"}})
-        
+        images = [ref for ref in map(self.media.add_file, media) if ref]
         if not images:
             return text
         return images + [{"type": "text", "text": text}]
+
+    @staticmethod
+    def history_content(content: str | list[dict[str, Any]]) -> str:
+        """
+        User message as stored in session history: images reduced to captions.
+
+        Takes the content built by build_messages, so the turn's image references
+        are reused instead of registering the files again.
+        """
+        if isinstance(content, str):
+            return content
+        text = "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+        captions = [caption_text(part) for part in content if part.get("type") == IMAGE_REF_TYPE]
+        return "\n".join([text, *captions])
     
     def add_tool_result(
         self,
@@ -0,0 +1,604 @@
+"""回合引擎：主 Agent 与子 Agent 共用的「调用 LLM → 执行工具 → 压缩」迭代循环。"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from loguru import logger
+
+from solopreneur.agent.core.budget import REASON_TIME, Budget, BudgetExceededError, current_budget
+from solopreneur.agent.core.media_store import amaterialize_media
+from solopreneur.agent.core.tokenizer import MessageTokenCounter
+from solopreneur.agent.core.tools.registry import ToolRegistry
+from solopreneur.agent.core.tools.scheduler import ToolScheduler
+from solopreneur.providers.base import LLMProvider, LLMResponse, ToolCallRequest
+
+if TYPE_CHECKING:
+    from solopreneur.agent.core.compaction import CompactionEngine
+
+# 停止原因
+STOP_COMPLETE = "complete"
+STOP_MAX_ITERATIONS = "max_iterations"
+STOP_TIMEOUT = "timeout"
+STOP_TOKEN_LIMIT = "token_limit"
+STOP_LLM_ERROR = "llm_error"
+STOP_BUDGET = "budget"
+
+DEFAULT_MAX_COMPACTION_ROUNDS = 10
+# 上下文使用率达到该比例时在后台预先压缩（硬阈值见 CompactionEngine.should_compact）
+DEFAULT_BACKGROUND_COMPACTION_RATIO = 0.6
+
+
+@dataclass
+class RetryPolicy:
+    """LLM 调用重试策略（指数退避 + 随机抖动）。"""
+    max_attempts: int = 3
+    base_delay: float = 2.0
+    max_delay: float = 30.0
+    retry_on: tuple[type[BaseException], ...] = (Exception,)
+
+    def delay(self, attempt: int) -> float:
+        return min(self.base_delay * (2 ** attempt) + random.uniform(0, 1), self.max_delay)
+
+
+@dataclass
+class BackgroundCompaction:
+    """进行中的后台压缩：基于 source[:mark] 的快照，完成后在迭代边界换入。"""
+    task: asyncio.Task
+    source: list[dict[str, Any]]
+    mark: int
+
+    def result(self, current: list[dict[str, Any]]) -> list[dict[str, Any]] | None:
+        """压缩结果 + 快照之后追加的消息；消息列表已被替换（如阻塞压缩）时返回 None。"""
+        if current is not self.source or self.task.cancelled() or self.task.exception():
+            return None
+        return [*self.task.result(), *current[self.mark:]]
+
+
+@dataclass
+class TurnState:
+    """一次回合的运行状态，供钩子读取。"""
+    messages: list[dict[str, Any]]
+    iteration: int = 0
+    start_time: float = field(default_factory=time.time)
+    window_tokens: int = 0  # 自上次压缩以来的 token，用于触发压缩
+    total_tokens: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    compactions: int = 0
+    used_tools: list[str] = field(default_factory=list)
+    tool_counts: Counter = field(default_factory=Counter)
+    streamed: list[str] = field(default_factory=list)
+    background_compaction: BackgroundCompaction | None = None
+
+    @property
+    def streamed_text(self) -> str:
+        return "".join(self.streamed)
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.start_time
+
+
+@dataclass
+class TurnResult:
+    """回合结果：content 为最后一次无工具调用的回复（或停止说明）。"""
+    content: str | None
+    stop_reason: str
+    state: TurnState
+
+    @property
+    def messages(self) -> list[dict[str, Any]]:
+        return self.state.messages
+
+
+@dataclass
+class TurnHooks:
+    """
+    回合引擎的可插拔钩子（均可选）。
+
+    on_chunk: 流式文本回调；提供时使用 chat_stream，并把 exec 的实时输出转发过去。
+    on_trace: 调用链路事件（llm_start / llm_end / tool_start / tool_end / compaction ...）。
+    select_tools: 每轮发送给 LLM 的工具 schema，默认全部。
+    prepare_tool_args: 执行前改写工具参数（如注入项目目录）。
+    on_final: LLM 未调用工具时调用；返回继续提示则注入后继续迭代，返回 None 结束回合。
+    on_llm_error: 重试耗尽后调用；返回说明文本则以 llm_error 结束回合，返回 None 则抛出异常。
+    """
+    on_chunk: Callable[[str], Awaitable[None]] | None = None
+    on_trace: Callable[[dict[str, Any]], Awaitable[None]] | None = None
+    select_tools: Callable[[TurnState], list[dict[str, Any]]] | None = None
+    prepare_tool_args: Callable[[ToolCallRequest, dict[str, Any]], dict[str, Any]] | None = None
+    on_final: Callable[[LLMResponse, TurnState], Awaitable[str | None]] | None = None
+    on_llm_error: Callable[[Exception, TurnState], Awaitable[str | None]] | None = None
+
+
+def _preview(result: Any, max_chars: int = 800) -> str:
+    """生成工具输出的可展示预览，避免 UI 过载。"""
+    try:
+        text = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False, default=str)
+    except Exception:
+        text = str(result)
+    text = text.strip()
+    if len(text) > max_chars:
+        return text[:max_chars] + "\n...<truncated>"
+    return text
+
+
+def _skill_name(tool_name: str, tool_args: dict[str, Any] | None) -> str | None:
+    """识别 read_file 读取 skill 文件的场景，并提取 skill 名称。"""
+    if tool_name != "read_file" or not tool_args:
+        return None
+    path = str(tool_args.get("path") or "").replace("\\", "/")
+    match = re.search(r"/skills/([^/]+)/SKILL\.md$", path, re.IGNORECASE)
+    return match.group(1) if match else None
+
+
+class TurnEngine:
+    """
+    统一的 Agent 回合引擎。
+
+    每轮迭代：超时 / 预算检查 → 预防性压缩 → 调用 LLM（带重试、记录 usage）→
+    超限压缩 → 执行工具（只读并发）并微压缩，或在无工具调用时交给 on_final 判断是否结束。
+    上下文使用率超过 background_compaction_ratio 时压缩在后台进行，完成后于下一个
+    迭代边界换入；只有到达硬阈值仍未完成时才阻塞等待（无后台任务则同步压缩）。
+    提供 budget 时，在途的 LLM / 工具调用按剩余预算设置超时并在到期时取消，
+    预算将尽时降级模型与输出上限；回合期间 budget 通过 current_budget 传给子 Agent。
+    回合任务被取消时，在途 LLM 调用按估算 usage 记录（标记 cancelled），
+    发出 cancelled 事件后继续向上抛出 CancelledError。
+    主 Agent（总线 / 系统消息 / 流式）与子 Agent 均通过它运行，差异由配置与钩子表达。
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        tools: ToolRegistry,
+        model: str,
+        *,
+        agent_name: str = "主控 Agent",
+        max_iterations: int = 50,
+        max_total_time: float = 0,
+        max_session_tokens: int = 0,
+        max_tokens: int | None = None,
+        compaction: "CompactionEngine | None" = None,
+        max_compaction_rounds: int = DEFAULT_MAX_COMPACTION_ROUNDS,
+        background_compaction_ratio: float = DEFAULT_BACKGROUND_COMPACTION_RATIO,
+        retry: RetryPolicy | None = None,
+        usage_store: Any = None,
+        usage_key: str = "",
+        budget: Budget | None = None,
+    ):
+        self.provider = provider
+        self.tools = tools
+        self.model = model
+        self.agent_name = agent_name
+        self.max_iterations = max_iterations
+        self.max_total_time = max_total_time
+        self.max_session_tokens = max_session_tokens
+        self.max_tokens = max_tokens
+        self.compaction = compaction
+        # 与压缩引擎共用按消息缓存的计数器
+        self.token_counter = compaction.token_counter if compaction else MessageTokenCounter()
+        self.max_compaction_rounds = max_compaction_rounds
+        self.background_compaction_ratio = background_compaction_ratio
+        self.retry = retry or RetryPolicy()
+        self.usage_store = usage_store
+        self.usage_key = usage_key
+        self.budget = budget
+
+    async def run(self, messages: list[dict[str, Any]], hooks: TurnHooks | None = None) -> TurnResult:
+        """运行回合直到完成、达到迭代上限或触发停止条件。"""
+        hooks = hooks or TurnHooks()
+        state = TurnState(messages=messages)
+        # 本回合内派生的子 Agent / 工作流步骤从这里取得父预算
+        token = current_budget.set(self.budget)
+        try:
+            return await self._run(state, hooks)
+        except asyncio.CancelledError as e:
+            reason = e.args[0] if e.args else "cancelled"
+            logger.info(f"[{self.agent_name}] 回合已取消 (第{state.iteration}轮): {reason}")
+            if hooks.on_trace:
+                await self._emit_quietly(hooks.on_trace, {
+                    "event": "cancelled",
+                    "agent_name": self.agent_name,
+                    "reason": reason,
+                    "iteration": state.iteration,
+                    "total_tokens": state.total_tokens,
+                    "timestamp": time.time(),
+                })
+            raise
+        finally:
+            if state.background_compaction:
+                state.background_compaction.task.cancel()
+            current_budget.reset(token)
+
+    async def _run(self, state: TurnState, hooks: TurnHooks) -> TurnResult:
+        async def emit(event: dict[str, Any]) -> None:
+            if hooks.on_trace:
+                await hooks.on_trace({"agent_name": self.agent_name, **event})
+
+        while state.iteration < self.max_iterations:
+            state.iteration += 1
+
+            if self.max_total_time and state.elapsed > self.max_total_time:
+                logger.warning(f"Agent循环超时: {state.elapsed:.1f}秒 (上限: {self.max_total_time}秒)")
+                notice = (
+                    f"⚠️ 执行时间已超过 {int(self.max_total_time) // 60} 分钟上限，任务已暂停。"
+                    "如需延长，请在配置中增大 agent_timeout 值后重试。"
+                )
+                return await self._stop(state, hooks, STOP_TIMEOUT, notice)
+
+            reason = self.budget.exceeded() if self.budget else None
+            if reason:
+                return await self._budget_stop(state, hooks, BudgetExceededError(reason, self.budget.describe(reason)))
+
+            # 调用 LLM 前：换入已完成的后台压缩，再检测是否需要压缩
+            if self._swap_background_compaction(state):
+                await emit({"event": "compaction", "type": "background", "round": state.compactions, "timestamp": time.time()})
+            if (
+                self.compaction
+                and self.max_session_tokens
+                and self.compaction.should_compact(state.messages, self.max_session_tokens)
+                and state.compactions < self.max_compaction_rounds
+            ):
+                state.compactions += 1
+                logger.info(f"上下文使用率达到阈值，执行预防性压缩 (第{state.compactions}次)")
+                await self._compact(state)
+                await emit({"event": "compaction", "type": "proactive", "round": state.compactions, "timestamp": time.time()})
+            else:
+                self._maybe_start_background_compaction(state)
+
+            try:
+                response = await self._call_llm(state, hooks, emit)
+            except BudgetExceededError as e:
+                return await self._budget_stop(state, hooks, e)
+            except Exception as e:
+                notice = await hooks.on_llm_error(e, state) if hooks.on_llm_error else None
+                if notice is None:
+                    raise
+                return TurnResult(notice, STOP_LLM_ERROR, state)
+
+            # Token 消耗检查：超限时压缩上下文而非停止
+            if self.max_session_tokens and state.window_tokens > self.max_session_tokens:
+                state.compactions += 1
+                if state.compactions >= self.max_compaction_rounds:
+                    logger.warning(f"Token消耗超限且压缩次数用尽: {state.window_tokens}")
+                    notice = f"Token消耗过多（{state.window_tokens}），已多次压缩上下文仍无法控制，请开始新的对话。"
+                    return await self._stop(state, hooks, STOP_TOKEN_LIMIT, notice)
+                logger.info(
+                    f"Token累计 {state.window_tokens}/{self.max_session_tokens} 超限，"
+                    f"执行上下文压缩 (第{state.compactions}次)"
+                )
+                if self.compaction:
+                    await self._compact(state)
+                    await emit({"event": "compaction", "type": "reactive", "round": state.compactions, "timestamp": time.time()})
+
+            if response.has_tool_calls:
+                await self._run_tools(response, state, hooks, emit)
+                continue
+
+            continuation = await hooks.on_final(response, state) if hooks.on_final else None
+            if continuation:
+                # 保留模型本轮回复，再注入继续提示
+                if response.content:
+                    state.messages.append({"role": "assistant", "content": response.content})
+                state.messages.append({"role": "user", "content": continuation})
+                continue
+            return TurnResult(response.content, STOP_COMPLETE, state)
+
+        return TurnResult(None, STOP_MAX_ITERATIONS, state)
+
+    async def _stop(self, state: TurnState, hooks: TurnHooks, reason: str, notice: str) -> TurnResult:
+        if hooks.on_chunk:
+            await hooks.on_chunk(notice)
+            state.streamed.append(notice)
+        return TurnResult(notice, reason, state)
+
+    async def _emit_quietly(self, emit: Callable[[dict[str, Any]], Awaitable[None]], event: dict[str, Any]) -> None:
+        """取消路径上发送 trace（前端连接可能已关闭，失败忽略）。"""
+        try:
+            await emit(event)
+        except Exception as e:
+            logger.debug(f"[{self.agent_name}] trace emit failed during cancellation: {e}")
+
+    async def _budget_stop(self, state: TurnState, hooks: TurnHooks, e: BudgetExceededError) -> TurnResult:
+        logger.warning(f"[{self.agent_name}] 预算耗尽: {e} ({self.budget.snapshot()})")
+        if e.reason == REASON_TIME:
+            return await self._stop(
+                state, hooks, STOP_TIMEOUT,
+                f"⚠️ {e}，任务已暂停。如需延长，请在配置中增大 agent_timeout 值后重试。",
+            )
+        return await self._stop(state, hooks, STOP_BUDGET, f"⚠️ {e}，任务已暂停。")
+
+    async def _compact(self, state: TurnState) -> None:
+        """两层压缩：微压缩（大型工具输出落盘）+ LLM 摘要压缩；后台压缩进行中时等待其结果。"""
+        pending = state.background_compaction
+        if pending:
+            state.background_compaction = None
+            try:
+                await asyncio.shield(pending.task)
+            except asyncio.CancelledError:
+                pending.task.cancel()
+                raise
+            except Exception as e:
+                logger.warning(f"[{self.agent_name}] 后台压缩失败，改为同步压缩: {e}")
+            compacted = pending.result(state.messages)
+            if compacted is not None:
+                state.messages = compacted
+                state.window_tokens = 0
+                return
+        messages = self.compaction.microcompact(state.messages)
+        state.messages = await self.compaction.auto_compact(messages, session_key=self.usage_key or None)
+        state.window_tokens = 0
+
+    def _maybe_start_background_compaction(self, state: TurnState) -> None:
+        """使用率超过软阈值时，基于当前消息快照在后台开始压缩。"""
+        if (
+            not self.compaction
+            or not self.max_session_tokens
+            or not self.background_compaction_ratio
+            or state.background_compaction
+            or state.compactions >= self.max_compaction_rounds
+            or not self.compaction.should_compact(
+                state.messages, self.max_session_tokens, usage_ratio=self.background_compaction_ratio,
+            )
+        ):
+            return
+        # 微压缩作用于快照副本，回合继续追加的消息不受影响
+        snapshot = self.compaction.microcompact(list(state.messages))
+        task = asyncio.create_task(
+            self.compaction.auto_compact(snapshot, session_key=self.usage_key or None)
+        )
+        # 结果可能不再被读取（回合结束或消息已被替换），避免未取回异常的告警
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        state.background_compaction = BackgroundCompaction(task, state.messages, len(state.messages))
+        logger.info(f"[{self.agent_name}] 上下文使用率超过 {self.background_compaction_ratio:.0%}，开始后台压缩")
+
+    def _swap_background_compaction(self, state: TurnState) -> bool:
+        """后台压缩已完成时换入结果（整体替换消息列表）。"""
+        pending = state.background_compaction
+        if not pending or not pending.task.done():
+            return False
+        state.background_compaction = None
+        compacted = pending.result(state.messages)
+        if compacted is None:
+            if not pending.task.cancelled() and pending.task.exception():
+                logger.warning(f"[{self.agent_name}] 后台压缩失败: {pending.task.exception()}")
+            return False
+        if len(compacted) >= len(state.messages):
+            return False  # 消息太少未压缩
+        state.messages = compacted
+        state.window_tokens = 0
+        state.compactions += 1
+        logger.info(f"[{self.agent_name}] 换入后台压缩结果 (第{state.compactions}次)")
+        return True
+
+    async def _call_llm(self, state: TurnState, hooks: TurnHooks, emit: Callable[[dict[str, Any]], Awaitable[None]]) -> LLMResponse:
+        tools = hooks.select_tools(state) if hooks.select_tools else self.tools.get_definitions()
+        model, max_tokens = self.model, self.max_tokens
+        if self.budget:
+            # 预算将尽时换用低成本模型、收紧输出上限
+            model = self.budget.choose_model(model)
+            max_tokens = self.budget.output_cap(max_tokens)
+        # 图片引用在发送时才展开为 base64（在线程中编码），state.messages 中只保留引用
+        messages = await amaterialize_media(state.messages)
+        kwargs: dict[str, Any] = {"messages": messages, "tools": tools, "model": model}
+        if max_tokens:
+            kwargs["max_tokens"] = max_tokens
+        streaming = hooks.on_chunk is not None and hasattr(self.provider, "chat_stream")
+
+        async def track_chunk(text: str) -> None:
+            state.streamed.append(text)
+            await hooks.on_chunk(text)
+
+        llm_start = time.time()
+        streamed_before = len(state.streamed)
+        await emit({"event": "llm_start", "iteration": state.iteration, "model": model, "timestamp": llm_start})
+        try:
+            for attempt in range(self.retry.max_attempts):
+                try:
+                    if streaming:
+                        call = self.provider.chat_stream(on_chunk=track_chunk, **kwargs)
+                    else:
+                        call = self.provider.chat(**kwargs)
+                    response = await (self.budget.run(call) if self.budget else call)
+                    break
+                except BudgetExceededError:
+                    raise
+                except self.retry.retry_on as e:
+                    if attempt >= self.retry.max_attempts - 1:
+                        logger.error(f"[{self.agent_name}] LLM 调用失败，已达到最大重试次数 ({self.retry.max_attempts}): {type(e).__name__}: {e}")
+                        raise
+                    delay = self.retry.delay(attempt)
+                    logger.warning(
+                        f"[{self.agent_name}] LLM 调用失败 (尝试 {attempt + 1}/{self.retry.max_attempts}): "
+                        f"{type(e).__name__}: {e}。将在 {delay:.1f} 秒后重试..."
+                    )
+                    await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            # 在途调用被取消：按已发送的 prompt 与已流出的文本估算消耗，标记为取消
+            partial = "".join(state.streamed[streamed_before:])
+            usage = self._estimate_usage(state.messages, partial)
+            self._record_usage(usage, model, int((time.time() - llm_start) * 1000), streaming, cancelled=True)
+            raise
+        llm_end = time.time()
+        duration_ms = int((llm_end - llm_start) * 1000)
+        self._record_usage(response.usage, model, duration_ms, streaming)
+
+        usage = response.usage or {}
+        if any(usage.values()):
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            step_tokens = usage.get("total_tokens", 0) or prompt_tokens + completion_tokens
+        else:
+            # Provider 没有返回 usage 数据，按字符数粗略估算
+            usage = self._estimate_usage(state.messages, response.content or "")
+            prompt_tokens = usage["prompt_tokens"]
+            completion_tokens = usage["completion_tokens"]
+            step_tokens = usage["total_tokens"]
+            logger.debug(f"LLM provider did not return usage data, estimating tokens: total={step_tokens}")
+        state.window_tokens += step_tokens
+        state.total_tokens += step_tokens
+        state.prompt_tokens += prompt_tokens
+        state.completion_tokens += completion_tokens
+        if self.budget:
+            self.budget.charge_tokens(step_tokens)
+
+        await emit({
+            "event": "llm_end",
+            "iteration": state.iteration,
+            "model": model,
+            "duration_ms": duration_ms,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": step_tokens,
+            "cached_tokens": usage.get("cached_tokens", 0),
+            "cumulative_tokens": state.total_tokens,
+            "has_tool_calls": response.has_tool_calls,
+            "timestamp": llm_end,
+        })
+        return response
+
+    def _estimate_usage(self, messages: list[dict[str, Any]], completion: str) -> dict[str, int]:
+        """Provider 未返回 usage（或调用被取消）时用分词器计数。"""
+        prompt_tokens = self.token_counter.count(messages)
+        completion_tokens = self.token_counter.tokenizer.count(completion)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _record_usage(
+        self,
+        usage: dict[str, int] | None,
+        model: str,
+        duration_ms: int,
+        is_stream: bool,
+        cancelled: bool = False,
+    ) -> None:
+        """记录一次 LLM 调用 usage（失败不影响主流程）。"""
+        if self.usage_store is None:
+            return
+        usage = usage or {}
+        try:
+            self.usage_store.record(
+                session_key=self.usage_key,
+                model=model,
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0),
+                total_tokens=usage.get("total_tokens", 0),
+                duration_ms=duration_ms,
+                is_stream=is_stream,
+                cancelled=cancelled,
+                cached_tokens=usage.get("cached_tokens", 0),
+            )
+        except Exception as e:
+            logger.warning(f"记录 LLM usage 失败: {e}")
+
+    async def _run_tools(
+        self,
+        response: LLMResponse,
+        state: TurnState,
+        hooks: TurnHooks,
+        emit: Callable[[dict[str, Any]], Awaitable[None]],
+    ) -> None:
+        tool_calls = response.tool_calls
+        state.messages.append({
+            "role": "assistant",
+            "content": response.content or "",
+            "tool_calls": [
+                {
+                    "id": tc.id,
+                    "type": "function",
+                    "function": {"name": tc.name, "arguments": json.dumps(tc.arguments)},  # 必须是 JSON 字符串
+                }
+                for tc in tool_calls
+            ],
+        })
+        state.used_tools.extend(tc.name for tc in tool_calls)
+
+        scheduler = ToolScheduler(self.tools)
+        parallel_calls = {
+            index for group in scheduler.plan(tool_calls)
+            if len(group) > 1 for index in group
+        }
+        iteration = state.iteration
+
+        async def run_one(index: int, tool_call: ToolCallRequest) -> str:
+            tool_args = dict(tool_call.arguments or {})
+            if hooks.prepare_tool_args:
+                tool_args = hooks.prepare_tool_args(tool_call, tool_args)
+            common = {
+                "iteration": iteration,
+                "tool_name": tool_call.name,
+                "tool_call_id": tool_call.id,
+                "call_index": index,
+                "parallel": index in parallel_calls,
+            }
+            skill_name = _skill_name(tool_call.name, tool_args)
+            if skill_name:
+                await emit({"event": "skill_start", "iteration": iteration, "skill_name": skill_name,
+                            "tool_name": tool_call.name, "tool_args": tool_args, "timestamp": time.time()})
+            tool_start = time.time()
+            await emit({"event": "tool_start", **common, "tool_args": tool_args, "timestamp": tool_start})
+            logger.debug(f"[{self.agent_name}] 正在执行工具：{tool_call.name}，参数：{json.dumps(tool_args, ensure_ascii=False)[:300]}")
+
+            # exec 工具：把实时输出转发到流式回调（回调按任务隔离）
+            exec_tool = self.tools.get("exec") if tool_call.name == "exec" and hooks.on_chunk else None
+            if exec_tool is not None and hasattr(exec_tool, "set_stream_callback"):
+                loop = asyncio.get_running_loop()
+                on_chunk = hooks.on_chunk
+                exec_tool.set_stream_callback(
+                    lambda line: asyncio.run_coroutine_threadsafe(on_chunk(line), loop)
+                )
+            try:
+                call = self.tools.execute(tool_call.name, tool_args)
+                if self.budget:
+                    # 委派类工具只受墙钟限制：子 Agent 的工具调用已沿预算链计入工具时间
+                    tool = self.tools.get(tool_call.name)
+                    call = self.budget.run(call, tool=not getattr(tool, "delegates", False))
+                result = await call
+            except BudgetExceededError as e:
+                # 在途工具被取消；下一轮迭代前的预算检查会结束回合
+                result = f"Error: {tool_call.name} 已取消: {e}"
+            except asyncio.CancelledError:
+                await self._emit_quietly(emit, {
+                    "event": "tool_end", **common, "cancelled": True,
+                    "duration_ms": round((time.time() - tool_start) * 1000), "timestamp": time.time(),
+                })
+                raise
+            finally:
+                if exec_tool is not None and hasattr(exec_tool, "set_stream_callback"):
+                    exec_tool.set_stream_callback(None)
+
+            tool_end = time.time()
+            duration_ms = round((tool_end - tool_start) * 1000)
+            preview = _preview(result)
+            await emit({"event": "tool_end", **common, "duration_ms": duration_ms,
+                        "result_length": len(str(result)), "result_preview": preview, "timestamp": tool_end})
+            if skill_name:
+                await emit({"event": "skill_end", "iteration": iteration, "skill_name": skill_name,
+                            "duration_ms": duration_ms, "result_length": len(str(result)),
+                            "result_preview": preview, "timestamp": tool_end})
+            return result
+
+        results = await scheduler.run(tool_calls, run_one)
+        for tool_call, result in zip(tool_calls, results):
+            state.tool_counts[tool_call.name] += 1
+            state.messages.append({
+                "role": "tool",
+                "tool_call_id": tool_call.id,
+                "name": tool_call.name,
+                "content": result,
+            })
+
+        # 工具调用后执行微压缩（大型输出落盘）
+        if self.compaction:
+            state.messages = self.compaction.microcompact(state.messages)
@@ -1,20 +1,24 @@
 """Agent 循环：核心处理引擎。"""
 
 import asyncio
-import json
-import re
 import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
 from loguru import logger
 
+from solopreneur.bus.dispatcher import SessionDispatcher
 from solopreneur.bus.events import InboundMessage, OutboundMessage
 from solopreneur.bus.queue import MessageBus
 from solopreneur.providers.base import LLMProvider
 from solopreneur.agent.core.context import ContextBuilder
 from solopreneur.agent.core.compaction import CompactionEngine
+from solopreneur.agent.core.budget import Budget
+from solopreneur.agent.core.cancellation import TurnCancelledError, TurnRegistry
+from solopreneur.agent.core.engine import RetryPolicy, TurnEngine, TurnHooks, TurnState
 from solopreneur.agent.core.tools.registry import ToolRegistry
+from solopreneur.agent.core.tools.router import RequestMoreToolsTool, ToolRouter
 from solopreneur.agent.core.tools.filesystem import ReadFileTool, WriteFileTool, EditFileTool, ListDirTool
 from solopreneur.agent.core.tools.db import DBInspectTool
 from solopreneur.agent.core.tools.metrics import MetricsInspectTool
@@ -23,16 +27,17 @@ from solopreneur.agent.core.tools.shell import ExecTool
 from solopreneur.agent.core.tools.web import WebSearchTool, WebFetchTool
 from solopreneur.agent.core.tools.message import MessageTool
 from solopreneur.agent.core.tools.spawn import SpawnTool
+from solopreneur.agent.core.tools.spill import ReadSpillTool
 from solopreneur.agent.core.tools.harness import HarnessTool
 from solopreneur.agent.core.tools.project_env import GetProjectEnvTool, SetProjectEnvTool
 from solopreneur.agent.core.subagent import SubagentManager
 from solopreneur.agent.core.validator import TaskCompletionValidator, ValidatorConfig
-from solopreneur.storage import UsagePersistence
+from solopreneur.storage import CompactionSummaryPersistence, get_usage_recorder
 from solopreneur.session.manager import SessionManager
 
 if TYPE_CHECKING:
     from solopreneur.agent.core.harness import LongRunningHarness
-    from solopreneur.config.schema import ExecToolConfig
+    from solopreneur.config.schema import BudgetConfig, ExecToolConfig, ToolRouterConfig
     from solopreneur.agent.core.tools.mcp import MCPManager
 
 # 安全限制常量（默认值，可通过 config 覆盖）
@@ -46,6 +51,17 @@ LLM_RETRY_BASE_DELAY = 2.0  # 基础重试延迟（秒）
 LLM_RETRY_MAX_DELAY = 30.0  # 最大重试延迟（秒）
 
 
+def _reply_target(msg: InboundMessage) -> tuple[str, str]:
+    """消息所属会话的 (channel, chat_id)：系统消息（子 Agent 宣告）的 chat_id 为 "原通道:原 chat_id"。"""
+    if msg.channel != "system":
+        return msg.channel, msg.chat_id
+    if ":" in msg.chat_id:
+        origin_channel, origin_chat_id = msg.chat_id.split(":", 1)
+        return origin_channel, origin_chat_id
+    # 备选方案
+    return "cli", msg.chat_id
+
+
 class AgentLoop:
     """
     Agent 循环是核心处理引擎。
@@ -73,8 +89,15 @@ class AgentLoop:
         memory_search_config: dict | None = None,
         history_window: int = 50,
         mcp_manager: "MCPManager | None" = None,
+        max_concurrency: int = 8,
+        channel_concurrency: dict[str, int] | None = None,
+        tool_router_config: "ToolRouterConfig | None" = None,
+        budget_config: "BudgetConfig | None" = None,
+        tokenizer: str = "auto",
+        rolling_summary: bool = True,
+        background_compaction_ratio: float = 0.6,
     ):
-        from solopreneur.config.schema import ExecToolConfig
+        from solopreneur.config.schema import BudgetConfig, ExecToolConfig, ToolRouterConfig
         self.bus = bus
         self.provider = provider
         self.workspace = workspace
@@ -84,12 +107,18 @@ class AgentLoop:
         self.exec_config = exec_config or ExecToolConfig()
         self.max_session_tokens = max_session_tokens or DEFAULT_MAX_TOKENS_PER_SESSION
         self.max_total_time = max_total_time or DEFAULT_MAX_TOTAL_TIME
+        self.budget_config = budget_config or BudgetConfig()
+        self.background_compaction_ratio = background_compaction_ratio
         self.history_window = history_window
         
         self.context = ContextBuilder(workspace, memory_search_config=memory_search_config)
-        self.usage_store = UsagePersistence()
+        self.usage_store = get_usage_recorder()
         self.sessions = SessionManager(workspace)
         self.tools = ToolRegistry()
+        # 工具较多时按轮次筛选发送给 LLM 的工具子集
+        self.tool_router = ToolRouter.from_config(tool_router_config or ToolRouterConfig())
+        # 按工作目录复用的请求级工具注册表：workspace -> (self.tools.version, registry)
+        self._request_tools_cache: OrderedDict[str, tuple[int, ToolRegistry]] = OrderedDict()
         self.subagents = SubagentManager(
             provider=provider,
             workspace=workspace,
@@ -97,6 +126,7 @@ class AgentLoop:
             model=self.model,
             brave_api_key=brave_api_key,
             exec_config=self.exec_config,
+            tokenizer=tokenizer,
         )
         
         # 任务完成验证器
@@ -114,6 +144,9 @@ class AgentLoop:
             provider=provider,
             workspace=workspace,
             model=self.model,
+            tokenizer=tokenizer,
+            rolling=rolling_summary,
+            summary_store=CompactionSummaryPersistence() if rolling_summary else None,
         )
 
         # 延迟导入以避免循环依赖
@@ -133,6 +166,14 @@ class AgentLoop:
         )
         
         self._running = False
+        # 入站消息按会话分片并发处理（同一会话内严格有序）
+        self.max_concurrency = max_concurrency
+        self.channel_concurrency = channel_concurrency or {}
+        self._dispatcher: SessionDispatcher | None = None
+        # 进行中的回合（按会话），支持取消与抢占
+        self.turns = TurnRegistry()
+        # 排队消息的语义记忆预取任务：id(msg) -> task
+        self._memory_prefetch: dict[int, asyncio.Task[str]] = {}
         # MCP Manager（可选）：管理 Docker/SSE MCP 服务器工具
         self.mcp_manager = mcp_manager
         self._register_default_tools()
@@ -148,99 +189,61 @@ class AgentLoop:
         self.workflow_engine.set_harness(harness)
         logger.debug(f"Validator & WorkflowEngine harness set: {harness is not None}")
 
-    def _record_usage(
-        self,
-        session_key: str,
-        model: str,
-        usage: dict[str, int] | None,
-        duration_ms: int,
-        is_stream: bool,
-    ) -> None:
-        """记录一次 LLM 调用 usage（失败不影响主流程）。"""
-        usage = usage or {}
-        try:
-            self.usage_store.record(
-                session_key=session_key,
-                model=model,
-                prompt_tokens=usage.get("prompt_tokens", 0),
-                completion_tokens=usage.get("completion_tokens", 0),
-                total_tokens=usage.get("total_tokens", 0),
-                duration_ms=duration_ms,
-                is_stream=is_stream,
-            )
-        except Exception as e:
-            logger.warning(f"记录 LLM usage 失败: {e}")
-    
-    async def _call_llm_with_retry(
-        self,
-        messages: list[dict],
-        tools: list[dict] | None,
-        on_chunk: Any = None,
-        use_stream: bool = True,
-    ) -> tuple[Any, bool]:
-        """
-        带重试机制的 LLM 调用。
-
-        Args:
-            messages: 消息列表
-            tools: 工具定义列表
-            on_chunk: 流式回调
-            use_stream: 是否使用流式调用
-
-        Returns:
-            (response, success) - 响应对象和是否成功
-
-        Raises:
-            最后一次重试失败后抛出异常
-        """
-        import random
+    def _make_engine(self, tools: ToolRegistry, usage_key: str) -> TurnEngine:
+        """创建主 Agent 的回合引擎（请求预算、压缩与网络错误重试）。"""
         from httpx import ReadTimeout, ConnectTimeout, ReadError, ConnectError
 
-        last_error = None
-
-        for attempt in range(LLM_MAX_RETRIES):
-            try:
-                if use_stream and hasattr(self.provider, "chat_stream") and on_chunk:
-                    response = await self.provider.chat_stream(
-                        messages=messages,
-                        tools=tools,
-                        model=self.model,
-                        on_chunk=on_chunk,
-                    )
-                else:
-                    response = await self.provider.chat(
-                        messages=messages,
-                        tools=tools,
-                        model=self.model,
-                    )
-                return response, True
-
-            except (ReadTimeout, ConnectTimeout, ReadError, ConnectError, asyncio.TimeoutError) as e:
-                last_error = e
-                if attempt < LLM_MAX_RETRIES - 1:
-                    # 指数退避 + 随机抖动
-                    delay = min(
-                        LLM_RETRY_BASE_DELAY * (2 ** attempt) + random.uniform(0, 1),
-                        LLM_RETRY_MAX_DELAY
-                    )
-                    logger.warning(
-                        f"LLM 调用失败 (尝试 {attempt + 1}/{LLM_MAX_RETRIES}): {type(e).__name__}: {e}。"
-                        f"将在 {delay:.1f} 秒后重试..."
-                    )
-                    await asyncio.sleep(delay)
-                else:
-                    logger.error(f"LLM 调用失败，已达到最大重试次数 ({LLM_MAX_RETRIES})")
-                    raise
+        return TurnEngine(
+            self.provider,
+            tools,
+            self.model,
+            max_iterations=self.max_iterations,
+            max_session_tokens=self.max_session_tokens,
+            compaction=self.compaction,
+            max_compaction_rounds=MAX_COMPACTION_ROUNDS,
+            background_compaction_ratio=self.background_compaction_ratio,
+            # 仅网络类错误重试，其他异常直接抛出
+            retry=RetryPolicy(
+                max_attempts=LLM_MAX_RETRIES,
+                base_delay=LLM_RETRY_BASE_DELAY,
+                max_delay=LLM_RETRY_MAX_DELAY,
+                retry_on=(ReadTimeout, ConnectTimeout, ReadError, ConnectError, asyncio.TimeoutError),
+            ),
+            usage_store=self.usage_store,
+            usage_key=usage_key,
+            # 每个请求一份预算，墙钟上限即 agent_timeout，到期时取消在途调用
+            budget=Budget.from_config(self.budget_config, max_seconds=self.max_total_time),
+        )
 
-            except Exception as e:
-                # 其他异常直接抛出，不重试
-                logger.error(f"LLM 调用遇到非网络错误: {type(e).__name__}: {e}")
-                raise
+    def _completion_check(self, on_chunk: Any = None) -> Any:
+        """
+        构造回合引擎的 on_final 钩子：LLM 不再调用工具时判断任务是否真正完成。
 
-        # 理论上不会到达这里，但为了类型安全
-        if last_error:
-            raise last_error
-        raise RuntimeError("LLM 调用失败，未知错误")
+        1. 最小迭代次数未满足时强制继续
+        2. 任务完成验证未通过时注入继续提示（受最大继续次数限制）
+        """
+        async def on_final(response: Any, state: TurnState) -> str | None:
+            continuation_prompt = None
+
+            force_continue, reason = self.validator.should_force_continue(state.iteration)
+            if force_continue:
+                continuation_prompt = f"任务刚开始，请继续调用工具工作。\n原因: {reason}"
+                logger.info(f"迭代次数不足 ({state.iteration}/{self.validator_config.min_iterations})，强制继续")
+            elif self.validator.can_send_continuation_prompt():
+                # 流式路径以已输出的全部文本作为验证对象
+                content = (state.streamed_text if on_chunk else "") or response.content or ""
+                validation_result = await self.validator.validate(content)
+                if not validation_result.is_complete:
+                    continuation_prompt = validation_result.get_continuation_prompt()
+                    self.validator.increment_continuation_count()
+                    logger.info(f"任务完成验证未通过: {validation_result.reasons}")
+
+            if continuation_prompt and on_chunk:
+                # 通知 UI 任务未完成，继续处理
+                await on_chunk("\n\n---\n**[系统] 任务未完成，继续执行...**\n\n")
+            return continuation_prompt
+
+        return on_final
 
     def _register_default_tools(self) -> None:
         """注册默认工具集。"""
@@ -251,6 +254,8 @@ class AgentLoop:
         self.tools.register(ListDirTool(workspace=self.workspace))
         self.tools.register(DBInspectTool())
         self.tools.register(MetricsInspectTool())
+        # 分段读取被微压缩移出上下文的工具输出
+        self.tools.register(ReadSpillTool(self.compaction.spill_store))
         self.tools.register(SearchCodeTool(workspace=self.workspace))
         self.tools.register(GitInspectTool(workspace=self.workspace))
         self.tools.register(GitCommandTool(workspace=self.workspace))
@@ -315,6 +320,9 @@ class AgentLoop:
         if self.mcp_manager and not self.mcp_manager.is_empty():
             self.mcp_manager.register_tools(self.tools)
 
+        # 工具路由的兜底入口：模型可按需解锁本轮未提供的工具
+        self.tools.register(RequestMoreToolsTool(router=self.tool_router, registry=self.tools))
+
     def _resolve_request_workspace(self, project_info: dict | None) -> Path:
         """根据项目上下文解析本次请求应使用的工作目录。"""
         if project_info and project_info.get("path"):
@@ -327,8 +335,30 @@ class AgentLoop:
                 logger.warning(f"解析项目路径失败，回退到默认工作区: {e}")
         return self.workspace
 
+    _REQUEST_TOOLS_CACHE_SIZE = 16
+
     def _build_request_tools(self, request_workspace: Path) -> ToolRegistry:
-        """为单次请求构建工具注册表，确保文件/命令作用域正确。"""
+        """
+        获取请求级工具注册表，确保文件/命令作用域正确。
+
+        同一工作目录的请求复用同一注册表（及其缓存的 schema）；
+        主注册表变化（如 MCP 工具接入）后自动重建。
+        """
+        key = str(request_workspace)
+        cached = self._request_tools_cache.get(key)
+        if cached is not None and cached[0] == self.tools.version:
+            self._request_tools_cache.move_to_end(key)
+            return cached[1]
+
+        tools = self._create_request_tools(request_workspace)
+        self._request_tools_cache[key] = (self.tools.version, tools)
+        self._request_tools_cache.move_to_end(key)
+        while len(self._request_tools_cache) > self._REQUEST_TOOLS_CACHE_SIZE:
+            self._request_tools_cache.popitem(last=False)
+        return tools
+
+    def _create_request_tools(self, request_workspace: Path) -> ToolRegistry:
+        """为指定工作目录新建工具注册表。"""
         tools = ToolRegistry()
 
         # 路径敏感工具：绑定到当前请求工作目录
@@ -352,9 +382,9 @@ class AgentLoop:
 
         # 非路径敏感/状态工具：沿用已注册实例
         for name in [
-            "db_inspect", "metrics_inspect", "web_search", "web_fetch",
+            "db_inspect", "metrics_inspect", "read_spill", "web_search", "web_fetch",
             "message", "spawn", "delegate", "delegate_parallel", "delegate_auto",
-            "run_workflow", "workflow_control",
+            "run_workflow", "workflow_control", "request_more_tools",
         ]:
             t = self.tools.get(name)
             if t is not None:
@@ -369,66 +399,153 @@ class AgentLoop:
 
         return tools
 
-    # ── 上下文压缩（委托给 CompactionEngine）─────────────────────────
+    async def run(self) -> None:
+        """
+        运行 agent 循环，处理总线传来的消息。
 
-    async def _compact_context(self, messages: list[dict]) -> list[dict]:
+        消息按 session_key 分派到并发 worker：同一会话内严格按到达顺序处理，
+        不同会话并行执行（受全局与各通道并发上限约束）。
         """
-        使用三层压缩引擎压缩上下文。
+        self._running = True
+        # 重放上次运行时溢出落盘、尚未处理的入站消息
+        await self.bus.start()
+        self._dispatcher = SessionDispatcher(
+            self._handle_inbound,
+            max_concurrency=self.max_concurrency,
+            channel_limits=self.channel_concurrency,
+        )
+        logger.info(f"Agent 循环已启动（并发上限 {self._dispatcher.max_concurrency}）")
+        
+        try:
+            while self._running:
+                try:
+                    # 等待下一条消息
+                    msg = await asyncio.wait_for(
+                        self.bus.consume_inbound(),
+                        timeout=1.0
+                    )
+                except asyncio.TimeoutError:
+                    continue
+                self._start_memory_prefetch(msg)
+                self._dispatcher.submit(msg)
+        finally:
+            await self._dispatcher.close()
+            for task in self._memory_prefetch.values():
+                task.cancel()
+            self._memory_prefetch.clear()
+
+    def _start_memory_prefetch(self, msg: InboundMessage) -> None:
+        """消息入队时即开始检索语义记忆，与同会话前序消息的处理重叠。
+
+        以消息对象的 id 为键：消息从入队到 _handle_inbound 取出之前一直由调度队列持有，
+        期间 id 不会被复用；取出后由 _handle_inbound 负责收尾。
+        """
+        # 系统消息（子 Agent 宣告）不检索语义记忆
+        if msg.channel == "system":
+            return
+        # 限制同时预取的数量，避免积压时对嵌入服务造成突发压力
+        if len(self._memory_prefetch) >= self.max_concurrency * 2:
+            return
+        self._memory_prefetch[id(msg)] = asyncio.create_task(
+            self.context.fetch_semantic_memory(msg.content)
+        )
 
-        1. 先执行微压缩（大型工具输出落盘）
-        2. 再执行 LLM 驱动的自动压缩（结构化摘要）
+    async def _prepare_context(
+        self,
+        session_key: str,
+        query: str,
+        project_info: dict | None = None,
+        memory_task: "asyncio.Task[str] | None" = None,
+    ) -> tuple[Any, str, tuple[list[str], list[str]]]:
+        """
+        并发准备一轮对话的上下文：会话加载、语义记忆检索、system prompt 组装。
+
+        记忆检索受 memory_search.retrieval_timeout 约束，超时则本轮不注入记忆。
 
         Returns:
-            压缩后的消息列表
+            (session, semantic_memory, prompt_sections)
         """
-        # 层1: 微压缩
-        messages = self.compaction.microcompact(messages)
-
-        # 层2: LLM 摘要压缩
-        messages = await self.compaction.auto_compact(messages)
+        if memory_task is None:
+            memory_task = asyncio.create_task(
+                self.context.fetch_semantic_memory(query, project_info=project_info)
+            )
+        session, prompt_sections, semantic_memory = await asyncio.gather(
+            self.sessions.aget_or_create(session_key),
+            asyncio.to_thread(self.context.build_prompt_sections, None, project_info),
+            self.context.await_semantic_memory(memory_task, self.context.memory_timeout),
+        )
+        return session, semantic_memory, prompt_sections
+
+    async def _handle_inbound(self, msg: InboundMessage) -> None:
+        """处理单条入站消息并发布响应（由会话 worker 调用）。"""
+        # 在第一个 await 之前取出预取任务：回合被取消或出错时也不会残留
+        memory_task = self._memory_prefetch.pop(id(msg), None)
+        # 系统消息的回合读写来源会话，按来源会话登记，cancel(来源会话) 才能取消它
+        channel, chat_id = _reply_target(msg)
+        try:
+            response = await self.turns.run(
+                f"{channel}:{chat_id}", self._process_message(msg, memory_task=memory_task)
+            )
+            if response:
+                await self.bus.publish_outbound(response)
+        except TurnCancelledError as e:
+            logger.info(str(e))
+            await self.bus.publish_outbound(OutboundMessage(
+                channel=channel,
+                chat_id=chat_id,
+                content="任务已取消。",
+            ))
+        except Exception as e:
+            logger.error(f"处理消息时出错: {e}")
+            # 发送错误响应
+            await self.bus.publish_outbound(OutboundMessage(
+                channel=channel,
+                chat_id=chat_id,
+                content=f"抱歉，我遇到了一个错误: {str(e)}"
+            ))
+        finally:
+            if memory_task is not None and not memory_task.done():
+                memory_task.cancel()
+
+    def dispatch_stats(self) -> dict[str, Any]:
+        """入站调度队列深度与并发情况（run 未启动时为空）。"""
+        if self._dispatcher is None:
+            return {
+                "active": False, "active_sessions": 0, "pending": 0, "running": 0,
+                "pending_by_channel": {}, "running_by_channel": {},
+                "max_concurrency": self.max_concurrency,
+                "channel_limits": dict(self.channel_concurrency),
+                "processed": 0, "failed": 0,
+            }
+        return {"active": self._running, **self._dispatcher.stats()}
+    
+    def cancel(self, session_key: str, reason: str = "user", include_background: bool = False) -> dict[str, Any]:
+        """
+        取消会话进行中的回合。
 
-        return messages
+        取消沿 LLM 调用、exec 子进程、MCP 请求与同步委派的子 Agent 传播；
+        include_background=True 时同时取消该会话生成的后台子 Agent。
+        """
+        cancelled = self.turns.cancel(session_key, reason)
+        background = self.subagents.cancel_for_session(session_key) if include_background else 0
+        if cancelled or background:
+            logger.info(f"已取消会话 {session_key} 的回合 (reason={reason}, 后台子 Agent {background} 个)")
+        return {"cancelled": cancelled, "background_cancelled": background}
 
-    async def run(self) -> None:
-        """运行 agent 循环，处理总线传来的消息。"""
-        self._running = True
-        logger.info("Agent 循环已启动")
-        
-        while self._running:
-            try:
-                # 等待下一条消息
-                msg = await asyncio.wait_for(
-                    self.bus.consume_inbound(),
-                    timeout=1.0
-                )
-                
-                # 处理消息
-                try:
-                    response = await self._process_message(msg)
-                    if response:
-                        await self.bus.publish_outbound(response)
-                except Exception as e:
-                    logger.error(f"处理消息时出错: {e}")
-                    # 发送错误响应
-                    await self.bus.publish_outbound(OutboundMessage(
-                        channel=msg.channel,
-                        chat_id=msg.chat_id,
-                        content=f"抱歉，我遇到了一个错误: {str(e)}"
-                    ))
-            except asyncio.TimeoutError:
-                continue
-    
     def stop(self) -> None:
         """停止 agent 循环。"""
         self._running = False
         logger.info("Agent 循环正在停止")
     
-    async def _process_message(self, msg: InboundMessage) -> OutboundMessage | None:
+    async def _process_message(
+        self, msg: InboundMessage, memory_task: "asyncio.Task[str] | None" = None
+    ) -> OutboundMessage | None:
         """
         处理单条入站消息。
         
         参数:
             msg: 要处理的入站消息。
+            memory_task: 入队时启动的语义记忆预取任务（可选）。
         
         返回:
             响应消息，如果不需要响应则为 None。
@@ -440,9 +557,6 @@ class AgentLoop:
         
         logger.info(f"正在处理来自 {msg.channel}:{msg.sender_id} 的消息")
         
-        # 获取或创建会话
-        session = self.sessions.get_or_create(msg.session_key)
-        
         # 重置验证器状态（新会话开始）
         self.validator.reset()
         # 设置验证上下文（用户请求）
@@ -457,8 +571,10 @@ class AgentLoop:
         if isinstance(spawn_tool, SpawnTool):
             spawn_tool.set_context(msg.channel, msg.chat_id)
         
-        # 语义记忆检索（将用户消息作为 query）
-        _semantic_mem = await self.context.fetch_semantic_memory(msg.content)
+        # 并发：获取或创建会话、语义记忆检索（将用户消息作为 query）、system prompt 组装
+        session, _semantic_mem, prompt_sections = await self._prepare_context(
+            msg.session_key, msg.content, memory_task=memory_task
+        )
 
         # 构建初始消息（使用 get_history 获取 LLM 格式的消息）
         messages = self.context.build_messages(
@@ -466,134 +582,26 @@ class AgentLoop:
             current_message=msg.content,
             media=msg.media if msg.media else None,
             semantic_memory=_semantic_mem,
+            prompt_sections=prompt_sections,
         )
-        
-        # Agent 循环 - 添加安全限制
-        iteration = 0
-        final_content = None
-        start_time = time.time()
-        total_tokens = 0
-        compacted_count = 0  # 已压缩次数
-        
-        while iteration < self.max_iterations:
-            iteration += 1
-            
-            # 时间检查
-            elapsed_time = time.time() - start_time
-            if elapsed_time > self.max_total_time:
-                final_content = f"⚠️ 执行时间已超过 {self.max_total_time // 60} 分钟上限，任务已暂停。如需延长，请在配置中增大 agent_timeout 值后重试。"
-                logger.warning(f"Agent循环超时: {elapsed_time:.1f}秒 (上限: {self.max_total_time}秒)")
-                break
-            
-            # 调用 LLM 前：主动检测是否需要压缩 (78% 阈值)
-            if self.compaction.should_compact(messages, self.max_session_tokens):
-                compacted_count += 1
-                if compacted_count <= MAX_COMPACTION_ROUNDS:
-                    logger.info(
-                        f"上下文使用率达到阈值，执行预防性压缩 (第{compacted_count}次)"
-                    )
-                    messages = await self._compact_context(messages)
-                    total_tokens = 0
-
-            # 调用 LLM
-            llm_start = time.time()
-            response = await self.provider.chat(
-                messages=messages,
-                tools=self.tools.get_definitions(),
-                model=self.model
-            )
-            llm_duration_ms = int((time.time() - llm_start) * 1000)
-            self._record_usage(
-                session_key=msg.session_key,
-                model=self.model,
-                usage=response.usage,
-                duration_ms=llm_duration_ms,
-                is_stream=False,
-            )
-            
-            # Token 消耗检查：超限时压缩上下文而非停止
-            total_tokens += response.usage.get("total_tokens", 0)
-            if total_tokens > self.max_session_tokens:
-                compacted_count += 1
-                if compacted_count >= MAX_COMPACTION_ROUNDS:
-                    # 多次压缩仍超标，强制停止
-                    final_content = f"Token消耗过多（{total_tokens}），已多次压缩上下文仍无法控制，请开始新的对话。"
-                    logger.warning(f"Token消耗超限且压缩次数用尽: {total_tokens}")
-                    break
-                logger.info(
-                    f"Token累计 {total_tokens}/{self.max_session_tokens} 超限，"
-                    f"执行上下文压缩 (第{compacted_count}次)"
-                )
-                messages = await self._compact_context(messages)
-                total_tokens = 0  # 压缩后重置计数
-            
-            # 处理工具调用
-            if response.has_tool_calls:
-                # 添加带有工具调用的 assistant 消息
-                tool_call_dicts = [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.name,
-                            "arguments": json.dumps(tc.arguments)  # 必须是 JSON 字符串
-                        }
-                    }
-                    for tc in response.tool_calls
-                ]
-                messages = self.context.add_assistant_message(
-                    messages, response.content, tool_call_dicts
-                )
-                
-                # 执行工具
-                for tool_call in response.tool_calls:
-                    args_str = json.dumps(tool_call.arguments)
-                    logger.debug(f"正在执行工具：{tool_call.name}，参数：{args_str}")
-                    result = await self.tools.execute(tool_call.name, tool_call.arguments)
-                    messages = self.context.add_tool_result(
-                        messages, tool_call.id, tool_call.name, result
-                    )
-
-                # 工具调用后执行微压缩（大型输出落盘）
-                messages = self.compaction.microcompact(messages)
-            else:
-                # 没有工具调用，验证任务是否真正完成
-                should_continue = False
-                continuation_prompt = ""
-                
-                # 1. 检查最小迭代次数
-                force_continue, reason = self.validator.should_force_continue(iteration)
-                if force_continue:
-                    should_continue = True
-                    continuation_prompt = f"任务刚开始，请继续调用工具工作。\n原因: {reason}"
-                    logger.info(f"迭代次数不足 ({iteration}/{self.validator_config.min_iterations})，强制继续")
-                
-                # 2. 任务完成验证（仅当最小迭代满足时）
-                if not should_continue and self.validator.can_send_continuation_prompt():
-                    validation_result = await self.validator.validate(response.content or "")
-                    if not validation_result.is_complete:
-                        should_continue = True
-                        continuation_prompt = validation_result.get_continuation_prompt()
-                        self.validator.increment_continuation_count()
-                        logger.info(f"任务完成验证未通过: {validation_result.reasons}")
-                
-                if should_continue:
-                    # 注入继续提示，强制 LLM 继续工作
-                    messages.append({
-                        "role": "user",
-                        "content": continuation_prompt
-                    })
-                    continue
-                
-                # 验证通过，处理完成
-                final_content = response.content
-                break
+        user_content = messages[-1]["content"]
+        
+        # Agent 循环（安全限制、压缩、重试由回合引擎统一处理）
+        self.tool_router.begin_request()
+        result = await self._make_engine(self.tools, usage_key=msg.session_key).run(
+            messages,
+            TurnHooks(
+                select_tools=lambda state: self.tool_router.select(self.tools, msg.content, state.used_tools),
+                on_final=self._completion_check(),
+            ),
+        )
+        final_content = result.content
         
         if final_content is None:
             final_content = "我已处理完毕，但没有生成任何响应。"
         
-        # 保存到会话
-        session.add_message("user", msg.content)
+        # 保存到会话（图片只保留文字说明，之后的回合不再重复发送）
+        session.add_message("user", self.context.history_content(user_content))
         session.add_message("assistant", final_content)
         self.sessions.save(session)
         
@@ -612,18 +620,10 @@ class AgentLoop:
         logger.info(f"正在处理来自 {msg.sender_id} 的系统消息")
         
         # 从 chat_id 解析来源（格式："channel:chat_id"）
-        if ":" in msg.chat_id:
-            parts = msg.chat_id.split(":", 1)
-            origin_channel = parts[0]
-            origin_chat_id = parts[1]
-        else:
-            # 备选方案
-            origin_channel = "cli"
-            origin_chat_id = msg.chat_id
+        origin_channel, origin_chat_id = _reply_target(msg)
         
         # 使用原始会话作为上下文
         session_key = f"{origin_channel}:{origin_chat_id}"
-        session = self.sessions.get_or_create(session_key)
         
         # 更新工具上下文
         message_tool = self.tools.get("message")
@@ -634,64 +634,28 @@ class AgentLoop:
         if isinstance(spawn_tool, SpawnTool):
             spawn_tool.set_context(origin_channel, origin_chat_id)
         
-        # 语义记忆检索
-        _semantic_mem = await self.context.fetch_semantic_memory(msg.content)
+        # 并发：会话加载、语义记忆检索、system prompt 组装
+        session, _semantic_mem, prompt_sections = await self._prepare_context(
+            session_key, msg.content
+        )
 
         # 使用宣告内容构建消息
         messages = self.context.build_messages(
             history=session.get_history(self.history_window),
             current_message=msg.content,
             semantic_memory=_semantic_mem,
+            prompt_sections=prompt_sections,
         )
         
-        # Agent 循环（针对宣告处理进行了限制）
-        iteration = 0
-        final_content = None
-        
-        while iteration < self.max_iterations:
-            iteration += 1
-            
-            llm_start = time.time()
-            response = await self.provider.chat(
-                messages=messages,
-                tools=self.tools.get_definitions(),
-                model=self.model
-            )
-            llm_duration_ms = int((time.time() - llm_start) * 1000)
-            self._record_usage(
-                session_key=session_key,
-                model=self.model,
-                usage=response.usage,
-                duration_ms=llm_duration_ms,
-                is_stream=False,
-            )
-            
-            if response.has_tool_calls:
-                tool_call_dicts = [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.name,
-                            "arguments": json.dumps(tc.arguments)
-                        }
-                    }
-                    for tc in response.tool_calls
-                ]
-                messages = self.context.add_assistant_message(
-                    messages, response.content, tool_call_dicts
-                )
-                
-                for tool_call in response.tool_calls:
-                    args_str = json.dumps(tool_call.arguments)
-                    logger.debug(f"正在执行工具：{tool_call.name}，参数：{args_str}")
-                    result = await self.tools.execute(tool_call.name, tool_call.arguments)
-                    messages = self.context.add_tool_result(
-                        messages, tool_call.id, tool_call.name, result
-                    )
-            else:
-                final_content = response.content
-                break
+        # Agent 循环（宣告处理无需完成验证）
+        self.tool_router.begin_request()
+        result = await self._make_engine(self.tools, usage_key=session_key).run(
+            messages,
+            TurnHooks(
+                select_tools=lambda state: self.tool_router.select(self.tools, msg.content, state.used_tools),
+            ),
+        )
+        final_content = result.content
         
         if final_content is None:
             final_content = "后台任务已完成。"
@@ -730,7 +694,7 @@ class AgentLoop:
             content=content
         )
         
-        response = await self._process_message(msg)
+        response = await self.turns.run(session_key, self._process_message(msg))
         return response.content if response else ""
 
     async def process_direct_stream(
@@ -740,20 +704,41 @@ class AgentLoop:
         on_chunk: Any = None,
         on_trace: Any = None,
         project_info: dict | None = None,
+        preempt: bool = False,
     ) -> str:
         """
         流式直接处理消息，支持实时文本输出和调用链路跟踪。
 
+        回合登记在 self.turns 中，可通过 cancel(session_key) 取消。
+
         Args:
             content: 消息内容。
             session_key: 会话标识符。
             on_chunk: 异步回调 async def on_chunk(text: str)，收到文本片段时调用。
             on_trace: 异步回调 async def on_trace(event: dict)，跟踪事件时调用。
             project_info: 项目信息字典，包含 id, name, path 等。
+            preempt: 是否先取消同一会话仍在进行的回合。
 
         Returns:
             Agent 的完整响应文本。
+
+        Raises:
+            TurnCancelledError: 回合被取消。
         """
+        return await self.turns.run(
+            session_key,
+            self._process_direct_stream(content, session_key, on_chunk, on_trace, project_info),
+            preempt=preempt,
+        )
+
+    async def _process_direct_stream(
+        self,
+        content: str,
+        session_key: str,
+        on_chunk: Any,
+        on_trace: Any,
+        project_info: dict | None,
+    ) -> str:
         if ":" in session_key:
             channel, chat_id = session_key.split(":", 1)
         else:
@@ -775,7 +760,11 @@ class AgentLoop:
         request_workspace = self._resolve_request_workspace(project_info)
         request_tools = self._build_request_tools(request_workspace)
 
-        session = self.sessions.get_or_create(msg.session_key)
+        # 会话加载、语义记忆检索（含项目级记忆）与 system prompt 组装在后台并发进行，
+        # 与下面的 Harness 启动测试重叠
+        context_task = asyncio.create_task(
+            self._prepare_context(msg.session_key, msg.content, project_info=project_info)
+        )
 
         # 初始化并设置 Harness（长期运行框架）
         from solopreneur.agent.core.harness import LongRunningHarness
@@ -810,27 +799,16 @@ class AgentLoop:
         if isinstance(spawn_tool, SpawnTool):
             spawn_tool.set_context(msg.channel, msg.chat_id)
 
-        # 语义记忆检索（含项目级记忆）
-        _semantic_mem = await self.context.fetch_semantic_memory(
-            msg.content, project_info=project_info
-        )
+        session, _semantic_mem, prompt_sections = await context_task
 
         messages = self.context.build_messages(
             history=session.get_history(self.history_window),
             current_message=msg.content,
             project_info=project_info,
             semantic_memory=_semantic_mem,
+            prompt_sections=prompt_sections,
         )
-
-        iteration = 0
-        start_time = time.time()
-        total_tokens = 0
-        total_prompt_tokens = 0
-        total_completion_tokens = 0
-        compacted_count = 0  # 已压缩次数
-
-        # 累积所有流式输出的文本
-        all_streamed: list[str] = []
+        user_content = messages[-1]["content"]
 
         async def _emit_trace(event: dict):
             if on_trace:
@@ -839,356 +817,81 @@ class AgentLoop:
         # 将 trace 发射器注入子 Agent 管理器，形成统一调用链
         self.subagents.set_trace_emitter(_emit_trace)
 
-        async def _track_chunk(text: str):
-            all_streamed.append(text)
+        # 已输出的文本（回合被取消时保存到会话）
+        streamed: list[str] = []
+
+        async def _on_chunk(text: str) -> None:
+            streamed.append(text)
             if on_chunk:
                 await on_chunk(text)
 
-        def _make_result_preview(result: Any, max_chars: int = 800) -> str:
-            """生成工具输出的可展示预览，避免 UI 过载。"""
-            try:
-                if isinstance(result, str):
-                    text = result
-                else:
-                    text = json.dumps(result, ensure_ascii=False, default=str)
-            except Exception:
-                text = str(result)
-
-            text = text.strip()
-            if len(text) > max_chars:
-                return text[:max_chars] + "\n...<truncated>"
-            return text
-
-        def _extract_skill_name(tool_name: str, tool_args: dict[str, Any] | None) -> str | None:
-            """识别 read_file 读取 skill 文件的场景，并提取 skill 名称。"""
-            if tool_name != "read_file" or not tool_args:
-                return None
-            path = str(tool_args.get("path") or "")
-            if not path:
-                return None
-
-            normalized = path.replace("\\", "/")
-            match = re.search(r"/skills/([^/]+)/SKILL\.md$", normalized, re.IGNORECASE)
-            if not match:
-                return None
-            return match.group(1)
+        async def _on_llm_error(e: Exception, state: TurnState) -> str:
+            # 重试耗尽后的错误处理：告知用户并结束本轮
+            error_msg = f"LLM 调用失败: {type(e).__name__}: {e}"
+            logger.error(error_msg)
+            await _on_chunk(f"\n\n**[错误]** {error_msg}")
+            state.streamed.append(error_msg)
+            return error_msg
+
+        def _prepare_tool_args(tool_call: Any, tool_args: dict[str, Any]) -> dict[str, Any]:
+            if tool_call.name == "run_workflow" and project_info:
+                if not tool_args.get("project_dir") and project_info.get("path"):
+                    tool_args["project_dir"] = str(project_info.get("path"))
+                if not tool_args.get("project_name") and project_info.get("name"):
+                    tool_args["project_name"] = str(project_info.get("name"))
+            if tool_call.name in {"run_workflow", "delegate", "delegate_parallel", "delegate_auto"}:
+                logger.info(f"请求作用域工作目录: {request_workspace}")
+            return tool_args
 
         # 发送开始事件
+        start_time = time.time()
         await _emit_trace({
             "event": "start",
             "agent_name": "主控 Agent",
             "model": self.model,
             "session_key": session_key,
-            "timestamp": time.time(),
+            "timestamp": start_time,
         })
 
-        while iteration < self.max_iterations:
-            iteration += 1
-
-            elapsed = time.time() - start_time
-            if elapsed > self.max_total_time:
-                timeout_msg = f"⚠️ 执行时间已超过 {self.max_total_time // 60} 分钟上限，任务已暂停。如需延长，请在配置中增大 agent_timeout 值后重试。"
-                logger.warning(f"Agent循环超时: {elapsed:.1f}秒 (上限: {self.max_total_time}秒)")
-                if on_chunk:
-                    await on_chunk(timeout_msg)
-                all_streamed.append(timeout_msg)
-                break
-
-            # 调用 LLM 前：主动检测是否需要压缩 (78% 阈值)
-            if self.compaction.should_compact(messages, self.max_session_tokens):
-                compacted_count += 1
-                if compacted_count <= MAX_COMPACTION_ROUNDS:
-                    logger.info(
-                        f"上下文使用率达到阈值，执行预防性压缩 (第{compacted_count}次)"
-                    )
-                    messages = await self._compact_context(messages)
-                    total_tokens = 0
-                    await _emit_trace({
-                        "event": "compaction",
-                        "type": "proactive",
-                        "round": compacted_count,
-                        "timestamp": time.time(),
-                    })
-
-            # 发送 LLM 调用开始事件
-            llm_start = time.time()
-            await _emit_trace({
-                "event": "llm_start",
-                "agent_name": "主控 Agent",
-                "iteration": iteration,
-                "model": self.model,
-                "timestamp": llm_start,
-            })
-
-            # 使用带重试的 LLM 调用
-            try:
-                response, call_success = await self._call_llm_with_retry(
-                    messages=messages,
-                    tools=request_tools.get_definitions(),
-                    on_chunk=_track_chunk,
-                    use_stream=True,
-                )
-                llm_duration_ms = int((time.time() - llm_start) * 1000)
-                self._record_usage(
-                    session_key=msg.session_key,
-                    model=self.model,
-                    usage=response.usage,
-                    duration_ms=llm_duration_ms,
-                    is_stream=True,
-                )
-            except Exception as e:
-                # 重试耗尽后的错误处理
-                error_msg = f"LLM 调用失败: {type(e).__name__}: {e}"
-                logger.error(error_msg)
-                if on_chunk:
-                    await on_chunk(f"\n\n**[错误]** {error_msg}")
-                all_streamed.append(error_msg)
-                break
-
-            llm_end = time.time()
-
-            # 获取 token 数据，如果 provider 没有返回则估算
-            if response.usage and any(response.usage.values()):
-                # Provider 返回了 usage 数据
-                prompt_tokens = response.usage.get("prompt_tokens", 0)
-                completion_tokens = response.usage.get("completion_tokens", 0)
-                step_tokens = response.usage.get("total_tokens", 0)
-            else:
-                # Provider 没有返回 usage 数据，使用简单估算
-                # 假设：中文约 1.5 token/字，英文约 0.25 token/字
-                # 这里使用粗略估算：字符数 / 2
-                total_chars = sum(len(msg.get("content", "")) for msg in messages)
-                output_chars = len("".join(all_streamed)) if all_streamed else 0
-                prompt_tokens = total_chars // 2
-                completion_tokens = output_chars // 2
-                step_tokens = prompt_tokens + completion_tokens
-                logger.warning(
-                    f"LLM provider did not return usage data, estimating tokens: "
-                    f"prompt={prompt_tokens}, completion={completion_tokens}, total={step_tokens}"
-                )
-
-            total_tokens += step_tokens
-            total_prompt_tokens += prompt_tokens
-            total_completion_tokens += completion_tokens
-
-            # 调试日志
-            logger.info(f"LLM usage data: {response.usage}, tokens: prompt={prompt_tokens}, completion={completion_tokens}, total={step_tokens}")
-
-            # 发送 LLM 调用结束事件
-            await _emit_trace({
-                "event": "llm_end",
-                "agent_name": "主控 Agent",
-                "iteration": iteration,
-                "model": self.model,
-                "duration_ms": round((llm_end - llm_start) * 1000),
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_tokens": step_tokens,
-                "cumulative_tokens": total_tokens,
-                "has_tool_calls": response.has_tool_calls,
-                "timestamp": llm_end,
-            })
-
-            if total_tokens > self.max_session_tokens:
-                compacted_count += 1
-                if compacted_count >= MAX_COMPACTION_ROUNDS:
-                    warn_msg = f"Token消耗过多（{total_tokens}），已多次压缩上下文仍无法控制，请开始新的对话。"
-                    logger.warning(f"Token消耗超限且压缩次数用尽: {total_tokens}")
-                    if on_chunk:
-                        await on_chunk(warn_msg)
-                    all_streamed.append(warn_msg)
-                    break
-                logger.info(
-                    f"Token累计 {total_tokens}/{self.max_session_tokens} 超限，"
-                    f"执行上下文压缩 (第{compacted_count}次)"
-                )
-                messages = await self._compact_context(messages)
-                total_tokens = 0  # 压缩后重置计数
-                await _emit_trace({
-                    "event": "compaction",
-                    "type": "reactive",
-                    "round": compacted_count,
-                    "timestamp": time.time(),
-                })
-
-            if response.has_tool_calls:
-                tool_call_dicts = [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.name,
-                            "arguments": json.dumps(tc.arguments),
-                        },
-                    }
-                    for tc in response.tool_calls
-                ]
-                messages = self.context.add_assistant_message(
-                    messages, response.content, tool_call_dicts
-                )
-
-                for tool_call in response.tool_calls:
-                    tool_args = dict(tool_call.arguments or {})
-                    if tool_call.name == "run_workflow" and project_info:
-                        if not tool_args.get("project_dir") and project_info.get("path"):
-                            tool_args["project_dir"] = str(project_info.get("path"))
-                        if not tool_args.get("project_name") and project_info.get("name"):
-                            tool_args["project_name"] = str(project_info.get("name"))
-
-                    delegate_agent = None
-                    if tool_call.name == "delegate":
-                        delegate_agent = str(tool_args.get("agent", ""))
-
-                    skill_name = _extract_skill_name(tool_call.name, tool_args)
-                    if skill_name:
-                        await _emit_trace({
-                            "event": "skill_start",
-                            "agent_name": "主控 Agent",
-                            "iteration": iteration,
-                            "skill_name": skill_name,
-                            "tool_name": tool_call.name,
-                            "tool_args": tool_args,
-                            "timestamp": time.time(),
-                        })
-
-                    tool_start = time.time()
-                    await _emit_trace({
-                        "event": "tool_start",
-                        "agent_name": "主控 Agent",
-                        "iteration": iteration,
-                        "tool_name": tool_call.name,
-                        "delegate_agent": delegate_agent,
-                        "tool_args": tool_args,
-                        "timestamp": tool_start,
-                    })
-
-                    logger.debug(
-                        f"正在执行工具：{tool_call.name}，"
-                        f"参数：{json.dumps(tool_args)}"
-                    )
-
-                    # ── exec 工具：注入实时流式输出回调 ──────────────────────
-                    _exec_tool_for_stream = None
-                    if tool_call.name == "exec" and on_chunk is not None:
-                        _exec_tool_for_stream = request_tools.get("exec")
-                        if _exec_tool_for_stream is not None and hasattr(
-                            _exec_tool_for_stream, "set_stream_callback"
-                        ):
-                            _current_event_loop = asyncio.get_running_loop()
-
-                            def _make_exec_stream_cb(
-                                _loop: asyncio.AbstractEventLoop,
-                                _on_chunk: Any,
-                            ):
-                                def _exec_stream_cb(line: str) -> None:
-                                    asyncio.run_coroutine_threadsafe(
-                                        _on_chunk(line), _loop
-                                    )
-                                return _exec_stream_cb
-
-                            _exec_tool_for_stream.set_stream_callback(
-                                _make_exec_stream_cb(
-                                    _current_event_loop, on_chunk
-                                )
-                            )
-                        else:
-                            _exec_tool_for_stream = None
-
-                    result = await request_tools.execute(
-                        tool_call.name, tool_args
-                    )
-
-                    # ── 清除 exec 流式回调 ────────────────────────────────────
-                    if _exec_tool_for_stream is not None:
-                        _exec_tool_for_stream.set_stream_callback(None)
-                    if tool_call.name in {"run_workflow", "delegate", "delegate_parallel", "delegate_auto"}:
-                        logger.info(f"请求作用域工作目录: {request_workspace}")
-                    tool_end = time.time()
-                    await _emit_trace({
-                        "event": "tool_end",
-                        "agent_name": "主控 Agent",
-                        "iteration": iteration,
-                        "tool_name": tool_call.name,
-                        "delegate_agent": delegate_agent,
-                        "duration_ms": round((tool_end - tool_start) * 1000),
-                        "result_length": len(str(result)),
-                        "result_preview": _make_result_preview(result),
-                        "timestamp": tool_end,
-                    })
-
-                    if skill_name:
-                        await _emit_trace({
-                            "event": "skill_end",
-                            "agent_name": "主控 Agent",
-                            "iteration": iteration,
-                            "skill_name": skill_name,
-                            "duration_ms": round((tool_end - tool_start) * 1000),
-                            "result_length": len(str(result)),
-                            "result_preview": _make_result_preview(result),
-                            "timestamp": tool_end,
-                        })
-
-                    messages = self.context.add_tool_result(
-                        messages, tool_call.id, tool_call.name, result
-                    )
-
-                # 工具调用后执行微压缩（大型输出落盘）
-                messages = self.compaction.microcompact(messages)
-            else:
-                # 没有工具调用，验证任务是否真正完成
-                should_continue = False
-                continuation_prompt = ""
-
-                # 1. 检查最小迭代次数
-                force_continue, reason = self.validator.should_force_continue(iteration)
-                if force_continue:
-                    should_continue = True
-                    continuation_prompt = f"任务刚开始，请继续调用工具工作。\n原因: {reason}"
-                    logger.info(f"[Stream] 迭代次数不足 ({iteration}/{self.validator_config.min_iterations})，强制继续")
-
-                # 2. 任务完成验证（仅当最小迭代满足时）
-                if not should_continue and self.validator.can_send_continuation_prompt():
-                    # 收集当前已流式输出的内容用于验证
-                    current_content = "".join(all_streamed)
-                    validation_result = await self.validator.validate(current_content or response.content or "")
-                    if not validation_result.is_complete:
-                        should_continue = True
-                        continuation_prompt = validation_result.get_continuation_prompt()
-                        self.validator.increment_continuation_count()
-                        logger.info(f"[Stream] 任务完成验证未通过: {validation_result.reasons}")
-
-                if should_continue:
-                    # 注入继续提示，强制 LLM 继续工作
-                    messages.append({
-                        "role": "user",
-                        "content": continuation_prompt
-                    })
-                    # 通知 UI 任务未完成，继续处理
-                    if on_chunk:
-                        await on_chunk(f"\n\n---\n**[系统] 任务未完成，继续执行...**\n\n")
-                    continue
-
-                # 验证通过，处理完成
-                break
+        self.tool_router.begin_request()
+        try:
+            result = await self._make_engine(request_tools, usage_key=msg.session_key).run(
+                messages,
+                TurnHooks(
+                    on_chunk=_on_chunk,
+                    on_trace=_emit_trace,
+                    select_tools=lambda state: self.tool_router.select(request_tools, msg.content, state.used_tools),
+                    prepare_tool_args=_prepare_tool_args,
+                    on_final=self._completion_check(on_chunk=_on_chunk),
+                    on_llm_error=_on_llm_error,
+                ),
+            )
+        except asyncio.CancelledError:
+            # 保留用户消息与已输出的部分回复，下一轮对话可接续
+            session.add_message("user", self.context.history_content(user_content))
+            session.add_message("assistant", "".join(streamed) + "\n\n[已取消]")
+            self.sessions.save(session)
+            raise
+        state = result.state
 
-        final_content = "".join(all_streamed) if all_streamed else "我已处理完毕，但没有生成任何响应。"
+        # 流式路径以所有轮次输出的文本作为最终回复
+        final_content = state.streamed_text or "我已处理完毕，但没有生成任何响应。"
 
-        total_elapsed = time.time() - start_time
         # 发送结束事件
         await _emit_trace({
             "event": "end",
             "agent_name": "主控 Agent",
-            "total_iterations": iteration,
-            "total_tokens": total_tokens,
-            "prompt_tokens": total_prompt_tokens,
-            "completion_tokens": total_completion_tokens,
-            "total_duration_ms": round(total_elapsed * 1000),
+            "total_iterations": state.iteration,
+            "total_tokens": state.total_tokens,
+            "prompt_tokens": state.prompt_tokens,
+            "completion_tokens": state.completion_tokens,
+            "total_duration_ms": round((time.time() - start_time) * 1000),
             "model": self.model,
             "timestamp": time.time(),
         })
 
         # 保存到会话
-        session.add_message("user", msg.content)
+        session.add_message("user", self.context.history_content(user_content))
         session.add_message("assistant", final_content)
         self.sessions.save(session)
 
@@ -0,0 +1,221 @@
+"""
+图片附件的媒体存储：消息中只保存引用，发送给 Provider 时再展开为 base64。
+
+- 按内容哈希寻址：同一图片（如多次附加的同一文件）只编码一次
+- 延迟编码：构建消息时读取文件并计算哈希，首次发送时才缩放并编码（使用登记时读取的
+  内容，之后文件被覆盖或删除不影响引用；在线程中执行，不阻塞事件循环），结果在进程内缓存
+- 缩放：安装 Pillow 时长边超过 max_edge 的图片先缩小再编码，否则按原图编码
+- 历史裁剪：回合结束后图片以文字说明（caption）保存到会话历史，不再重复发送
+
+消息中的引用块格式: {"type": "image_ref", "key": <哈希>, "caption": <说明>}
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import io
+import mimetypes
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+IMAGE_REF_TYPE = "image_ref"
+# 缓存的图片条目数上限（按最久未使用淘汰）
+DEFAULT_MAX_ENTRIES = 64
+# 缩放后长边的最大像素数
+DEFAULT_MAX_EDGE = 1568
+
+
+@dataclass
+class MediaEntry:
+    """一张图片：登记时读取的原始内容，首次发送后换成缓存的 data URL。"""
+    key: str
+    mime: str
+    caption: str
+    raw: bytes | None = None
+    data_url: str | None = None
+
+
+class MediaStore:
+    """按内容哈希缓存图片编码结果（线程安全，进程内通过 get_media_store 共享）。"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_edge: int = DEFAULT_MAX_EDGE):
+        self.max_entries = max_entries
+        self.max_edge = max_edge
+        self._entries: OrderedDict[str, MediaEntry] = OrderedDict()
+        # (路径, mtime_ns, 大小) -> key：同一文件未变化时不重新计算哈希
+        self._by_file: dict[tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def add_file(self, path: str | Path) -> dict[str, Any] | None:
+        """登记图片文件并返回引用块；不是图片或文件不存在时返回 None。"""
+        p = Path(path)
+        mime, _ = mimetypes.guess_type(str(p))
+        if not mime or not mime.startswith("image/"):
+            return None
+        try:
+            st = p.stat()
+            if not p.is_file():
+                return None
+            file_key = (str(p.resolve()), st.st_mtime_ns, st.st_size)
+            with self._lock:
+                entry = self._entries.get(self._by_file.get(file_key, ""))
+                if entry is not None:
+                    self._entries.move_to_end(entry.key)
+                    return self._ref(entry)
+            raw = p.read_bytes()
+        except OSError:
+            return None
+
+        key = hashlib.sha256(raw).hexdigest()[:32]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                caption = f"{p.name} ({mime}, {len(raw) // 1024} KB)"
+                entry = MediaEntry(key=key, mime=mime, caption=caption, raw=raw)
+                self._entries[key] = entry
+                self._evict()
+            self._entries.move_to_end(key)
+            self._by_file[file_key] = key
+        return self._ref(entry)
+
+    @staticmethod
+    def _ref(entry: MediaEntry) -> dict[str, Any]:
+        return {"type": IMAGE_REF_TYPE, "key": entry.key, "caption": entry.caption}
+
+    def data_url(self, key: str) -> str | None:
+        """取得图片的 data URL（首次调用时编码）；条目已被淘汰时返回 None。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            if entry.data_url is not None:
+                return entry.data_url
+            raw = entry.raw
+        mime, data = self._encode(raw, entry.mime)
+        with self._lock:
+            entry.data_url = f"data:{mime};base64,{base64.b64encode(data).decode()}"
+            entry.raw = None
+        return entry.data_url
+
+    def materialize(self, messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """把引用块展开为 image_url 块；没有引用时原样返回同一列表。"""
+        if not any(_has_refs(msg.get("content")) for msg in messages):
+            return messages
+        result = []
+        for msg in messages:
+            content = msg.get("content")
+            if not _has_refs(content):
+                result.append(msg)
+                continue
+            parts = []
+            for part in content:
+                if isinstance(part, dict) and part.get("type") == IMAGE_REF_TYPE:
+                    url = self.data_url(part.get("key", ""))
+                    if url:
+                        parts.append({"type": "image_url", "image_url": {"url": url}})
+                    else:
+                        # 图片已不可用：退化为文字说明
+                        parts.append({"type": "text", "text": caption_text(part)})
+                else:
+                    parts.append(part)
+            result.append({**msg, "content": parts})
+        return result
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            encoded = sum(1 for e in self._entries.values() if e.data_url is not None)
+            return {"entries": len(self._entries), "encoded": encoded, "max_entries": self.max_entries}
+
+    # ── 内部 ────────────────────────────────────────────────────────
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            key, _ = self._entries.popitem(last=False)
+            self._by_file = {k: v for k, v in self._by_file.items() if v != key}
+
+    def _encode(self, raw: bytes, mime: str) -> tuple[str, bytes]:
+        """长边超过 max_edge 时缩小（需要 Pillow），返回 (mime, 数据)。"""
+        if Image is None or mime in ("image/gif", "image/svg+xml"):
+            return mime, raw
+        try:
+            with Image.open(io.BytesIO(raw)) as img:
+                if max(img.size) <= self.max_edge:
+                    return mime, raw
+                img.thumbnail((self.max_edge, self.max_edge))
+                buf = io.BytesIO()
+                if img.mode in ("RGBA", "LA", "P"):
+                    img.save(buf, format="PNG", optimize=True)
+                    return "image/png", buf.getvalue()
+                img.convert("RGB").save(buf, format="JPEG", quality=85)
+                return "image/jpeg", buf.getvalue()
+        except Exception as e:
+            logger.debug(f"Image downscale failed, sending original: {e}")
+            return mime, raw
+
+
+def _has_refs(content: Any) -> bool:
+    return isinstance(content, list) and any(
+        isinstance(part, dict) and part.get("type") == IMAGE_REF_TYPE for part in content
+    )
+
+
+def caption_text(part: dict[str, Any]) -> str:
+    return f"[图片: {part.get('caption') or part.get('key', '')}]"
+
+
+def content_text(content: Any) -> str:
+    """把多模态内容转成纯文本：图片块替换为文字说明（用于历史与压缩摘要）。"""
+    if isinstance(content, str):
+        return content
+    if not isinstance(content, list):
+        return "" if content is None else str(content)
+    texts = []
+    for part in content:
+        if not isinstance(part, dict):
+            continue
+        kind = part.get("type")
+        if kind == "text":
+            texts.append(part.get("text", ""))
+        elif kind == IMAGE_REF_TYPE:
+            texts.append(caption_text(part))
+        elif kind == "image_url":
+            texts.append("[图片]")
+    return "\n".join(texts)
+
+
+_store: MediaStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_media_store() -> MediaStore:
+    """获取进程内共享的媒体存储（主 Agent 与子 Agent 共用编码缓存）。"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MediaStore()
+        return _store
+
+
+def materialize_media(messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """发送前展开消息中的图片引用。"""
+    return get_media_store().materialize(messages)
+
+
+async def amaterialize_media(messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """materialize_media 的异步版本：有图片引用时在线程中解码、缩放与编码。"""
+    if not any(_has_refs(msg.get("content")) for msg in messages):
+        return messages
+    return await asyncio.to_thread(materialize_media, messages)
@@ -0,0 +1,86 @@
+"""
+System prompt 片段缓存。
+
+每个片段（身份、项目上下文、引导文件、记忆、技能、Agent 团队）以其输入的签名为键：
+文件输入取 (路径, mtime_ns, size)，内存输入取内容哈希。签名不变时直接复用上次的
+构建结果，因此每次构建只需 stat 输入文件，只有输入变化的片段才会重新读取和解析。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Any, Callable, Hashable, Iterable
+
+
+def file_signature(paths: Iterable[Path]) -> tuple:
+    """文件签名：(路径, mtime_ns, size)；不存在的文件记为 (路径, None, None)。"""
+    signature = []
+    for path in paths:
+        try:
+            st = path.stat()
+            signature.append((str(path), st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append((str(path), None, None))
+    return tuple(signature)
+
+
+def tree_signature(root: Path, pattern: str) -> tuple:
+    """目录签名：目录本身与其下匹配 pattern 的文件（按路径排序）。"""
+    try:
+        files = sorted(root.glob(pattern))
+    except OSError:
+        files = []
+    return file_signature([root, *files])
+
+
+def content_hash(value: Any) -> str:
+    """内存输入（如 project_info）的内容哈希。"""
+    raw = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class PromptFragmentCache:
+    """按名称缓存片段，键（签名）变化时重建。"""
+
+    def __init__(self):
+        self._fragments: dict[Hashable, tuple[Hashable, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        name: Hashable,
+        key: Hashable,
+        build: Callable[[], Any],
+        rekey: Callable[[], Hashable] | None = None,
+    ) -> Any:
+        """
+        返回片段；key 与缓存不一致时调用 build 重建。
+
+        rekey: 构建过程本身会改动输入时（如首次加载时写入预置文件），
+            构建后重新计算签名作为缓存键。
+        """
+        with self._lock:
+            cached = self._fragments.get(name)
+            if cached is not None and cached[0] == key:
+                self.hits += 1
+                return cached[1]
+        value = build()
+        if rekey is not None:
+            key = rekey()
+        with self._lock:
+            self._fragments[name] = (key, value)
+            self.misses += 1
+        return value
+
+    def invalidate(self, name: Hashable | None = None) -> None:
+        """丢弃指定片段（None 时全部丢弃）。"""
+        with self._lock:
+            if name is None:
+                self._fragments.clear()
+            else:
+                self._fragments.pop(name, None)
@@ -1,16 +1,211 @@
-"""Agent 能力的技能加载器（单一路径模式）。"""
+"""
+Agent 能力的技能加载器（单一路径模式）。
+
+技能索引（SkillsIndex）按工作空间技能目录在进程内共享：
+- 首次使用时扫描一次，之后按 SKILL.md 的 mtime / 大小增量重新解析（扫描间隔 INDEX_CHECK_INTERVAL）
+- 正文、frontmatter 与 solopreneur 元数据解析后常驻内存
+- 要求检查（PATH 上的二进制文件、环境变量）结果按 REQUIREMENTS_TTL 缓存
+- 技能摘要与常驻技能正文在索引与可用性不变时直接复用
+"""
 
 import json
 import os
 import re
 import shutil
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, Callable
 
 # 默认内置技能目录（相对于此文件）
 # 当前文件: solopreneur/agent/core/skills.py
 # 内置技能: solopreneur/skills/
 BUILTIN_SKILLS_DIR = Path(__file__).parent.parent.parent / "skills"
 
+# 两次扫描技能目录的最小间隔（秒）
+INDEX_CHECK_INTERVAL = 1.0
+# 要求检查结果的缓存时间（秒）
+REQUIREMENTS_TTL = 30.0
+
+_FRONTMATTER_RE = re.compile(r"^---\n(.*?)\n---", re.DOTALL)
+_FRONTMATTER_BLOCK_RE = re.compile(r"^---\n.*?\n---\n", re.DOTALL)
+
+
+@dataclass
+class SkillEntry:
+    """索引中的单个技能（解析结果常驻内存）。"""
+    name: str
+    path: Path
+    mtime_ns: int
+    size: int
+    content: str
+    body: str  # 去掉 frontmatter 的正文
+    metadata: dict | None  # frontmatter；没有时为 None
+    skill_meta: dict  # frontmatter 中的 solopreneur 元数据
+
+
+def _strip_frontmatter(content: str) -> str:
+    if content.startswith("---"):
+        match = _FRONTMATTER_BLOCK_RE.match(content)
+        if match:
+            return content[match.end():].strip()
+    return content
+
+
+def _parse_frontmatter(content: str) -> dict | None:
+    if content.startswith("---"):
+        match = _FRONTMATTER_RE.match(content)
+        if match:
+            # 简单的 YAML 解析
+            metadata = {}
+            for line in match.group(1).split("\n"):
+                if ":" in line:
+                    key, value = line.split(":", 1)
+                    metadata[key.strip()] = value.strip().strip('"\'')
+            return metadata
+    return None
+
+
+def _parse_solopreneur_metadata(raw: str) -> dict:
+    try:
+        data = json.loads(raw)
+        return data.get("solopreneur", {}) if isinstance(data, dict) else {}
+    except (json.JSONDecodeError, TypeError):
+        return {}
+
+
+class SkillsIndex:
+    """技能目录的内存索引（线程安全，同一目录通过 get_skills_index 共享）。"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.version = 0
+        self._entries: dict[str, SkillEntry] = {}
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        # (bins, env) -> (过期时间, 缺失项描述)
+        self._requirements: dict[tuple, tuple[float, str]] = {}
+        self._memo: dict[str, tuple[tuple, object]] = {}
+
+    def refresh(self, force: bool = False) -> bool:
+        """按 mtime / 大小增量重新解析 SKILL.md；返回是否有变化。"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < INDEX_CHECK_INTERVAL:
+            return False
+        with self._lock:
+            self._checked_at = now
+            found = self._scan()
+            changed = False
+            for name in [n for n in self._entries if n not in found]:
+                del self._entries[name]
+                changed = True
+            for name, (path, mtime_ns, size) in found.items():
+                entry = self._entries.get(name)
+                if entry and (entry.mtime_ns, entry.size) == (mtime_ns, size):
+                    continue
+                try:
+                    content = path.read_text(encoding="utf-8")
+                except OSError:
+                    self._entries.pop(name, None)
+                    changed = True
+                    continue
+                metadata = _parse_frontmatter(content)
+                self._entries[name] = SkillEntry(
+                    name=name,
+                    path=path,
+                    mtime_ns=mtime_ns,
+                    size=size,
+                    content=content,
+                    body=_strip_frontmatter(content),
+                    metadata=metadata,
+                    skill_meta=_parse_solopreneur_metadata((metadata or {}).get("metadata", "")),
+                )
+                changed = True
+            if changed:
+                self._entries = dict(sorted(self._entries.items()))
+                self.version += 1
+            return changed
+
+    def entries(self) -> list[SkillEntry]:
+        self.refresh()
+        return list(self._entries.values())
+
+    def get(self, name: str) -> SkillEntry | None:
+        self.refresh()
+        return self._entries.get(name)
+
+    def missing_requirements(self, skill_meta: dict) -> str:
+        """缺失要求的描述（空字符串表示满足），结果按 REQUIREMENTS_TTL 缓存。"""
+        requires = skill_meta.get("requires", {})
+        bins = tuple(requires.get("bins", []))
+        envs = tuple(requires.get("env", []))
+        if not bins and not envs:
+            return ""
+        key = (bins, envs)
+        now = time.monotonic()
+        cached = self._requirements.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        missing = [f"CLI: {b}" for b in bins if not shutil.which(b)]
+        missing += [f"ENV: {env}" for env in envs if not os.environ.get(env)]
+        result = ", ".join(missing)
+        self._requirements[key] = (now + REQUIREMENTS_TTL, result)
+        return result
+
+    def availability(self) -> tuple[tuple[str, bool], ...]:
+        """每个技能当前是否可用（按索引顺序）。"""
+        return tuple(
+            (entry.name, not self.missing_requirements(entry.skill_meta))
+            for entry in self.entries()
+        )
+
+    def signature(self) -> tuple:
+        """索引版本与可用性；两者不变时派生结果（摘要、常驻技能）不变。"""
+        availability = self.availability()
+        return (self.version, availability)
+
+    def cached(self, key: str, build: Callable[[], Any]) -> Any:
+        """按 signature 缓存派生结果。"""
+        signature = self.signature()
+        hit = self._memo.get(key)
+        if hit is not None and hit[0] == signature:
+            return hit[1]
+        value = build()
+        self._memo[key] = (signature, value)
+        return value
+
+    def _scan(self) -> dict[str, tuple[Path, int, int]]:
+        found: dict[str, tuple[Path, int, int]] = {}
+        try:
+            dirs = list(os.scandir(self.root))
+        except OSError:
+            return found
+        for skill_dir in dirs:
+            if not skill_dir.is_dir():
+                continue
+            path = Path(skill_dir.path) / "SKILL.md"
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            found[skill_dir.name] = (path, st.st_mtime_ns, st.st_size)
+        return found
+
+
+_indexes: dict[str, SkillsIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_skills_index(root: Path) -> SkillsIndex:
+    """获取技能目录的索引（进程内按目录共享）。"""
+    key = str(root.resolve())
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = SkillsIndex(root)
+        return index
+
 
 class SkillsLoader:
     """
@@ -25,6 +220,7 @@ class SkillsLoader:
         self.workspace_skills = workspace / "skills"
         self.builtin_skills = builtin_skills_dir or BUILTIN_SKILLS_DIR
         self.workspace_skills.mkdir(parents=True, exist_ok=True)
+        self.index = get_skills_index(self.workspace_skills)
         self._seed_builtin_skills()
     
     def list_skills(self, filter_unavailable: bool = True) -> list[dict[str, str]]:
@@ -37,20 +233,13 @@ class SkillsLoader:
         返回:
             包含技能信息的字典列表，键包括 'name'、'path'、'source'。
         """
-        skills = []
-
         # 单一路径：只从 workspace/skills 加载
-        if self.workspace_skills.exists():
-            for skill_dir in self.workspace_skills.iterdir():
-                if skill_dir.is_dir():
-                    skill_file = skill_dir / "SKILL.md"
-                    if skill_file.exists():
-                        skills.append({"name": skill_dir.name, "path": str(skill_file), "source": "workspace"})
+        entries = self.index.entries()
         
         # 按要求过滤
         if filter_unavailable:
-            return [s for s in skills if self._check_requirements(self._get_skill_meta(s["name"]))]
-        return skills
+            entries = [e for e in entries if self._check_requirements(e.skill_meta)]
+        return [{"name": e.name, "path": str(e.path), "source": "workspace"} for e in entries]
     
     def load_skill(self, name: str) -> str | None:
         """
@@ -62,12 +251,12 @@ class SkillsLoader:
         返回:
             技能内容，如果未找到则返回 None。
         """
-        # 单一路径：只检查工作区
-        workspace_skill = self.workspace_skills / name / "SKILL.md"
-        if workspace_skill.exists():
-            return workspace_skill.read_text(encoding="utf-8")
+        entry = self.index.get(name)
+        return entry.content if entry else None
 
-        return None
+    def signature(self) -> tuple:
+        """技能集合及其可用性的签名（用于 system prompt 片段缓存）。"""
+        return self.index.signature()
 
     def _seed_builtin_skills(self):
         """Copy built-in skills into canonical workspace/skills if missing."""
@@ -90,7 +279,7 @@ class SkillsLoader:
                 copied += 1
 
         if copied:
-            pass
+            self.index.refresh(force=True)
     
     def load_skills_for_context(self, skill_names: list[str]) -> str:
         """
@@ -104,10 +293,9 @@ class SkillsLoader:
         """
         parts = []
         for name in skill_names:
-            content = self.load_skill(name)
-            if content:
-                content = self._strip_frontmatter(content)
-                parts.append(f"### 技能：{name}\n\n{content}")
+            entry = self.index.get(name)
+            if entry and entry.content:
+                parts.append(f"### 技能：{name}\n\n{entry.body}")
         
         return "\n\n---\n\n".join(parts) if parts else ""
     
@@ -116,11 +304,15 @@ class SkillsLoader:
         构建所有技能的摘要（名称、描述、路径、可用性）。
         
         这用于渐进式加载——Agent 在需要时可以使用 read_file 读取完整的技能内容。
+        技能与可用性不变时复用上次结果。
         
         返回:
             XML 格式的技能摘要。
         """
-        all_skills = self.list_skills(filter_unavailable=False)
+        return self.index.cached("summary", self._render_skills_summary)
+
+    def _render_skills_summary(self) -> str:
+        all_skills = self.index.entries()
         if not all_skills:
             return ""
         
@@ -128,12 +320,12 @@ class SkillsLoader:
             return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
         
         lines = ["<skills>"]
-        for s in all_skills:
-            name = escape_xml(s["name"])
-            path = s["path"]
-            desc = escape_xml(self._get_skill_description(s["name"]))
-            skill_meta = self._get_skill_meta(s["name"])
-            available = self._check_requirements(skill_meta)
+        for entry in all_skills:
+            name = escape_xml(entry.name)
+            path = str(entry.path)
+            desc = escape_xml(self._get_skill_description(entry.name))
+            missing = self.index.missing_requirements(entry.skill_meta)
+            available = not missing
             
             lines.append(f"  <skill available=\"{str(available).lower()}\">")
             lines.append(f"    <name>{name}</name>")
@@ -142,9 +334,7 @@ class SkillsLoader:
             
             # 显示不可用技能缺失的要求
             if not available:
-                missing = self._get_missing_requirements(skill_meta)
-                if missing:
-                    lines.append(f"    <requires>{escape_xml(missing)}</requires>")
+                lines.append(f"    <requires>{escape_xml(missing)}</requires>")
             
             lines.append(f"  </skill>")
         lines.append("</skills>")
@@ -153,15 +343,7 @@ class SkillsLoader:
     
     def _get_missing_requirements(self, skill_meta: dict) -> str:
         """获取缺失要求的描述。"""
-        missing = []
-        requires = skill_meta.get("requires", {})
-        for b in requires.get("bins", []):
-            if not shutil.which(b):
-                missing.append(f"CLI: {b}")
-        for env in requires.get("env", []):
-            if not os.environ.get(env):
-                missing.append(f"ENV: {env}")
-        return ", ".join(missing)
+        return self.index.missing_requirements(skill_meta)
     
     def _get_skill_description(self, name: str) -> str:
         """从技能的 frontmatter 中获取描述。"""
@@ -172,45 +354,31 @@ class SkillsLoader:
     
     def _strip_frontmatter(self, content: str) -> str:
         """从 Markdown 内容中移除 YAML frontmatter。"""
-        if content.startswith("---"):
-            match = re.match(r"^---\n.*?\n---\n", content, re.DOTALL)
-            if match:
-                return content[match.end():].strip()
-        return content
+        return _strip_frontmatter(content)
     
     def _parse_solopreneur_metadata(self, raw: str) -> dict:
         """从 frontmatter 中解析 solopreneur 元数据 JSON。"""
-        try:
-            data = json.loads(raw)
-            return data.get("solopreneur", {}) if isinstance(data, dict) else {}
-        except (json.JSONDecodeError, TypeError):
-            return {}
+        return _parse_solopreneur_metadata(raw)
     
     def _check_requirements(self, skill_meta: dict) -> bool:
-        """检查是否满足技能要求（二进制文件、环境变量）。"""
-        requires = skill_meta.get("requires", {})
-        for b in requires.get("bins", []):
-            if not shutil.which(b):
-                return False
-        for env in requires.get("env", []):
-            if not os.environ.get(env):
-                return False
-        return True
+        """检查是否满足技能要求（二进制文件、环境变量），结果按 TTL 缓存。"""
+        return not self.index.missing_requirements(skill_meta)
     
     def _get_skill_meta(self, name: str) -> dict:
         """获取技能的 solopreneur 元数据（缓存在 frontmatter 中）。"""
-        meta = self.get_skill_metadata(name) or {}
-        return self._parse_solopreneur_metadata(meta.get("metadata", ""))
+        entry = self.index.get(name)
+        return entry.skill_meta if entry else {}
     
     def get_always_skills(self) -> list[str]:
         """获取标记为 always=true 且满足要求的技能。"""
-        result = []
-        for s in self.list_skills(filter_unavailable=True):
-            meta = self.get_skill_metadata(s["name"]) or {}
-            skill_meta = self._parse_solopreneur_metadata(meta.get("metadata", ""))
-            if skill_meta.get("always") or meta.get("always"):
-                result.append(s["name"])
-        return result
+        return list(self.index.cached("always", self._find_always_skills))
+
+    def _find_always_skills(self) -> tuple[str, ...]:
+        return tuple(
+            entry.name for entry in self.index.entries()
+            if self._check_requirements(entry.skill_meta)
+            and (entry.skill_meta.get("always") or (entry.metadata or {}).get("always"))
+        )
     
     def get_skill_metadata(self, name: str) -> dict | None:
         """
@@ -222,19 +390,7 @@ class SkillsLoader:
         返回:
             元数据字典，如果未找到则返回 None。
         """
-        content = self.load_skill(name)
-        if not content:
+        entry = self.index.get(name)
+        if entry is None or entry.metadata is None:
             return None
-        
-        if content.startswith("---"):
-            match = re.match(r"^---\n(.*?)\n---", content, re.DOTALL)
-            if match:
-                # 简单的 YAML 解析
-                metadata = {}
-                for line in match.group(1).split("\n"):
-                    if ":" in line:
-                        key, value = line.split(":", 1)
-                        metadata[key.strip()] = value.strip().strip('"\'')
-                return metadata
-        
-        return None
+        return dict(entry.metadata)
@@ -0,0 +1,236 @@
+"""
+工具输出溢出存储：微压缩落盘的大型工具结果按内容哈希寻址。
+
+- 去重：相同内容（如重复读取同一文件）只存一份，再次写入只刷新访问时间
+- 容量上限：总大小超过 max_bytes 时按最久未访问淘汰
+- 压缩：安装 zstandard 时使用 zstd，否则使用标准库 zlib（compress=False 时存原文）
+- 分段读取：按行偏移分页读取，供 read_spill 工具使用，无需把整段输出重新载入上下文
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 默认容量上限（字节，按落盘后的大小计）
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# 分段读取默认行数与单页最大字符数
+DEFAULT_PAGE_LINES = 200
+MAX_PAGE_CHARS = 16000
+
+_SUFFIXES = (".zst", ".z", ".txt")
+
+
+@dataclass(frozen=True)
+class SpillRef:
+    """溢出内容的引用。"""
+    key: str
+    size: int  # 原文字符数
+    lines: int
+
+
+@dataclass(frozen=True)
+class SpillPage:
+    """一页分段读取结果；next_offset 为 None 表示已读到末尾。"""
+    key: str
+    text: str
+    offset: int
+    end: int
+    total_lines: int
+    next_offset: int | None
+
+
+class SpillStore:
+    """按内容哈希寻址的工具输出存储（线程安全，同一目录建议通过 get_spill_store 共享实例）。"""
+
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_MAX_BYTES, compress: bool = True):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self._lock = threading.Lock()
+        # key -> (path, 落盘字节数, 最近访问时间)；首次使用时扫描目录建立
+        self._index: dict[str, tuple[Path, int, float]] | None = None
+        self._total = 0
+
+    @staticmethod
+    def key_for(content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+    def put(self, content: str) -> SpillRef:
+        """写入内容（已存在则只刷新访问时间），返回引用。"""
+        key = self.key_for(content)
+        ref = SpillRef(key=key, size=len(content), lines=content.count("\n") + 1)
+        with self._lock:
+            index = self._load_index()
+            now = time.time()
+            entry = index.get(key)
+            if entry is not None and entry[0].exists():
+                self._touch(entry[0], now)
+                index[key] = (entry[0], entry[1], now)
+                return ref
+
+            data, suffix = self._encode(content)
+            path = self.root / key[:2] / f"{key}{suffix}"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            if entry is not None:
+                self._total -= entry[1]
+            index[key] = (path, len(data), now)
+            self._total += len(data)
+            self._evict(keep=key)
+        return ref
+
+    def get(self, key: str) -> str | None:
+        """读取完整内容，不存在（或已淘汰）时返回 None。"""
+        with self._lock:
+            entry = self._load_index().get(key)
+            if entry is None:
+                return None
+            path = entry[0]
+            try:
+                data = path.read_bytes()
+            except OSError:
+                self._drop(key)
+                return None
+            now = time.time()
+            self._touch(path, now)
+            self._index[key] = (path, entry[1], now)
+        return self._decode(data, path.suffix)
+
+    def read(self, key: str, offset: int = 0, limit: int = DEFAULT_PAGE_LINES) -> SpillPage | None:
+        """按行分段读取：从第 offset 行（0 起）读取最多 limit 行，单页不超过 MAX_PAGE_CHARS 字符。"""
+        content = self.get(key)
+        if content is None:
+            return None
+        lines = content.split("\n")
+        total = len(lines)
+        start = max(0, min(offset, total))
+        end = min(total, start + max(1, limit))
+        parts: list[str] = []
+        used = 0
+        for i in range(start, end):
+            line = lines[i]
+            if used + len(line) > MAX_PAGE_CHARS:
+                if i == start:
+                    # 单行过长：截断本行，下一页从下一行开始
+                    parts.append(line[:MAX_PAGE_CHARS] + " ...<line truncated>")
+                    end = i + 1
+                else:
+                    end = i
+                break
+            parts.append(line)
+            used += len(line) + 1
+        return SpillPage(
+            key=key,
+            text="\n".join(parts),
+            offset=start,
+            end=end,
+            total_lines=total,
+            next_offset=end if end < total else None,
+        )
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            index = self._load_index()
+            return {"entries": len(index), "bytes": self._total, "max_bytes": self.max_bytes}
+
+    # ── 内部 ────────────────────────────────────────────────────────
+
+    def _load_index(self) -> dict[str, tuple[Path, int, float]]:
+        if self._index is not None:
+            return self._index
+        index: dict[str, tuple[Path, int, float]] = {}
+        total = 0
+        if self.root.exists():
+            for path in self.root.glob("*/*"):
+                if path.suffix not in _SUFFIXES:
+                    continue
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                key = path.name.split(".", 1)[0]
+                index[key] = (path, st.st_size, st.st_mtime)
+                total += st.st_size
+        self._index, self._total = index, total
+        return index
+
+    def _evict(self, keep: str) -> None:
+        if self._total <= self.max_bytes:
+            return
+        for key, (path, size, _) in sorted(self._index.items(), key=lambda item: item[1][2]):
+            if self._total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.debug(f"Spill eviction failed for {path}: {e}")
+                continue
+            self._drop(key)
+            logger.debug(f"Spill evicted: {key} ({size} bytes)")
+
+    def _drop(self, key: str) -> None:
+        entry = self._index.pop(key, None) if self._index is not None else None
+        if entry is not None:
+            self._total -= entry[1]
+
+    @staticmethod
+    def _touch(path: Path, now: float) -> None:
+        # 以 mtime 记录访问时间，重启后重建索引时保持淘汰顺序
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+    def _encode(self, content: str) -> tuple[bytes, str]:
+        raw = content.encode("utf-8")
+        if not self.compress:
+            return raw, ".txt"
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=3).compress(raw), ".zst"
+        return zlib.compress(raw, 6), ".z"
+
+    @staticmethod
+    def _decode(data: bytes, suffix: str) -> str:
+        if suffix == ".zst":
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read .zst spill entries")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        elif suffix == ".z":
+            data = zlib.decompress(data)
+        return data.decode("utf-8")
+
+
+_stores: dict[str, SpillStore] = {}
+_stores_lock = threading.Lock()
+
+
+def spill_root(workspace: Path) -> Path:
+    return workspace / ".compaction" / "spill"
+
+
+def get_spill_store(workspace: Path) -> SpillStore:
+    """获取工作空间的溢出存储（进程内按目录共享，主 Agent 与子 Agent 共用索引与容量）。"""
+    root = spill_root(workspace)
+    key = str(root.resolve())
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SpillStore(root)
+        return store
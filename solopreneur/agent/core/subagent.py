@@ -3,9 +3,9 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import time
 import uuid
+from collections import OrderedDict
 from pathlib import Path
 from typing import Any, TYPE_CHECKING
 
@@ -14,13 +14,17 @@ from loguru import logger
 from solopreneur.bus.events import InboundMessage
 from solopreneur.bus.queue import MessageBus
 from solopreneur.providers.base import LLMProvider
-from solopreneur.storage import SubagentTaskPersistence, UsagePersistence
+from solopreneur.storage import SubagentTaskPersistence, get_usage_recorder
+from solopreneur.agent.core.budget import current_budget
+from solopreneur.agent.core.spill_store import get_spill_store
+from solopreneur.agent.core.engine import RetryPolicy, TurnEngine, TurnHooks, TurnState
 from solopreneur.agent.core.tools.registry import ToolRegistry
 from solopreneur.agent.core.tools.filesystem import ReadFileTool, WriteFileTool, EditFileTool, ListDirTool
 from solopreneur.agent.core.tools.db import DBInspectTool
 from solopreneur.agent.core.tools.metrics import MetricsInspectTool
 from solopreneur.agent.core.tools.repo import GitInspectTool, GitCommandTool, SearchCodeTool
 from solopreneur.agent.core.tools.shell import ExecTool
+from solopreneur.agent.core.tools.spill import ReadSpillTool
 from solopreneur.agent.core.tools.web import WebSearchTool, WebFetchTool
 
 if TYPE_CHECKING:
@@ -44,6 +48,7 @@ class SubagentManager:
         model: str | None = None,
         brave_api_key: str | None = None,
         exec_config: "ExecToolConfig | None" = None,
+        tokenizer: str = "auto",
     ):
         from solopreneur.config.schema import ExecToolConfig
         self.provider = provider
@@ -52,12 +57,17 @@ class SubagentManager:
         self.model = model or provider.get_default_model()
         self.brave_api_key = brave_api_key
         self.exec_config = exec_config or ExecToolConfig()
+        self.tokenizer = tokenizer
         self.task_store = SubagentTaskPersistence()
-        self.usage_store = UsagePersistence()
+        self.usage_store = get_usage_recorder()
         self._running_tasks: dict[str, asyncio.Task[None]] = {}
+        # 后台任务来源会话：task_id -> "channel:chat_id"（用于按会话取消）
+        self._task_sessions: dict[str, str] = {}
         self._max_concurrent_subagents = 5  # 最大并发子Agent数
         self._subagent_semaphore = asyncio.Semaphore(self._max_concurrent_subagents)
         self._trace_emitter = None
+        # 工具注册表缓存：(workspace, allowed_tools) -> ToolRegistry
+        self._tools_cache: OrderedDict[tuple[str, tuple[str, ...] | None], ToolRegistry] = OrderedDict()
 
     def set_trace_emitter(self, emitter) -> None:
         """设置 trace 事件回调（由主 AgentLoop 注入）。"""
@@ -72,29 +82,6 @@ class SubagentManager:
         except Exception as e:
             logger.debug(f"Subagent trace emit failed: {e}")
 
-    def _record_usage(
-        self,
-        session_key: str,
-        usage: dict[str, int] | None,
-        duration_ms: int,
-        model: str | None = None,
-    ) -> None:
-        """记录一次子 Agent LLM 调用 usage（失败不影响主流程）。"""
-        usage = usage or {}
-        used_model = model or self.model
-        try:
-            self.usage_store.record(
-                session_key=session_key,
-                model=used_model,
-                prompt_tokens=usage.get("prompt_tokens", 0),
-                completion_tokens=usage.get("completion_tokens", 0),
-                total_tokens=usage.get("total_tokens", 0),
-                duration_ms=duration_ms,
-                is_stream=False,
-            )
-        except Exception as e:
-            logger.warning(f"记录子 Agent LLM usage 失败: {e}")
-
     def _persist_task(
         self,
         task_id: str,
@@ -165,9 +152,10 @@ class SubagentManager:
             self._run_subagent_with_semaphore(task_id, task, display_label, origin)
         )
         self._running_tasks[task_id] = bg_task
+        self._task_sessions[task_id] = f"{origin_channel}:{origin_chat_id}"
         
         # 完成后清理
-        bg_task.add_done_callback(lambda _: self._running_tasks.pop(task_id, None))
+        bg_task.add_done_callback(lambda _: self._forget_task(task_id))
         
         logger.info(f"生成子 Agent [{task_id}]: {display_label} (当前运行: {running_count + 1}/{self._max_concurrent_subagents})")
         return f"子 Agent [{display_label}] 已启动 (id: {task_id})。完成后我会通知您。"
@@ -180,15 +168,40 @@ class SubagentManager:
         origin: dict[str, str],
     ) -> None:
         """带信号量控制的子Agent执行包装器。"""
-        async with self._subagent_semaphore:
+        try:
+            async with self._subagent_semaphore:
+                self._persist_task(
+                    task_id=task_id,
+                    label=label,
+                    task_text=task,
+                    origin=origin,
+                    status="running",
+                )
+                await self._run_subagent(task_id, task, label, origin)
+        except asyncio.CancelledError:
+            logger.info(f"子 Agent [{task_id}] 已取消")
             self._persist_task(
                 task_id=task_id,
                 label=label,
                 task_text=task,
                 origin=origin,
-                status="running",
+                status="cancelled",
             )
-            await self._run_subagent(task_id, task, label, origin)
+            raise
+
+    def _forget_task(self, task_id: str) -> None:
+        self._running_tasks.pop(task_id, None)
+        self._task_sessions.pop(task_id, None)
+
+    def cancel_for_session(self, session_key: str) -> int:
+        """取消由指定会话生成、仍在运行的后台子 Agent，返回取消数量。"""
+        cancelled = 0
+        for task_id, key in list(self._task_sessions.items()):
+            task = self._running_tasks.get(task_id)
+            if key == session_key and task is not None and not task.done():
+                task.cancel(f"session {session_key} cancelled")
+                cancelled += 1
+        return cancelled
     
     async def _run_subagent(
         self,
@@ -202,24 +215,7 @@ class SubagentManager:
         
         try:
             # 构建子 Agent 工具集（不包含消息工具和生成工具，带工作空间限制）
-            tools = ToolRegistry()
-            tools.register(ReadFileTool(workspace=self.workspace))
-            tools.register(WriteFileTool(workspace=self.workspace))
-            tools.register(EditFileTool(workspace=self.workspace))
-            tools.register(ListDirTool(workspace=self.workspace))
-            tools.register(DBInspectTool())
-            tools.register(MetricsInspectTool())
-            tools.register(SearchCodeTool(workspace=self.workspace))
-            tools.register(GitInspectTool(workspace=self.workspace))
-            tools.register(GitCommandTool(workspace=self.workspace))
-            tools.register(ExecTool(
-                working_dir=str(self.workspace),
-                timeout=self.exec_config.timeout,
-                restrict_to_workspace=self.exec_config.restrict_to_workspace,
-                whitelist_mode=self.exec_config.whitelist_mode,
-            ))
-            tools.register(WebSearchTool(api_key=self.brave_api_key))
-            tools.register(WebFetchTool())
+            tools = self._get_tools(self.workspace)
             
             # 构建带有子 Agent 特定提示词的消息列表
             system_prompt = self._build_subagent_prompt(task)
@@ -228,60 +224,18 @@ class SubagentManager:
                 {"role": "user", "content": task},
             ]
             
-            # 运行 Agent 循环（限制迭代次数）
-            max_iterations = 15
-            iteration = 0
-            final_result: str | None = None
-            
-            while iteration < max_iterations:
-                iteration += 1
-
-                llm_start = time.time()
-                response = await self.provider.chat(
-                    messages=messages,
-                    tools=tools.get_definitions(),
-                    model=self.model,
-                    max_tokens=16384,
-                )
-                llm_duration_ms = int((time.time() - llm_start) * 1000)
-                self._record_usage(
-                    session_key=f"{origin['channel']}:{origin['chat_id']}",
-                    usage=response.usage,
-                    duration_ms=llm_duration_ms,
-                )
-                
-                if response.has_tool_calls:
-                    # 添加带有工具调用的助手消息
-                    tool_call_dicts = [
-                        {
-                            "id": tc.id,
-                            "type": "function",
-                            "function": {
-                                "name": tc.name,
-                                "arguments": json.dumps(tc.arguments),
-                            },
-                        }
-                        for tc in response.tool_calls
-                    ]
-                    messages.append({
-                        "role": "assistant",
-                        "content": response.content or "",
-                        "tool_calls": tool_call_dicts,
-                    })
-                    
-                    # 执行工具
-                    for tool_call in response.tool_calls:
-                        logger.debug(f"子 Agent [{task_id}] 执行工具: {tool_call.name}")
-                        result = await tools.execute(tool_call.name, tool_call.arguments)
-                        messages.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "name": tool_call.name,
-                            "content": result,
-                        })
-                else:
-                    final_result = response.content
-                    break
+            # 运行 Agent 循环（限制迭代次数；后台任务独立于发起请求，不继承请求预算）
+            engine = TurnEngine(
+                self.provider,
+                tools,
+                self.model,
+                agent_name=f"subagent:{task_id}",
+                max_iterations=15,
+                max_tokens=16384,
+                usage_store=self.usage_store,
+                usage_key=f"{origin['channel']}:{origin['chat_id']}",
+            )
+            final_result = (await engine.run(messages)).content
             
             if final_result is None:
                 final_result = "任务已完成，但未生成最终回复。"
@@ -395,6 +349,21 @@ class SubagentManager:
         # 如果提供了 project_dir，则将工具的 workspace/working_dir 指向该目录，
         # 以便子 Agent 能够在目标项目路径下读写文件。
         workspace_path = Path(project_dir) if project_dir else self.workspace
+        return self._get_tools(workspace_path, agent_def.tools)
+
+    _TOOLS_CACHE_SIZE = 32
+
+    def _get_tools(self, workspace_path: Path, allowed: list[str] | None = None) -> ToolRegistry:
+        """
+        获取绑定到指定目录的工具注册表（allowed 为 None 时提供全部工具）。
+
+        工具均为无状态实例，相同目录与工具集的运行复用同一注册表及其 schema 缓存。
+        """
+        key = (str(workspace_path), tuple(allowed) if allowed is not None else None)
+        registry = self._tools_cache.get(key)
+        if registry is not None:
+            self._tools_cache.move_to_end(key)
+            return registry
 
         all_tools = {
             "read_file": ReadFileTool(workspace=workspace_path),
@@ -418,14 +387,19 @@ class SubagentManager:
 
         registry = ToolRegistry()
 
-        if agent_def.tools is not None:
-            for tool_name in agent_def.tools:
+        if allowed is not None:
+            for tool_name in allowed:
                 if tool_name in all_tools:
                     registry.register(all_tools[tool_name])
         else:
             for tool in all_tools.values():
                 registry.register(tool)
+        # 微压缩引用的溢出输出需要能读回，不受 allowed_tools 限制
+        registry.register(ReadSpillTool(get_spill_store(self.workspace)))
 
+        self._tools_cache[key] = registry
+        while len(self._tools_cache) > self._TOOLS_CACHE_SIZE:
+            self._tools_cache.popitem(last=False)
         return registry
 
     # 必须调用 write_file 的角色（否则只会输出 MD 描述而不创建文件）
@@ -582,16 +556,74 @@ class SubagentManager:
             logger.debug(f"[{agent_id}] 消息 {i+1}: role={role}, content={content_preview}...")
 
         max_iterations = agent_def.max_iterations
-        iteration = 0
-        final_result: str | None = None
 
-        # 跟踪工具调用情况 —— 防止 Developer 只描述代码不创建文件
-        tools_called: set[str] = set()
-        write_file_count = 0
+        # 工具调用保障 —— 防止 Developer 只描述代码不创建文件
         reminder_count = 0
         must_write = (
             agent_def.name in self._MUST_WRITE_ROLES and bool(project_dir)
         )
+        must_exec = (
+            agent_def.name in self._MUST_EXEC_ROLES and bool(project_dir)
+        )
+
+        async def _on_final(response: Any, state: TurnState) -> str | None:
+            """LLM 无工具调用时检查角色的工具使用要求，未满足则返回提醒继续迭代。"""
+            nonlocal reminder_count
+            logger.info(f"[{agent_id}] LLM 无工具调用，准备结束迭代")
+            if reminder_count >= self._TOOL_REMINDER_MAX:
+                return None
+            tools_called = state.tool_counts
+
+            # 角色必须创建文件但还没有调用 write_file：要求调用工具而非只描述代码
+            if must_write and "write_file" not in tools_called:
+                reminder_count += 1
+                logger.warning(
+                    f"{agent_def.emoji} [{agent_id}] 未调用 write_file，"
+                    f"发送提醒 ({reminder_count}/{self._TOOL_REMINDER_MAX})"
+                )
+                return (
+                    "⚠️ 你还没有调用 `write_file` 工具创建任何实际文件！\n\n"
+                    "**请停止在文本中描述代码**，你必须立即使用 `write_file` 工具"
+                    "将源代码文件写入磁盘。\n\n"
+                    f"目标目录：`{project_dir}`\n\n"
+                    "请现在开始：\n"
+                    "1. 调用 `write_file` 创建第一个源文件\n"
+                    "2. 逐个创建所有必要的项目文件\n"
+                    "3. 每个文件都必须通过 `write_file` 工具写入\n\n"
+                    "不要再解释，直接调用工具。"
+                )
+
+            # Tester 角色已写测试但未调用 exec 运行测试
+            if must_exec and "exec" not in tools_called and "write_file" in tools_called:
+                reminder_count += 1
+                logger.warning(f"[{agent_id}] ⚠️ Tester角色已写测试但未调用exec运行测试 ({reminder_count}/{self._TOOL_REMINDER_MAX})")
+                return (
+                    "⚠️ 你已经编写了测试文件，但还没有使用 `exec` 工具实际运行测试！\n\n"
+                    "**请停止仅仅描述如何运行测试**，你必须立即使用 `exec` 工具执行测试。\n\n"
+                    f"项目目录：`{project_dir}`\n\n"
+                    "请现在执行：\n"
+                    "1. 使用 `exec` 工具运行你编写的测试\n"
+                    "2. 检查测试输出结果\n"
+                    "3. 如果测试失败，修复问题并重新运行\n"
+                    "4. 只有测试通过后才能报告完成\n\n"
+                    "不要再描述命令，直接调用 `exec` 工具运行。"
+                )
+
+            # 通用工具使用检查：architect/code_reviewer 等角色至少应使用一次工具
+            if agent_def.name in self._MUST_USE_TOOLS_ROLES and not tools_called and project_dir:
+                reminder_count += 1
+                logger.warning(
+                    f"{agent_def.emoji} [{agent_id}] 未使用任何工具，"
+                    f"发送工具使用提醒 ({reminder_count}/{self._TOOL_REMINDER_MAX})"
+                )
+                return (
+                    "⚠️ 你还没有使用任何工具！\n\n"
+                    "你必须先使用 `list_dir` 查看项目目录结构，"
+                    "再使用 `read_file` 阅读相关文件，然后基于实际代码给出专业产出。\n\n"
+                    f"项目目录：`{project_dir}`\n\n"
+                    "请立即调用 `list_dir` 工具开始。不要只在文本中描述你的计划。"
+                )
+            return None
 
         # 子代理也使用微压缩来控制上下文膨胀
         from solopreneur.agent.core.compaction import CompactionEngine
@@ -599,248 +631,35 @@ class SubagentManager:
             provider=self.provider,
             workspace=self.workspace,
             model=run_model,
+            tokenizer=self.tokenizer,
         )
 
-        while iteration < max_iterations:
-            iteration += 1
-            logger.info(f"[{agent_id}] ════════ 迭代 {iteration}/{max_iterations} ════════")
-
-            # 微压缩：大型工具输出落盘
-            logger.debug(f"[{agent_id}] 执行微压缩（当前消息数: {len(messages)}）")
-            messages = compactor.microcompact(messages)
-            logger.debug(f"[{agent_id}] 微压缩完成（当前消息数: {len(messages)}）")
-
-            # LLM 调用（带瞬时错误重试）
-            logger.info(f"[{agent_id}] 准备调用 LLM (max_tokens=16384)")
-            response = None
-            for _retry in range(self._LLM_CALL_MAX_RETRIES):
-                try:
-                    logger.debug(f"[{agent_id}] 调用 LLM (尝试 {_retry + 1}/{self._LLM_CALL_MAX_RETRIES})")
-                    llm_start = time.time()
-                    await self._emit_trace({
-                        "event": "llm_start",
-                        "agent_name": agent_def.name,
-                        "iteration": iteration,
-                        "model": run_model,
-                        "timestamp": llm_start,
-                    })
-                    response = await self.provider.chat(
-                        messages=messages,
-                        tools=tools.get_definitions(),
-                        model=run_model,
-                        max_tokens=16384,  # 代码生成需要更多输出空间
-                    )
-                    llm_duration_ms = int((time.time() - llm_start) * 1000)
-                    self._record_usage(
-                        session_key=f"subagent:{agent_id}",
-                        usage=response.usage,
-                        duration_ms=llm_duration_ms,
-                        model=run_model,
-                    )
-                    logger.info(f"[{agent_id}] ✓ LLM 调用成功 | tool_calls={len(response.tool_calls)} | has_tool_calls={response.has_tool_calls}")
-                    await self._emit_trace({
-                        "event": "llm_end",
-                        "agent_name": agent_def.name,
-                        "iteration": iteration,
-                        "model": run_model,
-                        "duration_ms": llm_duration_ms,
-                        "prompt_tokens": (response.usage or {}).get("prompt_tokens", 0),
-                        "completion_tokens": (response.usage or {}).get("completion_tokens", 0),
-                        "total_tokens": (response.usage or {}).get("total_tokens", 0),
-                        "has_tool_calls": response.has_tool_calls,
-                        "timestamp": time.time(),
-                    })
-                    if response.content:
-                        content_preview = response.content[:200].replace('\n', ' ')
-                        logger.debug(f"[{agent_id}] LLM 回复内容: {content_preview}...")
-                    break  # 成功，跳出重试循环
-                except Exception as llm_err:
-                    retries_left = self._LLM_CALL_MAX_RETRIES - _retry - 1
-                    err_desc = f"{type(llm_err).__name__}: {llm_err}" or repr(llm_err)
-                    if retries_left > 0:
-                        delay = self._LLM_CALL_RETRY_BASE_DELAY * (2 ** _retry)
-                        logger.warning(
-                            f"{agent_def.emoji} [{agent_id}] LLM 调用失败 ({err_desc}), "
-                            f"等待 {delay}s 后重试 (剩余 {retries_left} 次)"
-                        )
-                        await asyncio.sleep(delay)
-                    else:
-                        logger.error(
-                            f"{agent_def.emoji} [{agent_id}] LLM 调用重试耗尽: {err_desc}"
-                        )
-                        raise  # 所有重试耗尽，抛出异常
-
-            if response is None:
-                # 不应到达这里，但以防万一
-                logger.error(f"[{agent_id}] LLM 调用未返回有效响应且未抛出异常")
-                raise RuntimeError("LLM 调用未返回有效响应且未抛出异常")
-
-            logger.info(f"[{agent_id}] 处理 LLM 响应...")
-            logger.debug(f"[{agent_id}] 响应状态: content_len={len(response.content) if response.content else 0}, tool_calls={len(response.tool_calls) if response.has_tool_calls else 0}")
-
-            if response.has_tool_calls:
-                logger.info(f"[{agent_id}] 检测到 {len(response.tool_calls)} 个工具调用")
-                tool_call_dicts = [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.name,
-                            "arguments": json.dumps(tc.arguments),
-                        },
-                    }
-                    for tc in response.tool_calls
-                ]
-                messages.append({
-                    "role": "assistant",
-                    "content": response.content or "",
-                    "tool_calls": tool_call_dicts,
-                })
-
-                for tool_call in response.tool_calls:
-                    tools_called.add(tool_call.name)
-                    if tool_call.name == "write_file":
-                        write_file_count += 1
-                    tool_start = time.time()
-                    await self._emit_trace({
-                        "event": "tool_start",
-                        "agent_name": agent_def.name,
-                        "iteration": iteration,
-                        "tool_name": tool_call.name,
-                        "tool_args": tool_call.arguments,
-                        "timestamp": tool_start,
-                    })
-                    logger.info(f"[{agent_id}] → 执行工具 [{tool_call.name}]: {json.dumps(tool_call.arguments, ensure_ascii=False)[:150]}...")
-                    try:
-                        result = await tools.execute(
-                            tool_call.name, tool_call.arguments
-                        )
-                        logger.info(f"[{agent_id}] ✓ 工具 [{tool_call.name}] 执行完成，结果长度: {len(result)}")
-                    except Exception as e:
-                        logger.error(f"[{agent_id}] ✗ 工具 [{tool_call.name}] 执行失败: {e}", exc_info=True)
-                        result = f"Error: {e}"
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "name": tool_call.name,
-                        "content": result,
-                    })
-                    tool_end = time.time()
-                    result_text = str(result)
-                    await self._emit_trace({
-                        "event": "tool_end",
-                        "agent_name": agent_def.name,
-                        "iteration": iteration,
-                        "tool_name": tool_call.name,
-                        "duration_ms": int((tool_end - tool_start) * 1000),
-                        "result_length": len(result_text),
-                        "result_preview": (result_text[:800] + "\n...<truncated>") if len(result_text) > 800 else result_text,
-                        "timestamp": tool_end,
-                    })
-            else:
-                logger.info(f"[{agent_id}] LLM 无工具调用，准备结束迭代")
-                # ── 工具调用强制保障 ──────────────────────────────
-                # 如果角色必须创建文件但还没有调用 write_file，
-                # 注入提醒消息要求调用工具而非只描述代码
-                if (
-                    must_write
-                    and "write_file" not in tools_called
-                    and reminder_count < self._TOOL_REMINDER_MAX
-                ):
-                    reminder_count += 1
-                    logger.warning(f"[{agent_id}] ⚠️ 角色要求必须写文件但尚未调用 write_file，发送提醒 ({reminder_count}/{self._TOOL_REMINDER_MAX})")
-                    # 将模型的文本回复加入上下文
-                    messages.append({
-                        "role": "assistant",
-                        "content": response.content or "",
-                    })
-                    # 注入强制工具调用提醒
-                    messages.append({
-                        "role": "user",
-                        "content": (
-                            "⚠️ 你还没有调用 `write_file` 工具创建任何实际文件！\n\n"
-                            "**请停止在文本中描述代码**，你必须立即使用 `write_file` 工具"
-                            "将源代码文件写入磁盘。\n\n"
-                            f"目标目录：`{project_dir}`\n\n"
-                            "请现在开始：\n"
-                            "1. 调用 `write_file` 创建第一个源文件\n"
-                            "2. 逐个创建所有必要的项目文件\n"
-                            "3. 每个文件都必须通过 `write_file` 工具写入\n\n"
-                            "不要再解释，直接调用工具。"
-                        ),
-                    })
-                    logger.warning(
-                        f"{agent_def.emoji} [{agent_id}] 未调用 write_file，"
-                        f"发送提醒 ({reminder_count}/{self._TOOL_REMINDER_MAX})"
-                    )
-                    continue  # 不退出循环，继续要求模型调用工具
-
-                # ── Tester 角色强制执行测试（exec 保障）──────────
-                # 如果 tester 已经写了测试文件但还没有调用 exec 运行测试
-                must_exec = (
-                    agent_def.name in self._MUST_EXEC_ROLES and bool(project_dir)
-                )
-                if (
-                    must_exec
-                    and "exec" not in tools_called
-                    and "write_file" in tools_called
-                    and reminder_count < self._TOOL_REMINDER_MAX
-                ):
-                    reminder_count += 1
-                    logger.warning(f"[{agent_id}] ⚠️ Tester角色已写测试但未调用exec运行测试 ({reminder_count}/{self._TOOL_REMINDER_MAX})")
-                    messages.append({
-                        "role": "assistant",
-                        "content": response.content or "",
-                    })
-                    messages.append({
-                        "role": "user",
-                        "content": (
-                            "⚠️ 你已经编写了测试文件，但还没有使用 `exec` 工具实际运行测试！\n\n"
-                            "**请停止仅仅描述如何运行测试**，你必须立即使用 `exec` 工具执行测试。\n\n"
-                            f"项目目录：`{project_dir}`\n\n"
-                            "请现在执行：\n"
-                            "1. 使用 `exec` 工具运行你编写的测试\n"
-                            "2. 检查测试输出结果\n"
-                            "3. 如果测试失败，修复问题并重新运行\n"
-                            "4. 只有测试通过后才能报告完成\n\n"
-                            "不要再描述命令，直接调用 `exec` 工具运行。"
-                        ),
-                    })
-                    continue
-
-                # 通用工具使用检查：architect/code_reviewer 等角色至少应使用一次工具
-                # 如果完全没用过工具就想结束，提醒它先查看项目目录
-                if (
-                    agent_def.name in self._MUST_USE_TOOLS_ROLES
-                    and not tools_called
-                    and reminder_count < self._TOOL_REMINDER_MAX
-                    and bool(project_dir)
-                ):
-                    reminder_count += 1
-                    logger.warning(f"[{agent_id}] ⚠️ 角色要求必须使用工具但尚未使用任何工具，发送工具使用提醒 ({reminder_count}/{self._TOOL_REMINDER_MAX})")
-                    messages.append({
-                        "role": "assistant",
-                        "content": response.content or "",
-                    })
-                    messages.append({
-                        "role": "user",
-                        "content": (
-                            "⚠️ 你还没有使用任何工具！\n\n"
-                            "你必须先使用 `list_dir` 查看项目目录结构，"
-                            "再使用 `read_file` 阅读相关文件，然后基于实际代码给出专业产出。\n\n"
-                            f"项目目录：`{project_dir}`\n\n"
-                            "请立即调用 `list_dir` 工具开始。不要只在文本中描述你的计划。"
-                        ),
-                    })
-                    logger.warning(
-                        f"{agent_def.emoji} [{agent_id}] 未使用任何工具，"
-                        f"发送工具使用提醒 ({reminder_count}/{self._TOOL_REMINDER_MAX})"
-                    )
-                    continue
-
-                final_result = response.content
-                logger.info(f"[{agent_id}] 迭代完成，获得最终结果")
-                break
+        # 从调用方（主 Agent / 工作流步骤）的预算派生子预算，消耗计入整条链
+        parent_budget = current_budget.get()
+        budget = parent_budget.child() if parent_budget else None
+
+        engine = TurnEngine(
+            self.provider,
+            tools,
+            run_model,
+            agent_name=agent_def.name,
+            max_iterations=max_iterations,
+            max_tokens=16384,  # 代码生成需要更多输出空间
+            compaction=compactor,
+            retry=RetryPolicy(
+                max_attempts=self._LLM_CALL_MAX_RETRIES,
+                base_delay=self._LLM_CALL_RETRY_BASE_DELAY,
+                max_delay=60.0,
+            ),
+            usage_store=self.usage_store,
+            usage_key=f"subagent:{agent_id}",
+            budget=budget,
+        )
+        result = await engine.run(messages, TurnHooks(on_trace=self._emit_trace, on_final=_on_final))
+        iteration = result.state.iteration
+        tools_called = set(result.state.tool_counts)
+        write_file_count = result.state.tool_counts["write_file"]
+        final_result = result.content
 
         if final_result is None:
             final_result = "任务已完成，但未生成最终回复。"
@@ -880,6 +699,7 @@ class SubagentManager:
             "agent_id": agent_id,
             "total_iterations": iteration,
             "result_length": len(final_result) if final_result else 0,
+            "budget": budget.snapshot() if budget else None,
             "timestamp": time.time(),
         })
         return final_result
@@ -0,0 +1,180 @@
+"""
+Token 计数层：BPE 分词器（tiktoken）可用时精确计数，否则使用按字符类别校准的估算。
+
+MessageTokenCounter 按消息缓存计数：消息内容不变时不重新分词，
+消息列表追加新消息后只对新消息计数，总量随之增量更新。
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from typing import Any, Callable, Protocol
+
+from loguru import logger
+
+# 启发式估算系数（以 cl100k_base 在中英混合文本、代码与 JSON 上校准）
+CJK_TOKENS_PER_CHAR = 1.2
+OTHER_CHARS_PER_TOKEN = 3.8
+# 每条消息的格式开销（role、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+# 图片内容块按固定值计入（base64 数据不参与分词）
+IMAGE_TOKENS = 765
+
+# CJK 部首 / 汉字、韩文音节、兼容汉字、全角字符与 CJK 标点
+_CJK_RE = re.compile("[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef\u3000-\u303f]")
+
+
+class Tokenizer(Protocol):
+    name: str
+
+    def count(self, text: str) -> int: ...
+
+
+class HeuristicTokenizer:
+    """按字符类别估算：CJK 字符约 1.2 token，其余约 3.8 字符 / token。"""
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        cjk = len(_CJK_RE.findall(text))
+        return int(cjk * CJK_TOKENS_PER_CHAR + (len(text) - cjk) / OTHER_CHARS_PER_TOKEN) + 1
+
+
+class TiktokenTokenizer:
+    """tiktoken BPE 分词。"""
+
+    def __init__(self, encoding: Any):
+        self._encoding = encoding
+        self.name = f"tiktoken:{encoding.name}"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+def _load_tiktoken(encoding_name: str) -> Tokenizer | None:
+    if encoding_name == "cl100k_base":
+        try:
+            # LiteLLM 随包附带 cl100k_base 词表，离线可用
+            from litellm.litellm_core_utils.default_encoding import encoding
+
+            return TiktokenTokenizer(encoding)
+        except Exception:
+            pass
+    try:
+        import tiktoken
+
+        return TiktokenTokenizer(tiktoken.get_encoding(encoding_name))
+    except Exception as e:
+        logger.debug(f"tiktoken encoding {encoding_name} unavailable: {e}")
+        return None
+
+
+_factories: dict[str, Callable[[], Tokenizer | None]] = {
+    "heuristic": HeuristicTokenizer,
+    "tiktoken": lambda: _load_tiktoken("cl100k_base"),
+}
+_tokenizers: dict[str, Tokenizer] = {}
+_lock = threading.Lock()
+
+
+def register_tokenizer(name: str, factory: Callable[[], Tokenizer | None]) -> None:
+    """注册自定义分词器（如模型专用分词器），之后可通过 get_tokenizer(name) 获取。"""
+    with _lock:
+        _factories[name] = factory
+        _tokenizers.pop(name, None)
+
+
+def get_tokenizer(name: str = "auto") -> Tokenizer:
+    """
+    获取分词器（进程内缓存）。
+
+    name: "auto"（tiktoken 可用时使用，否则启发式）、"heuristic"、"tiktoken"、
+        "tiktoken:<encoding>" 或通过 register_tokenizer 注册的名称。
+        无法加载时回退到启发式估算。
+    """
+    with _lock:
+        cached = _tokenizers.get(name)
+    if cached is not None:
+        return cached
+
+    if name == "auto":
+        tokenizer = get_tokenizer("tiktoken")
+    elif name.startswith("tiktoken:"):
+        tokenizer = _load_tiktoken(name.split(":", 1)[1])
+    else:
+        factory = _factories.get(name)
+        tokenizer = factory() if factory else None
+    if tokenizer is None:
+        logger.info(f"Tokenizer '{name}' unavailable, falling back to heuristic estimation")
+        tokenizer = HeuristicTokenizer()
+
+    with _lock:
+        return _tokenizers.setdefault(name, tokenizer)
+
+
+def count_tokens(text: str, tokenizer: Tokenizer | None = None) -> int:
+    return (tokenizer or get_tokenizer()).count(text)
+
+
+class MessageTokenCounter:
+    """
+    按消息缓存 token 计数。
+
+    以消息对象身份为键，并校验 content / tool_calls 对象未被替换。多个会话可共用
+    同一计数器；缓存条目超过 max_entries 时只保留本次列表中的消息。
+    """
+
+    def __init__(self, tokenizer: Tokenizer | None = None, max_entries: int = 4096):
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.max_entries = max_entries
+        self._entries: dict[int, tuple[dict, Any, Any, int, int]] = {}
+
+    def count(self, messages: list[dict[str, Any]]) -> int:
+        entries = self._entries
+        current: set[int] = set()
+        total = 0
+        for msg in messages:
+            content = msg.get("content")
+            tool_calls = msg.get("tool_calls")
+            n_calls = len(tool_calls) if tool_calls else 0
+            entry = entries.get(id(msg))
+            if (
+                entry is not None
+                and entry[0] is msg
+                and entry[1] is content
+                and entry[2] is tool_calls
+                and entry[3] == n_calls
+            ):
+                tokens = entry[4]
+            else:
+                tokens = self.count_message(msg)
+                entries[id(msg)] = (msg, content, tool_calls, n_calls, tokens)
+            current.add(id(msg))
+            total += tokens
+        if len(entries) > self.max_entries:
+            self._entries = {key: entries[key] for key in current}
+        return total
+
+    def count_message(self, msg: dict[str, Any]) -> int:
+        count = self.tokenizer.count
+        tokens = MESSAGE_OVERHEAD_TOKENS
+        content = msg.get("content")
+        if isinstance(content, str):
+            tokens += count(content)
+        elif isinstance(content, list):
+            for item in content:
+                if not isinstance(item, dict):
+                    continue
+                if item.get("type") == "text":
+                    tokens += count(item.get("text", ""))
+                elif item.get("type") in ("image_url", "image_ref"):
+                    tokens += IMAGE_TOKENS
+        for tc in msg.get("tool_calls") or []:
+            func = tc.get("function", {}) if isinstance(tc, dict) else {}
+            tokens += count(func.get("name", "")) + count(str(func.get("arguments", "")))
+        return tokens
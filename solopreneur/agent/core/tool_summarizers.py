@@ -0,0 +1,139 @@
+"""
+按工具类型生成的微压缩摘要。
+
+微压缩把冷工具结果移出上下文后，引用中保留的是该工具输出的结构化摘要，
+而不是固定长度的开头预览：
+- list_dir：目录 / 文件计数、扩展名分布与条目节选
+- search_code：按文件统计的匹配数与前几条匹配
+- exec：错误相关行、退出码与输出尾部
+- read_file：代码文件保留类 / 函数签名大纲，Markdown 保留标题
+其他工具使用开头 + 结尾预览。可通过 register_summarizer 为其他工具注册策略。
+"""
+
+from __future__ import annotations
+
+import re
+from collections import Counter
+from pathlib import PurePosixPath
+from typing import Any, Callable
+
+# 摘要整体字符上限（超出时截断）
+MAX_SUMMARY_CHARS = 2000
+
+Summarizer = Callable[[str, dict[str, Any]], str]
+
+_CODE_SUFFIXES = {
+    ".py", ".pyi", ".js", ".jsx", ".mjs", ".ts", ".tsx", ".vue", ".go", ".java", ".kt",
+    ".rs", ".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".rb", ".php", ".swift", ".scala",
+}
+_MARKDOWN_SUFFIXES = {".md", ".markdown", ".rst"}
+
+_OUTLINE_RE = re.compile(
+    r"^\s*(?:@\w[\w.]*(?:\(.*)?$|(?:export\s+)?(?:default\s+)?"
+    r"(?:(?:public|private|protected|internal|static|async|abstract|final|pub(?:\([\w ]+\))?)\s+)*"
+    r"(?:def|class|function|interface|struct|enum|trait|impl|fn|func|type|module|object)\b)"
+)
+_HEADING_RE = re.compile(r"^#{1,6}\s")
+_ERROR_RE = re.compile(r"error|exception|traceback|failed|failure|fatal|panic|denied|not found", re.IGNORECASE)
+_SEARCH_MATCH_RE = re.compile(r"^(.+?):(\d+): ")
+
+
+def _clip(text: str, limit: int = MAX_SUMMARY_CHARS) -> str:
+    return text if len(text) <= limit else text[:limit] + "\n..."
+
+
+def _head_tail(content: str, head: int = 500, tail: int = 300) -> str:
+    if len(content) <= head + tail:
+        return content
+    return f"{content[:head]}\n...\n{content[-tail:]}"
+
+
+def summarize_list_dir(content: str, args: dict[str, Any]) -> str:
+    lines = [line for line in content.splitlines() if line.strip()]
+    dirs = [line[2:].strip() for line in lines if line.startswith("📁")]
+    files = [line[2:].strip() for line in lines if line.startswith("📄")]
+    suffixes = Counter(PurePosixPath(name).suffix or "(无扩展名)" for name in files)
+    parts = [f"目录 {args.get('path', '')}: {len(dirs)} 个子目录, {len(files)} 个文件"]
+    if suffixes:
+        parts.append("文件类型: " + ", ".join(f"{s} ×{n}" for s, n in suffixes.most_common(10)))
+    if dirs:
+        parts.append("子目录: " + ", ".join(dirs[:50]) + (" ..." if len(dirs) > 50 else ""))
+    if files:
+        parts.append("文件节选: " + ", ".join(files[:30]) + (" ..." if len(files) > 30 else ""))
+    return _clip("\n".join(parts))
+
+
+def summarize_search_code(content: str, args: dict[str, Any]) -> str:
+    lines = content.splitlines()
+    header = lines[0] if lines else ""
+    per_file: Counter[str] = Counter()
+    matches: list[str] = []
+    for line in lines[1:]:
+        m = _SEARCH_MATCH_RE.match(line)
+        if m:
+            per_file[m.group(1)] += 1
+            matches.append(line)
+    parts = [f"{header} (query: {args.get('query', '')})"]
+    if per_file:
+        parts.append(f"涉及 {len(per_file)} 个文件:")
+        parts.extend(f"  {path}: {n}" for path, n in per_file.most_common(20))
+        parts.append("前几条匹配:")
+        parts.extend(f"  {line[:200]}" for line in matches[:10])
+    return _clip("\n".join(parts))
+
+
+def summarize_exec(content: str, args: dict[str, Any]) -> str:
+    lines = content.splitlines()
+    errors = [line.strip()[:200] for line in lines if _ERROR_RE.search(line)]
+    exit_line = next((line for line in reversed(lines) if line.startswith("Exit code:")), "")
+    parts = [f"命令: {str(args.get('command', ''))[:200]}", f"输出 {len(lines)} 行"]
+    if exit_line:
+        parts.append(exit_line)
+    if errors:
+        # 保留首尾错误行（首个错误往往是根因，末尾是最终结果）
+        picked = errors if len(errors) <= 20 else [*errors[:10], "...", *errors[-10:]]
+        parts.append("错误相关行:")
+        parts.extend(f"  {line}" for line in picked)
+    parts.append("输出尾部:")
+    parts.append(_clip("\n".join(lines[-30:]), 1200))
+    return _clip("\n".join(parts))
+
+
+def summarize_read_file(content: str, args: dict[str, Any]) -> str:
+    path = str(args.get("path", ""))
+    suffix = PurePosixPath(path.replace("\\", "/")).suffix.lower()
+    lines = content.splitlines()
+    pattern = _OUTLINE_RE if suffix in _CODE_SUFFIXES else _HEADING_RE if suffix in _MARKDOWN_SUFFIXES else None
+    if pattern is None:
+        return _head_tail(content)
+    outline = [f"  {i}: {line.rstrip()[:160]}" for i, line in enumerate(lines, start=1) if pattern.match(line)]
+    if not outline:
+        return _head_tail(content)
+    kind = "大纲（类 / 函数签名）" if pattern is _OUTLINE_RE else "标题"
+    return _clip("\n".join([f"文件 {path}: {len(lines)} 行，{kind}:", *outline]))
+
+
+def summarize_default(content: str, args: dict[str, Any]) -> str:
+    return _head_tail(content)
+
+
+_summarizers: dict[str, Summarizer] = {
+    "list_dir": summarize_list_dir,
+    "search_code": summarize_search_code,
+    "exec": summarize_exec,
+    "read_file": summarize_read_file,
+}
+
+
+def register_summarizer(tool_name: str, summarizer: Summarizer) -> None:
+    """为工具注册微压缩摘要策略。"""
+    _summarizers[tool_name] = summarizer
+
+
+def summarize_tool_output(tool_name: str, content: str, args: dict[str, Any] | None = None) -> str:
+    """生成工具输出的摘要；策略出错时回退到开头 + 结尾预览。"""
+    summarizer = _summarizers.get(tool_name, summarize_default)
+    try:
+        return summarizer(content, args or {})
+    except Exception:
+        return summarize_default(content, args or {})
@@ -12,6 +12,18 @@ class Tool(ABC):
     the environment, such as reading files, executing commands, etc.
     """
     
+    # Side-effect-free tools may run concurrently with other read-only calls
+    # of the same LLM turn (see ToolScheduler); everything else runs serialized.
+    read_only: bool = False
+    
+    # Tools whose description/parameters change at runtime (e.g. list the
+    # currently registered agents) are re-rendered on every get_definitions().
+    dynamic_schema: bool = False
+    
+    # Tools that run other agents (delegate, workflows). Their duration is not
+    # charged as tool time; the nested agents' own tool calls are.
+    delegates: bool = False
+    
     _TYPE_MAP = {
         "string": str,
         "integer": int,
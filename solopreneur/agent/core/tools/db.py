@@ -12,6 +12,8 @@ from solopreneur.agent.core.tools.base import Tool
 class DBInspectTool(Tool):
     """Read-only database inspect tool for solopreneur SQLite."""
 
+    read_only = True
+
     def __init__(self, db_path: Path | None = None, default_limit: int = 100):
         self.db_path = db_path or (Path.home() / ".solopreneur" / "solopreneur.db")
         self.default_limit = max(1, min(default_limit, 500))
@@ -5,7 +5,6 @@ Delegate 委派工具 - 将任务委派给指定的 Agent。
 from typing import Any, TYPE_CHECKING
 
 from solopreneur.agent.core.tools.base import Tool
-from solopreneur.agent.definitions.registry import AgentRegistry
 
 if TYPE_CHECKING:
     from solopreneur.agent.core.subagent import SubagentManager
@@ -20,6 +19,9 @@ class DelegateTool(Tool):
     主 Agent 可以将结果传递给下一个 Agent。
     """
 
+    dynamic_schema = True  # 描述/参数随已注册 Agent 变化
+    delegates = True  # 耗时不计入工具时间，子 Agent 的工具调用自行计入
+
     def __init__(
         self,
         manager: "SubagentManager",
@@ -27,7 +29,7 @@ class DelegateTool(Tool):
     ):
         self._manager = manager
         self._agent_manager = agent_manager
-        self._registry = AgentRegistry(agent_manager.workspace)
+        self._registry = agent_manager.registry
 
     @property
     def name(self) -> str:
@@ -19,6 +19,9 @@ if TYPE_CHECKING:
 class DelegateAutoTool(Tool):
     """根据任务依赖自动选择串行或并行委派。"""
 
+    dynamic_schema = True  # 描述/参数随已注册 Agent 变化
+    delegates = True  # 耗时不计入工具时间，子 Agent 的工具调用自行计入
+
     _PATH_RE = re.compile(r"[A-Za-z0-9_./\\-]+\.(?:py|ts|tsx|js|jsx|vue|java|kt|go|rs|sql|md|yaml|yml|json)")
 
     def __init__(self, manager: "SubagentManager", agent_manager: "AgentManager"):
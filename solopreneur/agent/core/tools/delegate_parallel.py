@@ -14,6 +14,9 @@ if TYPE_CHECKING:
 class DelegateParallelTool(Tool):
     """将多个任务并行委派给不同 Agent，并聚合返回结果。"""
 
+    dynamic_schema = True  # 描述/参数随已注册 Agent 变化
+    delegates = True  # 耗时不计入工具时间，子 Agent 的工具调用自行计入
+
     def __init__(
         self,
         manager: "SubagentManager",
@@ -33,6 +33,8 @@ def _validate_path(path: str, workspace: Path | None = None) -> tuple[Path, str
 
 class ReadFileTool(Tool):
     """Tool to read file contents."""
+
+    read_only = True
     
     def __init__(self, workspace: Path | None = None):
         self.workspace = workspace
@@ -209,6 +211,8 @@ class EditFileTool(Tool):
 
 class ListDirTool(Tool):
     """Tool to list directory contents."""
+
+    read_only = True
     
     def __init__(self, workspace: Path | None = None):
         self.workspace = workspace
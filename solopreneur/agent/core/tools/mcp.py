@@ -58,6 +58,23 @@ class MCPError(Exception):
     """MCP 协议错误。"""
 
 
+# 取消通知等后台发送任务（保留引用，防止被回收）
+_background_sends: set[asyncio.Task] = set()
+
+
+def _send_in_background(coro: Any) -> None:
+    """在独立任务中发送通知（调用方任务已被取消，无法再等待）。"""
+    task = asyncio.get_running_loop().create_task(coro)
+    _background_sends.add(task)
+    task.add_done_callback(_on_background_send_done)
+
+
+def _on_background_send_done(task: asyncio.Task) -> None:
+    _background_sends.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug(f"MCP 取消通知发送失败: {task.exception()}")
+
+
 # ---------------------------------------------------------------------------
 # Stdio 传输（Docker 容器 stdin/stdout）
 # ---------------------------------------------------------------------------
@@ -205,6 +222,11 @@ class MCPStdioClient:
         except asyncio.TimeoutError:
             self._pending.pop(req_id, None)
             raise MCPError(f"MCP 请求 '{method}' 超时（{timeout}s）")
+        except asyncio.CancelledError:
+            # 调用方取消：通知服务器停止处理该请求
+            self._pending.pop(req_id, None)
+            _send_in_background(self._notify("notifications/cancelled", {"requestId": req_id, "reason": "cancelled"}))
+            raise
 
     async def _notify(self, method: str, params: dict | None = None) -> None:
         async with self._write_lock:
@@ -371,6 +393,11 @@ class MCPSseClient:
         except asyncio.TimeoutError:
             self._pending.pop(req_id, None)
             raise MCPError(f"MCP SSE 请求 '{method}' 超时（{timeout}s）")
+        except asyncio.CancelledError:
+            # 调用方取消：通知服务器停止处理该请求
+            self._pending.pop(req_id, None)
+            _send_in_background(self._notify("notifications/cancelled", {"requestId": req_id, "reason": "cancelled"}))
+            raise
 
     async def _notify(self, method: str, params: dict | None = None) -> None:
         assert self._post_url and self._client
@@ -7,13 +7,17 @@ from pathlib import Path
 from typing import Any
 
 from solopreneur.agent.core.tools.base import Tool
+from solopreneur.storage.services import MetricsQueryService
 
 
 class MetricsInspectTool(Tool):
     """Aggregate llm_usage/subagent_tasks metrics for quick diagnostics."""
 
+    read_only = True
+
     def __init__(self, db_path: Path | None = None):
         self.db_path = db_path or (Path.home() / ".solopreneur" / "solopreneur.db")
+        self._svc: MetricsQueryService | None = None
 
     @property
     def name(self) -> str:
@@ -89,23 +93,23 @@ class MetricsInspectTool(Tool):
         limit = max(1, min(limit, 100))
 
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
-                conn.row_factory = sqlite3.Row
-
-                if action == "usage_daily":
-                    return self._usage_daily(conn, days, session_key, model, limit)
-                if action == "usage_summary":
-                    return self._usage_summary(conn, days, session_key, model)
-                if action == "task_daily":
-                    return self._task_daily(conn, days, status, limit)
-                if action == "task_summary":
-                    return self._task_summary(conn, days, status)
-                if action == "snapshot":
-                    usage = self._usage_summary(conn, days, session_key, model)
-                    tasks = self._task_summary(conn, days, status)
-                    return f"# usage\n{usage}\n\n# tasks\n{tasks}"
-
-                return f"Error: unsupported action: {action}"
+            if self._svc is None:
+                self._svc = MetricsQueryService(db_path=self.db_path)
+
+            if action == "usage_daily":
+                return self._usage_daily(days, session_key, model, limit)
+            if action == "usage_summary":
+                return self._usage_summary(days, session_key, model)
+            if action == "task_daily":
+                return self._task_daily(days, status, limit)
+            if action == "task_summary":
+                return self._task_summary(days, status)
+            if action == "snapshot":
+                usage = self._usage_summary(days, session_key, model)
+                tasks = self._task_summary(days, status)
+                return f"# usage\n{usage}\n\n# tasks\n{tasks}"
+
+            return f"Error: unsupported action: {action}"
         except sqlite3.Error as e:
             return f"Error: sqlite failed: {e}"
         except Exception as e:
@@ -113,35 +117,12 @@ class MetricsInspectTool(Tool):
 
     def _usage_daily(
         self,
-        conn: sqlite3.Connection,
         days: int,
         session_key: str | None,
         model: str | None,
         limit: int,
     ) -> str:
-        sql = (
-            """
-            SELECT substr(created_at, 1, 10) AS day,
-                   COUNT(*) AS calls,
-                   SUM(prompt_tokens) AS prompt_tokens,
-                   SUM(completion_tokens) AS completion_tokens,
-                   SUM(total_tokens) AS total_tokens,
-                   AVG(duration_ms) AS avg_duration_ms
-            FROM llm_usage
-            WHERE datetime(created_at) >= datetime('now', ?)
-            """
-        )
-        params: list[Any] = [f"-{days} days"]
-        if session_key:
-            sql += " AND session_key = ?"
-            params.append(session_key)
-        if model:
-            sql += " AND model = ?"
-            params.append(model)
-        sql += " GROUP BY day ORDER BY day DESC LIMIT ?"
-        params.append(limit)
-
-        rows = conn.execute(sql, tuple(params)).fetchall()
+        rows = self._svc.usage_daily(days, session_key=session_key, model=model, limit=limit)
         if not rows:
             return "(no usage rows)"
 
@@ -149,96 +130,39 @@ class MetricsInspectTool(Tool):
         lines.append("--- | ---: | ---: | ---: | ---: | ---:")
         for r in rows:
             lines.append(
-                f"{r['day']} | {r['calls']} | {r['prompt_tokens'] or 0} | "
-                f"{r['completion_tokens'] or 0} | {r['total_tokens'] or 0} | {int(r['avg_duration_ms'] or 0)}"
+                f"{r['day']} | {r['calls']} | {r['prompt_tokens']} | "
+                f"{r['completion_tokens']} | {r['total_tokens']} | {r['avg_duration_ms']}"
             )
         return "\n".join(lines)
 
     def _usage_summary(
         self,
-        conn: sqlite3.Connection,
         days: int,
         session_key: str | None,
         model: str | None,
     ) -> str:
-        sql = (
-            """
-            SELECT COUNT(*) AS calls,
-                   SUM(prompt_tokens) AS prompt_tokens,
-                   SUM(completion_tokens) AS completion_tokens,
-                   SUM(total_tokens) AS total_tokens,
-                   AVG(duration_ms) AS avg_duration_ms,
-                   SUM(CASE WHEN is_stream = 1 THEN 1 ELSE 0 END) AS stream_calls
-            FROM llm_usage
-            WHERE datetime(created_at) >= datetime('now', ?)
-            """
-        )
-        params: list[Any] = [f"-{days} days"]
-        if session_key:
-            sql += " AND session_key = ?"
-            params.append(session_key)
-        if model:
-            sql += " AND model = ?"
-            params.append(model)
-
-        r = conn.execute(sql, tuple(params)).fetchone()
-        calls = r["calls"] or 0
+        r = self._svc.usage_summary(days, session_key=session_key, model=model)
         return (
-            f"calls={calls}, prompt_tokens={r['prompt_tokens'] or 0}, "
-            f"completion_tokens={r['completion_tokens'] or 0}, total_tokens={r['total_tokens'] or 0}, "
-            f"avg_duration_ms={int(r['avg_duration_ms'] or 0)}, stream_calls={r['stream_calls'] or 0}"
+            f"calls={r['calls']}, prompt_tokens={r['prompt_tokens']}, "
+            f"completion_tokens={r['completion_tokens']}, total_tokens={r['total_tokens']}, "
+            f"cached_tokens={r['cached_tokens']}, "
+            f"avg_duration_ms={r['avg_duration_ms']}, stream_calls={r['stream_calls']}"
         )
 
-    def _task_daily(
-        self,
-        conn: sqlite3.Connection,
-        days: int,
-        status: str | None,
-        limit: int,
-    ) -> str:
-        sql = (
-            """
-            SELECT substr(updated_at, 1, 10) AS day,
-                   status,
-                   COUNT(*) AS cnt
-            FROM subagent_tasks
-            WHERE datetime(updated_at) >= datetime('now', ?)
-            """
-        )
-        params: list[Any] = [f"-{days} days"]
-        if status:
-            sql += " AND status = ?"
-            params.append(status)
-        sql += " GROUP BY day, status ORDER BY day DESC, cnt DESC LIMIT ?"
-        params.append(limit)
-
-        rows = conn.execute(sql, tuple(params)).fetchall()
+    def _task_daily(self, days: int, status: str | None, limit: int) -> str:
+        rows = self._svc.task_daily(days, status=status, limit=limit)
         if not rows:
             return "(no task rows)"
 
         lines = ["day | status | count", "--- | --- | ---:"]
         for r in rows:
-            lines.append(f"{r['day']} | {r['status']} | {r['cnt']}")
+            lines.append(f"{r['day']} | {r['status']} | {r['count']}")
         return "\n".join(lines)
 
-    def _task_summary(self, conn: sqlite3.Connection, days: int, status: str | None) -> str:
-        sql = (
-            """
-            SELECT status, COUNT(*) AS cnt
-            FROM subagent_tasks
-            WHERE datetime(updated_at) >= datetime('now', ?)
-            """
-        )
-        params: list[Any] = [f"-{days} days"]
-        if status:
-            sql += " AND status = ?"
-            params.append(status)
-        sql += " GROUP BY status ORDER BY cnt DESC"
-
-        rows = conn.execute(sql, tuple(params)).fetchall()
-        if not rows:
+    def _task_summary(self, days: int, status: str | None) -> str:
+        summary = self._svc.task_summary(days, status=status)
+        if not summary["by_status"]:
             return "(no task rows)"
 
-        total = sum(r["cnt"] for r in rows)
-        pairs = ", ".join([f"{r['status']}={r['cnt']}" for r in rows])
-        return f"total={total}; {pairs}"
+        pairs = ", ".join([f"{k}={v}" for k, v in summary["by_status"].items()])
+        return f"total={summary['total']}; {pairs}"
@@ -5,12 +5,15 @@ from pathlib import Path
 from typing import Any
 
 from solopreneur.agent.core.tools.base import Tool
-from solopreneur.projects import ProjectManager, ProjectEnvVar
+from solopreneur.core.dependencies import get_component_manager
+from solopreneur.projects import ProjectEnvVar
 
 
 class GetProjectEnvTool(Tool):
     """Read project-level environment variables."""
 
+    read_only = True
+
     def __init__(self, workspace: Path):
         self.workspace = workspace
 
@@ -36,7 +39,7 @@ class GetProjectEnvTool(Tool):
         }
 
     async def execute(self, key: str | None = None, **kwargs: Any) -> str:
-        manager = ProjectManager()
+        manager = get_component_manager().get_project_manager()
         project = manager.get_project_by_path(self.workspace)
         if not project:
             return f"Error: No project matched current workspace path: {self.workspace}"
@@ -98,7 +101,7 @@ class SetProjectEnvTool(Tool):
         }
 
     async def execute(self, env_vars: list[dict[str, Any]], **kwargs: Any) -> str:
-        manager = ProjectManager()
+        manager = get_component_manager().get_project_manager()
         project = manager.get_project_by_path(self.workspace)
         if not project:
             return f"Error: No project matched current workspace path: {self.workspace}"
@@ -16,14 +16,24 @@ class ToolRegistry:
     
     def __init__(self):
         self._tools: dict[str, Tool] = {}
+        # Rendered schemas in registration order; None marks a dynamic tool
+        self._definitions: list[dict[str, Any] | None] | None = None
+        self.version = 0
     
     def register(self, tool: Tool) -> None:
         """Register a tool."""
         self._tools[tool.name] = tool
+        self.invalidate()
     
     def unregister(self, name: str) -> None:
         """Unregister a tool by name."""
-        self._tools.pop(name, None)
+        if self._tools.pop(name, None) is not None:
+            self.invalidate()
+    
+    def invalidate(self) -> None:
+        """Drop the cached schemas (call after changing a tool's schema in place)."""
+        self._definitions = None
+        self.version += 1
     
     def get(self, name: str) -> Tool | None:
         """Get a tool by name."""
@@ -33,9 +43,22 @@ class ToolRegistry:
         """Check if a tool is registered."""
         return name in self._tools
     
+    def is_read_only(self, name: str) -> bool:
+        """Check whether a tool is declared side-effect-free (unknown tools are not)."""
+        tool = self._tools.get(name)
+        return bool(tool and tool.read_only)
+    
     def get_definitions(self) -> list[dict[str, Any]]:
-        """Get all tool definitions in OpenAI format."""
-        return [tool.to_schema() for tool in self._tools.values()]
+        """Get all tool definitions in OpenAI format (cached until the registry changes)."""
+        if self._definitions is None:
+            self._definitions = [
+                None if tool.dynamic_schema else tool.to_schema()
+                for tool in self._tools.values()
+            ]
+        return [
+            schema if schema is not None else tool.to_schema()
+            for schema, tool in zip(self._definitions, self._tools.values())
+        ]
     
     async def execute(self, name: str, params: dict[str, Any]) -> str:
         """
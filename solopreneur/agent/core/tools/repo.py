@@ -22,6 +22,8 @@ _TEXT_EXTENSIONS = {
 class SearchCodeTool(Tool):
     """Search text in workspace files with optional regex."""
 
+    read_only = True
+
     def __init__(self, workspace: Path, max_file_size: int = 1_000_000):
         self.workspace = workspace.resolve()
         self.max_file_size = max_file_size
@@ -118,6 +120,8 @@ class SearchCodeTool(Tool):
 class GitInspectTool(Tool):
     """Read-only git inspection tool."""
 
+    read_only = True
+
     # 类级别缓存 git 路径
     _git_path: str | None = None
 
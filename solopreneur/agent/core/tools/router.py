@@ -0,0 +1,191 @@
+"""Per-turn tool selection: send the LLM a relevant subset of a large tool registry."""
+
+import re
+import weakref
+from contextvars import ContextVar
+from typing import Any, Iterable
+
+from solopreneur.agent.core.tools.base import Tool
+from solopreneur.agent.core.tools.registry import ToolRegistry
+
+REQUEST_MORE_TOOLS = "request_more_tools"
+
+DEFAULT_CORE_TOOLS = (
+    "read_file", "write_file", "edit_file", "list_dir", "search_code",
+    "exec", "message", "delegate", "harness", "read_spill",
+)
+
+_WORD_RE = re.compile(r"[a-z0-9]{2,}")
+_CJK_RE = re.compile(r"[一-鿿]+")
+
+
+def _tokens(text: str) -> set[str]:
+    """Lowercase words plus CJK character bigrams."""
+    text = text.lower().replace("_", " ").replace("-", " ")
+    tokens = set(_WORD_RE.findall(text))
+    for run in _CJK_RE.findall(text):
+        tokens.update(run[i:i + 2] for i in range(max(1, len(run) - 1)))
+    return tokens
+
+
+class ToolRouter:
+    """
+    Picks the tools offered to the LLM for one turn.
+
+    Registries at or below ``min_tools`` are passed through untouched. Larger
+    ones are cut down to at most ``max_tools``: pinned core tools, tools
+    used earlier in the request, tools unlocked through request_more_tools,
+    then the best keyword matches against the user message. Selected schemas
+    keep registry order so the tools block stays stable across turns.
+    """
+
+    def __init__(
+        self,
+        core_tools: Iterable[str] = DEFAULT_CORE_TOOLS,
+        max_tools: int = 20,
+        min_tools: int = 24,
+        enabled: bool = True,
+    ):
+        self.core_tools = tuple(core_tools)
+        self.max_tools = max(1, max_tools)
+        self.min_tools = min_tools
+        self.enabled = enabled
+        # registry -> (registry.version, {tool name: (name tokens, description tokens)})
+        self._index: "weakref.WeakKeyDictionary[ToolRegistry, tuple[int, dict[str, tuple[set[str], set[str]]]]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        # tools unlocked for the current request (task-local, shared with child tasks)
+        self._unlocked: ContextVar[set[str] | None] = ContextVar(f"tool_router_unlocked_{id(self)}", default=None)
+
+    @classmethod
+    def from_config(cls, config: Any) -> "ToolRouter":
+        """Build a router from a ToolRouterConfig."""
+        return cls(
+            core_tools=config.core_tools,
+            max_tools=config.max_tools,
+            min_tools=config.min_tools,
+            enabled=config.enabled,
+        )
+
+    def begin_request(self) -> None:
+        """Start a new request: forget tools unlocked by earlier requests of this task."""
+        self._unlocked.set(set())
+
+    def unlock(self, names: Iterable[str]) -> None:
+        unlocked = self._unlocked.get()
+        if unlocked is None:
+            unlocked = set()
+            self._unlocked.set(unlocked)
+        unlocked.update(names)
+
+    def _get_index(self, registry: ToolRegistry) -> dict[str, tuple[set[str], set[str]]]:
+        cached = self._index.get(registry)
+        if cached is not None and cached[0] == registry.version:
+            return cached[1]
+        index = {}
+        for name in registry.tool_names:
+            tool = registry.get(name)
+            index[name] = (_tokens(name), _tokens(tool.description) if tool else set())
+        self._index[registry] = (registry.version, index)
+        return index
+
+    def search(self, registry: ToolRegistry, query: str, limit: int | None = None) -> list[str]:
+        """Tool names ranked by keyword overlap with the query (matches only)."""
+        words = _tokens(query)
+        if not words:
+            return []
+        scored = []
+        for position, (name, (name_tokens, desc_tokens)) in enumerate(self._get_index(registry).items()):
+            score = 3 * len(words & name_tokens) + len(words & desc_tokens)
+            if score:
+                scored.append((-score, position, name))
+        scored.sort()
+        names = [name for _, _, name in scored]
+        return names[:limit] if limit is not None else names
+
+    def select_names(self, registry: ToolRegistry, query: str, recent: Iterable[str] = ()) -> list[str]:
+        """Names of the tools to offer this turn, in registry order."""
+        names = registry.tool_names
+        if not self.enabled or len(names) <= self.min_tools:
+            return names
+
+        chosen: list[str] = []
+
+        def add(candidates: Iterable[str]) -> None:
+            for name in candidates:
+                if name in registry and name not in chosen:
+                    chosen.append(name)
+
+        # pinned and explicitly requested tools are always offered
+        add([REQUEST_MORE_TOOLS, *self.core_tools])
+        add(sorted(self._unlocked.get() or ()))
+        add(recent)
+        for name in self.search(registry, query):
+            if len(chosen) >= self.max_tools:
+                break
+            add([name])
+
+        selected = set(chosen)
+        return [name for name in names if name in selected]
+
+    def select(self, registry: ToolRegistry, query: str, recent: Iterable[str] = ()) -> list[dict[str, Any]]:
+        """Schemas of the tools to offer this turn."""
+        names = self.select_names(registry, query, recent)
+        definitions = registry.get_definitions()
+        if len(names) == len(definitions):
+            return definitions
+        selected = set(names)
+        return [d for d in definitions if d["function"]["name"] in selected]
+
+
+class RequestMoreToolsTool(Tool):
+    """Lets the model unlock tools that were not offered in the current turn."""
+
+    read_only = True
+
+    def __init__(self, router: ToolRouter, registry: ToolRegistry):
+        self._router = router
+        self._registry = registry
+
+    @property
+    def name(self) -> str:
+        return REQUEST_MORE_TOOLS
+
+    @property
+    def description(self) -> str:
+        return (
+            "Only a subset of tools is offered per turn. If you need a capability that is not "
+            "available, call this with tool names or a short description of what you need; "
+            "matching tools become available from the next turn."
+        )
+
+    @property
+    def parameters(self) -> dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "What you need to do, e.g. 'query the postgres database'",
+                },
+                "names": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Exact tool names to unlock, if known",
+                },
+            },
+        }
+
+    async def execute(self, query: str = "", names: list[str] | None = None, **kwargs: Any) -> str:
+        found = [name for name in (names or []) if name in self._registry]
+        missing = [name for name in (names or []) if name not in self._registry]
+        if query:
+            found += [name for name in self._router.search(self._registry, query, limit=10) if name not in found]
+        if not found:
+            available = ", ".join(self._registry.tool_names)
+            return f"No matching tools. Available tools: {available}"
+        self._router.unlock(found)
+        result = f"Unlocked for the next turn: {', '.join(found)}"
+        if missing:
+            result += f"\nUnknown tools: {', '.join(missing)}"
+        return result
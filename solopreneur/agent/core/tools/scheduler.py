@@ -0,0 +1,76 @@
+"""Tool call scheduler: runs read-only tool calls of one LLM turn concurrently."""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Sequence
+
+from solopreneur.agent.core.tools.registry import ToolRegistry
+
+# Executes one call: (index in the turn, tool call) -> result text
+CallRunner = Callable[[int, Any], Awaitable[str]]
+
+DEFAULT_MAX_PARALLEL = 8
+
+
+class ToolScheduler:
+    """
+    Schedules the tool calls returned by one LLM response.
+
+    Consecutive calls to read-only tools form a group that runs concurrently;
+    any other call (writes, exec, delegation, unknown tools) runs alone, after
+    everything before it has finished and before anything after it starts.
+    Results are always returned in the original call order.
+    """
+
+    def __init__(self, registry: ToolRegistry, max_parallel: int = DEFAULT_MAX_PARALLEL):
+        self.registry = registry
+        self.max_parallel = max(1, max_parallel)
+
+    def plan(self, tool_calls: Sequence[Any]) -> list[list[int]]:
+        """Split call indices into groups; calls within a group may run concurrently."""
+        groups: list[list[int]] = []
+        parallel: list[int] = []
+        for index, call in enumerate(tool_calls):
+            if self.registry.is_read_only(call.name):
+                parallel.append(index)
+                continue
+            if parallel:
+                groups.append(parallel)
+                parallel = []
+            groups.append([index])
+        if parallel:
+            groups.append(parallel)
+        return groups
+
+    async def run(
+        self,
+        tool_calls: Sequence[Any],
+        runner: CallRunner | None = None,
+    ) -> list[str]:
+        """
+        Execute all calls and return their results in call order.
+
+        Args:
+            tool_calls: Objects with ``name`` and ``arguments`` attributes.
+            runner: Optional per-call coroutine (e.g. to emit trace events);
+                defaults to ``registry.execute``.
+        """
+        if runner is None:
+            async def runner(_: int, call: Any) -> str:
+                return await self.registry.execute(call.name, call.arguments)
+
+        results: list[str] = [""] * len(tool_calls)
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def _run_one(index: int) -> None:
+            async with semaphore:
+                try:
+                    results[index] = await runner(index, tool_calls[index])
+                except Exception as e:
+                    results[index] = f"Error executing {tool_calls[index].name}: {e}"
+
+        for group in self.plan(tool_calls):
+            if len(group) == 1:
+                await _run_one(group[0])
+            else:
+                await asyncio.gather(*(_run_one(index) for index in group))
+        return results
@@ -4,15 +4,32 @@ import asyncio
 import functools
 import os
 import re
+import signal
 import subprocess
 import sys
 import threading
+from contextvars import ContextVar
 from pathlib import Path
 from typing import Any, Callable
 
 from solopreneur.agent.core.tools.base import Tool
 
 
+def _kill_process_tree(proc: subprocess.Popen) -> None:
+    """Kill the shell and everything it spawned (its own process group on POSIX)."""
+    try:
+        if sys.platform == "win32":
+            subprocess.run(
+                ["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError):
+        proc.kill()
+
+
 class ExecTool(Tool):
     """Tool to execute shell commands."""
 
@@ -117,11 +134,14 @@ class ExecTool(Tool):
         
         self.restrict_to_workspace = restrict_to_workspace
         # 实时输出流回调（每行调用一次，从线程安全地推送到 async 侧）
-        self._stream_callback: Callable[[str], None] | None = None
+        # 按任务隔离：同一实例会被同一工作目录的并发请求复用
+        self._stream_callback: ContextVar[Callable[[str], None] | None] = ContextVar(
+            f"exec_stream_callback_{id(self)}", default=None
+        )
 
     def set_stream_callback(self, callback: Callable[[str], None] | None) -> None:
-        """注入实时输出回调；传 None 则清除。"""
-        self._stream_callback = callback
+        """注入实时输出回调（仅对当前任务生效）；传 None 则清除。"""
+        self._stream_callback.set(callback)
     
     @property
     def name(self) -> str:
@@ -154,6 +174,15 @@ class ExecTool(Tool):
         if guard_error:
             return guard_error
         
+        # 调用方取消时结束子进程（线程池中的阻塞读取随之返回）
+        cancelled = threading.Event()
+        procs: list[subprocess.Popen] = []
+
+        def _on_start(proc: subprocess.Popen) -> None:
+            procs.append(proc)
+            if cancelled.is_set():
+                _kill_process_tree(proc)
+
         try:
             # 使用 subprocess.run 在线程池中执行，避免 Windows SelectorEventLoop
             # 不支持 asyncio.create_subprocess_shell 的问题
@@ -162,14 +191,25 @@ class ExecTool(Tool):
             result = await loop.run_in_executor(
                 None,
                 functools.partial(
-                    self._run_command_sync, command, cwd
+                    self._run_command_sync, command, cwd, self._stream_callback.get(), _on_start
                 ),
             )
             return result
+        except asyncio.CancelledError:
+            cancelled.set()
+            for proc in procs:
+                _kill_process_tree(proc)
+            raise
         except Exception as e:
             return f"Error executing command: {str(e)}"
 
-    def _run_command_sync(self, command: str, cwd: str) -> str:
+    def _run_command_sync(
+        self,
+        command: str,
+        cwd: str,
+        cb: Callable[[str], None] | None = None,
+        on_start: Callable[[subprocess.Popen], None] | None = None,
+    ) -> str:
         """在线程池中同步执行命令，逐行读取输出并通过回调实时推送。"""
         try:
             env = os.environ.copy()
@@ -183,16 +223,19 @@ class ExecTool(Tool):
                 stderr=subprocess.STDOUT,   # stderr 合并进 stdout，便于按序流式输出
                 cwd=cwd,
                 env=env,
+                # 独立进程组：超时 / 取消时连同 shell 派生的子进程一起结束
+                start_new_session=sys.platform != "win32",
             )
+            if on_start is not None:
+                on_start(proc)
 
             timed_out = threading.Event()
 
             def _kill_on_timeout() -> None:
                 timed_out.set()
-                proc.kill()
+                _kill_process_tree(proc)
 
             timer = threading.Timer(self.timeout, _kill_on_timeout)
-            cb = self._stream_callback
             output_lines: list[str] = []
 
             try:
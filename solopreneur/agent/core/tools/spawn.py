@@ -1,5 +1,6 @@
 """Spawn tool for creating background subagents."""
 
+from contextvars import ContextVar
 from typing import Any, TYPE_CHECKING
 
 from solopreneur.agent.core.tools.base import Tool
@@ -18,13 +19,14 @@ class SpawnTool(Tool):
     
     def __init__(self, manager: "SubagentManager"):
         self._manager = manager
-        self._origin_channel = "cli"
-        self._origin_chat_id = "direct"
+        # Task-local so concurrently processed sessions keep their own origin
+        self._origin: ContextVar[tuple[str, str]] = ContextVar(
+            f"spawn_origin_{id(self)}", default=("cli", "direct")
+        )
     
     def set_context(self, channel: str, chat_id: str) -> None:
-        """Set the origin context for subagent announcements."""
-        self._origin_channel = channel
-        self._origin_chat_id = chat_id
+        """Set the origin context for subagent announcements (for the current task)."""
+        self._origin.set((channel, chat_id))
     
     @property
     def name(self) -> str:
@@ -57,9 +59,10 @@ class SpawnTool(Tool):
     
     async def execute(self, task: str, label: str | None = None, **kwargs: Any) -> str:
         """Spawn a subagent to execute the given task."""
+        origin_channel, origin_chat_id = self._origin.get()
         return await self._manager.spawn(
             task=task,
             label=label,
-            origin_channel=self._origin_channel,
-            origin_chat_id=self._origin_chat_id,
+            origin_channel=origin_channel,
+            origin_chat_id=origin_chat_id,
         )
@@ -0,0 +1,67 @@
+"""Ranged reads of tool outputs spilled to disk by microcompaction."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from solopreneur.agent.core.spill_store import DEFAULT_PAGE_LINES, SpillStore
+from solopreneur.agent.core.tools.base import Tool
+
+
+class ReadSpillTool(Tool):
+    """Page through a spilled tool output by key instead of reloading the whole blob."""
+
+    read_only = True
+
+    def __init__(self, store: SpillStore):
+        self.store = store
+
+    @property
+    def name(self) -> str:
+        return "read_spill"
+
+    @property
+    def description(self) -> str:
+        return (
+            "Read part of an earlier tool output that was moved out of the context "
+            "(referenced as 'spill key'). Returns lines [offset, offset+limit) and the "
+            "offset of the next page."
+        )
+
+    @property
+    def parameters(self) -> dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "key": {
+                    "type": "string",
+                    "description": "Spill key from the reference",
+                },
+                "offset": {
+                    "type": "integer",
+                    "minimum": 0,
+                    "default": 0,
+                    "description": "First line to read (0-based)",
+                },
+                "limit": {
+                    "type": "integer",
+                    "minimum": 1,
+                    "maximum": 1000,
+                    "default": DEFAULT_PAGE_LINES,
+                    "description": "Max lines to return",
+                },
+            },
+            "required": ["key"],
+        }
+
+    async def execute(self, key: str, offset: int = 0, limit: int = DEFAULT_PAGE_LINES, **kwargs: Any) -> str:
+        page = self.store.read(key.strip(), offset, limit)
+        if page is None:
+            return f"Error: spill key not found (it may have been evicted): {key}"
+        header = f"[spill {page.key}] lines {page.offset}-{page.end - 1} of {page.total_lines}"
+        footer = (
+            f"\n[next page: offset={page.next_offset}]"
+            if page.next_offset is not None
+            else "\n[end of output]"
+        )
+        return f"{header}\n{page.text}{footer}"
@@ -45,6 +45,8 @@ def _validate_url(url: str) -> tuple[bool, str]:
 
 class WebSearchTool(Tool):
     """Search the web using Brave Search API."""
+
+    read_only = True
     
     name = "web_search"
     description = "Search the web. Returns titles, URLs, and snippets."
@@ -105,6 +107,8 @@ class WebSearchTool(Tool):
 
 class WebFetchTool(Tool):
     """Fetch and extract content from a URL using Readability."""
+
+    read_only = True
     
     name = "web_fetch"
     description = "Fetch URL and extract readable content (HTML → markdown/text)."
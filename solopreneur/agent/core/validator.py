@@ -7,6 +7,7 @@
 
 import json
 import subprocess
+from contextvars import ContextVar
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import TYPE_CHECKING
@@ -137,11 +138,32 @@ class TaskCompletionValidator:
         self.provider = provider
         self.model = model
         
-        # 跟踪继续提示次数，防止无限循环
-        self._continuation_count = 0
-        
-        # 保存最近的用户请求，用于 AI 验证
-        self._current_user_request: str = ""
+        # 每个任务（会话 worker）独立的验证状态：
+        # continuation_count 跟踪继续提示次数，防止无限循环；user_request 用于 AI 验证
+        self._state: ContextVar[dict | None] = ContextVar(f"validator_state_{id(self)}", default=None)
+
+    def _task_state(self) -> dict:
+        state = self._state.get()
+        if state is None:
+            state = {"continuation_count": 0, "user_request": ""}
+            self._state.set(state)
+        return state
+
+    @property
+    def _continuation_count(self) -> int:
+        return self._task_state()["continuation_count"]
+
+    @_continuation_count.setter
+    def _continuation_count(self, value: int) -> None:
+        self._task_state()["continuation_count"] = value
+
+    @property
+    def _current_user_request(self) -> str:
+        return self._task_state()["user_request"]
+
+    @_current_user_request.setter
+    def _current_user_request(self, value: str) -> None:
+        self._task_state()["user_request"] = value
     
     def set_context(self, user_request: str, provider: "LLMProvider | None" = None, model: str | None = None):
         """设置验证上下文"""
@@ -152,9 +174,8 @@ class TaskCompletionValidator:
             self.model = model
     
     def reset(self):
-        """重置状态（新会话开始时调用）"""
-        self._continuation_count = 0
-        self._current_user_request = ""
+        """重置状态（新会话开始时调用，仅影响当前任务）"""
+        self._state.set({"continuation_count": 0, "user_request": ""})
     
     def should_force_continue(self, iteration: int) -> tuple[bool, str]:
         """
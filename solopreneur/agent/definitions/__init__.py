@@ -8,7 +8,7 @@ can be defined via YAML/JSON configuration files, supporting any domain
 
 from solopreneur.agent.definitions.definition import AgentDefinition, AgentType
 from solopreneur.agent.definitions.loader import AgentLoader
-from solopreneur.agent.definitions.registry import AgentRegistry
+from solopreneur.agent.definitions.registry import AgentRegistry, get_agent_registry
 from solopreneur.agent.definitions.manager import AgentManager
 
 __all__ = [
@@ -16,5 +16,6 @@ __all__ = [
     "AgentType",
     "AgentLoader",
     "AgentRegistry",
+    "get_agent_registry",
     "AgentManager",
 ]
@@ -55,6 +55,10 @@ class AgentLoader:
                     
         return agents
     
+    def load_file(self, file_path: Path) -> AgentDefinition | None:
+        """Load agent from a single file (always re-reads the file)."""
+        return self._load_file(file_path)
+
     def _load_file(self, file_path: Path) -> AgentDefinition | None:
         """Load agent from a single file."""
         try:
@@ -98,6 +102,10 @@ class AgentLoader:
         """Clear the load cache."""
         self._cache.clear()
     
+    def invalidate(self, name: str):
+        """Drop one agent from the load cache."""
+        self._cache.pop(name, None)
+    
     def reload(self, name: str) -> AgentDefinition | None:
         """Reload an agent (bypass cache)."""
         if name in self._cache:
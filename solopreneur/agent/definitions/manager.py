@@ -8,7 +8,7 @@ from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
 from solopreneur.agent.definitions.definition import AgentDefinition
-from solopreneur.agent.definitions.registry import AgentRegistry
+from solopreneur.agent.definitions.registry import AgentRegistry, get_agent_registry
 
 if TYPE_CHECKING:
     from solopreneur.agent.core.skills import SkillsLoader
@@ -24,7 +24,8 @@ class AgentManager:
     def __init__(self, workspace: Path, skills_loader: "SkillsLoader | None" = None):
         self.workspace = workspace
         self._skills_loader = skills_loader
-        self._registry = AgentRegistry(workspace)
+        # Shared per workspace: managers are cheap to construct
+        self._registry = get_agent_registry(workspace)
     
     @property
     def registry(self) -> AgentRegistry:
@@ -64,7 +65,11 @@ class AgentManager:
         Build summary of available agents for master agent context.
 
         This tells the master agent which sub-agents are available for delegation.
+        Memoized until an agent definition changes.
         """
+        return self._registry.cached("agent_summary", self._render_agent_summary)
+
+    def _render_agent_summary(self) -> str:
         lines = [
             "# Available Agents",
             "",
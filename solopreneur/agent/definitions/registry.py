@@ -2,15 +2,31 @@
 Agent Registry
 
 Single-source registry for all agents under one canonical directory.
+
+One registry per workspace is shared process-wide (see get_agent_registry).
+It stats the agent files to detect changes (throttled to RELOAD_CHECK_INTERVAL)
+and re-parses only the definitions whose files changed; derived values such as
+the agent summary are memoized per registry version.
 """
 
-from pathlib import Path
+import os
 import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, TypeVar
+
 from loguru import logger
 
 from solopreneur.agent.definitions.definition import AgentDefinition
 from solopreneur.agent.definitions.loader import AgentLoader
 
+AGENT_FILE_SUFFIXES = (".yaml", ".yml", ".json")
+# Minimum seconds between two stat scans of the agents directory
+RELOAD_CHECK_INTERVAL = 1.0
+
+T = TypeVar("T")
+
 
 class AgentRegistry:
     """
@@ -29,24 +45,132 @@ class AgentRegistry:
         self._seed_builtin_agents()
 
         self._loader = AgentLoader(self._agents_dir)
+        self._lock = threading.RLock()
         
+        # file -> (mtime_ns, size, parsed definition)
+        self._files: dict[Path, tuple[int, int, AgentDefinition | None]] = {}
         # Cache all loaded agents
         self._agents: dict[str, AgentDefinition] = {}
+        # Bumped whenever the set of definitions changes
+        self._version = 0
+        self._checked_at = 0.0
+        self._memo: dict[str, tuple[int, object]] = {}
         self._load_all()
     
-    def _load_all(self):
-        """Load all agents from canonical directory."""
-        self._agents.clear()
+    @property
+    def version(self) -> int:
+        """Change counter of the loaded definitions (checks files first)."""
+        self.refresh()
+        return self._version
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Re-parse agent files whose mtime/size changed since the last check.
+
+        Without force, the directory is scanned at most once per
+        RELOAD_CHECK_INTERVAL. Returns True if any definition changed.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return False
+        with self._lock:
+            self._checked_at = now
+            current = self._scan()
+            changed = [
+                path for path, sig in current.items()
+                if path not in self._files or self._files[path][:2] != sig
+            ]
+            removed = [path for path in self._files if path not in current]
+            if not changed and not removed:
+                return False
+
+            stale_names = {
+                entry[2].name for path in (*changed, *removed)
+                if (entry := self._files.get(path)) and entry[2]
+            }
+            for path in removed:
+                del self._files[path]
+            for path in changed:
+                self._files[path] = (*current[path], None)
+
+            # Children are merged with their parent at parse time: re-parse
+            # every (transitive) descendant of a changed definition too
+            pending = list(changed)
+            while pending:
+                for name in stale_names:
+                    self._loader.invalidate(name)
+                for path in pending:
+                    mtime, size, _ = self._files[path]
+                    agent = self._parse(path)
+                    self._files[path] = (mtime, size, agent)
+                    if agent:
+                        stale_names.add(agent.name)
+                pending = [
+                    path for path, (_, _, agent) in self._files.items()
+                    if agent and agent.extends in stale_names and agent.name not in stale_names
+                ]
+
+            self._rebuild()
+            logger.debug(
+                f"Reloaded {len(stale_names)} agent(s), removed {len(removed)} file(s) "
+                f"from {self._agents_dir}"
+            )
+            return True
 
-        for name, agent in self._loader.load_all().items():
+    def cached(self, key: str, build: Callable[[], T]) -> T:
+        """Memoize a value derived from the definitions until they change."""
+        version = self.version
+        hit = self._memo.get(key)
+        if hit is not None and hit[0] == version:
+            return hit[1]  # type: ignore[return-value]
+        value = build()
+        self._memo[key] = (version, value)
+        return value
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        """Stat every agent file in the canonical directory."""
+        found: dict[Path, tuple[int, int]] = {}
+        try:
+            entries = list(os.scandir(self._agents_dir))
+        except OSError:
+            return found
+        for entry in entries:
+            if not entry.name.endswith(AGENT_FILE_SUFFIXES) or not entry.is_file():
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            found[Path(entry.path)] = (st.st_mtime_ns, st.st_size)
+        return found
+
+    def _parse(self, path: Path) -> AgentDefinition | None:
+        try:
+            agent = self._loader.load_file(path)
+        except Exception as e:
+            logger.error(f"Failed to load agent from {path}: {e}")
+            return None
+        if agent:
             # Ensure compatible metadata fields exist
             agent.metadata["domain"] = agent.metadata.get("domain", "general")
             agent.metadata["source"] = agent.metadata.get("source", "preset")
-            self._agents[name] = agent
+        return agent
 
-        logger.info(
-            f"Loaded {len(self._agents)} agents from canonical path: {self._agents_dir}"
-        )
+    def _rebuild(self) -> None:
+        agents = [agent for _, _, agent in self._files.values() if agent]
+        self._agents = {agent.name: agent for agent in sorted(agents, key=lambda a: a.name)}
+        self._version += 1
+    
+    def _load_all(self):
+        """Load all agents from canonical directory."""
+        with self._lock:
+            self._files.clear()
+            self._loader.clear_cache()
+            self._checked_at = 0.0
+            self.refresh(force=True)
+            logger.info(
+                f"Loaded {len(self._agents)} agents from canonical path: {self._agents_dir}"
+            )
 
     def _seed_builtin_agents(self):
         """Copy built-in preset agent files into canonical directory if missing."""
@@ -59,7 +183,7 @@ class AgentRegistry:
             if not domain_dir.is_dir():
                 continue
             for file_path in domain_dir.iterdir():
-                if file_path.suffix not in [".yaml", ".yml", ".json"]:
+                if file_path.suffix not in AGENT_FILE_SUFFIXES:
                     continue
                 target = self._agents_dir / file_path.name
                 if not target.exists():
@@ -71,14 +195,17 @@ class AgentRegistry:
     
     def get(self, name: str) -> AgentDefinition | None:
         """Get agent by name."""
+        self.refresh()
         return self._agents.get(name)
     
     def list_all(self) -> list[AgentDefinition]:
         """List all available agents."""
+        self.refresh()
         return list(self._agents.values())
     
     def list_by_domain(self) -> dict[str, list[AgentDefinition]]:
         """List agents grouped by domain."""
+        self.refresh()
         domains: dict[str, list[AgentDefinition]] = {}
         for agent in self._agents.values():
             domain = agent.metadata.get("domain", "general")
@@ -89,19 +216,21 @@ class AgentRegistry:
     
     def list_by_type(self, agent_type: str) -> list[AgentDefinition]:
         """List agents by type."""
+        self.refresh()
         return [a for a in self._agents.values() if a.type.value == agent_type]
     
     def exists(self, name: str) -> bool:
         """Check if agent exists."""
+        self.refresh()
         return name in self._agents
     
     def get_names(self) -> list[str]:
         """Get all agent names."""
+        self.refresh()
         return list(self._agents.keys())
     
     def reload(self):
         """Reload all agents."""
-        self._loader.clear_cache()
         self._load_all()
     
     def create_custom(self, agent: AgentDefinition) -> bool:
@@ -116,8 +245,8 @@ class AgentRegistry:
                 yaml.dump(agent.model_dump(exclude_none=True), f, 
                          allow_unicode=True, sort_keys=False)
             
-            # Reload
-            self.reload()
+            # Pick up the new file
+            self.refresh(force=True)
             return True
         except Exception as e:
             logger.error(f"Failed to create agent: {e}")
@@ -130,10 +259,24 @@ class AgentRegistry:
             if file_path.exists():
                 try:
                     file_path.unlink()
-                    self.reload()
+                    self.refresh(force=True)
                     return True
                 except Exception as e:
                     logger.error(f"Failed to delete agent: {e}")
                     return False
         
         return False
+
+
+_registries: dict[str, AgentRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_agent_registry(workspace: Path) -> AgentRegistry:
+    """Process-wide registry for a workspace (presets are seeded once per process)."""
+    key = str(Path(workspace).expanduser().resolve())
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = AgentRegistry(Path(workspace))
+        return registry
@@ -193,6 +193,27 @@ async def send_message(request: ChatRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class CancelRequest(BaseModel):
+    """取消请求模型"""
+    session_id: str = "default"
+    channel: str = "web"
+    include_background: bool = False  # 同时取消该会话派生的后台子 Agent
+
+
+@router.post("/chat/cancel")
+async def cancel_turn(request: CancelRequest):
+    """取消会话进行中的 Agent 回合（部分回复会保存到会话历史）"""
+    from solopreneur.core.dependencies import get_component_manager
+    agent_loop = get_component_manager().peek_agent_loop()
+    if agent_loop is None:
+        return {"status": "ok", "cancelled": False, "background_cancelled": 0}
+
+    session_key = f"{request.channel}:{request.session_id}"
+    result = agent_loop.cancel(session_key, "user", include_background=request.include_background)
+    logger.info(f"Cancel requested for {session_key}: {result}")
+    return {"status": "ok", **result}
+
+
 @router.delete("/chat/history")
 async def clear_chat_history(session_id: Optional[str] = "default"):
     """清空对话历史"""
@@ -3,7 +3,6 @@
 提供全面的系统统计数据
 """
 import platform
-import sqlite3
 import sys
 import time
 from datetime import datetime
@@ -16,10 +15,21 @@ from pydantic import BaseModel
 
 from solopreneur.core.dependencies import get_component_manager
 from solopreneur.config.loader import get_config_path
+from solopreneur.storage.services import MetricsQueryService
 from solopreneur.utils.helpers import get_data_path
 
 router = APIRouter()
 
+_metrics_svc: Optional[MetricsQueryService] = None
+
+
+def _get_metrics_svc(db_path: Path) -> MetricsQueryService:
+    """懒加载指标查询服务（避免每次刷新都重新初始化数据库连接与迁移）"""
+    global _metrics_svc
+    if _metrics_svc is None:
+        _metrics_svc = MetricsQueryService(db_path=db_path)
+    return _metrics_svc
+
 
 class AgentStats(BaseModel):
     """Agent 统计"""
@@ -167,8 +177,7 @@ async def get_dashboard_stats():
         # === 项目统计 ===
         projects_data = {"total": 0, "recent": []}
         try:
-            from solopreneur.projects import ProjectManager
-            pm = ProjectManager()
+            pm = get_component_manager().get_project_manager()
             projects = pm.list_projects()
             projects_data["total"] = len(projects)
             
@@ -260,18 +269,9 @@ async def get_dashboard_stats():
             # 优先使用 SQLite 聚合（更准确，跨进程/重启可持续）
             db_path = get_data_path() / "solopreneur.db"
             if db_path.exists():
-                with sqlite3.connect(str(db_path)) as conn:
-                    row_all = conn.execute(
-                        "SELECT COALESCE(SUM(total_tokens), 0), COUNT(*) FROM llm_usage"
-                    ).fetchone()
-                    row_today = conn.execute(
-                        "SELECT COUNT(*) FROM llm_usage WHERE date(created_at) = date('now', 'localtime')"
-                    ).fetchone()
-
-                if row_all:
-                    tokens_data["total_used"] = int(row_all[0] or 0)
-                if row_today:
-                    tokens_data["requests_today"] = int(row_today[0] or 0)
+                metrics_svc = _get_metrics_svc(db_path)
+                tokens_data["total_used"] = metrics_svc.usage_totals()["total_tokens"]
+                tokens_data["requests_today"] = metrics_svc.requests_today()
         except Exception as e:
             logger.warning(f"获取 Token 统计失败: {e}")
         
@@ -5,20 +5,33 @@
 
 from __future__ import annotations
 
-import sqlite3
 from pathlib import Path
-from typing import Any, Optional
+from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field
 
+from solopreneur.storage.services import MetricsQueryService
+
 router = APIRouter()
 
+_metrics_svc: MetricsQueryService | None = None
+
 
 def _db_path() -> Path:
     return Path.home() / ".solopreneur" / "solopreneur.db"
 
 
+def _get_metrics_svc() -> MetricsQueryService:
+    global _metrics_svc
+    db = _db_path()
+    if not db.exists():
+        raise HTTPException(status_code=404, detail=f"Database not found: {db}")
+    if _metrics_svc is None:
+        _metrics_svc = MetricsQueryService(db_path=db)
+    return _metrics_svc
+
+
 class UsageSummary(BaseModel):
     calls: int = 0
     prompt_tokens: int = 0
@@ -26,6 +39,7 @@ class UsageSummary(BaseModel):
     total_tokens: int = 0
     avg_duration_ms: int = 0
     stream_calls: int = 0
+    cached_tokens: int = 0  # prompt 中命中 Provider 前缀缓存的 token 数
 
 
 class TaskSummary(BaseModel):
@@ -45,42 +59,8 @@ async def usage_summary(
     model: Optional[str] = Query(None),
 ):
     try:
-        db = _db_path()
-        if not db.exists():
-            raise HTTPException(status_code=404, detail=f"Database not found: {db}")
-
-        sql = (
-            """
-            SELECT COUNT(*) AS calls,
-                   SUM(prompt_tokens) AS prompt_tokens,
-                   SUM(completion_tokens) AS completion_tokens,
-                   SUM(total_tokens) AS total_tokens,
-                   AVG(duration_ms) AS avg_duration_ms,
-                   SUM(CASE WHEN is_stream = 1 THEN 1 ELSE 0 END) AS stream_calls
-            FROM llm_usage
-            WHERE datetime(created_at) >= datetime('now', ?)
-            """
-        )
-        params: list[Any] = [f"-{days} days"]
-        if session_key:
-            sql += " AND session_key = ?"
-            params.append(session_key)
-        if model:
-            sql += " AND model = ?"
-            params.append(model)
-
-        with sqlite3.connect(str(db)) as conn:
-            conn.row_factory = sqlite3.Row
-            row = conn.execute(sql, tuple(params)).fetchone()
-
-        return UsageSummary(
-            calls=int(row["calls"] or 0),
-            prompt_tokens=int(row["prompt_tokens"] or 0),
-            completion_tokens=int(row["completion_tokens"] or 0),
-            total_tokens=int(row["total_tokens"] or 0),
-            avg_duration_ms=int(row["avg_duration_ms"] or 0),
-            stream_calls=int(row["stream_calls"] or 0),
-        )
+        svc = _get_metrics_svc()
+        return UsageSummary(**svc.usage_summary(days, session_key=session_key, model=model))
     except HTTPException:
         raise
     except Exception as e:
@@ -95,46 +75,19 @@ async def usage_daily(
     limit: int = Query(30, ge=1, le=100),
 ):
     try:
-        db = _db_path()
-        if not db.exists():
-            raise HTTPException(status_code=404, detail=f"Database not found: {db}")
-
-        sql = (
-            """
-            SELECT substr(created_at, 1, 10) AS day,
-                   COUNT(*) AS calls,
-                   SUM(prompt_tokens) AS prompt_tokens,
-                   SUM(completion_tokens) AS completion_tokens,
-                   SUM(total_tokens) AS total_tokens,
-                   AVG(duration_ms) AS avg_duration_ms
-            FROM llm_usage
-            WHERE datetime(created_at) >= datetime('now', ?)
-            """
-        )
-        params: list[Any] = [f"-{days} days"]
-        if session_key:
-            sql += " AND session_key = ?"
-            params.append(session_key)
-        if model:
-            sql += " AND model = ?"
-            params.append(model)
-        sql += " GROUP BY day ORDER BY day DESC LIMIT ?"
-        params.append(limit)
-
-        with sqlite3.connect(str(db)) as conn:
-            conn.row_factory = sqlite3.Row
-            rows = conn.execute(sql, tuple(params)).fetchall()
-
+        svc = _get_metrics_svc()
+        rows = svc.usage_daily(days, session_key=session_key, model=model, limit=limit)
         return {
             "days": days,
             "rows": [
                 {
                     "day": r["day"],
-                    "calls": int(r["calls"] or 0),
-                    "prompt_tokens": int(r["prompt_tokens"] or 0),
-                    "completion_tokens": int(r["completion_tokens"] or 0),
-                    "total_tokens": int(r["total_tokens"] or 0),
-                    "avg_duration_ms": int(r["avg_duration_ms"] or 0),
+                    "calls": r["calls"],
+                    "prompt_tokens": r["prompt_tokens"],
+                    "completion_tokens": r["completion_tokens"],
+                    "total_tokens": r["total_tokens"],
+                    "cached_tokens": r.get("cached_tokens", 0),
+                    "avg_duration_ms": r["avg_duration_ms"],
                 }
                 for r in rows
             ],
@@ -145,35 +98,41 @@ async def usage_daily(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/metrics/usage/buckets")
+async def usage_buckets(
+    days: int = Query(7, ge=1, le=3650),
+    bucket_hours: int = Query(24, ge=1, le=24 * 366, description="桶宽（小时），整日倍数时按本地自然日对齐"),
+    group_by: Optional[str] = Query(None, pattern="^(model|session_prefix)$"),
+    model: Optional[str] = Query(None),
+    session_prefix: Optional[str] = Query(None, description="会话通道前缀，如 web / cli / cron"),
+):
+    """基于小时/日汇总表的用量时间序列，耗时与原始 llm_usage 行数无关。"""
+    try:
+        svc = _get_metrics_svc()
+        return {
+            "days": days,
+            **svc.usage_buckets(
+                since_ts=svc.since_days(days),
+                bucket_seconds=bucket_hours * 3600,
+                group_by=group_by,
+                model=model,
+                session_prefix=session_prefix,
+            ),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/metrics/tasks/summary", response_model=TaskSummary)
 async def task_summary(
     days: int = Query(7, ge=1, le=365),
     status: Optional[str] = Query(None),
 ):
     try:
-        db = _db_path()
-        if not db.exists():
-            raise HTTPException(status_code=404, detail=f"Database not found: {db}")
-
-        sql = (
-            """
-            SELECT status, COUNT(*) AS cnt
-            FROM subagent_tasks
-            WHERE datetime(updated_at) >= datetime('now', ?)
-            """
-        )
-        params: list[Any] = [f"-{days} days"]
-        if status:
-            sql += " AND status = ?"
-            params.append(status)
-        sql += " GROUP BY status ORDER BY cnt DESC"
-
-        with sqlite3.connect(str(db)) as conn:
-            conn.row_factory = sqlite3.Row
-            rows = conn.execute(sql, tuple(params)).fetchall()
-
-        by_status = {r["status"]: int(r["cnt"] or 0) for r in rows}
-        return TaskSummary(total=sum(by_status.values()), by_status=by_status)
+        svc = _get_metrics_svc()
+        return TaskSummary(**svc.task_summary(days, status=status))
     except HTTPException:
         raise
     except Exception as e:
@@ -187,41 +146,8 @@ async def task_daily(
     limit: int = Query(30, ge=1, le=100),
 ):
     try:
-        db = _db_path()
-        if not db.exists():
-            raise HTTPException(status_code=404, detail=f"Database not found: {db}")
-
-        sql = (
-            """
-            SELECT substr(updated_at, 1, 10) AS day,
-                   status,
-                   COUNT(*) AS cnt
-            FROM subagent_tasks
-            WHERE datetime(updated_at) >= datetime('now', ?)
-            """
-        )
-        params: list[Any] = [f"-{days} days"]
-        if status:
-            sql += " AND status = ?"
-            params.append(status)
-        sql += " GROUP BY day, status ORDER BY day DESC, cnt DESC LIMIT ?"
-        params.append(limit)
-
-        with sqlite3.connect(str(db)) as conn:
-            conn.row_factory = sqlite3.Row
-            rows = conn.execute(sql, tuple(params)).fetchall()
-
-        return {
-            "days": days,
-            "rows": [
-                {
-                    "day": r["day"],
-                    "status": r["status"],
-                    "count": int(r["cnt"] or 0),
-                }
-                for r in rows
-            ],
-        }
+        svc = _get_metrics_svc()
+        return {"days": days, "rows": svc.task_daily(days, status=status, limit=limit)}
     except HTTPException:
         raise
     except Exception as e:
@@ -237,3 +163,22 @@ async def metrics_snapshot(
     usage = await usage_summary(days=days, session_key=session_key, model=model)
     tasks = await task_summary(days=days, status=None)
     return MetricsSnapshot(usage=usage, tasks=tasks)
+
+
+@router.get("/metrics/dispatcher")
+async def dispatcher_stats():
+    """入站消息调度队列深度与并发情况（Agent 循环未创建时返回空统计）。"""
+    from solopreneur.core.dependencies import get_component_manager
+
+    agent_loop = get_component_manager().peek_agent_loop()
+    if agent_loop is None:
+        return {"active": False}
+    return agent_loop.dispatch_stats()
+
+
+@router.get("/metrics/bus")
+async def bus_stats():
+    """消息总线各优先级通道的队列深度、溢出计数与入队到出队延迟分布。"""
+    from solopreneur.core.dependencies import get_component_manager
+
+    return get_component_manager().get_message_bus().stats()
@@ -4,7 +4,6 @@
 
 import asyncio
 import uuid
-from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Query
 from loguru import logger
@@ -16,16 +15,10 @@ from solopreneur.storage import SubagentTaskPersistence
 
 router = APIRouter()
 
-# 全局项目管理器实例
-_project_manager: Optional[ProjectManager] = None
-
 
 def get_project_manager() -> ProjectManager:
-    """获取项目管理器实例（单例）"""
-    global _project_manager
-    if _project_manager is None:
-        _project_manager = ProjectManager()
-    return _project_manager
+    """获取项目管理器实例（由 ComponentManager 共享）"""
+    return get_component_manager().get_project_manager()
 
 
 @router.get("/projects")
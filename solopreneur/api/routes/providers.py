@@ -181,6 +181,7 @@ class MemorySearchConfigPayload(BaseModel):
     top_k: int = 5
     min_score: float = 0.1
     auto_index_on_start: bool = True
+    retrieval_timeout: float = 0.0
 
 
 @router.get("/memory-search")
@@ -206,6 +207,7 @@ async def get_memory_search_config() -> MemorySearchConfigPayload:
         top_k=ms.top_k,
         min_score=ms.min_score,
         auto_index_on_start=ms.auto_index_on_start,
+        retrieval_timeout=ms.retrieval_timeout,
     )
 
 
@@ -231,6 +233,7 @@ async def update_memory_search_config(payload: MemorySearchConfigPayload):
     ms.top_k = payload.top_k
     ms.min_score = payload.min_score
     ms.auto_index_on_start = payload.auto_index_on_start
+    ms.retrieval_timeout = payload.retrieval_timeout
 
     save_config(current_config)
     manager.reset()
@@ -4,31 +4,40 @@ Trace events API — 查询、审计协作调用链与原始事件流
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query
 from loguru import logger
 
 from solopreneur.storage.services import TracePersistence
 
 router = APIRouter()
 
-_trace_svc: TracePersistence | None = None
-
 
 def _get_trace_svc() -> TracePersistence:
-    global _trace_svc
-    if _trace_svc is None:
-        _trace_svc = TracePersistence()
-    return _trace_svc
+    from solopreneur.core.dependencies import get_component_manager
+    return get_component_manager().get_trace_persistence()
 
 
 @router.get("/traces/{session_key}")
-async def list_trace_requests(session_key: str):
+async def list_trace_requests(
+    session_key: str,
+    limit: int = Query(200, ge=1, le=2000, description="最大返回请求数"),
+):
     """列出某个 session 下的所有请求（按时间倒序），用于历史列表。"""
     svc = _get_trace_svc()
-    requests = svc.list_requests(session_key)
+    requests = svc.list_requests(session_key, limit=limit)
     return {"session_key": session_key, "requests": requests}
 
 
+@router.get("/traces/{session_key}/requests/{request_id}")
+async def get_trace_request(session_key: str, request_id: str):
+    """获取单次请求的摘要（起止时间、事件数、Token 合计、是否已清理原始事件）。"""
+    svc = _get_trace_svc()
+    summary = svc.get_request(session_key, request_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Trace request not found")
+    return {"session_key": session_key, **summary}
+
+
 @router.get("/traces/{session_key}/events")
 async def get_trace_events(
     session_key: str,
@@ -41,6 +50,13 @@ async def get_trace_events(
     return {"session_key": session_key, "request_id": request_id, "events": events}
 
 
+@router.post("/traces/maintenance")
+async def run_trace_maintenance():
+    """立即按保留策略清理/压缩原始 trace 事件。"""
+    svc = _get_trace_svc()
+    return svc.run_maintenance()
+
+
 @router.delete("/traces/{session_key}")
 async def delete_trace_events(
     session_key: str,
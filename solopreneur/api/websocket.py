@@ -9,19 +9,16 @@ import asyncio
 from typing import List
 from datetime import datetime
 
+from solopreneur.agent.core.cancellation import TurnCancelledError
 from solopreneur.storage.services import TracePersistence
 
 router = APIRouter()
 
-# 全局 trace 持久化服务（懒加载）
-_trace_svc: TracePersistence | None = None
-
 
 def _get_trace_svc() -> TracePersistence:
-    global _trace_svc
-    if _trace_svc is None:
-        _trace_svc = TracePersistence()
-    return _trace_svc
+    """全局 trace 持久化服务（由组件管理器统一管理保留策略）。"""
+    from solopreneur.core.dependencies import get_component_manager
+    return get_component_manager().get_trace_persistence()
 
 
 # ==================== 连接管理器 ====================
@@ -246,6 +243,8 @@ async def chat_websocket(websocket: WebSocket, token: str | None = Query(None)):
     消息格式:
     - 客户端: {"type": "message", "content": "消息", "model": "gpt-4o"}
     - 客户端: {"type": "clear"} - 清空历史
+    - 客户端: {"type": "cancel", "include_background": false} - 取消进行中的回合
+    - 服务端: {"type": "cancelled", "reason": "user"} - 回合已取消（新消息会抢占旧回合）
     - 服务端: {"type": "chunk", "content": "片段"}
     - 服务端: {"type": "done", "content": "完整回复"}
     - 服务端: {"type": "error", "content": "错误"}
@@ -259,6 +258,10 @@ async def chat_websocket(websocket: WebSocket, token: str | None = Query(None)):
     
     manager.chat_connections.append(websocket)
     logger.info(f"Chat WebSocket connected, total: {len(manager.chat_connections)}")
+
+    # 本连接上进行中的回合
+    turn_task: asyncio.Task | None = None
+    turn_session: str | None = None
     
     try:
         while True:
@@ -266,11 +269,38 @@ async def chat_websocket(websocket: WebSocket, token: str | None = Query(None)):
             msg_type = data.get("type", "message")
             session_id = data.get("session_id", "default")
             session_key = f"web:{session_id}"
+
+            if msg_type == "cancel":
+                include_background = bool(data.get("include_background"))
+                if turn_task is not None and not turn_task.done():
+                    # 本连接的回合可能仍在准备阶段（尚未登记），与抢占、断连一样直接取消任务
+                    await _cancel_turn(turn_task, turn_session, "user")
+                    if turn_task.cancelled():
+                        # 登记前被取消时回合任务不会发送回执
+                        await websocket.send_json({"type": "cancelled", "reason": "user"})
+                    if include_background:
+                        try:
+                            agent_loop = await get_agent_loop()
+                            agent_loop.cancel(turn_session, "user", include_background=True)
+                        except Exception as e:
+                            logger.warning(f"Failed to cancel background agents for {turn_session}: {e}")
+                    continue
+                result = {"cancelled": False, "background_cancelled": 0}
+                try:
+                    agent_loop = await get_agent_loop()
+                    result = agent_loop.cancel(session_key, "user", include_background=include_background)
+                except Exception as e:
+                    logger.warning(f"Failed to cancel turn for {session_key}: {e}")
+                if not result["cancelled"]:
+                    # 没有进行中的回合时直接回执；有则由回合任务发送 cancelled
+                    await websocket.send_json({"type": "cancelled", "reason": "idle", **result})
+                continue
             
             if msg_type == "clear":
                 try:
                     agent_loop = await get_agent_loop()
                     agent_loop.sessions.delete(session_key)
+                    agent_loop.compaction.forget_session(session_key)
                 except Exception as e:
                     logger.warning(f"Failed to clear session {session_key}: {e}")
                 await websocket.send_json({
@@ -286,157 +316,193 @@ async def chat_websocket(websocket: WebSocket, token: str | None = Query(None)):
             if not content:
                 continue
             
-            model = data.get("model")
-            
-            # 获取项目信息
-            project_info = None
-            project_id = data.get("project_id")
-            project_path = data.get("project_path")
-            if project_id and project_path:
-                from solopreneur.projects import ProjectManager
-                pm = ProjectManager()
-                project = pm.get_project(project_id)
-                if project:
-                    project_info = {
-                        "id": project.id,
-                        "name": project.name,
-                        "description": project.description,
-                        "path": project.path,
-                        "source": project.source.value,
-                        "git_info": project.git_info.model_dump(mode='json') if project.git_info else None,
-                        "env_vars": [item.model_dump(mode='json') for item in project.env_vars],
-                    }
-                else:
-                    # 前端传了项目信息但后端找不到，使用前端传来的基本信息
-                    project_info = {
-                        "id": project_id,
-                        "name": data.get("project_name", "未命名项目"),
-                        "path": project_path,
-                        "source": "unknown",
-                        "env_vars": data.get("env_vars", []),
-                    }
-            
-            logger.info(f"WebSocket chat: {content[:50]}... (session: {session_key}, project: {project_info['name'] if project_info else 'none'})")
-            
-            try:
-                agent_loop = await get_agent_loop()
+            # 新消息抢占本连接上仍在进行的回合
+            if turn_task is not None and not turn_task.done():
+                await _cancel_turn(turn_task, turn_session, "superseded")
 
-                # 临时覆盖模型（可选）
-                original_model = agent_loop.model
-                original_subagent_model = agent_loop.subagents.model
+            turn_session = session_key
+            turn_task = asyncio.create_task(_run_chat_turn(websocket, data, session_key, content))
+    
+    except WebSocketDisconnect:
+        manager.disconnect_chat(websocket)
+    except Exception as e:
+        logger.error(f"Chat WebSocket error: {e}")
+        manager.disconnect_chat(websocket)
+    finally:
+        # 连接关闭：取消仍在进行的回合，避免继续执行工具、消耗 token
+        if turn_task is not None and not turn_task.done():
+            await _cancel_turn(turn_task, turn_session, "disconnected")
+
+
+async def _cancel_turn(turn_task: asyncio.Task, session_key: str | None, reason: str) -> None:
+    """取消连接上的回合并等待其收尾（保存部分回复、记录 trace / usage）。"""
+    cancelled = False
+    try:
+        agent_loop = await get_agent_loop()
+        cancelled = bool(session_key) and agent_loop.cancel(session_key, reason)["cancelled"]
+    except Exception as e:
+        logger.warning(f"Failed to cancel turn for {session_key}: {e}")
+    if not cancelled:
+        # 回合尚未登记（仍在准备阶段）时直接取消任务
+        turn_task.cancel(reason)
+    await asyncio.wait([turn_task])
+
+
+async def _run_chat_turn(websocket: WebSocket, data: dict, session_key: str, content: str) -> None:
+    """处理一条聊天消息（在独立任务中运行，接收循环可同时处理取消请求）。"""
+    model = data.get("model")
+
+    # 获取项目信息
+    project_info = None
+    project_id = data.get("project_id")
+    project_path = data.get("project_path")
+    if project_id and project_path:
+        from solopreneur.core.dependencies import get_component_manager
+        pm = get_component_manager().get_project_manager()
+        project = pm.get_project(project_id)
+        if project:
+            project_info = {
+                "id": project.id,
+                "name": project.name,
+                "description": project.description,
+                "path": project.path,
+                "source": project.source.value,
+                "git_info": project.git_info.model_dump(mode='json') if project.git_info else None,
+                "env_vars": [item.model_dump(mode='json') for item in project.env_vars],
+            }
+        else:
+            # 前端传了项目信息但后端找不到，使用前端传来的基本信息
+            project_info = {
+                "id": project_id,
+                "name": data.get("project_name", "未命名项目"),
+                "path": project_path,
+                "source": "unknown",
+                "env_vars": data.get("env_vars", []),
+            }
+
+    logger.info(f"WebSocket chat: {content[:50]}... (session: {session_key}, project: {project_info['name'] if project_info else 'none'})")
+
+    try:
+        agent_loop = await get_agent_loop()
+
+        # 临时覆盖模型（可选）
+        original_model = agent_loop.model
+        original_subagent_model = agent_loop.subagents.model
+        try:
+            if model:
+                agent_loop.model = model
+                # 保持子 Agent 与主控本次请求模型一致，避免 trace 中模型显示为旧值
+                agent_loop.subagents.model = model
+
+            # 为本次请求生成唯一 request_id，用于 trace 持久化
+            import uuid
+            request_id = f"req-{uuid.uuid4().hex[:12]}"
+            trace_svc = _get_trace_svc()
+
+            async def send_chunk(text: str):
+                await websocket.send_json({
+                    "type": "chunk",
+                    "content": text
+                })
+
+            async def send_trace(event: dict):
+                # ── 持久化到 SQLite（先于推送，连接断开后的取消事件也能落盘） ──
+                evt_type = event.get("event", "unknown")
                 try:
-                    if model:
-                        agent_loop.model = model
-                        # 保持子 Agent 与主控本次请求模型一致，避免 trace 中模型显示为旧值
-                        agent_loop.subagents.model = model
-
-                    # 为本次请求生成唯一 request_id，用于 trace 持久化
-                    import uuid
-                    request_id = f"req-{uuid.uuid4().hex[:12]}"
-                    trace_svc = _get_trace_svc()
-
-                    async def send_chunk(text: str):
-                        await websocket.send_json({
-                            "type": "chunk",
-                            "content": text
-                        })
-
-                    async def send_trace(event: dict):
-                        # 将 trace 事件转发到前端
-                        await websocket.send_json({
-                            "type": "trace",
-                            "request_id": request_id,
-                            **event
-                        })
-
-                        # ── 持久化到 SQLite（异步落盘，不阻塞主流） ──
-                        evt_type = event.get("event", "unknown")
-                        try:
-                            trace_svc.save_event(
-                                session_key=session_key,
-                                request_id=request_id,
-                                event_type=evt_type,
-                                data=event,
-                                project_id=project_id,
-                                agent_name=event.get("agent_name"),
-                            )
-                        except Exception as persist_err:
-                            logger.warning(f"Failed to persist trace event: {persist_err}")
-
-                        # 工具调用和角色委派事件同时作为 activity 发送到聊天流
-                        evt = event.get("event", "")
-                        if evt in ("tool_start", "tool_end"):
-                            await websocket.send_json({
-                                "type": "activity",
-                                "activity_type": evt,
-                                "tool_name": event.get("tool_name", ""),
-                                "delegate_agent": event.get("delegate_agent", ""),
-                                "tool_args": event.get("tool_args", {}),
-                                "duration_ms": event.get("duration_ms"),
-                                "result_length": event.get("result_length"),
-                                "result_preview": event.get("result_preview"),
-                                "iteration": event.get("iteration"),
-                                "timestamp": event.get("timestamp"),
-                            })
-                        elif evt in ("llm_start", "llm_end"):
-                            await websocket.send_json({
-                                "type": "activity",
-                                "activity_type": evt,
-                                "iteration": event.get("iteration"),
-                                "agent_name": event.get("agent_name", ""),
-                                "model": event.get("model", ""),
-                                "duration_ms": event.get("duration_ms"),
-                                "total_tokens": event.get("total_tokens"),
-                                "timestamp": event.get("timestamp"),
-                            })
-                        elif evt in ("skill_start", "skill_end"):
-                            await websocket.send_json({
-                                "type": "activity",
-                                "activity_type": evt,
-                                "iteration": event.get("iteration"),
-                                "skill_name": event.get("skill_name", ""),
-                                "tool_name": event.get("tool_name", ""),
-                                "tool_args": event.get("tool_args", {}),
-                                "duration_ms": event.get("duration_ms"),
-                                "result_length": event.get("result_length"),
-                                "result_preview": event.get("result_preview"),
-                                "timestamp": event.get("timestamp"),
-                            })
-
-                    response_text = await agent_loop.process_direct_stream(
-                        content=content,
+                    trace_svc.save_event(
                         session_key=session_key,
-                        on_chunk=send_chunk,
-                        on_trace=send_trace,
-                        project_info=project_info,
+                        request_id=request_id,
+                        event_type=evt_type,
+                        data=event,
+                        project_id=project_id,
+                        agent_name=event.get("agent_name"),
                     )
-                finally:
-                    agent_loop.model = original_model
-                    agent_loop.subagents.model = original_subagent_model
+                except Exception as persist_err:
+                    logger.warning(f"Failed to persist trace event: {persist_err}")
 
+                # 将 trace 事件转发到前端
                 await websocket.send_json({
-                    "type": "done",
-                    "content": response_text
+                    "type": "trace",
+                    "request_id": request_id,
+                    **event
                 })
-            except WebSocketDisconnect:
-                # 客户端已断连，直接向外层抛出，不尝试再发任何消息
-                raise
-            except Exception as e:
-                logger.error(f"Chat API error: {e!r}")
-                error_text = str(e) or repr(e)
-                try:
+
+                # 工具调用和角色委派事件同时作为 activity 发送到聊天流
+                evt = event.get("event", "")
+                if evt in ("tool_start", "tool_end"):
                     await websocket.send_json({
-                        "type": "error",
-                        "content": f"API 调用失败: {error_text}"
+                        "type": "activity",
+                        "activity_type": evt,
+                        "tool_name": event.get("tool_name", ""),
+                        "delegate_agent": event.get("delegate_agent", ""),
+                        "tool_args": event.get("tool_args", {}),
+                        "duration_ms": event.get("duration_ms"),
+                        "result_length": event.get("result_length"),
+                        "result_preview": event.get("result_preview"),
+                        "iteration": event.get("iteration"),
+                        "timestamp": event.get("timestamp"),
                     })
-                except Exception:
-                    pass  # 发送失败（如连接已关闭）则静默忽略
-    
+                elif evt in ("llm_start", "llm_end"):
+                    await websocket.send_json({
+                        "type": "activity",
+                        "activity_type": evt,
+                        "iteration": event.get("iteration"),
+                        "agent_name": event.get("agent_name", ""),
+                        "model": event.get("model", ""),
+                        "duration_ms": event.get("duration_ms"),
+                        "total_tokens": event.get("total_tokens"),
+                        "timestamp": event.get("timestamp"),
+                    })
+                elif evt in ("skill_start", "skill_end"):
+                    await websocket.send_json({
+                        "type": "activity",
+                        "activity_type": evt,
+                        "iteration": event.get("iteration"),
+                        "skill_name": event.get("skill_name", ""),
+                        "tool_name": event.get("tool_name", ""),
+                        "tool_args": event.get("tool_args", {}),
+                        "duration_ms": event.get("duration_ms"),
+                        "result_length": event.get("result_length"),
+                        "result_preview": event.get("result_preview"),
+                        "timestamp": event.get("timestamp"),
+                    })
+
+            response_text = await agent_loop.process_direct_stream(
+                content=content,
+                session_key=session_key,
+                on_chunk=send_chunk,
+                on_trace=send_trace,
+                project_info=project_info,
+            )
+        finally:
+            agent_loop.model = original_model
+            agent_loop.subagents.model = original_subagent_model
+
+        await websocket.send_json({
+            "type": "done",
+            "content": response_text
+        })
     except WebSocketDisconnect:
-        manager.disconnect_chat(websocket)
+        # 客户端已断连，由接收循环处理，不尝试再发任何消息
+        return
+    except TurnCancelledError as e:
+        try:
+            await websocket.send_json({
+                "type": "cancelled",
+                "reason": e.reason,
+            })
+        except Exception:
+            pass  # 连接已关闭时静默忽略
     except Exception as e:
-        logger.error(f"Chat WebSocket error: {e}")
-        manager.disconnect_chat(websocket)
+        logger.error(f"Chat API error: {e!r}")
+        error_text = str(e) or repr(e)
+        try:
+            await websocket.send_json({
+                "type": "error",
+                "content": f"API 调用失败: {error_text}"
+            })
+        except Exception:
+            pass  # 发送失败（如连接已关闭）则静默忽略
 
 
 @router.websocket("/ws/flow")
@@ -1,6 +1,6 @@
 """Message bus module for decoupled channel-agent communication."""
 
 from solopreneur.bus.events import InboundMessage, OutboundMessage
-from solopreneur.bus.queue import MessageBus
+from solopreneur.bus.queue import BusFullError, MessageBus
 
-__all__ = ["MessageBus", "InboundMessage", "OutboundMessage"]
+__all__ = ["MessageBus", "BusFullError", "InboundMessage", "OutboundMessage"]
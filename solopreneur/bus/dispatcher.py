@@ -0,0 +1,125 @@
+"""Session-sharded dispatcher: runs inbound messages concurrently across sessions."""
+
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+from solopreneur.bus.events import InboundMessage
+
+
+def dispatch_key(msg: InboundMessage) -> str:
+    """
+    Ordering key for a message.
+
+    System messages (subagent announcements) carry the origin "channel:chat_id"
+    in chat_id, so they are serialized with the session they report back to.
+    """
+    if msg.channel == "system" and ":" in msg.chat_id:
+        return msg.chat_id
+    return msg.session_key
+
+
+class SessionDispatcher:
+    """
+    Shards inbound messages by session onto concurrent workers.
+
+    Messages of one session are handled strictly in arrival order by a single
+    worker; different sessions run in parallel, bounded by a global limit and
+    optional per-channel limits. Workers exist only while a session has
+    pending messages.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[InboundMessage], Awaitable[None]],
+        max_concurrency: int = 8,
+        channel_limits: dict[str, int] | None = None,
+    ):
+        self._handler = handler
+        self.max_concurrency = max(1, max_concurrency)
+        self._global = asyncio.Semaphore(self.max_concurrency)
+        self._channel_limits = {k: v for k, v in (channel_limits or {}).items() if v > 0}
+        self._channel_sems: dict[str, asyncio.Semaphore] = {}
+        self._queues: dict[str, deque[InboundMessage]] = {}
+        self._workers: dict[str, asyncio.Task[None]] = {}
+        self._running_by_channel: dict[str, int] = {}
+        self._processed = 0
+        self._failed = 0
+
+    def submit(self, msg: InboundMessage) -> None:
+        """Queue a message behind earlier messages of the same session."""
+        key = dispatch_key(msg)
+        self._queues.setdefault(key, deque()).append(msg)
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._work(key))
+
+    def _channel_sem(self, channel: str) -> asyncio.Semaphore | None:
+        limit = self._channel_limits.get(channel)
+        if limit is None:
+            return None
+        if channel not in self._channel_sems:
+            self._channel_sems[channel] = asyncio.Semaphore(limit)
+        return self._channel_sems[channel]
+
+    async def _work(self, key: str) -> None:
+        queue = self._queues[key]
+        try:
+            while queue:
+                msg = queue[0]
+                channel_sem = self._channel_sem(msg.channel)
+                if channel_sem is not None:
+                    await channel_sem.acquire()
+                try:
+                    async with self._global:
+                        queue.popleft()
+                        self._running_by_channel[msg.channel] = self._running_by_channel.get(msg.channel, 0) + 1
+                        try:
+                            await self._handler(msg)
+                            self._processed += 1
+                        except Exception as e:
+                            self._failed += 1
+                            logger.error(f"Dispatch handler failed for {key}: {e}")
+                        finally:
+                            self._running_by_channel[msg.channel] -= 1
+                finally:
+                    if channel_sem is not None:
+                        channel_sem.release()
+        finally:
+            self._workers.pop(key, None)
+            if not queue:
+                self._queues.pop(key, None)
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth and concurrency snapshot."""
+        pending_by_channel: dict[str, int] = {}
+        for queue in self._queues.values():
+            for msg in queue:
+                pending_by_channel[msg.channel] = pending_by_channel.get(msg.channel, 0) + 1
+        running_by_channel = {k: v for k, v in self._running_by_channel.items() if v}
+        return {
+            "active_sessions": len(self._workers),
+            "pending": sum(pending_by_channel.values()),
+            "running": sum(running_by_channel.values()),
+            "pending_by_channel": pending_by_channel,
+            "running_by_channel": running_by_channel,
+            "max_concurrency": self.max_concurrency,
+            "channel_limits": dict(self._channel_limits),
+            "processed": self._processed,
+            "failed": self._failed,
+        }
+
+    async def join(self) -> None:
+        """Wait until every queued message has been handled."""
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Cancel all workers and drop pending messages."""
+        workers = list(self._workers.values())
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
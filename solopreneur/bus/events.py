@@ -21,6 +21,31 @@ class InboundMessage:
     def session_key(self) -> str:
         """Unique key for session identification."""
         return f"{self.channel}:{self.chat_id}"
+    
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize to a JSON-compatible dict."""
+        return {
+            "channel": self.channel,
+            "sender_id": self.sender_id,
+            "chat_id": self.chat_id,
+            "content": self.content,
+            "timestamp": self.timestamp.isoformat(),
+            "media": list(self.media),
+            "metadata": dict(self.metadata),
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "InboundMessage":
+        """Inverse of to_dict()."""
+        return cls(
+            channel=data["channel"],
+            sender_id=data["sender_id"],
+            chat_id=data["chat_id"],
+            content=data["content"],
+            timestamp=datetime.fromisoformat(data["timestamp"]),
+            media=data.get("media") or [],
+            metadata=data.get("metadata") or {},
+        )
 
 
 @dataclass
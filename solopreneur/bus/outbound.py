@@ -0,0 +1,123 @@
+"""Per-channel outbound senders: isolated queues, retry with backoff and rate limiting."""
+
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+from solopreneur.bus.events import OutboundMessage
+
+OutboundCallback = Callable[[OutboundMessage], Awaitable[None]]
+
+
+class ChannelSender:
+    """
+    Delivers outbound messages of one channel from its own bounded queue.
+
+    Each channel runs in its own task, so a slow or failing channel never
+    delays the others. Failed sends are retried with jittered exponential
+    backoff, and sends are spaced to respect the channel's rate limit.
+    """
+
+    def __init__(
+        self,
+        channel: str,
+        callbacks: list[OutboundCallback],
+        max_queue: int = 100,
+        max_retries: int = 3,
+        retry_base: float = 0.5,
+        retry_max: float = 30.0,
+        rate: float = 0.0,
+    ):
+        self.channel = channel
+        self._callbacks = callbacks
+        self._queue: asyncio.Queue[OutboundMessage] = asyncio.Queue(maxsize=max(1, max_queue))
+        self.max_retries = max(0, max_retries)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_send_at = 0.0
+        self._task: asyncio.Task[None] | None = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def offer(self, msg: OutboundMessage) -> bool:
+        """Queue a message without waiting; returns False if the channel queue is full."""
+        try:
+            self._queue.put_nowait(msg)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.error(f"Outbound queue of {self.channel} full, dropped message to {msg.chat_id}")
+            return False
+
+    async def _run(self) -> None:
+        while True:
+            msg = await self._queue.get()
+            try:
+                for callback in self._callbacks:
+                    await self._deliver(callback, msg)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, callback: OutboundCallback, msg: OutboundMessage) -> None:
+        for attempt in range(self.max_retries + 1):
+            await self._throttle()
+            try:
+                await callback(msg)
+                self.sent += 1
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    logger.error(f"Error dispatching to {self.channel} after {attempt + 1} attempts: {e}")
+                    return
+                self.retried += 1
+                delay = min(self.retry_max, self.retry_base * (2 ** attempt))
+                delay = random.uniform(delay / 2, delay)
+                logger.warning(f"Send to {self.channel} failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _throttle(self) -> None:
+        if not self._interval:
+            return
+        now = time.monotonic()
+        if self._next_send_at > now:
+            await asyncio.sleep(self._next_send_at - now)
+            now = self._next_send_at
+        self._next_send_at = now + self._interval
+
+    async def drain(self, timeout: float | None = None) -> None:
+        """Wait until every queued message has been handled."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Outbound queue of {self.channel} not drained, {self._queue.qsize()} left")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "depth": self._queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+        }
@@ -1,80 +1,409 @@
 """Async message queue for decoupled channel-agent communication."""
 
 import asyncio
-from typing import Callable, Awaitable
+import bisect
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Awaitable
 
 from loguru import logger
 
 from solopreneur.bus.events import InboundMessage, OutboundMessage
+from solopreneur.bus.outbound import ChannelSender
+
+# Inbound priority lanes, highest priority first
+LANE_SYSTEM = "system"  # subagent announcements and other internal messages
+LANE_INTERACTIVE = "interactive"  # user traffic from chat channels / web
+LANE_BACKGROUND = "background"  # cron jobs and heartbeats
+LANES = (LANE_SYSTEM, LANE_INTERACTIVE, LANE_BACKGROUND)
+
+DEFAULT_CHANNEL_LANES = {
+    "system": LANE_SYSTEM,
+    "cron": LANE_BACKGROUND,
+    "heartbeat": LANE_BACKGROUND,
+}
+
+# What to do when a lane is full
+OVERFLOW_REJECT = "reject"  # raise BusFullError to the publisher
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # discard the oldest queued message of the lane
+OVERFLOW_SPILL = "spill"  # park the message in SQLite until the lane has room
+OVERFLOW_POLICIES = (OVERFLOW_REJECT, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL)
+
+DEFAULT_MAX_INBOUND = 1000  # per lane
+DEFAULT_MAX_OUTBOUND = 1000
+DEFAULT_CHANNEL_OUTBOUND = 100  # per-channel send queue
+
+
+class BusFullError(Exception):
+    """Raised when an inbound lane is full and the overflow policy is reject."""
+
+
+class LatencyHistogram:
+    """Cumulative histogram of enqueue-to-dequeue latency (milliseconds)."""
+
+    BOUNDS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 60000)
+
+    def __init__(self):
+        self._counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, latency_ms: float) -> None:
+        self._counts[bisect.bisect_left(self.BOUNDS_MS, latency_ms)] += 1
+        self.count += 1
+        self.total_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def snapshot(self) -> dict[str, Any]:
+        labels = [f"le_{bound}" for bound in self.BOUNDS_MS] + ["inf"]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "buckets": dict(zip(labels, self._counts)),
+        }
 
 
 class MessageBus:
     """
     Async message bus that decouples chat channels from the agent core.
-    
+
     Channels push messages to the inbound queue, and the agent processes
     them and pushes responses to the outbound queue.
+
+    Inbound messages are split into bounded priority lanes (system >
+    interactive > background); consumers always take from the highest
+    non-empty lane. When a lane is full the overflow policy decides whether
+    the publisher is rejected, the oldest message is dropped, or the message
+    is spilled to SQLite and re-queued once the lane has room. Spilled
+    messages outlive the bus: start() replays rows left behind by a previous
+    process, and spill reads/writes run in a worker thread.
     """
-    
-    def __init__(self):
-        self.inbound: asyncio.Queue[InboundMessage] = asyncio.Queue()
-        self.outbound: asyncio.Queue[OutboundMessage] = asyncio.Queue()
+
+    def __init__(
+        self,
+        max_inbound: int = DEFAULT_MAX_INBOUND,
+        max_outbound: int = DEFAULT_MAX_OUTBOUND,
+        overflow: str = OVERFLOW_SPILL,
+        channel_lanes: dict[str, str] | None = None,
+        spill_store: Any = None,
+        outbound_channel_queue: int = DEFAULT_CHANNEL_OUTBOUND,
+        outbound_max_retries: int = 3,
+        outbound_retry_base: float = 0.5,
+        outbound_rate: float = 0.0,
+        outbound_channel_rates: dict[str, float] | None = None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.max_inbound = max(1, max_inbound)
+        self.overflow = overflow
+        self.channel_lanes = {**DEFAULT_CHANNEL_LANES, **(channel_lanes or {})}
+        # lane -> deque[(enqueued_at, msg)]
+        self._lanes: dict[str, deque[tuple[float, InboundMessage]]] = {lane: deque() for lane in LANES}
+        self._spilled: dict[str, int] = dict.fromkeys(LANES, 0)
+        # spilled messages counted but not yet written (waiting for the spill lock)
+        self._spilling: dict[str, int] = dict.fromkeys(LANES, 0)
+        # permits of spilled messages that vanished from the store; skipped by consumers
+        self._lost = 0
+        self._dropped: dict[str, int] = dict.fromkeys(LANES, 0)
+        self._rejected: dict[str, int] = dict.fromkeys(LANES, 0)
+        self._latency: dict[str, LatencyHistogram] = {lane: LatencyHistogram() for lane in LANES}
+        # counts every pending inbound message (in memory or spilled)
+        self._pending = asyncio.Semaphore(0)
+        self._spill_store = spill_store
+        self._bus_id = uuid.uuid4().hex
+        self._started = False
+        self._registered = False
+        # serializes spill writes so rows keep publish order
+        self._spill_lock = asyncio.Lock()
+        # serializes lane selection (refills await the spill store)
+        self._consume_lock = asyncio.Lock()
+        self.outbound: asyncio.Queue[OutboundMessage] = asyncio.Queue(maxsize=max(1, max_outbound))
         self._outbound_subscribers: dict[str, list[Callable[[OutboundMessage], Awaitable[None]]]] = {}
+        self.outbound_channel_queue = outbound_channel_queue
+        self.outbound_max_retries = outbound_max_retries
+        self.outbound_retry_base = outbound_retry_base
+        self.outbound_rate = outbound_rate
+        self.outbound_channel_rates = dict(outbound_channel_rates or {})
+        self._senders: dict[str, ChannelSender] = {}
+        self._unrouted = 0
+        self._stop_event = asyncio.Event()
         self._running = False
-    
+
+    def lane_for(self, msg: InboundMessage) -> str:
+        """Priority lane of a message (metadata["lane"] overrides the channel default)."""
+        lane = msg.metadata.get("lane") or self.channel_lanes.get(msg.channel, LANE_INTERACTIVE)
+        return lane if lane in self._lanes else LANE_INTERACTIVE
+
+    def _get_spill_store(self):
+        if self._spill_store is None:
+            from solopreneur.storage.sqlite_store import SQLiteStore
+            self._spill_store = SQLiteStore()
+        return self._spill_store
+
+    async def start(self) -> int:
+        """
+        Replay messages spilled by a previous bus (e.g. before a restart).
+
+        Rows of buses that have exited are claimed for this bus and re-queued
+        behind anything already pending; buses still running against the same
+        database keep theirs. Safe to call more than once; returns the number
+        of messages recovered.
+        """
+        if self._started or self.overflow != OVERFLOW_SPILL:
+            return 0
+        self._started = True
+        store = self._get_spill_store()
+        await self._register(store)
+        claimed = await asyncio.to_thread(store.claim_bus_spill, self._bus_id)
+        recovered = 0
+        for lane, count in claimed.items():
+            if lane not in self._spilled:
+                continue
+            self._spilled[lane] += count
+            recovered += count
+        for _ in range(recovered):
+            self._pending.release()
+        if recovered:
+            logger.info(f"Recovered {recovered} spilled inbound message(s)")
+        return recovered
+
     async def publish_inbound(self, msg: InboundMessage) -> None:
-        """Publish a message from a channel to the agent."""
-        await self.inbound.put(msg)
-    
+        """
+        Publish a message from a channel to the agent.
+
+        Raises:
+            BusFullError: The lane is full and the overflow policy is reject.
+        """
+        lane = self.lane_for(msg)
+        queue = self._lanes[lane]
+        now = time.time()
+
+        # Once a lane has spilled, newer messages queue behind the spilled ones
+        if len(queue) < self.max_inbound and not self._spilled[lane]:
+            queue.append((now, msg))
+        elif self.overflow == OVERFLOW_REJECT:
+            self._rejected[lane] += 1
+            raise BusFullError(f"Inbound lane '{lane}' is full ({self.max_inbound})")
+        elif self.overflow == OVERFLOW_DROP_OLDEST:
+            _, dropped = queue.popleft()
+            queue.append((now, msg))
+            self._dropped[lane] += 1
+            logger.warning(f"Inbound lane '{lane}' full, dropped oldest message from {dropped.session_key}")
+            return
+        else:
+            # count first so later publishers queue behind this one while it is written;
+            # shielded so a cancelled publisher cannot leave an uncounted row behind
+            self._spilled[lane] += 1
+            self._spilling[lane] += 1
+            await asyncio.shield(self._spill(lane, msg, now))
+            return
+        self._pending.release()
+
+    async def _register(self, store: Any) -> None:
+        """Record this bus as alive so other buses sharing the store leave its rows alone."""
+        if not self._registered:
+            await asyncio.to_thread(store.register_bus, self._bus_id)
+            self._registered = True
+
+    async def _spill(self, lane: str, msg: InboundMessage, enqueued_at: float) -> None:
+        store = self._get_spill_store()
+        try:
+            async with self._spill_lock:
+                try:
+                    await self._register(store)
+                    await asyncio.to_thread(store.spill_bus_message, self._bus_id, lane, msg.to_dict(), enqueued_at)
+                finally:
+                    self._spilling[lane] -= 1
+        except Exception:
+            self._spilled[lane] -= 1
+            raise
+        self._pending.release()
+
     async def consume_inbound(self) -> InboundMessage:
-        """Consume the next inbound message (blocks until available)."""
-        return await self.inbound.get()
-    
+        """Consume the next inbound message, highest lane first (blocks until available)."""
+        while True:
+            await self._pending.acquire()
+            try:
+                async with self._consume_lock:
+                    msg = await self._take()
+            except asyncio.CancelledError:
+                # cancelled mid-refill (e.g. wait_for timeout): give the permit back
+                self._pending.release()
+                raise
+            if msg is not None:
+                return msg
+            if not self._lost:
+                raise RuntimeError("Inbound bus accounting error: no pending message found")
+            # the permit belonged to a spilled message that is gone
+            self._lost -= 1
+
+    async def _take(self) -> InboundMessage | None:
+        for lane in LANES:
+            queue = self._lanes[lane]
+            if not queue and self._spilled[lane]:
+                await self._refill(lane)
+            if queue:
+                enqueued_at, msg = queue.popleft()
+                # refill in chunks once the lane has drained to half capacity
+                if self._spilled[lane] and len(queue) <= self.max_inbound // 2:
+                    try:
+                        await self._refill(lane)
+                    except asyncio.CancelledError:
+                        queue.appendleft((enqueued_at, msg))
+                        raise
+                self._latency[lane].observe((time.time() - enqueued_at) * 1000)
+                return msg
+        return None
+
+    async def _refill(self, lane: str) -> None:
+        """Move spilled messages back into the lane while it has room."""
+        room = self.max_inbound - len(self._lanes[lane])
+        if room <= 0:
+            return
+        # shielded: rows are deleted by the store, so they must land in the lane even if we are cancelled
+        await asyncio.shield(self._load_spilled(lane, min(room, self._spilled[lane])))
+
+    async def _load_spilled(self, lane: str, limit: int) -> None:
+        store = self._get_spill_store()
+        # holding the spill lock: every counted message is either written or still waiting
+        async with self._spill_lock:
+            rows = await asyncio.to_thread(store.pop_bus_spill, self._bus_id, lane, limit)
+            for payload, enqueued_at in rows:
+                self._lanes[lane].append((enqueued_at, InboundMessage.from_dict(payload)))
+            self._spilled[lane] -= len(rows)
+            missing = self._spilled[lane] - self._spilling[lane] if len(rows) < limit else 0
+            if missing > 0:
+                # rows removed behind our back (e.g. claimed by another bus): fix the count
+                logger.warning(f"{missing} spilled message(s) of lane '{lane}' are missing from the spill store")
+                self._spilled[lane] -= missing
+                self._lost += missing
+
     async def publish_outbound(self, msg: OutboundMessage) -> None:
-        """Publish a response from the agent to channels."""
+        """Publish a response from the agent to channels (waits while the queue is full)."""
         await self.outbound.put(msg)
-    
+
     async def consume_outbound(self) -> OutboundMessage:
         """Consume the next outbound message (blocks until available)."""
         return await self.outbound.get()
-    
+
     def subscribe_outbound(
-        self, 
-        channel: str, 
+        self,
+        channel: str,
         callback: Callable[[OutboundMessage], Awaitable[None]]
     ) -> None:
         """Subscribe to outbound messages for a specific channel."""
         if channel not in self._outbound_subscribers:
             self._outbound_subscribers[channel] = []
         self._outbound_subscribers[channel].append(callback)
-    
-    async def dispatch_outbound(self) -> None:
+
+    def _sender_for(self, channel: str) -> ChannelSender | None:
+        sender = self._senders.get(channel)
+        if sender is None:
+            callbacks = self._outbound_subscribers.get(channel)
+            if not callbacks:
+                return None
+            sender = ChannelSender(
+                channel,
+                callbacks,
+                max_queue=self.outbound_channel_queue,
+                max_retries=self.outbound_max_retries,
+                retry_base=self.outbound_retry_base,
+                rate=self.outbound_channel_rates.get(channel, self.outbound_rate),
+            )
+            sender.start()
+            self._senders[channel] = sender
+        return sender
+
+    async def dispatch_outbound(self, drain_timeout: float = 5.0) -> None:
         """
         Dispatch outbound messages to subscribed channels.
-        Run this as a background task.
+        Run this as a background task; it returns after stop() is called.
+
+        Messages are routed to a per-channel sender task, so channels deliver
+        independently of each other.
         """
         self._running = True
-        while self._running:
-            try:
-                msg = await asyncio.wait_for(self.outbound.get(), timeout=1.0)
-                subscribers = self._outbound_subscribers.get(msg.channel, [])
-                for callback in subscribers:
-                    try:
-                        await callback(msg)
-                    except Exception as e:
-                        logger.error(f"Error dispatching to {msg.channel}: {e}")
-            except asyncio.TimeoutError:
-                continue
-    
+        self._stop_event.clear()
+        stop_wait = asyncio.create_task(self._stop_event.wait())
+        try:
+            while True:
+                get = asyncio.create_task(self.outbound.get())
+                done, _ = await asyncio.wait({get, stop_wait}, return_when=asyncio.FIRST_COMPLETED)
+                if get not in done:
+                    get.cancel()
+                    break
+                msg = get.result()
+                sender = self._sender_for(msg.channel)
+                if sender is None:
+                    self._unrouted += 1
+                    logger.warning(f"No outbound subscriber for channel: {msg.channel}")
+                    continue
+                sender.offer(msg)
+        finally:
+            stop_wait.cancel()
+            self._running = False
+            senders = list(self._senders.values())
+            self._senders.clear()
+            # flush what was already routed, then stop the sender tasks
+            await asyncio.gather(*(sender.drain(drain_timeout) for sender in senders))
+            await asyncio.gather(*(sender.close() for sender in senders))
+
     def stop(self) -> None:
         """Stop the dispatcher loop."""
         self._running = False
-    
+        self._stop_event.set()
+
+    def close(self) -> None:
+        """Release the bus; spilled messages stay in SQLite and are replayed by the next start()."""
+        if self._registered:
+            self._spill_store.release_bus(self._bus_id)
+            self._registered = False
+        if any(self._spilled.values()):
+            logger.info(f"Leaving {sum(self._spilled.values())} spilled inbound message(s) for the next start")
+
+    def stats(self) -> dict[str, Any]:
+        """Per-lane depth, overflow counters and enqueue-to-dequeue latency."""
+        return {
+            "overflow": self.overflow,
+            "max_inbound": self.max_inbound,
+            "lanes": {
+                lane: {
+                    "depth": len(self._lanes[lane]) + self._spilled[lane],
+                    "spilled": self._spilled[lane],
+                    "dropped": self._dropped[lane],
+                    "rejected": self._rejected[lane],
+                    "latency": self._latency[lane].snapshot(),
+                }
+                for lane in LANES
+            },
+            "outbound_depth": self.outbound.qsize(),
+            "outbound_unrouted": self._unrouted,
+            "outbound_channels": {name: sender.stats() for name, sender in self._senders.items()},
+        }
+
+    @classmethod
+    def from_config(cls, bus_config: Any) -> "MessageBus":
+        """Build a bus from a BusConfig."""
+        return cls(
+            max_inbound=bus_config.max_inbound,
+            max_outbound=bus_config.max_outbound,
+            overflow=bus_config.overflow,
+            channel_lanes=bus_config.channel_lanes,
+            outbound_channel_queue=bus_config.outbound_channel_queue,
+            outbound_max_retries=bus_config.outbound_max_retries,
+            outbound_retry_base=bus_config.outbound_retry_base,
+            outbound_rate=bus_config.outbound_rate,
+            outbound_channel_rates=bus_config.outbound_channel_rates,
+        )
+
     @property
     def inbound_size(self) -> int:
         """Number of pending inbound messages."""
-        return self.inbound.qsize()
-    
+        return sum(len(queue) for queue in self._lanes.values()) + sum(self._spilled.values())
+
     @property
     def outbound_size(self) -> int:
         """Number of pending outbound messages."""
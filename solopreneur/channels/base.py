@@ -3,8 +3,10 @@
 from abc import ABC, abstractmethod
 from typing import Any
 
+from loguru import logger
+
 from solopreneur.bus.events import InboundMessage, OutboundMessage
-from solopreneur.bus.queue import MessageBus
+from solopreneur.bus.queue import BusFullError, MessageBus
 
 
 class BaseChannel(ABC):
@@ -113,7 +115,10 @@ class BaseChannel(ABC):
             metadata=metadata or {}
         )
         
-        await self.bus.publish_inbound(msg)
+        try:
+            await self.bus.publish_inbound(msg)
+        except BusFullError as e:
+            logger.warning(f"{self.name}: inbound message from {sender_id} rejected: {e}")
     
     @property
     def is_running(self) -> bool:
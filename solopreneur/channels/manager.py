@@ -5,7 +5,6 @@ from typing import Any
 
 from loguru import logger
 
-from solopreneur.bus.events import OutboundMessage
 from solopreneur.bus.queue import MessageBus
 from solopreneur.channels.base import BaseChannel
 from solopreneur.config.schema import Config
@@ -84,8 +83,11 @@ class ChannelManager:
             logger.warning("未启用任何通道")
             return
         
-        # 启动传出调度器
-        self._dispatch_task = asyncio.create_task(self._dispatch_outbound())
+        # 每个通道订阅自己的出站消息，由总线按通道独立发送
+        for name, channel in self.channels.items():
+            self.bus.subscribe_outbound(name, channel.send)
+        self._dispatch_task = asyncio.create_task(self.bus.dispatch_outbound())
+        logger.info("传出调度器已启动")
         
         # 启动所有通道
         tasks = []
@@ -100,13 +102,14 @@ class ChannelManager:
         """停止所有通道和调度器。"""
         logger.info("正在停止所有通道...")
         
-        # 停止调度器
+        # 停止调度器（先发完已路由到各通道的消息）
         if self._dispatch_task:
-            self._dispatch_task.cancel()
+            self.bus.stop()
             try:
-                await self._dispatch_task
-            except asyncio.CancelledError:
+                await asyncio.wait_for(self._dispatch_task, timeout=10)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
                 pass
+            self._dispatch_task = None
         
         # 停止所有通道
         for name, channel in self.channels.items():
@@ -116,31 +119,6 @@ class ChannelManager:
             except Exception as e:
                 logger.error(f"停止 {name} 时出错: {e}")
     
-    async def _dispatch_outbound(self) -> None:
-        """将传出消息调度到相应的通道。"""
-        logger.info("传出调度器已启动")
-        
-        while True:
-            try:
-                msg = await asyncio.wait_for(
-                    self.bus.consume_outbound(),
-                    timeout=1.0
-                )
-                
-                channel = self.channels.get(msg.channel)
-                if channel:
-                    try:
-                        await channel.send(msg)
-                    except Exception as e:
-                        logger.error(f"向 {msg.channel} 发送消息时出错: {e}")
-                else:
-                    logger.warning(f"未知通道: {msg.channel}")
-                    
-            except asyncio.TimeoutError:
-                continue
-            except asyncio.CancelledError:
-                break
-    
     def get_channel(self, name: str) -> BaseChannel | None:
         """通过名称获取通道。"""
         return self.channels.get(name)
@@ -180,7 +180,7 @@ def gateway(
     config = load_config()
     
     # 创建组件
-    bus = MessageBus()
+    bus = MessageBus.from_config(config.bus)
     
     # 创建提供商（支持 OpenRouter, Anthropic, OpenAI, Bedrock）
     api_key = config.get_api_key()
@@ -208,9 +208,16 @@ def gateway(
         max_iterations=config.agents.defaults.max_tool_iterations,
         brave_api_key=config.tools.web.search.api_key or None,
         exec_config=config.tools.exec,
+        tool_router_config=config.tools.router,
+        budget_config=config.agents.defaults.budget,
+        tokenizer=config.agents.defaults.tokenizer,
+        rolling_summary=config.agents.defaults.rolling_summary,
+        background_compaction_ratio=config.agents.defaults.background_compaction_ratio,
         max_session_tokens=config.agents.defaults.max_tokens_per_session,
         max_total_time=config.agents.defaults.agent_timeout,
         history_window=config.agents.defaults.history_window,
+        max_concurrency=config.gateway.max_concurrency,
+        channel_concurrency=config.gateway.channel_concurrency,
     )
     
     # 创建定时服务
@@ -319,6 +326,11 @@ def agent(
         workspace=config.workspace_path,
         brave_api_key=config.tools.web.search.api_key or None,
         exec_config=config.tools.exec,
+        tool_router_config=config.tools.router,
+        budget_config=config.agents.defaults.budget,
+        tokenizer=config.agents.defaults.tokenizer,
+        rolling_summary=config.agents.defaults.rolling_summary,
+        background_compaction_ratio=config.agents.defaults.background_compaction_ratio,
         max_session_tokens=config.agents.defaults.max_tokens_per_session,
         max_total_time=config.agents.defaults.agent_timeout,
         history_window=config.agents.defaults.history_window,
@@ -50,6 +50,15 @@ class TaskValidatorConfig(BaseModel):
     validator_model: str = ""  # 验证器使用的模型（空字符串=使用 provider 默认模型）
 
 
+class BudgetConfig(BaseModel):
+    """单次请求预算（主 Agent、子 Agent、工作流步骤共享；墙钟上限沿用 agent_timeout）"""
+    max_tokens: int = 0  # 单次请求累计 Token 上限（0=不限）
+    max_tool_seconds: int = 0  # 工具累计执行时间上限（秒，0=不限）
+    fallback_model: str = ""  # 预算将尽时切换的低成本模型（空=不切换）
+    degrade_at: float = 0.2  # 剩余预算比例低于该值时降级模型
+    min_output_tokens: int = 1024  # 按剩余 Token 收紧 max_tokens 时的下限
+
+
 class AgentDefaults(BaseModel):
     """Default agent configuration."""
     workspace: str = "~/.solopreneur/workspace"
@@ -64,6 +73,10 @@ class AgentDefaults(BaseModel):
     max_tokens_per_session: int = 500000  # 每个会话最大Token消耗（超限后自动压缩上下文继续执行）
     history_window: int = 50  # 每次 LLM 调用携带的最大历史消息条数（越大上下文越长）
     task_validator: TaskValidatorConfig = Field(default_factory=TaskValidatorConfig)  # 任务完成验证器
+    budget: BudgetConfig = Field(default_factory=BudgetConfig)  # 单次请求预算
+    tokenizer: str = "auto"  # 上下文 token 计数：auto / tiktoken / tiktoken:<encoding> / heuristic
+    rolling_summary: bool = True  # 自动压缩使用按会话持久化的滚动摘要（只摘要新增消息）
+    background_compaction_ratio: float = 0.6  # 上下文使用率超过该比例时后台预先压缩（0 关闭）
 
 
 class AgentsConfig(BaseModel):
@@ -93,6 +106,8 @@ class GatewayConfig(BaseModel):
     """Gateway/server configuration."""
     host: str = "0.0.0.0"
     port: int = 18790
+    max_concurrency: int = 8  # 同时处理的会话数上限（同一会话内消息始终串行）
+    channel_concurrency: dict[str, int] = Field(default_factory=dict)  # 各通道并发上限，如 {"telegram": 2}
 
 
 class WebSearchConfig(BaseModel):
@@ -144,11 +159,23 @@ class MCPConfig(BaseModel):
     servers: list[MCPServerConfig] = Field(default_factory=list)
 
 
+class ToolRouterConfig(BaseModel):
+    """按轮次筛选工具集（工具较多时只向 LLM 发送相关子集）"""
+    enabled: bool = True
+    max_tools: int = 20  # 每轮最多发送的工具数
+    min_tools: int = 24  # 工具总数不超过该值时不做筛选
+    core_tools: list[str] = Field(default_factory=lambda: [
+        "read_file", "write_file", "edit_file", "list_dir", "search_code",
+        "exec", "message", "delegate", "harness", "read_spill",
+    ])  # 始终发送的核心工具
+
+
 class ToolsConfig(BaseModel):
     """Tools configuration."""
     web: WebToolsConfig = Field(default_factory=WebToolsConfig)
     exec: ExecToolConfig = Field(default_factory=ExecToolConfig)
     mcp: MCPConfig = Field(default_factory=MCPConfig)
+    router: ToolRouterConfig = Field(default_factory=ToolRouterConfig)
 
 
 class MemorySearchConfig(BaseModel):
@@ -168,6 +195,7 @@ class MemorySearchConfig(BaseModel):
     top_k: int = 5  # 搜索返回条数
     min_score: float = 0.1  # 最低融合分数阈值
     auto_index_on_start: bool = True  # 启动时自动索引记忆目录
+    retrieval_timeout: float = 0.0  # 单轮记忆检索时限（秒），超时跳过记忆注入以免拖慢首 token；0 = 不限
 
 
 class TokenPoolConfig(BaseModel):
@@ -180,6 +208,27 @@ class TokenPoolConfig(BaseModel):
     dead_threshold: int = 10  # 连续错误多少次标记为DEAD
 
 
+class TracesConfig(BaseModel):
+    """Trace 事件生命周期配置（0 表示关闭对应规则）。"""
+    retention_days: int = 30  # 原始事件保留天数，超期删除（请求摘要保留）
+    max_events: int = 200000  # 原始事件总量上限，超出删除最旧事件
+    compress_after_days: int = 3  # 早于该天数的事件负载压缩存储
+    maintenance_every: int = 500  # 每写入多少条事件执行一次清理
+
+
+class BusConfig(BaseModel):
+    """消息总线配置（入站按优先级通道排队：system > interactive > background）"""
+    max_inbound: int = 1000  # 每个优先级通道的内存队列上限
+    max_outbound: int = 1000  # 出站队列上限（满时发布方等待）
+    overflow: Literal["reject", "drop_oldest", "spill"] = "spill"  # 入站通道满时的处理策略
+    channel_lanes: dict[str, str] = Field(default_factory=dict)  # 通道到优先级通道的映射，如 {"wecom": "background"}
+    outbound_channel_queue: int = 100  # 每个通道的发送队列上限（满时丢弃并记录）
+    outbound_max_retries: int = 3  # 发送失败的重试次数
+    outbound_retry_base: float = 0.5  # 重试退避基准秒数（指数增长并带随机抖动）
+    outbound_rate: float = 0.0  # 每个通道每秒最多发送条数（0 = 不限）
+    outbound_channel_rates: dict[str, float] = Field(default_factory=dict)  # 按通道覆盖发送速率，如 {"telegram": 20}
+
+
 class Config(BaseSettings):
     """Root configuration for solopreneur."""
     agents: AgentsConfig = Field(default_factory=AgentsConfig)
@@ -189,6 +238,8 @@ class Config(BaseSettings):
     tools: ToolsConfig = Field(default_factory=ToolsConfig)
     memory_search: MemorySearchConfig = Field(default_factory=MemorySearchConfig)
     token_pool: TokenPoolConfig = Field(default_factory=TokenPoolConfig)
+    traces: TracesConfig = Field(default_factory=TracesConfig)
+    bus: BusConfig = Field(default_factory=BusConfig)
     
     @property
     def workspace_path(self) -> Path:
@@ -36,6 +36,8 @@ class ComponentManager:
         self._message_bus: Optional = None
         self._agent_manager: Optional = None
         self._mcp_manager: Optional = None
+        self._trace_persistence: Optional = None
+        self._project_manager: Optional = None
 
         self._initialized = True
         logger.debug("ComponentManager initialized")
@@ -122,9 +124,35 @@ class ComponentManager:
         """获取消息总线"""
         if self._message_bus is None:
             from solopreneur.bus.queue import MessageBus
-            self._message_bus = MessageBus()
+            self._message_bus = MessageBus.from_config(self.get_config().bus)
         return self._message_bus
 
+    # ==================== Trace Persistence ====================
+
+    def get_trace_persistence(self):
+        """获取 Trace 持久化服务（按配置执行保留/压缩策略）"""
+        if self._trace_persistence is None:
+            from solopreneur.storage.services import TracePersistence, TraceRetentionPolicy
+            traces_cfg = self.get_config().traces
+            self._trace_persistence = TracePersistence(
+                retention=TraceRetentionPolicy(
+                    retention_days=traces_cfg.retention_days,
+                    max_events=traces_cfg.max_events,
+                    compress_after_days=traces_cfg.compress_after_days,
+                    maintenance_every=traces_cfg.maintenance_every,
+                )
+            )
+        return self._trace_persistence
+
+    # ==================== Project Manager ====================
+
+    def get_project_manager(self):
+        """获取项目管理器（进程内共享，项目常驻内存）"""
+        if self._project_manager is None:
+            from solopreneur.projects.manager import ProjectManager
+            self._project_manager = ProjectManager()
+        return self._project_manager
+
     # ==================== Agent Manager ====================
 
     def get_agent_manager(self):
@@ -142,6 +170,10 @@ class ComponentManager:
 
     # ==================== Agent Loop ====================
 
+    def peek_agent_loop(self):
+        """返回已创建的 AgentLoop（不触发创建）"""
+        return self._agent_loop
+
     async def get_agent_loop(self):
         """获取或创建 AgentLoop（异步）"""
         if self._agent_loop is not None:
@@ -205,6 +237,7 @@ class ComponentManager:
             "top_k": memory_search_cfg.top_k,
             "min_score": memory_search_cfg.min_score,
             "auto_index_on_start": memory_search_cfg.auto_index_on_start,
+            "retrieval_timeout": memory_search_cfg.retrieval_timeout,
             "providers": providers_dict,
         }
 
@@ -216,12 +249,19 @@ class ComponentManager:
             max_iterations=config.agents.defaults.max_tool_iterations,
             brave_api_key=config.tools.web.search.api_key or None,
             exec_config=config.tools.exec,
+            tool_router_config=config.tools.router,
+            budget_config=config.agents.defaults.budget,
+            tokenizer=config.agents.defaults.tokenizer,
+            rolling_summary=config.agents.defaults.rolling_summary,
+            background_compaction_ratio=config.agents.defaults.background_compaction_ratio,
             max_session_tokens=config.agents.defaults.max_tokens_per_session,
             max_total_time=config.agents.defaults.agent_timeout,
             validator_config=validator_config,
             memory_search_config=memory_search_config,
             history_window=config.agents.defaults.history_window,
             mcp_manager=await self._get_mcp_manager(config),
+            max_concurrency=config.gateway.max_concurrency,
+            channel_concurrency=config.gateway.channel_concurrency,
         )
 
         return self._agent_loop
@@ -262,6 +302,22 @@ class ComponentManager:
                 logger.error(f"Error stopping MCP manager: {e}")
             self._mcp_manager = None
 
+        try:
+            from solopreneur.storage.usage_recorder import peek_usage_recorder
+
+            recorder = peek_usage_recorder()
+            if recorder is not None:
+                await recorder.close()
+                logger.info("Usage recorder flushed")
+        except Exception as e:
+            logger.error(f"Error flushing usage recorder: {e}")
+
+        if self._message_bus:
+            try:
+                self._message_bus.close()
+            except Exception as e:
+                logger.error(f"Error closing message bus: {e}")
+
         self._agent_loop = None
         self._llm_provider = None
         self._message_bus = None
@@ -277,6 +333,7 @@ class ComponentManager:
         self._message_bus = None
         self._agent_manager = None
         self._mcp_manager = None
+        self._project_manager = None
         # 不重置 _copilot_provider，保持认证状态
         logger.debug("ComponentManager reset complete")
 
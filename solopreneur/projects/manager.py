@@ -5,13 +5,16 @@ import subprocess
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, List, Optional
 from urllib.parse import urlparse, urlunparse
 from loguru import logger
 
 from solopreneur.storage import GitCredentialPersistence, ProjectPersistence
 from .models import Project, ProjectCreate, ProjectUpdate, ProjectSource, ProjectStatus, GitInfo, ProjectEnvVar
 
+# 项目变更监听器: (事件类型 created/updated/deleted, 项目对象)
+ProjectChangeListener = Callable[[str, Project], None]
+
 
 class ProjectManager:
     """
@@ -20,6 +23,9 @@ class ProjectManager:
     管理项目配置存储在 SQLite
     项目代码存储在各自指定的 path 中
     Git 凭证存储在 SQLite git_credentials 表
+
+    进程内共享单个实例（ComponentManager.get_project_manager），项目常驻内存；
+    修改只标记脏项目并按项目单事务写回，变更通过 subscribe 注册的监听器广播。
     """
     
     def __init__(self, data_dir: Optional[Path] = None):
@@ -37,6 +43,8 @@ class ProjectManager:
         self.storage = ProjectPersistence(db_path=self.data_dir / "solopreneur.db")
         self.credential_store = GitCredentialPersistence(db_path=self.data_dir / "solopreneur.db")
         self._projects: dict[str, Project] = {}
+        self._dirty: set[str] = set()
+        self._listeners: list[ProjectChangeListener] = []
         self._load_projects()
     
     def _load_projects(self):
@@ -61,14 +69,52 @@ class ProjectManager:
         else:
             logger.info(f"Loaded {len(self._projects)} projects")
     
+    def _mark_dirty(self, project_id: str):
+        """标记项目待写回。"""
+        self._dirty.add(project_id)
+
     def _save_projects(self):
-        """保存项目列表到 SQLite。"""
-        try:
-            for project in self._projects.values():
+        """将脏项目写回 SQLite（每个项目一个事务，未变更的项目不写）。"""
+        for project_id in sorted(self._dirty):
+            project = self._projects.get(project_id)
+            if project is None:
+                self._dirty.discard(project_id)
+                continue
+            try:
                 self.storage.save(project.to_dict())
-        except Exception as e:
-            logger.error(f"Failed to save projects to SQLite: {e}")
-            raise
+            except Exception as e:
+                logger.error(f"Failed to save project {project_id} to SQLite: {e}")
+                raise
+            self._dirty.discard(project_id)
+
+    def subscribe(self, listener: ProjectChangeListener) -> Callable[[], None]:
+        """
+        注册项目变更监听器
+
+        Returns:
+            取消注册的函数
+        """
+        self._listeners.append(listener)
+
+        def unsubscribe():
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+        return unsubscribe
+
+    def _notify(self, event: str, project: Project):
+        """广播项目变更（监听器异常不影响主流程）。"""
+        for listener in list(self._listeners):
+            try:
+                listener(event, project)
+            except Exception as e:
+                logger.warning(f"Project change listener failed: {e}")
+
+    def _commit(self, project: Project, event: str = "updated"):
+        """写回单个项目并广播变更。"""
+        self._mark_dirty(project.id)
+        self._save_projects()
+        self._notify(event, project)
     
     def _create_default_project(self):
         """创建默认项目"""
@@ -86,6 +132,7 @@ class ProjectManager:
             updated_at=datetime.now(),
         )
         self._projects[project.id] = project
+        self._mark_dirty(project.id)
         self._save_projects()
         logger.info("Created default project")
     
@@ -279,7 +326,7 @@ class ProjectManager:
         )
         
         self._projects[project_id] = project
-        self._save_projects()
+        self._commit(project, "created")
         
         logger.info(f"Created project: {project.name} ({project.id})")
         return project
@@ -309,7 +356,7 @@ class ProjectManager:
             project.env_vars = data.env_vars
         
         project.updated_at = datetime.now()
-        self._save_projects()
+        self._commit(project)
         
         logger.info(f"Updated project: {project.name} ({project.id})")
         return project
@@ -322,7 +369,7 @@ class ProjectManager:
 
         project.env_vars = env_vars
         project.updated_at = datetime.now()
-        self._save_projects()
+        self._commit(project)
         logger.info(f"Updated env vars for project: {project.name} ({project.id}), count={len(env_vars)}")
         return project
 
@@ -350,7 +397,7 @@ class ProjectManager:
             return False, project
 
         project.updated_at = datetime.now()
-        self._save_projects()
+        self._commit(project)
         logger.info(f"Deleted env var '{key}' from project: {project.name} ({project.id})")
         return True, project
     
@@ -387,8 +434,9 @@ class ProjectManager:
         self._save_git_credentials(project_id, None, None)
         
         del self._projects[project_id]
+        self._dirty.discard(project_id)
         self.storage.delete(project_id)
-        self._save_projects()
+        self._notify("deleted", project)
         
         logger.info(f"Deleted project: {project.name} ({project.id})")
         return True
@@ -538,7 +586,7 @@ class ProjectManager:
                     project.git_info.last_commit = commit_result.stdout.strip()
 
                 project.updated_at = datetime.now()
-                self._save_projects()
+                self._commit(project)
 
                 logger.info(f"Successfully pulled updates for: {project.name}")
                 return {
@@ -4,6 +4,46 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from typing import Any
 
+# Hint set by the context builder on the system message: character offsets
+# where its stable prefix segments end (static, per-session). Providers that
+# support explicit prompt caching turn them into cache breakpoints; all
+# providers drop the key before sending.
+CACHE_BREAKPOINTS_KEY = "cache_breakpoints"
+
+
+def strip_message_hints(messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Return messages without internal hint keys (copies only the messages that carry one)."""
+    return [
+        {k: v for k, v in m.items() if k != CACHE_BREAKPOINTS_KEY} if CACHE_BREAKPOINTS_KEY in m else m
+        for m in messages
+    ]
+
+
+def normalize_usage(raw: Any) -> dict[str, int]:
+    """
+    Normalize a provider usage payload (object or dict) to plain token counts.
+
+    cached_tokens is the part of prompt_tokens served from the provider's
+    prompt cache (OpenAI prompt_tokens_details.cached_tokens, Anthropic
+    cache_read_input_tokens).
+    """
+    if not raw:
+        return {}
+
+    def get(obj: Any, name: str) -> Any:
+        return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+    usage = {
+        "prompt_tokens": int(get(raw, "prompt_tokens") or 0),
+        "completion_tokens": int(get(raw, "completion_tokens") or 0),
+        "total_tokens": int(get(raw, "total_tokens") or 0),
+    }
+    details = get(raw, "prompt_tokens_details")
+    cached = (get(details, "cached_tokens") if details else None) or get(raw, "cache_read_input_tokens")
+    if isinstance(cached, (int, float)) and cached:
+        usage["cached_tokens"] = int(cached)
+    return usage
+
 
 @dataclass
 class ToolCallRequest:
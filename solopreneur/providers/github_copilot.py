@@ -28,6 +28,8 @@ from solopreneur.providers.base import (
     LLMProvider,
     LLMResponse,
     ToolCallRequest,
+    normalize_usage,
+    strip_message_hints,
 )
 from solopreneur.providers.exceptions import LLMInvalidResponseError, LLMRateLimitError
 from solopreneur.providers.token_pool import TokenPool, TokenSlot, SlotState
@@ -581,7 +583,7 @@ class GitHubCopilotProvider(LLMProvider):
         logger.info(f"[GitHubCopilot] 原始模型: {original_model} → 规范化后: {normalized_model}")
 
         payload = {
-            "messages": messages,
+            "messages": strip_message_hints(messages),
             "model": normalized_model,
             "temperature": temperature,
             "max_tokens": max_tokens,
@@ -709,7 +711,7 @@ class GitHubCopilotProvider(LLMProvider):
                     ToolCallRequest(id=tc["id"], name=tc["function"]["name"], arguments=args)
                 )
 
-        usage = data.get("usage", {})
+        usage = normalize_usage(data.get("usage"))
 
         return LLMResponse(
             content=content,
@@ -783,7 +785,7 @@ class GitHubCopilotProvider(LLMProvider):
         model = self._normalize_model_name(model or self.get_default_model())
 
         payload = {
-            "messages": messages,
+            "messages": strip_message_hints(messages),
             "model": model,
             "temperature": temperature,
             "max_tokens": max_tokens,
@@ -876,7 +878,7 @@ class GitHubCopilotProvider(LLMProvider):
                         continue
 
                     if "usage" in chunk:
-                        usage = chunk["usage"]
+                        usage = normalize_usage(chunk["usage"])
 
                     if "choices" not in chunk or not chunk["choices"]:
                         continue
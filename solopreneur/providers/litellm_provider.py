@@ -8,7 +8,14 @@ from loguru import logger
 import litellm
 from litellm import acompletion
 
-from solopreneur.providers.base import LLMProvider, LLMResponse, ToolCallRequest
+from solopreneur.providers.base import (
+    CACHE_BREAKPOINTS_KEY,
+    LLMProvider,
+    LLMResponse,
+    ToolCallRequest,
+    normalize_usage,
+    strip_message_hints,
+)
 from solopreneur.providers.exceptions import (
     LLMAPIError,
     LLMAuthenticationError,
@@ -108,7 +115,7 @@ class LiteLLMProvider(LLMProvider):
         """构建 acompletion 调用参数。"""
         kwargs: dict[str, Any] = {
             "model": model,
-            "messages": messages,
+            "messages": self._prepare_messages(model, messages),
             "max_tokens": max_tokens,
             "temperature": temperature,
         }
@@ -121,6 +128,39 @@ class LiteLLMProvider(LLMProvider):
             kwargs["tool_choice"] = "auto"
         return kwargs
 
+    @staticmethod
+    def _supports_cache_control(model: str) -> bool:
+        """Anthropic 系模型（含 OpenRouter / Bedrock 上的 Claude）支持显式 cache_control。"""
+        name = model.lower()
+        return not name.startswith("hosted_vllm/") and ("claude" in name or "anthropic" in name)
+
+    def _prepare_messages(self, model: str, messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        转换消息中的缓存提示。
+
+        支持 cache_control 的模型：system 消息按稳定前缀断点拆分为多个文本块并标记缓存，
+        最后一条用户消息也标记缓存（工具循环内的后续迭代复用整段历史）；
+        其余模型（OpenAI 等自动前缀缓存）只移除提示字段。
+        """
+        if not self._supports_cache_control(model):
+            return strip_message_hints(messages)
+
+        prepared = []
+        for m in messages:
+            breakpoints = m.get(CACHE_BREAKPOINTS_KEY)
+            m = {k: v for k, v in m.items() if k != CACHE_BREAKPOINTS_KEY}
+            if m.get("role") == "system" and isinstance(m.get("content"), str) and m["content"]:
+                m["content"] = _split_cached_blocks(m["content"], breakpoints or [len(m["content"])])
+            prepared.append(m)
+
+        for i in range(len(prepared) - 1, -1, -1):
+            m = prepared[i]
+            if m.get("role") == "user":
+                if isinstance(m.get("content"), str) and m["content"]:
+                    prepared[i] = {**m, "content": _split_cached_blocks(m["content"], [len(m["content"])])}
+                break
+        return prepared
+
     def _handle_error(self, e: Exception, model: str):
         """统一错误处理。"""
         error_msg = str(e).lower()
@@ -209,11 +249,7 @@ class LiteLLMProvider(LLMProvider):
                 # 处理没有 choices 的 chunk（可能只有 usage）
                 if not chunk.choices:
                     if hasattr(chunk, "usage") and chunk.usage:
-                        usage = {
-                            "prompt_tokens": getattr(chunk.usage, "prompt_tokens", 0) or 0,
-                            "completion_tokens": getattr(chunk.usage, "completion_tokens", 0) or 0,
-                            "total_tokens": getattr(chunk.usage, "total_tokens", 0) or 0,
-                        }
+                        usage = normalize_usage(chunk.usage)
                         logger.info(f"LiteLLM stream: chunk #{chunk_count} with no choices, usage: {usage}")
                     continue
 
@@ -246,11 +282,7 @@ class LiteLLMProvider(LLMProvider):
 
                 # Usage
                 if hasattr(chunk, "usage") and chunk.usage:
-                    usage = {
-                        "prompt_tokens": getattr(chunk.usage, "prompt_tokens", 0) or 0,
-                        "completion_tokens": getattr(chunk.usage, "completion_tokens", 0) or 0,
-                        "total_tokens": getattr(chunk.usage, "total_tokens", 0) or 0,
-                    }
+                    usage = normalize_usage(chunk.usage)
                     logger.info(f"LiteLLM stream: chunk #{chunk_count} has usage: {usage}")
 
             logger.info(f"LiteLLM stream completed: {chunk_count} chunks, final usage: {usage}")
@@ -302,11 +334,7 @@ class LiteLLMProvider(LLMProvider):
 
         usage = {}
         if hasattr(response, "usage") and response.usage:
-            usage = {
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens,
-            }
+            usage = normalize_usage(response.usage)
         else:
             # 调试：记录没有 usage 的情况
             logger.warning(f"LLM response missing usage data. Response type: {type(response)}")
@@ -323,3 +351,16 @@ class LiteLLMProvider(LLMProvider):
     def get_default_model(self) -> str:
         """Get the default model."""
         return self.default_model
+
+
+def _split_cached_blocks(text: str, breakpoints: list[int]) -> list[dict[str, Any]]:
+    """按断点把文本拆成内容块，每个断点结束的块带 cache_control（Anthropic 最多 4 个断点）。"""
+    blocks: list[dict[str, Any]] = []
+    start = 0
+    for end in sorted({b for b in breakpoints if 0 < b <= len(text)}):
+        if end > start:
+            blocks.append({"type": "text", "text": text[start:end], "cache_control": {"type": "ephemeral"}})
+            start = end
+    if start < len(text):
+        blocks.append({"type": "text", "text": text[start:]})
+    return blocks
@@ -1,5 +1,6 @@
 """Session management for conversation history."""
 
+import asyncio
 import hashlib
 import secrets
 from pathlib import Path
@@ -139,7 +140,23 @@ class SessionManager:
             return session
         
         # Try to load from persistence
-        session = self._load(key)
+        return self._admit(key, self._load(key))
+    
+    async def aget_or_create(self, key: str) -> Session:
+        """
+        Async variant of get_or_create: a cache miss is loaded from SQLite in a
+        worker thread so the event loop keeps serving other sessions.
+        """
+        if key in self._cache:
+            return self.get_or_create(key)
+        loaded = await asyncio.to_thread(self._load, key)
+        # 等待期间可能已被其他协程加载
+        if key in self._cache:
+            return self.get_or_create(key)
+        return self._admit(key, loaded)
+    
+    def _admit(self, key: str, session: Session | None) -> Session:
+        """校验加载结果并放入缓存。"""
         if session is None:
             session = Session(key=key)
         else:
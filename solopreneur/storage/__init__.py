@@ -3,21 +3,32 @@
 from solopreneur.storage.sqlite_store import SQLiteStore
 from solopreneur.storage.services import (
 	AppKVPersistence,
+	CompactionSummaryPersistence,
 	GitCredentialPersistence,
+	MetricsQueryService,
 	ProjectPersistence,
 	SessionPersistence,
 	SubagentTaskPersistence,
+	TracePersistence,
+	TraceRetentionPolicy,
 	UsagePersistence,
 )
+from solopreneur.storage.usage_recorder import UsageRecorder, get_usage_recorder
 
 __all__ = [
 	"SQLiteStore",
 	"AppKVPersistence",
+	"CompactionSummaryPersistence",
 	"GitCredentialPersistence",
+	"MetricsQueryService",
 	"SessionPersistence",
 	"ProjectPersistence",
 	"UsagePersistence",
 	"SubagentTaskPersistence",
+	"TracePersistence",
+	"TraceRetentionPolicy",
+	"UsageRecorder",
+	"get_usage_recorder",
 ]
 
 # Lazy import for memory engine (avoid import overhead when not used)
@@ -2,11 +2,18 @@
 
 from __future__ import annotations
 
+import asyncio
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import Any
 
+from loguru import logger
+
 from solopreneur.storage.sqlite_store import SQLiteStore
+from solopreneur.storage.usage_recorder import UsageRecorder, peek_usage_recorder
 
 
 class SessionPersistence:
@@ -74,6 +81,8 @@ class UsagePersistence:
         total_tokens: int,
         duration_ms: int = 0,
         is_stream: bool = False,
+        cancelled: bool = False,
+        cached_tokens: int = 0,
     ) -> None:
         self._store.record_llm_usage(
             session_key=session_key,
@@ -83,7 +92,294 @@ class UsagePersistence:
             total_tokens=total_tokens,
             duration_ms=duration_ms,
             is_stream=is_stream,
+            cancelled=cancelled,
+            cached_tokens=cached_tokens,
+        )
+
+
+class MetricsQueryService:
+    """
+    llm_usage / subagent_tasks 聚合查询层。
+
+    指标 API、MetricsInspectTool 与仪表盘共用此服务。查询优先读取小时/日汇总表，
+    窗口起点不足一小时的零头再用原始表的索引范围查询补齐，结果与直接聚合原始表一致；
+    按完整 session_key 过滤时汇总表无法覆盖，回退到原始表范围查询。
+    UsageRecorder 缓冲中尚未落库的记录在查询时一并合入，统计不受批量写入延迟影响。
+    """
+
+    USAGE_FIELDS = (
+        "calls", "prompt_tokens", "completion_tokens", "total_tokens", "duration_ms", "stream_calls",
+        "cached_tokens",
+    )
+
+    def __init__(
+        self,
+        store: SQLiteStore | None = None,
+        db_path: Path | None = None,
+        recorder: UsageRecorder | None = None,
+    ):
+        self._store = store or SQLiteStore(db_path)
+        self._recorder = recorder
+
+    @staticmethod
+    def since_days(days: int) -> int:
+        """最近 N 天窗口的起点（epoch 秒）。"""
+        return int(time.time()) - days * 86400
+
+    @staticmethod
+    def start_of_day(ts: int) -> int:
+        """时间戳所在本地日的零点（epoch 秒）。"""
+        dt = datetime.fromtimestamp(ts)
+        return int(dt.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+    @classmethod
+    def start_of_today(cls) -> int:
+        """本地时区今日零点（epoch 秒）。"""
+        return cls.start_of_day(int(time.time()))
+
+    @staticmethod
+    def _next_hour(ts: int) -> int:
+        return ts if ts % 3600 == 0 else ts - ts % 3600 + 3600
+
+    @staticmethod
+    def _with_avg_duration(row: dict[str, Any]) -> dict[str, Any]:
+        calls = row.get("calls", 0)
+        row["avg_duration_ms"] = row.pop("duration_ms", 0) // calls if calls else 0
+        return row
+
+    def _pending_usage(self):
+        """未落库 usage 记录的一致性快照（记录器写入其他数据库时为空）。"""
+        recorder = self._recorder or peek_usage_recorder()
+        if recorder is None or Path(recorder.db_path).resolve() != Path(self._store.db_path).resolve():
+            return nullcontext([])
+        return recorder.consistent_tail()
+
+    @staticmethod
+    def _match_tail(
+        tail: list[dict[str, Any]],
+        since_ts: int,
+        session_key: str | None = None,
+        model: str | None = None,
+        session_prefix: str | None = None,
+    ) -> list[dict[str, Any]]:
+        return [
+            row for row in tail
+            if row["created_ts"] >= since_ts
+            and (not session_key or row["session_key"] == session_key)
+            and (not model or row["model"] == model)
+            and (session_prefix is None or SQLiteStore._session_prefix(row["session_key"]) == session_prefix)
+        ]
+
+    @staticmethod
+    def _add_usage(target: dict[str, Any], row: dict[str, Any]) -> None:
+        target["calls"] = target.get("calls", 0) + 1
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens", "duration_ms", "cached_tokens"):
+            target[field] = target.get(field, 0) + row[field]
+        target["stream_calls"] = target.get("stream_calls", 0) + row["is_stream"]
+
+    def _merge_tail_buckets(
+        self,
+        rows: list[dict[str, Any]],
+        tail: list[dict[str, Any]],
+        granularity: str,
+        since_ts: int,
+        until_ts: int | None = None,
+        bucket_seconds: int | None = None,
+        group_by: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """按 query_usage_rollup 相同的分桶规则把内存尾部累加进结果。"""
+        index = {(row["bucket"], row.get(group_by) if group_by else None): row for row in rows}
+        for record in tail:
+            ts = record["created_ts"]
+            base = ts - ts % 3600 if granularity == "hour" else self.start_of_day(ts)
+            if base < since_ts or (until_ts is not None and base >= until_ts):
+                continue
+            bucket = since_ts + (base - since_ts) // bucket_seconds * bucket_seconds if bucket_seconds else since_ts
+            group = None
+            if group_by == "model":
+                group = record["model"]
+            elif group_by == "session_prefix":
+                group = SQLiteStore._session_prefix(record["session_key"])
+            row = index.get((bucket, group))
+            if row is None:
+                row = {"bucket": bucket, **({group_by: group} if group_by else {})}
+                row.update(dict.fromkeys(self.USAGE_FIELDS, 0))
+                index[(bucket, group)] = row
+                rows.append(row)
+            self._add_usage(row, record)
+        rows.sort(key=lambda row: row["bucket"])
+        return rows
+
+    def _usage_window(self, since_ts: int, model: str | None = None) -> dict[str, int]:
+        """[since_ts, now] 的精确用量：整点之后读汇总表，整点之前的零头读原始表。"""
+        edge = self._next_hour(since_ts)
+        totals = dict.fromkeys(self.USAGE_FIELDS, 0)
+        parts = self._store.query_usage_rollup("hour", edge, model=model)
+        if edge > since_ts:
+            parts.append(self._store.query_usage_summary(since_ts, model=model, until_ts=edge))
+        for part in parts:
+            for field in self.USAGE_FIELDS:
+                totals[field] += part.get(field, 0)
+        return totals
+
+    def usage_summary(
+        self,
+        days: int,
+        session_key: str | None = None,
+        model: str | None = None,
+    ) -> dict[str, Any]:
+        since_ts = self.since_days(days)
+        with self._pending_usage() as tail:
+            if session_key:
+                row = self._store.query_usage_summary(since_ts, session_key, model)
+            else:
+                row = self._usage_window(since_ts, model=model)
+            for record in self._match_tail(tail, since_ts, session_key, model):
+                self._add_usage(row, record)
+        return self._with_avg_duration(row)
+
+    def usage_daily(
+        self,
+        days: int,
+        session_key: str | None = None,
+        model: str | None = None,
+        limit: int = 30,
+    ) -> list[dict[str, Any]]:
+        """按本地自然日汇总（不按会话过滤时窗口首日按整日统计）。"""
+        since_ts = self.since_days(days)
+        with self._pending_usage() as tail:
+            if session_key:
+                rows = self._store.query_usage_daily(since_ts, session_key, model, limit)
+                by_day = {row["day"]: row for row in rows}
+                for record in self._match_tail(tail, since_ts, session_key, model):
+                    day = record["created_at"][:10]
+                    row = by_day.setdefault(day, {"day": day})
+                    self._add_usage(row, record)
+                    row.pop("stream_calls", None)
+                rows = sorted(by_day.values(), key=lambda row: row["day"], reverse=True)[:limit]
+                return [self._with_avg_duration(row) for row in rows]
+
+            day_start = self.start_of_day(since_ts)
+            rows = self._store.query_usage_rollup(
+                "day", day_start, bucket_seconds=86400, model=model,
+            )
+            rows = self._merge_tail_buckets(
+                rows, self._match_tail(tail, day_start, model=model), "day", day_start,
+                bucket_seconds=86400,
+            )
+        result = []
+        for row in reversed(rows[-limit:]):
+            bucket = row.pop("bucket")
+            row.pop("stream_calls", None)
+            result.append({
+                "day": datetime.fromtimestamp(bucket).strftime("%Y-%m-%d"),
+                **self._with_avg_duration(row),
+            })
+        return result
+
+    def usage_buckets(
+        self,
+        since_ts: int,
+        bucket_seconds: int,
+        until_ts: int | None = None,
+        group_by: str | None = None,
+        model: str | None = None,
+        session_prefix: str | None = None,
+    ) -> dict[str, Any]:
+        """
+        任意桶宽的用量时间序列。
+
+        桶宽为整日倍数时读日汇总表（按本地零点对齐），否则读小时汇总表
+        （桶宽向上取整到小时）。
+        """
+        if bucket_seconds >= 86400 and bucket_seconds % 86400 == 0:
+            granularity = "day"
+            since_ts = self.start_of_day(since_ts)
+        else:
+            granularity = "hour"
+            bucket_seconds = max(3600, self._next_hour(bucket_seconds))
+            since_ts -= since_ts % 3600
+        with self._pending_usage() as tail:
+            rows = self._store.query_usage_rollup(
+                granularity,
+                since_ts,
+                until_ts=until_ts,
+                bucket_seconds=bucket_seconds,
+                group_by=group_by,
+                model=model,
+                session_prefix=session_prefix,
+            )
+            rows = self._merge_tail_buckets(
+                rows,
+                self._match_tail(tail, since_ts, model=model, session_prefix=session_prefix),
+                granularity,
+                since_ts,
+                until_ts=until_ts,
+                bucket_seconds=bucket_seconds,
+                group_by=group_by,
+            )
+        for row in rows:
+            row["bucket_start"] = datetime.fromtimestamp(row["bucket"]).isoformat()
+            self._with_avg_duration(row)
+        return {
+            "granularity": granularity,
+            "bucket_seconds": bucket_seconds,
+            "since_ts": since_ts,
+            "rows": rows,
+        }
+
+    def usage_totals(self) -> dict[str, int]:
+        """全量调用次数与 Token 合计。"""
+        with self._pending_usage() as tail:
+            rows = self._store.query_usage_rollup("day", 0)
+            row = rows[0] if rows else {}
+            for record in tail:
+                self._add_usage(row, record)
+        return {"calls": row.get("calls", 0), "total_tokens": row.get("total_tokens", 0)}
+
+    def requests_today(self) -> int:
+        today = self.start_of_today()
+        with self._pending_usage() as tail:
+            rows = self._store.query_usage_rollup("day", today)
+            pending = len(self._match_tail(tail, today))
+        return (rows[0]["calls"] if rows else 0) + pending
+
+    def task_summary(self, days: int, status: str | None = None) -> dict[str, Any]:
+        since_ts = self.since_days(days)
+        edge = self._next_hour(since_ts)
+        by_status: dict[str, int] = {}
+        for row in self._store.query_task_rollup("hour", edge, status=status):
+            by_status[row["status"]] = by_status.get(row["status"], 0) + row["count"]
+        if edge > since_ts:
+            for task_status, count in self._store.query_task_counts(
+                since_ts, status, until_ts=edge
+            ).items():
+                by_status[task_status] = by_status.get(task_status, 0) + count
+        by_status = dict(sorted(by_status.items(), key=lambda item: item[1], reverse=True))
+        return {"total": sum(by_status.values()), "by_status": by_status}
+
+    def task_daily(
+        self,
+        days: int,
+        status: str | None = None,
+        limit: int = 30,
+    ) -> list[dict[str, Any]]:
+        rows = self._store.query_task_rollup(
+            "day", self.start_of_day(self.since_days(days)), status=status, bucket_seconds=86400,
         )
+        rows.sort(key=lambda row: (-row["bucket"], -row["count"]))
+        return [
+            {
+                "day": datetime.fromtimestamp(row["bucket"]).strftime("%Y-%m-%d"),
+                "status": row["status"],
+                "count": row["count"],
+            }
+            for row in rows[:limit]
+        ]
+
+    def rebuild_rollups(self) -> None:
+        """由原始表重建汇总表。"""
+        self._store.rebuild_rollups()
 
 
 class SubagentTaskPersistence:
@@ -131,6 +427,22 @@ class AppKVPersistence:
         return self._store.delete_kv(key)
 
 
+class CompactionSummaryPersistence:
+    """Persistence service for per-session rolling compaction summaries."""
+
+    def __init__(self, store: SQLiteStore | None = None):
+        self._store = store or SQLiteStore()
+
+    def load(self, session_key: str) -> dict[str, Any] | None:
+        return self._store.load_compaction_summary(session_key)
+
+    def save(self, session_key: str, summary: str, covered: list[str], compactions: int) -> None:
+        self._store.save_compaction_summary(session_key, summary, covered, compactions)
+
+    def delete(self, session_key: str) -> bool:
+        return self._store.delete_compaction_summary(session_key)
+
+
 class GitCredentialPersistence:
     """Persistence service for git credentials."""
 
@@ -147,11 +459,28 @@ class GitCredentialPersistence:
         return self._store.delete_git_credentials(project_id)
 
 
+@dataclass
+class TraceRetentionPolicy:
+    """Trace 事件生命周期策略（0 表示不启用对应规则）。"""
+
+    retention_days: int = 30  # 原始事件最长保留天数
+    max_events: int = 200000  # 原始事件总量上限
+    compress_after_days: int = 3  # 早于该天数的事件 data_json 压缩存储
+    maintenance_every: int = 500  # 每写入多少条事件执行一次维护
+
+
 class TracePersistence:
     """Persistence service for trace events (audit trail)."""
 
-    def __init__(self, store: SQLiteStore | None = None):
+    def __init__(
+        self,
+        store: SQLiteStore | None = None,
+        retention: TraceRetentionPolicy | None = None,
+    ):
         self._store = store or SQLiteStore()
+        self._retention = retention
+        self._writes_since_maintenance = 0
+        self._maintenance_task: asyncio.Task | None = None
 
     def save_event(
         self,
@@ -170,9 +499,11 @@ class TracePersistence:
             project_id=project_id,
             agent_name=agent_name,
         )
+        self._after_write(1)
 
     def save_batch(self, events: list[dict[str, Any]]) -> None:
         self._store.save_trace_events_batch(events)
+        self._after_write(len(events))
 
     def load(
         self,
@@ -186,8 +517,48 @@ class TracePersistence:
             limit=limit,
         )
 
-    def list_requests(self, session_key: str) -> list[dict[str, Any]]:
-        return self._store.list_trace_requests(session_key)
+    def list_requests(self, session_key: str, limit: int = 200) -> list[dict[str, Any]]:
+        return self._store.list_trace_requests(session_key, limit=limit)
+
+    def get_request(self, session_key: str, request_id: str) -> dict[str, Any] | None:
+        return self._store.get_trace_request(session_key, request_id)
 
     def delete(self, session_key: str, request_id: str | None = None) -> int:
         return self._store.delete_trace_events(session_key, request_id)
+
+    def _after_write(self, count: int) -> None:
+        if self._retention is None or self._retention.maintenance_every <= 0:
+            return
+        self._writes_since_maintenance += count
+        if self._writes_since_maintenance < self._retention.maintenance_every:
+            return
+        self._writes_since_maintenance = 0
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            self._safe_maintenance()
+        elif self._maintenance_task is None or self._maintenance_task.done():
+            # 在事件循环中写入时，清理与压缩放到线程中执行，不阻塞事件循环
+            self._maintenance_task = loop.create_task(asyncio.to_thread(self._safe_maintenance))
+
+    def _safe_maintenance(self) -> None:
+        try:
+            self.run_maintenance()
+        except Exception as e:
+            logger.warning(f"Trace maintenance failed: {e}")
+
+    def run_maintenance(self) -> dict[str, int]:
+        """按保留策略清理并压缩原始事件，请求摘要不受影响。"""
+        policy = self._retention or TraceRetentionPolicy()
+        pruned = self._store.prune_trace_events(
+            max_age_days=policy.retention_days or None,
+            max_events=policy.max_events or None,
+        )
+        compressed = 0
+        if policy.compress_after_days > 0:
+            compressed = self._store.compress_trace_events(policy.compress_after_days)
+        if pruned or compressed:
+            logger.info(f"Trace maintenance: pruned={pruned}, compressed={compressed}")
+        return {"pruned": pruned, "compressed": compressed}
@@ -3,8 +3,12 @@
 from __future__ import annotations
 
 import json
+import os
 import sqlite3
-from datetime import datetime
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
 from pathlib import Path
 from threading import Lock
 from typing import Any
@@ -12,6 +16,28 @@ from typing import Any
 from loguru import logger
 
 
+def _pid_alive(pid: int) -> bool:
+    """进程是否仍在运行（判断总线实例是否已退出）。"""
+    if pid <= 0:
+        return False
+    if sys.platform == "win32":
+        import ctypes
+
+        # os.kill(pid, 0) 在 Windows 上会结束进程，改为尝试打开进程句柄
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
 class SQLiteStore:
     """Thread-safe SQLite storage backend."""
 
@@ -20,6 +46,8 @@ class SQLiteStore:
         self.data_dir.mkdir(parents=True, exist_ok=True)
         self.db_path = db_path or (self.data_dir / "solopreneur.db")
         self._lock = Lock()
+        # 已压缩事件的最高 id（AUTOINCREMENT 单调递增），后续压缩从其后开始扫描
+        self._trace_compress_mark = 0
         self._init_db()
 
     def _connect(self) -> sqlite3.Connection:
@@ -137,11 +165,111 @@ class SQLiteStore:
 
                 CREATE INDEX IF NOT EXISTS idx_trace_events_session_time
                 ON trace_events(session_key, created_at);
+
+                CREATE INDEX IF NOT EXISTS idx_trace_events_created
+                ON trace_events(created_at);
+
+                CREATE TABLE IF NOT EXISTS trace_requests (
+                    session_key TEXT NOT NULL,
+                    request_id TEXT NOT NULL,
+                    project_id TEXT,
+                    first_event_id INTEGER NOT NULL,
+                    last_event_id INTEGER NOT NULL,
+                    started_at TEXT NOT NULL,
+                    ended_at TEXT NOT NULL,
+                    event_count INTEGER NOT NULL DEFAULT 0,
+                    llm_calls INTEGER NOT NULL DEFAULT 0,
+                    tool_calls INTEGER NOT NULL DEFAULT 0,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    total_tokens INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    raw_pruned INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY(session_key, request_id)
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_trace_requests_session_order
+                ON trace_requests(session_key, first_event_id);
+
+                CREATE TABLE IF NOT EXISTS llm_usage_rollup (
+                    granularity TEXT NOT NULL,
+                    bucket_ts INTEGER NOT NULL,
+                    model TEXT NOT NULL,
+                    session_prefix TEXT NOT NULL,
+                    calls INTEGER NOT NULL DEFAULT 0,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    total_tokens INTEGER NOT NULL DEFAULT 0,
+                    duration_ms INTEGER NOT NULL DEFAULT 0,
+                    stream_calls INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY(granularity, bucket_ts, model, session_prefix)
+                );
+
+                CREATE TABLE IF NOT EXISTS subagent_task_rollup (
+                    granularity TEXT NOT NULL,
+                    bucket_ts INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY(granularity, bucket_ts, status)
+                );
+
+                CREATE TABLE IF NOT EXISTS bus_spill (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bus_id TEXT NOT NULL,
+                    lane TEXT NOT NULL,
+                    payload_json TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_bus_spill_lane
+                ON bus_spill(bus_id, lane, id);
+
+                CREATE TABLE IF NOT EXISTS bus_owners (
+                    bus_id TEXT PRIMARY KEY,
+                    pid INTEGER NOT NULL,
+                    started_at REAL NOT NULL
+                );
+
+                CREATE TABLE IF NOT EXISTS compaction_summaries (
+                    session_key TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    covered_json TEXT NOT NULL DEFAULT '[]',
+                    compactions INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL
+                );
                 """
             )
 
             # 兼容迁移：旧版本 projects 表没有 env_vars_json 字段
             self._ensure_column(conn, "projects", "env_vars_json", "TEXT")
+            # 兼容迁移：llm_usage / subagent_tasks 增加 epoch 秒时间戳列，供可走索引的范围查询
+            self._ensure_epoch_column(conn, "llm_usage", "created_ts", "created_at")
+            # 兼容迁移：llm_usage 增加 cancelled 列（回合被取消时的在途调用）
+            self._ensure_column(conn, "llm_usage", "cancelled", "INTEGER NOT NULL DEFAULT 0")
+            # 兼容迁移：prompt 中命中 Provider 前缀缓存的 token 数
+            self._ensure_column(conn, "llm_usage", "cached_tokens", "INTEGER NOT NULL DEFAULT 0")
+            self._ensure_column(conn, "llm_usage_rollup", "cached_tokens", "INTEGER NOT NULL DEFAULT 0")
+            self._ensure_epoch_column(conn, "subagent_tasks", "updated_ts", "updated_at")
+            conn.executescript(
+                """
+                CREATE INDEX IF NOT EXISTS idx_llm_usage_ts
+                ON llm_usage(created_ts);
+
+                CREATE INDEX IF NOT EXISTS idx_llm_usage_session_ts
+                ON llm_usage(session_key, created_ts);
+
+                CREATE INDEX IF NOT EXISTS idx_llm_usage_model_ts
+                ON llm_usage(model, created_ts);
+
+                CREATE INDEX IF NOT EXISTS idx_subagent_tasks_updated_ts
+                ON subagent_tasks(updated_ts);
+                """
+            )
+            # 兼容迁移：旧版本 trace_events 表没有压缩列
+            self._ensure_column(conn, "trace_events", "data_zlib", "BLOB")
+            self._backfill_trace_requests(conn)
+            if not conn.execute("SELECT 1 FROM llm_usage_rollup LIMIT 1").fetchone():
+                self._rebuild_rollups(conn)
 
     def _ensure_column(self, conn: sqlite3.Connection, table: str, column: str, column_type: str) -> None:
         """确保指定表存在指定列（幂等）。"""
@@ -150,6 +278,64 @@ class SQLiteStore:
         if column not in existing:
             conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
 
+    def _ensure_epoch_column(
+        self,
+        conn: sqlite3.Connection,
+        table: str,
+        column: str,
+        source_column: str,
+    ) -> None:
+        """确保 epoch 时间戳列存在，并由本地时间 ISO 列回填（幂等）。"""
+        self._ensure_column(conn, table, column, "INTEGER")
+        conn.execute(
+            f"""
+            UPDATE {table}
+            SET {column} = CAST(strftime('%s', {source_column}, 'utc') AS INTEGER)
+            WHERE {column} IS NULL
+            """
+        )
+
+    def _backfill_trace_requests(self, conn: sqlite3.Connection) -> None:
+        """从历史 trace_events 一次性生成请求摘要（仅在摘要表为空时执行）。"""
+        if conn.execute("SELECT 1 FROM trace_requests LIMIT 1").fetchone():
+            return
+        if not conn.execute("SELECT 1 FROM trace_events LIMIT 1").fetchone():
+            return
+        rows = conn.execute(
+            """
+            SELECT id, session_key, request_id, project_id, event_type, data_json, created_at
+            FROM trace_events
+            ORDER BY id ASC
+            """
+        ).fetchall()
+        events = []
+        for row in rows:
+            try:
+                data = json.loads(row["data_json"]) if row["data_json"] else {}
+            except json.JSONDecodeError:
+                data = {}
+            events.append((row["id"], {
+                "session_key": row["session_key"],
+                "request_id": row["request_id"],
+                "project_id": row["project_id"],
+                "event_type": row["event_type"],
+                "data": data,
+                "created_at": row["created_at"],
+            }))
+        self._upsert_trace_summaries(conn, events)
+        logger.info(f"Backfilled trace_requests from {len(events)} trace events")
+
+    @staticmethod
+    def _rollup_buckets(ts: int) -> list[tuple[str, int]]:
+        """返回时间戳所属的 (粒度, 桶起点)；日桶按本地零点对齐，与 created_at 日期一致。"""
+        day_start = datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0)
+        return [("hour", ts - ts % 3600), ("day", int(day_start.timestamp()))]
+
+    @staticmethod
+    def _session_prefix(session_key: str | None) -> str:
+        """会话键的通道前缀（如 web / cli / cron），用于按来源汇总。"""
+        return (session_key or "").split(":", 1)[0]
+
     @staticmethod
     def _to_iso(value: datetime | str | None) -> str:
         if value is None:
@@ -266,6 +452,7 @@ class SQLiteStore:
     def delete_session(self, key: str) -> bool:
         with self._lock, self._connect() as conn:
             result = conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            conn.execute("DELETE FROM compaction_summaries WHERE session_key = ?", (key,))
             return result.rowcount > 0
 
     def list_sessions(self) -> list[dict[str, Any]]:
@@ -387,27 +574,139 @@ class SQLiteStore:
         total_tokens: int,
         duration_ms: int = 0,
         is_stream: bool = False,
+        cancelled: bool = False,
+        cached_tokens: int = 0,
     ) -> None:
+        self.record_llm_usage_batch([{
+            "session_key": session_key,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": total_tokens,
+            "duration_ms": duration_ms,
+            "is_stream": is_stream,
+            "cancelled": cancelled,
+            "cached_tokens": cached_tokens,
+        }])
+
+    @staticmethod
+    def normalize_usage_row(record: dict[str, Any]) -> dict[str, Any]:
+        """规范化 usage 记录（缺省时间取当前时间），供批量写入与内存尾部统计共用。"""
+        created_ts = record.get("created_ts")
+        if created_ts is None:
+            created_ts = int(time.time())
+        return {
+            "session_key": record.get("session_key"),
+            "model": record["model"],
+            "prompt_tokens": max(int(record.get("prompt_tokens") or 0), 0),
+            "completion_tokens": max(int(record.get("completion_tokens") or 0), 0),
+            "total_tokens": max(int(record.get("total_tokens") or 0), 0),
+            "duration_ms": max(int(record.get("duration_ms") or 0), 0),
+            "is_stream": 1 if record.get("is_stream") else 0,
+            "cancelled": 1 if record.get("cancelled") else 0,
+            "cached_tokens": max(int(record.get("cached_tokens") or 0), 0),
+            "created_at": record.get("created_at") or datetime.fromtimestamp(created_ts).isoformat(),
+            "created_ts": int(created_ts),
+        }
+
+    def record_llm_usage_batch(self, records: list[dict[str, Any]]) -> None:
+        """在单个事务中写入多条 usage 记录并更新汇总表。"""
+        if not records:
+            return
+        rows = [self.normalize_usage_row(record) for record in records]
         with self._lock, self._connect() as conn:
-            conn.execute(
+            conn.executemany(
                 """
                 INSERT INTO llm_usage(
                     session_key, model, prompt_tokens, completion_tokens,
-                    total_tokens, duration_ms, is_stream, created_at
+                    total_tokens, duration_ms, is_stream, cancelled, cached_tokens, created_at, created_ts
+                )
+                VALUES(
+                    :session_key, :model, :prompt_tokens, :completion_tokens,
+                    :total_tokens, :duration_ms, :is_stream, :cancelled, :cached_tokens, :created_at, :created_ts
                 )
-                VALUES(?, ?, ?, ?, ?, ?, ?, ?)
                 """,
-                (
-                    session_key,
-                    model,
-                    max(int(prompt_tokens or 0), 0),
-                    max(int(completion_tokens or 0), 0),
-                    max(int(total_tokens or 0), 0),
-                    max(int(duration_ms or 0), 0),
-                    1 if is_stream else 0,
-                    datetime.now().isoformat(),
-                ),
+                rows,
+            )
+            self._apply_usage_rollups(conn, rows)
+
+    def _apply_usage_rollups(self, conn: sqlite3.Connection, rows: list[dict[str, Any]]) -> None:
+        """将新写入的 usage 行增量累加到小时/日汇总表。"""
+        deltas: dict[tuple[str, int, str, str], list[int]] = {}
+        for row in rows:
+            prefix = self._session_prefix(row["session_key"])
+            for granularity, bucket_ts in self._rollup_buckets(row["created_ts"]):
+                delta = deltas.setdefault((granularity, bucket_ts, row["model"], prefix), [0] * 7)
+                delta[0] += 1
+                delta[1] += row["prompt_tokens"]
+                delta[2] += row["completion_tokens"]
+                delta[3] += row["total_tokens"]
+                delta[4] += row["duration_ms"]
+                delta[5] += row["is_stream"]
+                delta[6] += row["cached_tokens"]
+        conn.executemany(
+            """
+            INSERT INTO llm_usage_rollup(
+                granularity, bucket_ts, model, session_prefix, calls, prompt_tokens,
+                completion_tokens, total_tokens, duration_ms, stream_calls, cached_tokens
+            )
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(granularity, bucket_ts, model, session_prefix) DO UPDATE SET
+                calls = llm_usage_rollup.calls + excluded.calls,
+                prompt_tokens = llm_usage_rollup.prompt_tokens + excluded.prompt_tokens,
+                completion_tokens = llm_usage_rollup.completion_tokens + excluded.completion_tokens,
+                total_tokens = llm_usage_rollup.total_tokens + excluded.total_tokens,
+                duration_ms = llm_usage_rollup.duration_ms + excluded.duration_ms,
+                stream_calls = llm_usage_rollup.stream_calls + excluded.stream_calls,
+                cached_tokens = llm_usage_rollup.cached_tokens + excluded.cached_tokens
+            """,
+            [(*key, *delta) for key, delta in deltas.items()],
+        )
+
+    def _rebuild_rollups(self, conn: sqlite3.Connection) -> None:
+        """由原始表全量重建汇总表（迁移回填与修复用）。"""
+        conn.execute("DELETE FROM llm_usage_rollup")
+        conn.execute("DELETE FROM subagent_task_rollup")
+        bucket_exprs = {
+            "hour": "{col} - {col} % 3600",
+            "day": "CAST(strftime('%s', date({col}, 'unixepoch', 'localtime'), 'utc') AS INTEGER)",
+        }
+        prefix_expr = (
+            "CASE WHEN instr(COALESCE(session_key, ''), ':') > 0 "
+            "THEN substr(session_key, 1, instr(session_key, ':') - 1) "
+            "ELSE COALESCE(session_key, '') END"
+        )
+        for granularity, expr in bucket_exprs.items():
+            conn.execute(
+                f"""
+                INSERT INTO llm_usage_rollup(
+                    granularity, bucket_ts, model, session_prefix, calls, prompt_tokens,
+                    completion_tokens, total_tokens, duration_ms, stream_calls, cached_tokens
+                )
+                SELECT ?, {expr.format(col="created_ts")} AS bucket, model, {prefix_expr} AS prefix,
+                       COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), SUM(total_tokens),
+                       SUM(duration_ms), SUM(is_stream), SUM(cached_tokens)
+                FROM llm_usage
+                WHERE created_ts IS NOT NULL
+                GROUP BY bucket, model, prefix
+                """,
+                (granularity,),
             )
+            conn.execute(
+                f"""
+                INSERT INTO subagent_task_rollup(granularity, bucket_ts, status, count)
+                SELECT ?, {expr.format(col="updated_ts")} AS bucket, status, COUNT(*)
+                FROM subagent_tasks
+                WHERE updated_ts IS NOT NULL
+                GROUP BY bucket, status
+                """,
+                (granularity,),
+            )
+
+    def rebuild_rollups(self) -> None:
+        """Recompute usage/task rollups from the raw tables."""
+        with self._lock, self._connect() as conn:
+            self._rebuild_rollups(conn)
 
     # ---------- Subagent task persistence ----------
 
@@ -422,15 +721,21 @@ class SQLiteStore:
         result_text: str | None = None,
         error_text: str | None = None,
     ) -> None:
-        now = datetime.now().isoformat()
+        now_dt = datetime.now()
+        now = now_dt.isoformat()
+        now_ts = int(now_dt.timestamp())
         with self._lock, self._connect() as conn:
+            previous = conn.execute(
+                "SELECT status, updated_ts FROM subagent_tasks WHERE task_id = ?",
+                (task_id,),
+            ).fetchone()
             conn.execute(
                 """
                 INSERT INTO subagent_tasks(
                     task_id, label, task_text, origin_channel, origin_chat_id,
-                    status, result_text, error_text, created_at, updated_at
+                    status, result_text, error_text, created_at, updated_at, updated_ts
                 )
-                VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(task_id) DO UPDATE SET
                     label = excluded.label,
                     task_text = excluded.task_text,
@@ -439,7 +744,8 @@ class SQLiteStore:
                     status = excluded.status,
                     result_text = excluded.result_text,
                     error_text = excluded.error_text,
-                    updated_at = excluded.updated_at
+                    updated_at = excluded.updated_at,
+                    updated_ts = excluded.updated_ts
                 """,
                 (
                     task_id,
@@ -452,8 +758,207 @@ class SQLiteStore:
                     error_text,
                     now,
                     now,
+                    now_ts,
                 ),
             )
+            # 任务汇总按「最后状态 + 最后更新时间」计数：先从旧桶移出，再计入新桶
+            changes: list[tuple[str, int, str, int]] = []
+            if previous is not None and previous["updated_ts"] is not None:
+                for granularity, bucket_ts in self._rollup_buckets(previous["updated_ts"]):
+                    changes.append((granularity, bucket_ts, previous["status"], -1))
+            for granularity, bucket_ts in self._rollup_buckets(now_ts):
+                changes.append((granularity, bucket_ts, status, 1))
+            conn.executemany(
+                """
+                INSERT INTO subagent_task_rollup(granularity, bucket_ts, status, count)
+                VALUES(?, ?, ?, ?)
+                ON CONFLICT(granularity, bucket_ts, status) DO UPDATE SET
+                    count = subagent_task_rollup.count + excluded.count
+                """,
+                changes,
+            )
+
+    # ---------- Metrics queries ----------
+    # 所有时间过滤均为 epoch 整数列上的范围谓词，可直接命中索引。
+
+    @staticmethod
+    def _usage_where(
+        since_ts: int,
+        session_key: str | None,
+        model: str | None,
+        until_ts: int | None = None,
+    ) -> tuple[str, list[Any]]:
+        clauses = ["created_ts >= ?"]
+        params: list[Any] = [since_ts]
+        if until_ts is not None:
+            clauses.append("created_ts < ?")
+            params.append(until_ts)
+        if session_key:
+            clauses.append("session_key = ?")
+            params.append(session_key)
+        if model:
+            clauses.append("model = ?")
+            params.append(model)
+        return " AND ".join(clauses), params
+
+    def query_usage_summary(
+        self,
+        since_ts: int,
+        session_key: str | None = None,
+        model: str | None = None,
+        until_ts: int | None = None,
+    ) -> dict[str, Any]:
+        where, params = self._usage_where(since_ts, session_key, model, until_ts)
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                f"""
+                SELECT COUNT(*) AS calls,
+                       SUM(prompt_tokens) AS prompt_tokens,
+                       SUM(completion_tokens) AS completion_tokens,
+                       SUM(total_tokens) AS total_tokens,
+                       SUM(duration_ms) AS duration_ms,
+                       SUM(CASE WHEN is_stream = 1 THEN 1 ELSE 0 END) AS stream_calls,
+                       SUM(cached_tokens) AS cached_tokens
+                FROM llm_usage
+                WHERE {where}
+                """,
+                params,
+            ).fetchone()
+        return {key: int(row[key] or 0) for key in row.keys()}
+
+    def query_usage_daily(
+        self,
+        since_ts: int,
+        session_key: str | None = None,
+        model: str | None = None,
+        limit: int = 30,
+    ) -> list[dict[str, Any]]:
+        where, params = self._usage_where(since_ts, session_key, model)
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT substr(created_at, 1, 10) AS day,
+                       COUNT(*) AS calls,
+                       SUM(prompt_tokens) AS prompt_tokens,
+                       SUM(completion_tokens) AS completion_tokens,
+                       SUM(total_tokens) AS total_tokens,
+                       SUM(duration_ms) AS duration_ms,
+                       SUM(cached_tokens) AS cached_tokens
+                FROM llm_usage
+                WHERE {where}
+                GROUP BY day
+                ORDER BY day DESC
+                LIMIT ?
+                """,
+                [*params, limit],
+            ).fetchall()
+        return [
+            {"day": row["day"], **{key: int(row[key] or 0) for key in row.keys() if key != "day"}}
+            for row in rows
+        ]
+
+    def query_task_counts(
+        self,
+        since_ts: int,
+        status: str | None = None,
+        until_ts: int | None = None,
+    ) -> dict[str, int]:
+        sql = "SELECT status, COUNT(*) AS cnt FROM subagent_tasks WHERE updated_ts >= ?"
+        params: list[Any] = [since_ts]
+        if until_ts is not None:
+            sql += " AND updated_ts < ?"
+            params.append(until_ts)
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += " GROUP BY status ORDER BY cnt DESC"
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return {row["status"]: int(row["cnt"] or 0) for row in rows}
+
+    def query_usage_rollup(
+        self,
+        granularity: str,
+        since_ts: int,
+        until_ts: int | None = None,
+        bucket_seconds: int | None = None,
+        group_by: str | None = None,
+        model: str | None = None,
+        session_prefix: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        按任意桶宽聚合汇总表（桶宽需为粒度的整数倍，桶从 since_ts 起对齐）。
+
+        bucket_seconds 为空时整个时间窗口合并为一个桶。
+        """
+        if group_by not in (None, "model", "session_prefix"):
+            raise ValueError(f"Unsupported group_by: {group_by}")
+        width = bucket_seconds or 1 << 62
+        clauses = ["granularity = ?", "bucket_ts >= ?"]
+        params: list[Any] = [granularity, since_ts]
+        if until_ts is not None:
+            clauses.append("bucket_ts < ?")
+            params.append(until_ts)
+        if model:
+            clauses.append("model = ?")
+            params.append(model)
+        if session_prefix is not None:
+            clauses.append("session_prefix = ?")
+            params.append(session_prefix)
+        group_cols = ", " + group_by if group_by else ""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT ((bucket_ts - ?) / ?) * ? + ? AS bucket{group_cols},
+                       SUM(calls) AS calls,
+                       SUM(prompt_tokens) AS prompt_tokens,
+                       SUM(completion_tokens) AS completion_tokens,
+                       SUM(total_tokens) AS total_tokens,
+                       SUM(duration_ms) AS duration_ms,
+                       SUM(stream_calls) AS stream_calls,
+                       SUM(cached_tokens) AS cached_tokens
+                FROM llm_usage_rollup
+                WHERE {" AND ".join(clauses)}
+                GROUP BY bucket{group_cols}
+                ORDER BY bucket ASC
+                """,
+                [since_ts, width, width, since_ts, *params],
+            ).fetchall()
+        return [
+            {
+                key: (row[key] if key in ("model", "session_prefix") else int(row[key] or 0))
+                for key in row.keys()
+            }
+            for row in rows
+        ]
+
+    def query_task_rollup(
+        self,
+        granularity: str,
+        since_ts: int,
+        status: str | None = None,
+        bucket_seconds: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """按任意桶宽聚合任务汇总表，返回 (bucket, status, count)。"""
+        width = bucket_seconds or 1 << 62
+        sql = (
+            """
+            SELECT ((bucket_ts - ?) / ?) * ? + ? AS bucket, status, SUM(count) AS cnt
+            FROM subagent_task_rollup
+            WHERE granularity = ? AND bucket_ts >= ?
+            """
+        )
+        params: list[Any] = [since_ts, width, width, since_ts, granularity, since_ts]
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += " GROUP BY bucket, status HAVING cnt > 0 ORDER BY bucket ASC, cnt DESC"
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [
+            {"bucket": int(row["bucket"]), "status": row["status"], "count": int(row["cnt"])}
+            for row in rows
+        ]
 
     # ---------- Generic KV persistence ----------
 
@@ -483,6 +988,122 @@ class SQLiteStore:
             result = conn.execute("DELETE FROM app_kv WHERE key = ?", (key,))
             return result.rowcount > 0
 
+    # ---------- Message bus spill ----------
+
+    def spill_bus_message(self, bus_id: str, lane: str, payload: dict[str, Any], enqueued_at: float) -> None:
+        """总线队列溢出时将消息暂存到 SQLite（按 id 保持 FIFO）。"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO bus_spill(bus_id, lane, payload_json, enqueued_at) VALUES(?, ?, ?, ?)",
+                (bus_id, lane, json.dumps(payload, ensure_ascii=False, default=str), enqueued_at),
+            )
+
+    def pop_bus_spill(self, bus_id: str, lane: str, limit: int) -> list[tuple[dict[str, Any], float]]:
+        """按入队顺序取出并删除最多 limit 条暂存消息，返回 (payload, enqueued_at)。"""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, payload_json, enqueued_at FROM bus_spill
+                WHERE bus_id = ? AND lane = ?
+                ORDER BY id ASC
+                LIMIT ?
+                """,
+                (bus_id, lane, limit),
+            ).fetchall()
+            if rows:
+                conn.execute(
+                    "DELETE FROM bus_spill WHERE bus_id = ? AND lane = ? AND id <= ?",
+                    (bus_id, lane, rows[-1]["id"]),
+                )
+        return [(json.loads(row["payload_json"]), row["enqueued_at"]) for row in rows]
+
+    def register_bus(self, bus_id: str, pid: int | None = None) -> None:
+        """登记总线实例及其所属进程；进程仍在运行时其暂存消息不会被其他实例认领。"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO bus_owners(bus_id, pid, started_at) VALUES(?, ?, ?)",
+                (bus_id, os.getpid() if pid is None else pid, time.time()),
+            )
+
+    def release_bus(self, bus_id: str) -> None:
+        """总线实例关闭：注销登记，其暂存消息可由下一个启动的实例认领。"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM bus_owners WHERE bus_id = ?", (bus_id,))
+
+    def claim_bus_spill(self, bus_id: str) -> dict[str, int]:
+        """
+        将已退出的总线实例遗留的暂存消息转到 bus_id 名下，返回各通道认领条数。
+
+        未登记、已注销或所属进程已不存在的实例视为已退出；仍在运行的实例（可能与
+        本实例共用数据库）的消息保持不动。
+        """
+        with self._lock, self._connect() as conn:
+            owners = {
+                row["bus_id"]: row["pid"]
+                for row in conn.execute("SELECT bus_id, pid FROM bus_owners WHERE bus_id != ?", (bus_id,))
+            }
+            dead = [
+                row["bus_id"]
+                for row in conn.execute("SELECT DISTINCT bus_id FROM bus_spill WHERE bus_id != ?", (bus_id,))
+                if row["bus_id"] not in owners or not _pid_alive(owners[row["bus_id"]])
+            ]
+            counts: dict[str, int] = {}
+            for old_id in dead:
+                for row in conn.execute(
+                    "SELECT lane, COUNT(*) AS n FROM bus_spill WHERE bus_id = ? GROUP BY lane", (old_id,)
+                ):
+                    counts[row["lane"]] = counts.get(row["lane"], 0) + row["n"]
+                conn.execute("UPDATE bus_spill SET bus_id = ? WHERE bus_id = ?", (bus_id, old_id))
+                conn.execute("DELETE FROM bus_owners WHERE bus_id = ?", (old_id,))
+        return counts
+
+    def clear_bus_spill(self, bus_id: str) -> int:
+        with self._lock, self._connect() as conn:
+            result = conn.execute("DELETE FROM bus_spill WHERE bus_id = ?", (bus_id,))
+            return result.rowcount
+
+    # ---------- Rolling compaction summaries ----------
+
+    def load_compaction_summary(self, session_key: str) -> dict[str, Any] | None:
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT summary, covered_json, compactions FROM compaction_summaries WHERE session_key = ?",
+                (session_key,),
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "summary": row["summary"],
+            "covered": json.loads(row["covered_json"] or "[]"),
+            "compactions": row["compactions"],
+        }
+
+    def save_compaction_summary(
+        self,
+        session_key: str,
+        summary: str,
+        covered: list[str],
+        compactions: int,
+    ) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO compaction_summaries(session_key, summary, covered_json, compactions, updated_at)
+                VALUES(?, ?, ?, ?, ?)
+                ON CONFLICT(session_key) DO UPDATE SET
+                    summary = excluded.summary,
+                    covered_json = excluded.covered_json,
+                    compactions = excluded.compactions,
+                    updated_at = excluded.updated_at
+                """,
+                (session_key, summary, json.dumps(covered), compactions, datetime.now().isoformat()),
+            )
+
+    def delete_compaction_summary(self, session_key: str) -> bool:
+        with self._lock, self._connect() as conn:
+            result = conn.execute("DELETE FROM compaction_summaries WHERE session_key = ?", (session_key,))
+            return result.rowcount > 0
+
     # ---------- Git credential persistence ----------
 
     def get_git_credentials(self, project_id: str) -> tuple[str | None, str | None]:
@@ -524,6 +1145,107 @@ class SQLiteStore:
 
     # ---------- Trace event persistence ----------
 
+    @staticmethod
+    def _trace_event_delta(event_type: str, data: dict[str, Any]) -> dict[str, int]:
+        """计算单个事件对请求摘要的增量贡献。"""
+        delta = {
+            "llm_calls": 0,
+            "tool_calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+            "completed": 0,
+        }
+        if event_type == "llm_end":
+            prompt = int(data.get("prompt_tokens") or 0)
+            completion = int(data.get("completion_tokens") or 0)
+            delta["llm_calls"] = 1
+            delta["prompt_tokens"] = prompt
+            delta["completion_tokens"] = completion
+            delta["total_tokens"] = int(data.get("total_tokens") or 0) or prompt + completion
+        elif event_type == "tool_end":
+            delta["tool_calls"] = 1
+        elif event_type == "end":
+            delta["completed"] = 1
+        return delta
+
+    def _upsert_trace_summaries(
+        self,
+        conn: sqlite3.Connection,
+        events: list[tuple[int, dict[str, Any]]],
+    ) -> None:
+        """将 (event_id, event) 列表聚合后增量写入 trace_requests。"""
+        summaries: dict[tuple[str, str], dict[str, Any]] = {}
+        for event_id, evt in events:
+            key = (evt["session_key"], evt["request_id"])
+            summary = summaries.get(key)
+            if summary is None:
+                summary = summaries[key] = {
+                    "project_id": evt.get("project_id"),
+                    "first_event_id": event_id,
+                    "last_event_id": event_id,
+                    "started_at": evt["created_at"],
+                    "ended_at": evt["created_at"],
+                    "event_count": 0,
+                    "llm_calls": 0,
+                    "tool_calls": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "total_tokens": 0,
+                    "completed": 0,
+                }
+            summary["last_event_id"] = event_id
+            summary["ended_at"] = evt["created_at"]
+            summary["event_count"] += 1
+            if summary["project_id"] is None:
+                summary["project_id"] = evt.get("project_id")
+            for field, value in self._trace_event_delta(evt["event_type"], evt.get("data") or {}).items():
+                summary[field] += value
+
+        conn.executemany(
+            """
+            INSERT INTO trace_requests(
+                session_key, request_id, project_id, first_event_id, last_event_id,
+                started_at, ended_at, event_count, llm_calls, tool_calls,
+                prompt_tokens, completion_tokens, total_tokens, status
+            )
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(session_key, request_id) DO UPDATE SET
+                project_id = COALESCE(trace_requests.project_id, excluded.project_id),
+                last_event_id = excluded.last_event_id,
+                ended_at = excluded.ended_at,
+                event_count = trace_requests.event_count + excluded.event_count,
+                llm_calls = trace_requests.llm_calls + excluded.llm_calls,
+                tool_calls = trace_requests.tool_calls + excluded.tool_calls,
+                prompt_tokens = trace_requests.prompt_tokens + excluded.prompt_tokens,
+                completion_tokens = trace_requests.completion_tokens + excluded.completion_tokens,
+                total_tokens = trace_requests.total_tokens + excluded.total_tokens,
+                status = CASE
+                    WHEN excluded.status = 'completed' THEN 'completed'
+                    ELSE trace_requests.status
+                END
+            """,
+            [
+                (
+                    session_key,
+                    request_id,
+                    summary["project_id"],
+                    summary["first_event_id"],
+                    summary["last_event_id"],
+                    summary["started_at"],
+                    summary["ended_at"],
+                    summary["event_count"],
+                    summary["llm_calls"],
+                    summary["tool_calls"],
+                    summary["prompt_tokens"],
+                    summary["completion_tokens"],
+                    summary["total_tokens"],
+                    "completed" if summary["completed"] else "running",
+                )
+                for (session_key, request_id), summary in summaries.items()
+            ],
+        )
+
     def save_trace_event(
         self,
         session_key: str,
@@ -534,57 +1256,62 @@ class SQLiteStore:
         agent_name: str | None = None,
     ) -> None:
         """Save a single trace event."""
-        now = datetime.now().isoformat()
-        with self._lock, self._connect() as conn:
-            conn.execute(
-                """
-                INSERT INTO trace_events(
-                    session_key, request_id, project_id, event_type,
-                    agent_name, data_json, created_at
-                )
-                VALUES(?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    session_key,
-                    request_id,
-                    project_id,
-                    event_type,
-                    agent_name,
-                    json.dumps(data, ensure_ascii=False),
-                    now,
-                ),
-            )
+        self.save_trace_events_batch([{
+            "session_key": session_key,
+            "request_id": request_id,
+            "project_id": project_id,
+            "event_type": event_type,
+            "agent_name": agent_name,
+            "data": data,
+        }])
 
     def save_trace_events_batch(
         self,
         events: list[dict[str, Any]],
     ) -> None:
-        """Batch-save multiple trace events."""
+        """Batch-save multiple trace events and update their request summaries."""
         if not events:
             return
         now = datetime.now().isoformat()
-        params = []
-        for evt in events:
-            params.append((
-                evt["session_key"],
-                evt["request_id"],
-                evt.get("project_id"),
-                evt["event_type"],
-                evt.get("agent_name"),
-                json.dumps(evt.get("data", {}), ensure_ascii=False),
-                evt.get("created_at", now),
-            ))
+        normalized = [{**evt, "created_at": evt.get("created_at", now)} for evt in events]
         with self._lock, self._connect() as conn:
-            conn.executemany(
-                """
-                INSERT INTO trace_events(
-                    session_key, request_id, project_id, event_type,
-                    agent_name, data_json, created_at
+            inserted: list[tuple[int, dict[str, Any]]] = []
+            for evt in normalized:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO trace_events(
+                        session_key, request_id, project_id, event_type,
+                        agent_name, data_json, created_at
+                    )
+                    VALUES(?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        evt["session_key"],
+                        evt["request_id"],
+                        evt.get("project_id"),
+                        evt["event_type"],
+                        evt.get("agent_name"),
+                        json.dumps(evt.get("data", {}), ensure_ascii=False),
+                        evt["created_at"],
+                    ),
                 )
-                VALUES(?, ?, ?, ?, ?, ?, ?)
-                """,
-                params,
-            )
+                inserted.append((cursor.lastrowid, evt))
+            self._upsert_trace_summaries(conn, inserted)
+
+    @staticmethod
+    def _decode_trace_data(row: sqlite3.Row) -> dict[str, Any]:
+        raw = row["data_json"]
+        if row["data_zlib"] is not None:
+            try:
+                raw = zlib.decompress(row["data_zlib"]).decode("utf-8")
+            except (zlib.error, UnicodeDecodeError):
+                return {}
+        if not raw:
+            return {}
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return {}
 
     def load_trace_events(
         self,
@@ -598,7 +1325,7 @@ class SQLiteStore:
                 rows = conn.execute(
                     """
                     SELECT id, session_key, request_id, project_id, event_type,
-                           agent_name, data_json, created_at
+                           agent_name, data_json, data_zlib, created_at
                     FROM trace_events
                     WHERE session_key = ? AND request_id = ?
                     ORDER BY id ASC
@@ -610,7 +1337,7 @@ class SQLiteStore:
                 rows = conn.execute(
                     """
                     SELECT id, session_key, request_id, project_id, event_type,
-                           agent_name, data_json, created_at
+                           agent_name, data_json, data_zlib, created_at
                     FROM trace_events
                     WHERE session_key = ?
                     ORDER BY id ASC
@@ -619,67 +1346,148 @@ class SQLiteStore:
                     (session_key, limit),
                 ).fetchall()
 
-        results: list[dict[str, Any]] = []
-        for row in rows:
-            data = {}
-            if row["data_json"]:
-                try:
-                    data = json.loads(row["data_json"])
-                except json.JSONDecodeError:
-                    pass
-            results.append({
+        return [
+            {
                 "id": row["id"],
                 "session_key": row["session_key"],
                 "request_id": row["request_id"],
                 "project_id": row["project_id"],
                 "event_type": row["event_type"],
                 "agent_name": row["agent_name"],
-                "data": data,
+                "data": self._decode_trace_data(row),
                 "created_at": row["created_at"],
-            })
-        return results
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def _trace_summary_from_row(row: sqlite3.Row) -> dict[str, Any]:
+        return {
+            "request_id": row["request_id"],
+            "project_id": row["project_id"],
+            "started_at": row["started_at"],
+            "ended_at": row["ended_at"],
+            "event_count": row["event_count"],
+            "llm_calls": row["llm_calls"],
+            "tool_calls": row["tool_calls"],
+            "prompt_tokens": row["prompt_tokens"],
+            "completion_tokens": row["completion_tokens"],
+            "total_tokens": row["total_tokens"],
+            "status": row["status"],
+            "raw_pruned": bool(row["raw_pruned"]),
+        }
 
     def list_trace_requests(
         self,
         session_key: str,
+        limit: int = 200,
     ) -> list[dict[str, Any]]:
-        """List distinct request_ids for a session with summary info."""
+        """List request summaries for a session (newest first), served from trace_requests."""
         with self._lock, self._connect() as conn:
             rows = conn.execute(
                 """
-                SELECT request_id,
-                       MIN(created_at) as started_at,
-                       MAX(created_at) as ended_at,
-                       COUNT(*) as event_count
-                FROM trace_events
+                SELECT *
+                FROM trace_requests
                 WHERE session_key = ?
-                GROUP BY request_id
-                ORDER BY MIN(id) DESC
+                ORDER BY first_event_id DESC
+                LIMIT ?
                 """,
-                (session_key,),
+                (session_key, limit),
             ).fetchall()
+        return [self._trace_summary_from_row(row) for row in rows]
 
-        return [
-            {
-                "request_id": row["request_id"],
-                "started_at": row["started_at"],
-                "ended_at": row["ended_at"],
-                "event_count": row["event_count"],
-            }
-            for row in rows
-        ]
+    def get_trace_request(self, session_key: str, request_id: str) -> dict[str, Any] | None:
+        """Get the summary row of a single request."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM trace_requests WHERE session_key = ? AND request_id = ?",
+                (session_key, request_id),
+            ).fetchone()
+        return self._trace_summary_from_row(row) if row else None
 
     def delete_trace_events(self, session_key: str, request_id: str | None = None) -> int:
-        """Delete trace events. Returns number of deleted rows."""
+        """Delete trace events and their summaries. Returns number of deleted event rows."""
         with self._lock, self._connect() as conn:
             if request_id:
                 result = conn.execute(
                     "DELETE FROM trace_events WHERE session_key = ? AND request_id = ?",
                     (session_key, request_id),
                 )
+                conn.execute(
+                    "DELETE FROM trace_requests WHERE session_key = ? AND request_id = ?",
+                    (session_key, request_id),
+                )
             else:
                 result = conn.execute(
                     "DELETE FROM trace_events WHERE session_key = ?",
                     (session_key,),
                 )
+                conn.execute(
+                    "DELETE FROM trace_requests WHERE session_key = ?",
+                    (session_key,),
+                )
             return result.rowcount
+
+    def prune_trace_events(
+        self,
+        max_age_days: int | None = None,
+        max_events: int | None = None,
+    ) -> int:
+        """
+        按保留期与总量上限删除原始 trace 事件，请求摘要保留并标记 raw_pruned。
+
+        事件 id 单调递增，因此两种策略都归约为一个 id 阈值，删除走主键范围。
+        Returns number of deleted event rows.
+        """
+        with self._lock, self._connect() as conn:
+            threshold = 0
+            if max_age_days:
+                cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+                row = conn.execute(
+                    "SELECT MAX(id) AS id FROM trace_events WHERE created_at < ?",
+                    (cutoff,),
+                ).fetchone()
+                threshold = max(threshold, row["id"] or 0)
+            if max_events:
+                row = conn.execute("SELECT MAX(id) AS id FROM trace_events").fetchone()
+                threshold = max(threshold, (row["id"] or 0) - max_events)
+            if threshold <= 0:
+                return 0
+
+            result = conn.execute("DELETE FROM trace_events WHERE id <= ?", (threshold,))
+            conn.execute(
+                "UPDATE trace_requests SET raw_pruned = 1 WHERE first_event_id <= ? AND raw_pruned = 0",
+                (threshold,),
+            )
+            return result.rowcount
+
+    def compress_trace_events(self, older_than_days: int, batch_size: int = 500) -> int:
+        """将早于指定天数的事件 data_json 压缩为 zlib BLOB。Returns number of compressed rows.
+
+        按 id 范围从上次压缩到的位置继续，不再扫描已压缩的行。
+        """
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+        compressed = 0
+        with self._lock, self._connect() as conn:
+            while True:
+                rows = conn.execute(
+                    """
+                    SELECT id, data_json FROM trace_events
+                    WHERE id > ? AND created_at < ? AND data_zlib IS NULL AND data_json != ''
+                    ORDER BY id
+                    LIMIT ?
+                    """,
+                    (self._trace_compress_mark, cutoff, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+                conn.executemany(
+                    "UPDATE trace_events SET data_zlib = ?, data_json = '' WHERE id = ?",
+                    [
+                        (zlib.compress(row["data_json"].encode("utf-8")), row["id"])
+                        for row in rows
+                    ],
+                )
+                compressed += len(rows)
+                self._trace_compress_mark = rows[-1]["id"]
+        return compressed
@@ -0,0 +1,182 @@
+"""Buffered LLM usage recorder: batches llm_usage writes off the event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterator
+
+from loguru import logger
+
+from solopreneur.storage.sqlite_store import SQLiteStore
+
+DEFAULT_FLUSH_INTERVAL_S = 2.0  # 后台批量落库间隔（秒）
+DEFAULT_MAX_BATCH = 200  # 缓冲达到该条数时立即唤醒落库
+DEFAULT_MAX_BUFFER = 50000  # 落库持续失败时的缓冲上限，超出丢弃最旧记录
+
+
+class UsageRecorder:
+    """
+    LLM usage 缓冲记录器。
+
+    record() 只在内存中追加记录，后台任务按批在线程池中写入 SQLite（单事务）。
+    尚未落库的记录构成「内存尾部」，指标查询通过 consistent_tail() 与库内数据
+    合并，因此统计始终精确。与 UsagePersistence.record 签名一致，可直接替换。
+    """
+
+    def __init__(
+        self,
+        store: SQLiteStore | None = None,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL_S,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_buffer: int = DEFAULT_MAX_BUFFER,
+    ):
+        self._store = store or SQLiteStore()
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_buffer = max_buffer
+        self._buffer: list[dict[str, Any]] = []
+        self._inflight: list[dict[str, Any]] = []
+        self._buffer_lock = threading.Lock()
+        # 落库与「库 + 尾部」一致性读取互斥，避免同一批记录被重复或遗漏统计
+        self._flush_lock = threading.Lock()
+        self._task: asyncio.Task[None] | None = None
+        self._wake: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def db_path(self):
+        return self._store.db_path
+
+    def record(
+        self,
+        session_key: str | None,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        total_tokens: int,
+        duration_ms: int = 0,
+        is_stream: bool = False,
+        cancelled: bool = False,
+        cached_tokens: int = 0,
+    ) -> None:
+        """缓冲一条 usage 记录；无事件循环时直接同步落库。"""
+        now = datetime.now()
+        row = SQLiteStore.normalize_usage_row({
+            "session_key": session_key,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": total_tokens,
+            "duration_ms": duration_ms,
+            "is_stream": is_stream,
+            "cancelled": cancelled,
+            "cached_tokens": cached_tokens,
+            "created_at": now.isoformat(),
+            "created_ts": int(now.timestamp()),
+        })
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._store.record_llm_usage_batch([row])
+            return
+
+        with self._buffer_lock:
+            self._buffer.append(row)
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+                logger.warning(f"Usage buffer full, dropped {overflow} oldest records")
+            pending = len(self._buffer)
+
+        self._ensure_flusher(loop)
+        if pending >= self.max_batch and self._wake is not None:
+            self._wake.set()
+
+    def _ensure_flusher(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """将当前缓冲在线程池中批量落库，返回写入条数。"""
+        return await asyncio.to_thread(self.flush_sync)
+
+    def flush_sync(self) -> int:
+        with self._flush_lock:
+            with self._buffer_lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            self._inflight = batch
+            try:
+                self._store.record_llm_usage_batch(batch)
+                return len(batch)
+            except Exception as e:
+                logger.warning(f"批量写入 LLM usage 失败，稍后重试: {e}")
+                with self._buffer_lock:
+                    self._buffer = batch + self._buffer
+                return 0
+            finally:
+                self._inflight = []
+
+    @contextmanager
+    def consistent_tail(self) -> Iterator[list[dict[str, Any]]]:
+        """
+        产出尚未落库的记录快照；上下文内不会发生落库，
+        调用方在此期间查询数据库即可得到不重不漏的结果。
+        """
+        with self._flush_lock:
+            with self._buffer_lock:
+                tail = self._inflight + self._buffer
+            yield tail
+
+    def pending_count(self) -> int:
+        with self._buffer_lock:
+            return len(self._buffer) + len(self._inflight)
+
+    async def close(self) -> None:
+        """停止后台任务并落库全部剩余记录。"""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+
+_recorder: UsageRecorder | None = None
+_recorder_lock = threading.Lock()
+
+
+def get_usage_recorder() -> UsageRecorder:
+    """获取进程级 UsageRecorder（首次调用时创建，并注册退出时兜底落库）。"""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = UsageRecorder()
+                atexit.register(_recorder.flush_sync)
+    return _recorder
+
+
+def peek_usage_recorder() -> UsageRecorder | None:
+    """返回已创建的 UsageRecorder（不触发创建）。"""
+    return _recorder
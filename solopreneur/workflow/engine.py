@@ -1278,6 +1278,8 @@ echo "=== Init complete ==="
 class RunWorkflowTool(Tool):
     """通过工具调用执行预定义的开发工作流。"""
 
+    delegates = True  # 耗时不计入工具时间，各步骤 Agent 的工具调用自行计入
+
     def __init__(self, engine: WorkflowEngine):
         self._engine = engine
 
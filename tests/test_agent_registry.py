@@ -0,0 +1,116 @@
+"""
+Agent 注册表缓存与热重载测试。
+
+测试覆盖:
+1. 共享实例 — 同一工作空间的 AgentManager 共用一个注册表，预置 Agent 只写入一次
+2. 增量重载 — 修改单个定义文件只重新解析该文件（及继承它的子 Agent）
+3. 新增 / 删除文件 — 按 stat 结果加入或移除定义
+4. 摘要缓存 — build_agent_summary 在定义不变时复用，变化后重新生成
+
+运行: python -m pytest tests/test_agent_registry.py -v
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import yaml
+
+from solopreneur.agent.definitions import AgentManager, get_agent_registry
+from solopreneur.agent.definitions.loader import AgentLoader
+
+
+def _write_agent(path: Path, name: str, description: str, **extra) -> None:
+    data = {"name": name, "title": name.title(), "description": description, "system_prompt": "p", **extra}
+    path.write_text(yaml.safe_dump(data, allow_unicode=True), encoding="utf-8")
+    # 保证 mtime 变化（部分文件系统时间精度较粗）
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def _count_parses(monkeypatch) -> list[Path]:
+    parsed: list[Path] = []
+    original = AgentLoader._load_file
+
+    def counting(self, file_path):
+        parsed.append(Path(file_path))
+        return original(self, file_path)
+
+    monkeypatch.setattr(AgentLoader, "_load_file", counting)
+    return parsed
+
+
+class TestSharedRegistry:
+    def test_managers_share_registry(self, tmp_path: Path):
+        first = AgentManager(tmp_path)
+        second = AgentManager(tmp_path)
+        assert first.registry is second.registry
+        assert get_agent_registry(tmp_path) is first.registry
+        assert "developer" in first.get_agent_names()
+
+    def test_unchanged_tree_is_not_reparsed(self, tmp_path: Path, monkeypatch):
+        registry = get_agent_registry(tmp_path)
+        parsed = _count_parses(monkeypatch)
+        assert registry.refresh(force=True) is False
+        AgentManager(tmp_path).list_agents()
+        assert parsed == []
+
+
+class TestIncrementalReload:
+    def test_only_changed_file_is_reparsed(self, tmp_path: Path, monkeypatch):
+        registry = get_agent_registry(tmp_path)
+        version = registry.version
+        parsed = _count_parses(monkeypatch)
+
+        _write_agent(tmp_path / "agents" / "developer.yaml", "developer", "edited")
+        assert registry.refresh(force=True) is True
+
+        assert [p.name for p in parsed] == ["developer.yaml"]
+        assert registry.get("developer").description == "edited"
+        assert registry.version == version + 1
+
+    def test_child_follows_parent_change(self, tmp_path: Path):
+        registry = get_agent_registry(tmp_path)
+        agents_dir = tmp_path / "agents"
+        _write_agent(agents_dir / "base_helper.yaml", "base_helper", "base", emoji="1️⃣")
+        _write_agent(agents_dir / "child_helper.yaml", "child_helper", "child", extends="base_helper")
+        registry.refresh(force=True)
+        assert registry.get("child_helper").emoji == "1️⃣"
+
+        _write_agent(agents_dir / "base_helper.yaml", "base_helper", "base", emoji="2️⃣")
+        registry.refresh(force=True)
+        assert registry.get("child_helper").emoji == "2️⃣"
+
+    def test_added_and_removed_files(self, tmp_path: Path):
+        registry = get_agent_registry(tmp_path)
+        path = tmp_path / "agents" / "translator.yaml"
+        _write_agent(path, "translator", "translates")
+        registry.refresh(force=True)
+        assert registry.exists("translator")
+
+        path.unlink()
+        registry.refresh(force=True)
+        assert not registry.exists("translator")
+
+
+class TestSummaryCache:
+    def test_summary_memoized_until_change(self, tmp_path: Path, monkeypatch):
+        manager = AgentManager(tmp_path)
+        renders = []
+        original = AgentManager._render_agent_summary
+
+        def counting(self):
+            renders.append(1)
+            return original(self)
+
+        monkeypatch.setattr(AgentManager, "_render_agent_summary", counting)
+
+        first = manager.build_agent_summary()
+        assert AgentManager(tmp_path).build_agent_summary() == first
+        assert len(renders) == 1
+
+        _write_agent(tmp_path / "agents" / "translator.yaml", "translator", "translates")
+        manager.registry.refresh(force=True)
+        assert "translator" in manager.build_agent_summary()
+        assert len(renders) == 2
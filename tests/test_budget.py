@@ -0,0 +1,209 @@
+"""
+Budget 测试。
+
+测试覆盖:
+1. 子预算 — 消耗计入父预算，剩余额度取整条链上最紧的一项
+2. 降级 — 剩余比例低于阈值时切换模型、收紧 max_tokens
+3. 抢占 — 到期时取消在途调用并抛出 BudgetExceededError，计入工具时间
+4. 回合引擎 — Token 预算耗尽时以 budget 停止，子 Agent 通过 current_budget 取得父预算
+5. 委派工具 — 只计入子 Agent 的叶子工具时间，不因工具时间上限取消整个子 Agent
+
+运行: python -m pytest tests/test_budget.py -v
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from solopreneur.agent.core.budget import (
+    REASON_TIME,
+    REASON_TOKENS,
+    REASON_TOOL_TIME,
+    Budget,
+    BudgetExceededError,
+    current_budget,
+)
+from solopreneur.agent.core.engine import STOP_BUDGET, TurnEngine, TurnHooks
+from solopreneur.agent.core.tools.base import Tool
+from solopreneur.agent.core.tools.registry import ToolRegistry
+from solopreneur.providers.base import LLMProvider, LLMResponse, ToolCallRequest
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _ExpensiveProvider(LLMProvider):
+    """每次调用消耗 600 token，并记录调用时看到的模型与预算。"""
+
+    def __init__(self):
+        super().__init__()
+        self.models: list[str] = []
+        self.budgets: list[Budget | None] = []
+
+    async def chat(self, messages, tools=None, model=None, max_tokens=4096, temperature=0.7) -> LLMResponse:
+        self.models.append(model)
+        self.budgets.append(current_budget.get())
+        return LLMResponse(content="ok", usage={"prompt_tokens": 500, "completion_tokens": 100, "total_tokens": 600})
+
+    def get_default_model(self) -> str:
+        return "big"
+
+
+class _ScriptedProvider(LLMProvider):
+    """先调用一次指定工具，再给出最终回复；每次调用耗时 delay 秒。"""
+
+    def __init__(self, tool_name: str, delay: float = 0.0):
+        super().__init__()
+        self.tool_name = tool_name
+        self.delay = delay
+        self.calls = 0
+
+    async def chat(self, messages, tools=None, model=None, max_tokens=4096, temperature=0.7) -> LLMResponse:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.calls == 1:
+            return LLMResponse(content="", tool_calls=[ToolCallRequest(id="c1", name=self.tool_name, arguments={})])
+        return LLMResponse(content="done")
+
+    def get_default_model(self) -> str:
+        return "test-model"
+
+
+class _NoArgsTool(Tool):
+    def __init__(self, name: str, run):
+        self._name = name
+        self._run = run
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> str:
+        return self._name
+
+    @property
+    def parameters(self) -> dict[str, Any]:
+        return {"type": "object", "properties": {}}
+
+    async def execute(self, **kwargs: Any) -> str:
+        return await self._run()
+
+
+class _DelegatingTool(_NoArgsTool):
+    delegates = True
+
+
+class TestBudget:
+    def test_child_charges_parent(self):
+        clock = _Clock()
+        parent = Budget(max_tokens=1000, max_seconds=100, clock=clock)
+        child = parent.child(max_tokens=300)
+
+        child.charge_tokens(200)
+        assert parent.used_tokens == 200
+        assert child.remaining_tokens() == 100
+
+        parent.charge_tokens(750)
+        assert child.remaining_tokens() == 50  # 父预算更紧
+        clock.now = 100
+        assert child.exceeded() == REASON_TIME
+
+        parent.used_tokens = 0
+        clock.now = 0
+        child.charge_tokens(300)
+        assert child.exceeded() == REASON_TOKENS
+        assert parent.exceeded() is None
+
+    def test_degrade_model_and_output_cap(self):
+        budget = Budget(max_tokens=10000, fallback_model="small", degrade_at=0.2, min_output_tokens=500)
+        assert budget.choose_model("big") == "big"
+        assert budget.output_cap(8192) == 8192
+
+        budget.charge_tokens(8500)
+        assert budget.choose_model("big") == "small"
+        assert budget.output_cap(8192) == 1500
+        budget.charge_tokens(1400)
+        assert budget.output_cap(8192) == 500
+        assert Budget().output_cap(None) is None
+
+    def test_run_cancels_in_flight(self):
+        async def scenario() -> None:
+            started = asyncio.Event()
+            cancelled = asyncio.Event()
+
+            async def slow() -> str:
+                started.set()
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+                return "never"
+
+            with pytest.raises(BudgetExceededError) as exc:
+                await Budget(max_seconds=0.05).run(slow())
+            assert exc.value.reason == REASON_TIME
+            assert started.is_set() and cancelled.is_set()
+
+            tool_budget = Budget(max_tool_seconds=0.05)
+            with pytest.raises(BudgetExceededError) as exc:
+                await tool_budget.run(asyncio.sleep(10), tool=True)
+            assert exc.value.reason == REASON_TOOL_TIME
+            assert tool_budget.tool_seconds >= 0.05
+
+            # 与预算无关的超时原样抛出
+            async def own_timeout() -> None:
+                raise asyncio.TimeoutError()
+
+            with pytest.raises(asyncio.TimeoutError):
+                await Budget(max_seconds=100).run(own_timeout())
+
+        asyncio.run(scenario())
+
+    def test_engine_stops_on_token_budget(self):
+        provider = _ExpensiveProvider()
+        budget = Budget(max_tokens=1000, fallback_model="small", degrade_at=0.5)
+        engine = TurnEngine(provider, ToolRegistry(), "big", budget=budget)
+
+        async def keep_going(response: Any, state: Any) -> str:
+            return "continue"
+
+        result = asyncio.run(engine.run([{"role": "user", "content": "hi"}], TurnHooks(on_final=keep_going)))
+
+        assert result.stop_reason == STOP_BUDGET
+        assert provider.models == ["big", "small"]
+        assert provider.budgets == [budget, budget]
+        assert current_budget.get() is None
+
+    def test_delegated_work_charges_only_leaf_tools(self):
+        async def leaf() -> str:
+            await asyncio.sleep(0.1)
+            return "leaf ok"
+
+        async def delegate() -> str:
+            # 子 Agent：两次 LLM 调用共 0.2s，叶子工具 0.1s，预算从 current_budget 派生
+            tools = ToolRegistry()
+            tools.register(_NoArgsTool("leaf", leaf))
+            child = current_budget.get().child()
+            engine = TurnEngine(_ScriptedProvider("leaf", delay=0.1), tools, "test-model", budget=child)
+            return (await engine.run([{"role": "user", "content": "sub task"}])).content
+
+        tools = ToolRegistry()
+        tools.register(_DelegatingTool("delegate", delegate))
+        budget = Budget(max_tool_seconds=0.25)
+        engine = TurnEngine(_ScriptedProvider("delegate"), tools, "test-model", budget=budget)
+
+        result = asyncio.run(engine.run([{"role": "user", "content": "hi"}]))
+
+        assert result.stop_reason != STOP_BUDGET
+        assert result.state.messages[2]["content"] == "done"
+        assert 0.1 <= budget.tool_seconds < 0.2
@@ -0,0 +1,221 @@
+"""
+回合取消测试。
+
+测试覆盖:
+1. TurnRegistry — 取消回合抛出 TurnCancelledError 且不连带取消调用方；新消息抢占旧回合；
+   同一会话的并发回合全部登记并一起取消；子 Agent 宣告的回合按来源会话登记，取消通知发回来源通道
+2. TurnEngine — 在途 LLM 调用被取消时发出 cancelled 事件并按估算记录 usage
+3. ExecTool — 取消时结束子进程
+4. SQLiteStore — usage 记录持久化 cancelled 标记
+
+运行: python -m pytest tests/test_cancellation.py -v
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from solopreneur.agent.core.cancellation import TurnCancelledError, TurnRegistry
+from solopreneur.agent.core.engine import TurnEngine, TurnHooks
+from solopreneur.agent.core.loop import AgentLoop
+from solopreneur.agent.core.tokenizer import get_tokenizer
+from solopreneur.agent.core.tools.registry import ToolRegistry
+from solopreneur.agent.core.tools.shell import ExecTool
+from solopreneur.bus.events import InboundMessage
+from solopreneur.providers.base import LLMProvider, LLMResponse
+from solopreneur.storage.sqlite_store import SQLiteStore
+
+
+class _HangingProvider(LLMProvider):
+    """流式输出一段文本后挂起，直到被取消。"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = asyncio.Event()
+
+    async def chat(self, messages, tools=None, model=None, max_tokens=4096, temperature=0.7) -> LLMResponse:
+        self.started.set()
+        await asyncio.sleep(3600)
+        return LLMResponse(content="never")
+
+    async def chat_stream(self, messages, tools=None, model=None, max_tokens=4096, temperature=0.7, on_chunk=None):
+        await on_chunk("partial answer")
+        return await self.chat(messages)
+
+    def get_default_model(self) -> str:
+        return "test-model"
+
+
+class _UsageSink:
+    def __init__(self):
+        self.records: list[dict[str, Any]] = []
+
+    def record(self, **kwargs: Any) -> None:
+        self.records.append(kwargs)
+
+
+class TestTurnRegistry:
+    def test_cancel_raises_turn_cancelled(self):
+        async def scenario():
+            turns = TurnRegistry()
+            started = asyncio.Event()
+
+            async def turn():
+                started.set()
+                await asyncio.sleep(3600)
+
+            runner = asyncio.create_task(turns.run("web:s1", turn()))
+            await started.wait()
+            assert turns.active() == ["web:s1"]
+            assert turns.cancel("web:s1") is True
+
+            with pytest.raises(TurnCancelledError) as exc:
+                await runner
+            assert exc.value.reason == "user"
+            assert turns.active() == []
+            assert turns.cancel("web:s1") is False
+
+        asyncio.run(scenario())
+
+    def test_preempt_cancels_previous_turn(self):
+        async def scenario():
+            turns = TurnRegistry()
+            started = asyncio.Event()
+
+            async def slow():
+                started.set()
+                await asyncio.sleep(3600)
+
+            async def fast():
+                return "second"
+
+            first = asyncio.create_task(turns.run("web:s1", slow()))
+            await started.wait()
+            assert await turns.run("web:s1", fast(), preempt=True) == "second"
+
+            with pytest.raises(TurnCancelledError) as exc:
+                await first
+            assert exc.value.reason == "superseded"
+
+        asyncio.run(scenario())
+
+    def test_cancel_reaches_every_turn_of_session(self):
+        async def scenario():
+            turns = TurnRegistry()
+            started = asyncio.Semaphore(0)
+
+            async def slow():
+                started.release()
+                await asyncio.sleep(3600)
+
+            runners = [asyncio.create_task(turns.run("web:s1", slow())) for _ in range(2)]
+            await started.acquire()
+            await started.acquire()
+            assert turns.cancel("web:s1") is True
+
+            for runner in runners:
+                with pytest.raises(TurnCancelledError):
+                    await runner
+            assert turns.active() == []
+
+        asyncio.run(scenario())
+
+
+    def test_system_turn_cancelled_via_origin_session(self):
+        async def scenario():
+            started = asyncio.Event()
+            outbound = []
+
+            async def publish_outbound(msg) -> None:
+                outbound.append(msg)
+
+            async def process(msg, memory_task=None):
+                started.set()
+                await asyncio.sleep(3600)
+
+            loop = SimpleNamespace(
+                _memory_prefetch={},
+                turns=TurnRegistry(),
+                bus=SimpleNamespace(publish_outbound=publish_outbound),
+                _process_message=process,
+            )
+            announce = InboundMessage("system", "subagent", "web:chat1", "子任务完成")
+            handler = asyncio.create_task(AgentLoop._handle_inbound(loop, announce))
+            await started.wait()
+
+            assert AgentLoop.cancel(SimpleNamespace(turns=loop.turns), "web:chat1")["cancelled"] is True
+            await handler
+            return outbound
+
+        [notice] = asyncio.run(scenario())
+        assert (notice.channel, notice.chat_id, notice.content) == ("web", "chat1", "任务已取消。")
+
+
+class TestEngineCancellation:
+    def test_cancelled_llm_call_emits_event_and_records_usage(self):
+        async def scenario():
+            provider = _HangingProvider()
+            sink = _UsageSink()
+            engine = TurnEngine(provider, ToolRegistry(), "test-model", usage_store=sink, usage_key="web:s1")
+            events: list[dict[str, Any]] = []
+            chunks: list[str] = []
+
+            async def on_trace(event: dict[str, Any]) -> None:
+                events.append(event)
+
+            async def on_chunk(text: str) -> None:
+                chunks.append(text)
+
+            messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": "hello there"}]
+            task = asyncio.create_task(engine.run(messages, TurnHooks(on_trace=on_trace, on_chunk=on_chunk)))
+            await provider.started.wait()
+            task.cancel("user")
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return events, chunks, sink.records
+
+        events, chunks, records = asyncio.run(scenario())
+
+        assert chunks == ["partial answer"]
+        assert events[-1]["event"] == "cancelled"
+        assert events[-1]["reason"] == "user"
+        assert len(records) == 1
+        assert records[0]["cancelled"] is True
+        assert records[0]["is_stream"] is True
+        assert records[0]["completion_tokens"] == get_tokenizer().count("partial answer")
+
+
+class TestExecCancellation:
+    def test_cancel_kills_subprocess(self, tmp_path: Path):
+        marker = tmp_path / "marker"
+
+        async def scenario():
+            tool = ExecTool(timeout=30, working_dir=str(tmp_path), console_stream=False)
+            task = asyncio.create_task(tool.execute(f"sleep 1 && touch {marker.name}"))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        started = time.monotonic()
+        asyncio.run(scenario())
+        assert time.monotonic() - started < 1.0
+        time.sleep(1.2)
+        assert not marker.exists()
+
+
+class TestCancelledUsage:
+    def test_cancelled_flag_persisted(self, tmp_path: Path):
+        store = SQLiteStore(tmp_path / "test.db")
+        store.record_llm_usage("web:s1", "m", 10, 2, 12, cancelled=True)
+        store.record_llm_usage("web:s1", "m", 10, 2, 12)
+
+        with store._connect() as conn:
+            rows = conn.execute("SELECT cancelled FROM llm_usage ORDER BY id").fetchall()
+        assert [row[0] for row in rows] == [1, 0]
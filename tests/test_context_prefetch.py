@@ -0,0 +1,118 @@
+"""
+ContextBuilder 上下文预取测试。
+
+测试覆盖:
+1. 记忆检索时限 — 超时返回空字符串，检索在后台继续完成
+2. 预构建 prompt 分段 — 与直接构建的 system prompt 一致
+3. 入队预取 — 系统消息不预取；回合在开始前被取消时预取任务也被取出并取消
+
+运行: python -m pytest tests/test_context_prefetch.py -v
+"""
+
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+from solopreneur.agent.core.cancellation import TurnRegistry
+from solopreneur.agent.core.context import ContextBuilder
+from solopreneur.agent.core.loop import AgentLoop
+from solopreneur.bus.events import InboundMessage
+
+
+def _builder(tmp_path, **config) -> ContextBuilder:
+    return ContextBuilder(tmp_path, memory_search_config={"enabled": False, **config})
+
+
+class TestContextPrefetch:
+    def test_memory_deadline(self, tmp_path):
+        builder = _builder(tmp_path, retrieval_timeout=0.05)
+        finished: list[str] = []
+
+        async def slow_fetch(query: str, project_info: dict | None) -> str:
+            await asyncio.sleep(0.2)
+            finished.append(query)
+            return "remembered"
+
+        builder._fetch_semantic_memory = slow_fetch
+
+        async def scenario() -> tuple[str, str]:
+            late = await builder.fetch_semantic_memory("q1", timeout=builder.memory_timeout)
+            await asyncio.sleep(0.3)
+            in_time = await builder.fetch_semantic_memory("q2", timeout=1.0)
+            return late, in_time
+
+        assert asyncio.run(scenario()) == ("", "remembered")
+        assert finished == ["q1", "q2"]
+
+    def test_prebuilt_sections_match(self, tmp_path):
+        builder = _builder(tmp_path)
+        (tmp_path / "AGENTS.md").write_text("be helpful", encoding="utf-8")
+
+        sections = builder.build_prompt_sections()
+        direct = builder.build_system_prompt(semantic_memory="fact")
+        prebuilt = builder.build_system_prompt(semantic_memory="fact", prompt_sections=sections)
+
+        assert prebuilt == direct
+        assert "be helpful" in direct and "fact" in direct
+
+
+class _Bus:
+    def __init__(self):
+        self.outbound = []
+
+    async def publish_outbound(self, msg) -> None:
+        self.outbound.append(msg)
+
+
+def _loop_stub() -> SimpleNamespace:
+    async def never_done(query: str) -> str:
+        await asyncio.sleep(10)
+        return ""
+
+    loop = SimpleNamespace(
+        _memory_prefetch={},
+        max_concurrency=2,
+        context=SimpleNamespace(fetch_semantic_memory=never_done),
+        turns=TurnRegistry(),
+        bus=_Bus(),
+    )
+
+    async def process(msg, memory_task=None):
+        return None
+
+    loop._process_message = process
+    return loop
+
+
+class TestMemoryPrefetch:
+    def test_system_messages_not_prefetched(self):
+        async def scenario():
+            loop = _loop_stub()
+            AgentLoop._start_memory_prefetch(loop, InboundMessage("system", "sub", "web:1", "done"))
+            return loop._memory_prefetch
+
+        assert asyncio.run(scenario()) == {}
+
+    def test_cancelled_turn_releases_prefetch(self):
+        async def scenario():
+            loop = _loop_stub()
+            msg = InboundMessage("web", "u", "1", "hello")
+            AgentLoop._start_memory_prefetch(loop, msg)
+            task = loop._memory_prefetch[id(msg)]
+
+            async def cancelled_run(session_key, coro):
+                coro.close()
+                raise asyncio.CancelledError
+
+            loop.turns.run = cancelled_run
+            try:
+                await AgentLoop._handle_inbound(loop, msg)
+            except asyncio.CancelledError:
+                pass
+            await asyncio.sleep(0)
+            return loop._memory_prefetch, task
+
+        pending, task = asyncio.run(scenario())
+        assert pending == {}
+        assert task.cancelled()
@@ -0,0 +1,146 @@
+"""
+媒体存储（图片延迟编码）测试。
+
+测试覆盖:
+1. 构建消息 — 用户消息只携带图片引用，不含 base64，token 计数按固定图片开销
+2. 发送时展开 — Provider 收到 data URL，回合内的消息列表仍只保留引用；编码不在事件循环线程中执行
+3. 按内容哈希去重 — 相同内容的不同文件共用一个条目，只编码一次
+4. 来源变化 — 登记后文件被覆盖或删除仍发送登记时的内容；条目被淘汰时退化为文字说明
+5. 历史裁剪 — 会话历史（复用回合的图片引用，文件删除后说明仍在）与压缩摘要中图片替换为文字说明
+
+运行: python -m pytest tests/test_media_store.py -v
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import threading
+from pathlib import Path
+from typing import Any
+
+from solopreneur.agent.core.compaction import CompactionEngine
+from solopreneur.agent.core.context import ContextBuilder
+from solopreneur.agent.core.engine import TurnEngine
+from solopreneur.agent.core.media_store import IMAGE_REF_TYPE, MediaStore
+from solopreneur.agent.core.tokenizer import IMAGE_TOKENS, HeuristicTokenizer, MessageTokenCounter
+from solopreneur.agent.core.tools.registry import ToolRegistry
+from solopreneur.providers.base import LLMProvider, LLMResponse
+
+PNG_BYTES = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+
+class _RecordingProvider(LLMProvider):
+    def __init__(self):
+        super().__init__()
+        self.calls: list[list[dict[str, Any]]] = []
+
+    async def chat(self, messages, tools=None, model=None, max_tokens=4096, temperature=0.7) -> LLMResponse:
+        self.calls.append(messages)
+        return LLMResponse(content="a cat")
+
+    def get_default_model(self) -> str:
+        return "test-model"
+
+
+def _image(tmp_path: Path, name: str = "cat.png", data: bytes = PNG_BYTES) -> Path:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return path
+
+
+class TestImageReferences:
+    def test_user_message_carries_reference(self, tmp_path: Path):
+        builder = ContextBuilder(tmp_path, memory_search_config={"enabled": False})
+        messages = builder.build_messages([], "what is this?", media=[str(_image(tmp_path)), "notes.txt"])
+
+        content = messages[-1]["content"]
+        assert [part["type"] for part in content] == [IMAGE_REF_TYPE, "text"]
+        assert "cat.png" in content[0]["caption"]
+        assert "base64" not in str(content)
+        counter = MessageTokenCounter(HeuristicTokenizer())
+        assert counter.count_message(messages[-1]) >= IMAGE_TOKENS
+
+    def test_expanded_only_at_send_time(self, tmp_path: Path):
+        builder = ContextBuilder(tmp_path, memory_search_config={"enabled": False})
+        messages = builder.build_messages([], "what is this?", media=[str(_image(tmp_path))])
+        provider = _RecordingProvider()
+
+        result = asyncio.run(TurnEngine(provider, ToolRegistry(), "test-model").run(messages))
+
+        sent = provider.calls[0][-1]["content"]
+        assert sent[0]["type"] == "image_url"
+        assert sent[0]["image_url"]["url"] == "data:image/png;base64," + base64.b64encode(PNG_BYTES).decode()
+        assert result.state.messages[1]["content"][0]["type"] == IMAGE_REF_TYPE
+
+    def test_encoding_runs_off_event_loop(self, tmp_path: Path, monkeypatch):
+        encode_threads: list[threading.Thread] = []
+        original = MediaStore._encode
+
+        def recording(self, raw, mime):
+            encode_threads.append(threading.current_thread())
+            return original(self, raw, mime)
+
+        monkeypatch.setattr(MediaStore, "_encode", recording)
+        # 内容唯一，确保共享存储中没有已编码的缓存
+        builder = ContextBuilder(tmp_path, memory_search_config={"enabled": False})
+        image = _image(tmp_path, "fresh.png", PNG_BYTES + b"off-loop")
+        messages = builder.build_messages([], "what is this?", media=[str(image)])
+
+        asyncio.run(TurnEngine(_RecordingProvider(), ToolRegistry(), "test-model").run(messages))
+
+        assert encode_threads and threading.main_thread() not in encode_threads
+
+
+class TestMediaStore:
+    def test_same_content_encoded_once(self, tmp_path: Path):
+        store = MediaStore()
+        first = store.add_file(_image(tmp_path, "a.png"))
+        second = store.add_file(_image(tmp_path, "b.png"))
+        assert first["key"] == second["key"]
+
+        message = {"role": "user", "content": [first, second]}
+        expanded = store.materialize([message])
+        urls = [part["image_url"]["url"] for part in expanded[0]["content"]]
+        assert urls[0] == urls[1]
+        assert store.stats() == {"entries": 1, "encoded": 1, "max_entries": store.max_entries}
+        # 没有引用的消息列表原样返回
+        plain = [{"role": "user", "content": "hi"}]
+        assert store.materialize(plain) is plain
+
+    def test_registered_bytes_survive_file_changes(self, tmp_path: Path):
+        store = MediaStore()
+        overwritten = store.add_file(_image(tmp_path, "upload.png"))
+        (tmp_path / "upload.png").write_bytes(b"different bytes")
+        deleted = store.add_file(_image(tmp_path, "tmp.png", PNG_BYTES + b"\1"))
+        (tmp_path / "tmp.png").unlink()
+
+        expanded = store.materialize([{"role": "user", "content": [overwritten, deleted]}])[0]["content"]
+        urls = [part["image_url"]["url"] for part in expanded]
+        assert urls[0].endswith(base64.b64encode(PNG_BYTES).decode())
+        assert urls[1].endswith(base64.b64encode(PNG_BYTES + b"\1").decode())
+
+    def test_evicted_image_becomes_caption(self, tmp_path: Path):
+        store = MediaStore(max_entries=1)
+        evicted = store.add_file(_image(tmp_path, "old.png"))
+        store.add_file(_image(tmp_path, "new.png", PNG_BYTES + b"\0"))
+
+        expanded = store.materialize([{"role": "user", "content": [evicted]}])[0]["content"]
+        assert expanded == [{"type": "text", "text": f"[图片: {evicted['caption']}]"}]
+
+
+class TestHistoryCaptions:
+    def test_history_and_summary_use_captions(self, tmp_path: Path):
+        builder = ContextBuilder(tmp_path, memory_search_config={"enabled": False})
+        image = _image(tmp_path)
+        message = builder.build_messages([], "what is this?", media=[str(image)])[-1]
+        # 回合中临时上传的文件被删除：说明来自回合开始时的引用，不再重新登记
+        image.unlink()
+        assert builder.history_content(message["content"]).startswith("what is this?\n[图片: cat.png")
+        assert builder.history_content("plain") == "plain"
+
+        serialized = CompactionEngine._serialize_messages([message])
+        assert serialized.startswith("[User] [图片: cat.png")
+        assert "what is this?" in serialized
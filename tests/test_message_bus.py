@@ -0,0 +1,241 @@
+"""
+MessageBus 优先级与背压测试。
+
+测试覆盖:
+1. 优先级 — system > interactive > background
+2. 溢出策略 — reject 抛出 BusFullError，drop_oldest 保留最新消息
+3. 溢出落盘 — spill 到 SQLite 后仍按 FIFO 取出，stats 计数正确；close() 保留落盘消息，
+   重启后 start() 重放；只认领已退出实例的消息；暂存消息缺失时修正计数；取消中的 consume 不丢消息
+4. 延迟直方图 — 每次出队记录一次
+5. 出站分发 — 慢通道不阻塞其他通道，失败重试，stop() 后发完已路由消息
+
+运行: python -m pytest tests/test_message_bus.py -v
+"""
+
+from __future__ import annotations
+
+import asyncio
+import subprocess
+import sys
+import time
+
+import pytest
+
+from solopreneur.bus.events import InboundMessage, OutboundMessage
+from solopreneur.bus.queue import BusFullError, MessageBus
+from solopreneur.storage.sqlite_store import SQLiteStore
+
+
+def _msg(channel: str, content: str) -> InboundMessage:
+    return InboundMessage(channel=channel, sender_id="u", chat_id="c", content=content)
+
+
+async def _drain(bus: MessageBus, n: int) -> list[str]:
+    return [(await bus.consume_inbound()).content for _ in range(n)]
+
+
+class TestMessageBus:
+    def test_priority_lanes(self):
+        async def scenario():
+            bus = MessageBus()
+            await bus.publish_inbound(_msg("cron", "bg"))
+            await bus.publish_inbound(_msg("web", "user"))
+            await bus.publish_inbound(_msg("system", "sys"))
+            return await _drain(bus, 3)
+
+        assert asyncio.run(scenario()) == ["sys", "user", "bg"]
+
+    def test_reject_policy(self):
+        async def scenario():
+            bus = MessageBus(max_inbound=1, overflow="reject")
+            await bus.publish_inbound(_msg("web", "a"))
+            with pytest.raises(BusFullError):
+                await bus.publish_inbound(_msg("web", "b"))
+            # other lanes are unaffected
+            await bus.publish_inbound(_msg("cron", "bg"))
+            return bus.stats()
+
+        stats = asyncio.run(scenario())
+        assert stats["lanes"]["interactive"]["rejected"] == 1
+        assert stats["lanes"]["background"]["depth"] == 1
+
+    def test_drop_oldest_policy(self):
+        async def scenario():
+            bus = MessageBus(max_inbound=2, overflow="drop_oldest")
+            for content in ("a", "b", "c"):
+                await bus.publish_inbound(_msg("web", content))
+            assert bus.inbound_size == 2
+            return await _drain(bus, 2), bus.stats()
+
+        contents, stats = asyncio.run(scenario())
+        assert contents == ["b", "c"]
+        assert stats["lanes"]["interactive"]["dropped"] == 1
+
+    def test_spill_preserves_fifo(self, tmp_path):
+        store = SQLiteStore(tmp_path / "test.db")
+
+        async def scenario():
+            bus = MessageBus(max_inbound=2, overflow="spill", spill_store=store)
+            for i in range(5):
+                await bus.publish_inbound(_msg("web", f"m{i}"))
+            lane = bus.stats()["lanes"]["interactive"]
+            assert lane["depth"] == 5
+            assert lane["spilled"] == 3
+            first = await _drain(bus, 1)
+            # a message published after spilling still queues behind spilled ones
+            await bus.publish_inbound(_msg("web", "late"))
+            return first + await _drain(bus, 5), bus.stats()
+
+        contents, stats = asyncio.run(scenario())
+        assert contents == ["m0", "m1", "m2", "m3", "m4", "late"]
+        assert stats["lanes"]["interactive"]["depth"] == 0
+        assert stats["lanes"]["interactive"]["spilled"] == 0
+
+    def test_spilled_messages_replayed_after_restart(self, tmp_path):
+        store = SQLiteStore(tmp_path / "test.db")
+
+        async def before_restart():
+            bus = MessageBus(max_inbound=1, overflow="spill", spill_store=store)
+            for i in range(3):
+                await bus.publish_inbound(_msg("web", f"m{i}"))
+            bus.close()
+            return bus.stats()["lanes"]["interactive"]["spilled"]
+
+        async def after_restart():
+            bus = MessageBus(max_inbound=1, overflow="spill", spill_store=store)
+            recovered = await bus.start()
+            assert await bus.start() == 0
+            await bus.publish_inbound(_msg("web", "new"))
+            return recovered, await _drain(bus, 3)
+
+        assert asyncio.run(before_restart()) == 2
+        recovered, contents = asyncio.run(after_restart())
+        assert recovered == 2
+        assert contents == ["m1", "m2", "new"]
+
+    def test_running_bus_keeps_its_spill(self, tmp_path):
+        store = SQLiteStore(tmp_path / "test.db")
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        store.register_bus("crashed", pid=exited.pid)
+        store.spill_bus_message("crashed", "interactive", _msg("web", "orphan").to_dict(), time.time())
+
+        async def scenario():
+            running = MessageBus(max_inbound=1, overflow="spill", spill_store=store)
+            for i in range(3):
+                await running.publish_inbound(_msg("web", f"m{i}"))
+            other = MessageBus(max_inbound=1, overflow="spill", spill_store=store)
+            recovered = await other.start()
+            return recovered, await _drain(other, 1), await _drain(running, 3)
+
+        recovered, other_contents, running_contents = asyncio.run(scenario())
+        assert recovered == 1
+        assert other_contents == ["orphan"]
+        assert running_contents == ["m0", "m1", "m2"]
+
+    def test_missing_spill_rows_fix_count(self, tmp_path):
+        store = SQLiteStore(tmp_path / "test.db")
+
+        async def scenario():
+            bus = MessageBus(max_inbound=1, overflow="spill", spill_store=store)
+            for i in range(3):
+                await bus.publish_inbound(_msg("web", f"m{i}"))
+            store.clear_bus_spill(bus._bus_id)  # rows taken behind the bus's back
+            await bus.publish_inbound(_msg("web", "late"))
+            contents = await _drain(bus, 2)
+            assert bus.inbound_size == 0
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(bus.consume_inbound(), timeout=0.05)
+            await bus.publish_inbound(_msg("web", "next"))
+            return contents + await _drain(bus, 1)
+
+        assert asyncio.run(scenario()) == ["m0", "late", "next"]
+
+    def test_cancelled_consume_keeps_messages(self, tmp_path):
+        store = SQLiteStore(tmp_path / "test.db")
+        original = store.pop_bus_spill
+
+        def slow_pop(*args):
+            time.sleep(0.1)
+            return original(*args)
+
+        store.pop_bus_spill = slow_pop
+
+        async def scenario():
+            bus = MessageBus(max_inbound=1, overflow="spill", spill_store=store)
+            for i in range(3):
+                await bus.publish_inbound(_msg("web", f"m{i}"))
+            first = await _drain(bus, 1)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(bus.consume_inbound(), timeout=0.01)
+            return first + await _drain(bus, 2), bus.inbound_size
+
+        contents, remaining = asyncio.run(scenario())
+        assert contents == ["m0", "m1", "m2"]
+        assert remaining == 0
+
+    def test_latency_histogram(self):
+        async def scenario():
+            bus = MessageBus()
+            await bus.publish_inbound(_msg("web", "a"))
+            await bus.publish_inbound(_msg("web", "b"))
+            await _drain(bus, 2)
+            return bus.stats()["lanes"]["interactive"]["latency"]
+
+        latency = asyncio.run(scenario())
+        assert latency["count"] == 2
+        assert sum(latency["buckets"].values()) == 2
+
+
+class TestOutboundDispatch:
+    def test_slow_channel_does_not_block_others(self):
+        async def scenario():
+            bus = MessageBus()
+            delivered: list[str] = []
+            slow_gate = asyncio.Event()
+
+            async def slow(msg: OutboundMessage) -> None:
+                await slow_gate.wait()
+                delivered.append(msg.content)
+
+            async def fast(msg: OutboundMessage) -> None:
+                delivered.append(msg.content)
+
+            bus.subscribe_outbound("telegram", slow)
+            bus.subscribe_outbound("wecom", fast)
+            task = asyncio.create_task(bus.dispatch_outbound())
+            await bus.publish_outbound(OutboundMessage(channel="telegram", chat_id="1", content="slow"))
+            await bus.publish_outbound(OutboundMessage(channel="wecom", chat_id="2", content="fast"))
+            await asyncio.sleep(0.05)
+            assert delivered == ["fast"]
+            slow_gate.set()
+            bus.stop()
+            await task
+            return delivered
+
+        assert asyncio.run(scenario()) == ["fast", "slow"]
+
+    def test_failed_send_is_retried(self):
+        async def scenario():
+            bus = MessageBus(outbound_retry_base=0.001)
+            attempts: list[str] = []
+
+            async def flaky(msg: OutboundMessage) -> None:
+                attempts.append(msg.content)
+                if len(attempts) == 1:
+                    raise ConnectionError("temporary")
+
+            bus.subscribe_outbound("web", flaky)
+            task = asyncio.create_task(bus.dispatch_outbound())
+            await bus.publish_outbound(OutboundMessage(channel="web", chat_id="1", content="a"))
+            stats = None
+            while stats is None or stats["sent"] < 1:
+                await asyncio.sleep(0.01)
+                stats = bus.stats()["outbound_channels"].get("web")
+            bus.stop()
+            await task
+            return attempts, stats
+
+        attempts, stats = asyncio.run(scenario())
+        assert attempts == ["a", "a"]
+        assert stats["retried"] == 1 and stats["failed"] == 0
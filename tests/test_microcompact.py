@@ -0,0 +1,134 @@
+"""
+微压缩测试。
+
+测试覆盖:
+1. 按工具摘要 — list_dir 统计、search_code 按文件计数、exec 保留错误与尾部、read_file 代码大纲
+2. 引用内容 — 冷工具结果替换为 spill key + 按调用参数生成的摘要
+3. 增量处理 — 每个工具结果只在移出热尾部时检查一次；消息列表被替换时重新扫描
+
+运行: python -m pytest tests/test_microcompact.py -v
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from solopreneur.agent.core.compaction import (
+    MICRO_COMPACT_THRESHOLD,
+    MICRO_HOT_TAIL,
+    CompactionEngine,
+)
+from solopreneur.agent.core.spill_store import SpillStore
+from solopreneur.agent.core.tool_summarizers import summarize_tool_output
+
+PY_SOURCE = "\n".join([
+    "import os",
+    "",
+    "class Loader:",
+    "    @property",
+    "    def name(self):",
+    "        return 'x'",
+    "",
+    "    async def load(self, path: str) -> bytes:",
+    "        return b''",
+    "",
+    "def main():",
+    "    pass",
+])
+
+
+class _CountingSpill(SpillStore):
+    def __init__(self, root: Path):
+        super().__init__(root)
+        self.puts = 0
+
+    def put(self, content: str):
+        self.puts += 1
+        return super().put(content)
+
+
+def _call(call_id: str, name: str, args: dict) -> dict:
+    return {
+        "role": "assistant", "content": "",
+        "tool_calls": [{"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}],
+    }
+
+
+def _result(call_id: str, name: str, content: str) -> dict:
+    return {"role": "tool", "tool_call_id": call_id, "name": name, "content": content}
+
+
+class TestToolSummarizers:
+    def test_list_dir(self):
+        content = "\n".join(["📁 src", "📁 tests"] + [f"📄 mod{i}.py" for i in range(40)] + ["📄 README.md"])
+        summary = summarize_tool_output("list_dir", content, {"path": "."})
+        assert "2 个子目录, 41 个文件" in summary
+        assert ".py ×40" in summary and "src, tests" in summary
+
+    def test_search_code(self):
+        lines = [f"a.py:{i}: hit" for i in range(5)] + [f"b.py:{i}: hit" for i in range(2)]
+        summary = summarize_tool_output("search_code", "\n".join(["Found 7 matches (scanned_files=9):", *lines]), {"query": "hit"})
+        assert "涉及 2 个文件" in summary
+        assert "a.py: 5" in summary and "b.py: 2" in summary
+
+    def test_exec_keeps_errors_and_tail(self):
+        content = "\n".join(
+            [f"collecting {i}" for i in range(500)]
+            + ["E   AssertionError: boom", *[f"detail {i}" for i in range(50)], "1 failed, 99 passed", "Exit code: 1"]
+        )
+        summary = summarize_tool_output("exec", content, {"command": "pytest"})
+        assert "Exit code: 1" in summary
+        assert "AssertionError: boom" in summary
+        assert "1 failed, 99 passed" in summary
+        assert "collecting 3\n" not in summary
+
+    def test_read_file_outline(self):
+        summary = summarize_tool_output("read_file", PY_SOURCE, {"path": "pkg/loader.py"})
+        assert "3: class Loader:" in summary
+        assert "4:     @property" in summary
+        assert "8:     async def load(self, path: str) -> bytes:" in summary
+        assert "11: def main():" in summary
+        assert "return b''" not in summary
+
+        text = "plain text " * 200
+        assert summarize_tool_output("read_file", text, {"path": "notes.txt"}).startswith("plain text")
+
+
+class TestIncrementalMicrocompact:
+    def _engine(self, tmp_path: Path) -> CompactionEngine:
+        return CompactionEngine(provider=None, workspace=tmp_path, spill_store=_CountingSpill(tmp_path / "spill"))
+
+    def test_reference_uses_tool_summary(self, tmp_path: Path):
+        engine = self._engine(tmp_path)
+        source = PY_SOURCE + "\n" + "# filler\n" * MICRO_COMPACT_THRESHOLD
+        messages = [_call("c0", "read_file", {"path": "loader.py"}), _result("c0", "read_file", source)]
+        for i in range(1, MICRO_HOT_TAIL + 1):
+            messages += [_call(f"c{i}", "list_dir", {"path": "."}), _result(f"c{i}", "list_dir", "📄 a.py")]
+
+        engine.microcompact(messages)
+
+        content = messages[1]["content"]
+        assert "spill key:" in content
+        assert "3: class Loader:" in content
+        assert engine.spill_store.get(engine.spill_store.key_for(source)) == source
+
+    def test_each_result_checked_once(self, tmp_path: Path):
+        engine = self._engine(tmp_path)
+        big = "x\n" * MICRO_COMPACT_THRESHOLD
+        messages: list[dict] = [{"role": "system", "content": "sys"}]
+        for i in range(MICRO_HOT_TAIL + 2):
+            messages += [_call(f"c{i}", "exec", {"command": f"run {i}"}), _result(f"c{i}", "exec", big + str(i))]
+            engine.microcompact(messages)
+
+        assert engine.spill_store.puts == 2
+        cursor = engine._micro_cursors[id(messages)]
+        assert cursor.scanned == len(messages) and cursor.cold == 2
+
+        # 没有新消息时不再检查任何结果
+        engine.microcompact(messages)
+        assert engine.spill_store.puts == 2
+
+        # 新列表（如压缩后）重新扫描；已替换为引用的结果不再落盘
+        engine.microcompact(list(messages))
+        assert engine.spill_store.puts == 2
@@ -0,0 +1,59 @@
+"""
+ProjectManager 持久化测试。
+
+测试覆盖:
+1. 增量写回 — 只写入变更的项目
+2. 变更通知 — 创建/更新/删除广播给监听器
+
+运行: python -m pytest tests/test_project_manager.py -v
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from solopreneur.projects import ProjectCreate, ProjectManager, ProjectUpdate
+from solopreneur.projects.models import ProjectSource
+
+
+@pytest.fixture
+def manager(tmp_path: Path) -> ProjectManager:
+    return ProjectManager(data_dir=tmp_path)
+
+
+def _create(manager: ProjectManager, tmp_path: Path, name: str):
+    return manager.create_project(
+        ProjectCreate(name=name, source=ProjectSource.LOCAL, local_path=str(tmp_path / name))
+    )
+
+
+class TestProjectPersistence:
+    def test_only_changed_project_written(self, manager: ProjectManager, tmp_path: Path, monkeypatch):
+        first = _create(manager, tmp_path, "a")
+        _create(manager, tmp_path, "b")
+
+        saved: list[str] = []
+        original = manager.storage.save
+        monkeypatch.setattr(
+            manager.storage, "save", lambda data: (saved.append(data["id"]), original(data))
+        )
+        manager.update_project(first.id, ProjectUpdate(description="changed"))
+
+        assert saved == [first.id]
+        reloaded = ProjectManager(data_dir=tmp_path)
+        assert reloaded.get_project(first.id).description == "changed"
+        assert len(reloaded.list_projects()) == 3
+
+    def test_change_notifications(self, manager: ProjectManager, tmp_path: Path):
+        events: list[tuple[str, str]] = []
+        unsubscribe = manager.subscribe(lambda event, project: events.append((event, project.name)))
+
+        project = _create(manager, tmp_path, "a")
+        manager.update_project(project.id, ProjectUpdate(name="renamed"))
+        manager.delete_project(project.id)
+        unsubscribe()
+        _create(manager, tmp_path, "b")
+
+        assert events == [("created", "a"), ("updated", "renamed"), ("deleted", "renamed")]
@@ -0,0 +1,156 @@
+"""
+System prompt 片段缓存测试。
+
+测试覆盖:
+1. 输入未变化 — 不重新读取引导文件、不重新解析 Agent 定义
+2. 单个输入变化 — 只重建对应片段，内容随之更新
+3. 按项目缓存 — 不同项目的组装结果互不覆盖
+4. 稳定前缀 — 时间 / 今日笔记 / 语义记忆位于末尾，跨轮次前缀不变，断点指向分段边界
+5. Provider 缓存断点 — Claude 模型拆分 system 块并标记 cache_control，其他模型移除提示字段
+6. 缓存命中统计 — usage 归一化提取 cached_tokens，并写入 llm_usage 汇总
+
+运行: python -m pytest tests/test_prompt_cache.py -v
+"""
+
+from __future__ import annotations
+
+import os
+from types import SimpleNamespace
+
+from solopreneur.agent.core.context import ContextBuilder
+from solopreneur.providers.base import CACHE_BREAKPOINTS_KEY, normalize_usage
+from solopreneur.providers.litellm_provider import LiteLLMProvider
+from solopreneur.storage.sqlite_store import SQLiteStore
+
+
+def _builder(tmp_path) -> ContextBuilder:
+    return ContextBuilder(tmp_path, memory_search_config={"enabled": False})
+
+
+def _count_calls(builder: ContextBuilder, name: str) -> list[int]:
+    calls = [0]
+    original = getattr(builder, name)
+
+    def wrapped(*args, **kwargs):
+        calls[0] += 1
+        return original(*args, **kwargs)
+
+    setattr(builder, name, wrapped)
+    return calls
+
+
+def _touch(path, content: str) -> None:
+    """写入并推进 mtime（避免同一时间戳下签名不变）。"""
+    before = path.stat().st_mtime_ns if path.exists() else 0
+    path.write_text(content, encoding="utf-8")
+    os.utime(path, ns=(before + 10**9, before + 10**9))
+
+
+class TestPromptCache:
+    def test_unchanged_inputs_reuse_fragments(self, tmp_path):
+        builder = _builder(tmp_path)
+        (tmp_path / "AGENTS.md").write_text("be helpful", encoding="utf-8")
+        bootstrap_calls = _count_calls(builder, "_load_bootstrap_files")
+        agent_calls = _count_calls(builder, "_build_agents_summary")
+
+        first = builder.build_system_prompt()
+        second = builder.build_system_prompt()
+
+        assert first == second
+        assert "be helpful" in first
+        assert bootstrap_calls == [1]
+        assert agent_calls == [1]
+
+    def test_changed_input_rebuilds_only_its_fragment(self, tmp_path):
+        builder = _builder(tmp_path)
+        _touch(tmp_path / "AGENTS.md", "version one")
+        builder.build_system_prompt()
+        bootstrap_calls = _count_calls(builder, "_load_bootstrap_files")
+        skills_calls = _count_calls(builder, "_build_skills_sections")
+        memory_calls = _count_calls(builder.memory, "read_long_term")
+
+        _touch(tmp_path / "AGENTS.md", "version two")
+        prompt = builder.build_system_prompt()
+
+        assert "version two" in prompt and "version one" not in prompt
+        assert bootstrap_calls == [1]
+        assert skills_calls == [0]
+        assert memory_calls == [0]
+
+        _touch(builder.memory.memory_file, "remember this")
+        assert "remember this" in builder.build_system_prompt()
+        assert memory_calls == [1]
+        assert bootstrap_calls == [1]
+
+    def test_sections_cached_per_project(self, tmp_path):
+        builder = _builder(tmp_path)
+        alpha = {"id": "a", "name": "Alpha", "path": str(tmp_path / "a")}
+        beta = {"id": "b", "name": "Beta", "path": str(tmp_path / "b")}
+
+        session_a = builder.build_prompt_sections(project_info=alpha).session
+        session_b = builder.build_prompt_sections(project_info=beta).session
+        again_a = builder.build_prompt_sections(project_info=alpha).session
+
+        assert any("Alpha" in part for part in session_a)
+        assert any("Beta" in part for part in session_b)
+        assert again_a == session_a
+
+
+class TestStablePrefix:
+    def test_volatile_sections_last(self, tmp_path):
+        builder = _builder(tmp_path)
+        (tmp_path / "AGENTS.md").write_text("be helpful", encoding="utf-8")
+        _touch(builder.memory.get_today_file(), "did things today")
+        project = {"id": "a", "name": "Alpha", "path": str(tmp_path / "a")}
+
+        builder._current_time = lambda: "2026-01-01 10:00 (Thursday)"
+        first = builder.build_messages([], "hi", project_info=project, semantic_memory="fact one")[0]
+        builder._current_time = lambda: "2026-01-01 10:01 (Thursday)"
+        second = builder.build_messages([], "hi", project_info=project, semantic_memory="fact two")[0]
+
+        static_end, session_end = first[CACHE_BREAKPOINTS_KEY]
+        assert first[CACHE_BREAKPOINTS_KEY] == second[CACHE_BREAKPOINTS_KEY]
+        assert first["content"][:session_end] == second["content"][:session_end]
+        assert "be helpful" in first["content"][:static_end]
+        assert "Alpha" in first["content"][static_end:session_end]
+        volatile = first["content"][session_end:]
+        assert "10:00" in volatile and "did things today" in volatile
+        assert volatile.rstrip().endswith("fact one")
+
+    def test_provider_cache_breakpoints(self):
+        provider = LiteLLMProvider(default_model="anthropic/claude-sonnet-4")
+        messages = [
+            {"role": "system", "content": "static|session|turn", CACHE_BREAKPOINTS_KEY: [7, 15]},
+            {"role": "user", "content": "question"},
+            {"role": "assistant", "content": "answer"},
+        ]
+
+        prepared = provider._prepare_messages("anthropic/claude-sonnet-4", messages)
+        assert [b["text"] for b in prepared[0]["content"]] == ["static|", "session|", "turn"]
+        assert [("cache_control" in b) for b in prepared[0]["content"]] == [True, True, False]
+        assert prepared[1]["content"][0]["cache_control"] == {"type": "ephemeral"}
+        assert prepared[2] == messages[2]
+        assert CACHE_BREAKPOINTS_KEY in messages[0]
+
+        plain = provider._prepare_messages("gpt-4o", messages)
+        assert plain[0] == {"role": "system", "content": "static|session|turn"}
+        assert plain[1] is messages[1]
+
+    def test_cached_tokens_tracked(self, tmp_path):
+        openai_usage = {
+            "prompt_tokens": 100, "completion_tokens": 5, "total_tokens": 105,
+            "prompt_tokens_details": {"cached_tokens": 80},
+        }
+        anthropic_usage = SimpleNamespace(
+            prompt_tokens=50, completion_tokens=5, total_tokens=55,
+            prompt_tokens_details=None, cache_read_input_tokens=40,
+        )
+        assert normalize_usage(openai_usage)["cached_tokens"] == 80
+        assert normalize_usage(anthropic_usage)["cached_tokens"] == 40
+        assert "cached_tokens" not in normalize_usage({"prompt_tokens": 1})
+
+        store = SQLiteStore(tmp_path / "test.db")
+        store.record_llm_usage("web:s1", "m", 100, 5, 105, cached_tokens=80)
+        store.record_llm_usage("web:s1", "m", 50, 5, 55, cached_tokens=40)
+        assert store.query_usage_summary(0)["cached_tokens"] == 120
+        assert sum(row["cached_tokens"] for row in store.query_usage_rollup("hour", 0)) == 120
@@ -0,0 +1,136 @@
+"""
+滚动摘要压缩测试。
+
+测试覆盖:
+1. 同一回合内再次压缩 — 只把水位之后的新消息和上次摘要发给 LLM
+2. 重启后延续 — 摘要与水位持久化到 SQLite，新引擎按重建的历史定位水位
+3. 水位之后没有新消息 — 直接复用上次摘要，不调用 LLM
+4. 清空会话 — forget_session / delete_session 删除持久化的摘要
+5. 重复消息 — 新消息与已摘要消息内容相同（如再次“继续”）时不误判水位
+
+运行: python -m pytest tests/test_rolling_summary.py -v
+"""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+from solopreneur.agent.core.compaction import CompactionEngine, RollingSummary
+from solopreneur.providers.base import LLMProvider, LLMResponse
+from solopreneur.storage import CompactionSummaryPersistence, SQLiteStore
+
+
+class _SummaryProvider(LLMProvider):
+    """记录摘要请求，按调用次数返回 summary-N。"""
+
+    def __init__(self):
+        super().__init__()
+        self.prompts: list[str] = []
+
+    async def chat(self, messages, tools=None, model=None, max_tokens=4096, temperature=0.7) -> LLMResponse:
+        self.prompts.append(messages[-1]["content"])
+        return LLMResponse(content=f"summary-{len(self.prompts)}")
+
+    def get_default_model(self) -> str:
+        return "test-model"
+
+
+def _conversation(start: int, count: int) -> list[dict]:
+    messages = []
+    for i in range(start, start + count):
+        role = "user" if i % 2 == 0 else "assistant"
+        messages.append({"role": role, "content": f"message-{i}"})
+    return messages
+
+
+def _engine(tmp_path: Path, provider: _SummaryProvider, store: SQLiteStore | None = None) -> CompactionEngine:
+    return CompactionEngine(
+        provider=provider,
+        workspace=tmp_path,
+        summary_store=CompactionSummaryPersistence(store) if store else None,
+    )
+
+
+class TestRollingSummary:
+    def test_second_compaction_only_sends_new_messages(self, tmp_path: Path):
+        provider = _SummaryProvider()
+        engine = _engine(tmp_path, provider)
+        messages = [{"role": "system", "content": "sys"}, *_conversation(0, 10)]
+
+        compacted = asyncio.run(engine.auto_compact(messages, session_key="web:s1"))
+        assert "message-0" in provider.prompts[0] and "message-5" in provider.prompts[0]
+        assert "summary-1" in compacted[1]["content"]
+
+        compacted.extend(_conversation(10, 6))
+        compacted = asyncio.run(engine.auto_compact(compacted, session_key="web:s1"))
+
+        second = provider.prompts[1]
+        assert "summary-1" in second
+        assert "message-5" not in second  # 已在水位之内
+        assert "message-6" in second and "message-11" in second
+        assert "message-12" not in second  # 最近消息保留原文
+        assert "本次会话从上一段对话的压缩摘要继续" not in second
+        assert "summary-2" in compacted[1]["content"]
+
+    def test_summary_survives_restart(self, tmp_path: Path):
+        store = SQLiteStore(tmp_path / "test.db")
+        history = _conversation(0, 10)
+        first = _engine(tmp_path, _SummaryProvider(), store)
+        asyncio.run(first.auto_compact([{"role": "system", "content": "sys"}, *history], session_key="web:s1"))
+
+        provider = _SummaryProvider()
+        restarted = _engine(tmp_path, provider, store)
+        # 重启后按会话历史窗口重建的消息列表
+        rebuilt = [{"role": "system", "content": "sys"}, *history[2:], *_conversation(10, 4)]
+        compacted = asyncio.run(restarted.auto_compact(rebuilt, session_key="web:s1"))
+
+        prompt = provider.prompts[0]
+        assert "summary-1" in prompt
+        assert "message-5" not in prompt
+        assert "message-6" in prompt and "message-9" in prompt
+        assert "summary-1" in compacted[1]["content"]
+        assert store.load_compaction_summary("web:s1")["compactions"] == 2
+
+    def test_no_new_messages_reuses_summary(self, tmp_path: Path):
+        provider = _SummaryProvider()
+        engine = _engine(tmp_path, provider)
+        messages = [{"role": "system", "content": "sys"}, *_conversation(0, 10)]
+        asyncio.run(engine.auto_compact(messages, session_key="web:s1"))
+
+        compacted = asyncio.run(engine.auto_compact(messages, session_key="web:s1"))
+        assert len(provider.prompts) == 1
+        assert "summary-1" in compacted[1]["content"]
+
+    def test_repeated_message_does_not_move_watermark(self, tmp_path: Path):
+        state = RollingSummary("old")
+        covered = [{"role": "user", "content": "继续"}, {"role": "assistant", "content": "A"}]
+        state.advance("old", covered)
+        new = [
+            {"role": "user", "content": "改成用 Postgres"},
+            {"role": "assistant", "content": "B"},
+            {"role": "user", "content": "继续"},
+        ]
+        assert state.pending(new) == new
+        assert state.pending([*covered, *new]) == new
+
+        provider = _SummaryProvider()
+        store = SQLiteStore(tmp_path / "test.db")
+        history = [*covered, *_conversation(0, 8)]
+        asyncio.run(_engine(tmp_path, _SummaryProvider(), store).auto_compact(history, session_key="web:s1"))
+        rebuilt = [*history, *new, *_conversation(8, 4)]
+        asyncio.run(_engine(tmp_path, provider, store).auto_compact(rebuilt, session_key="web:s1"))
+        assert "改成用 Postgres" in provider.prompts[0]
+
+    def test_forget_session_drops_summary(self, tmp_path: Path):
+        store = SQLiteStore(tmp_path / "test.db")
+        engine = _engine(tmp_path, _SummaryProvider(), store)
+        messages = [{"role": "system", "content": "sys"}, *_conversation(0, 10)]
+        asyncio.run(engine.auto_compact(messages, session_key="web:s1"))
+        asyncio.run(engine.auto_compact(messages, session_key="web:s2"))
+
+        engine.forget_session("web:s1")
+        assert store.load_compaction_summary("web:s1") is None
+
+        store.delete_session("web:s2")
+        assert store.load_compaction_summary("web:s2") is None
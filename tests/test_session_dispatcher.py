@@ -0,0 +1,97 @@
+"""
+SessionDispatcher 测试。
+
+测试覆盖:
+1. 同一会话严格有序、不同会话并行
+2. 全局与通道并发上限
+3. 系统消息归入其来源会话
+
+运行: python -m pytest tests/test_session_dispatcher.py -v
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+from solopreneur.bus.dispatcher import SessionDispatcher, dispatch_key
+from solopreneur.bus.events import InboundMessage
+
+
+def _msg(channel: str, chat_id: str, content: str) -> InboundMessage:
+    return InboundMessage(channel=channel, sender_id="u", chat_id=chat_id, content=content)
+
+
+class TestSessionDispatcher:
+    def test_ordered_within_session_parallel_across(self):
+        log: list[str] = []
+        peak = 0
+        running = 0
+
+        async def handler(msg: InboundMessage) -> None:
+            nonlocal peak, running
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            log.append(f"{msg.chat_id}:{msg.content}")
+            running -= 1
+
+        async def scenario():
+            dispatcher = SessionDispatcher(handler, max_concurrency=4)
+            for i in range(3):
+                dispatcher.submit(_msg("telegram", "a", str(i)))
+                dispatcher.submit(_msg("wecom", "b", str(i)))
+            await dispatcher.join()
+            return dispatcher.stats()
+
+        stats = asyncio.run(scenario())
+        assert [item for item in log if item.startswith("a:")] == ["a:0", "a:1", "a:2"]
+        assert [item for item in log if item.startswith("b:")] == ["b:0", "b:1", "b:2"]
+        assert peak == 2
+        assert stats["processed"] == 6 and stats["pending"] == 0
+
+    def test_channel_limit(self):
+        peak = 0
+        running = 0
+
+        async def handler(msg: InboundMessage) -> None:
+            nonlocal peak, running
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        async def scenario():
+            dispatcher = SessionDispatcher(handler, max_concurrency=8, channel_limits={"telegram": 1})
+            for chat in ("a", "b", "c"):
+                dispatcher.submit(_msg("telegram", chat, "x"))
+            await asyncio.sleep(0)
+            pending = dispatcher.stats()["pending_by_channel"]
+            await dispatcher.join()
+            return pending
+
+        pending = asyncio.run(scenario())
+        assert peak == 1
+        assert pending == {"telegram": 2}
+
+    def test_handler_error_does_not_stop_session(self):
+        handled: list[str] = []
+
+        async def handler(msg: InboundMessage) -> None:
+            if msg.content == "boom":
+                raise RuntimeError("boom")
+            handled.append(msg.content)
+
+        async def scenario():
+            dispatcher = SessionDispatcher(handler)
+            dispatcher.submit(_msg("telegram", "a", "boom"))
+            dispatcher.submit(_msg("telegram", "a", "ok"))
+            await dispatcher.join()
+            return dispatcher.stats()
+
+        stats = asyncio.run(scenario())
+        assert handled == ["ok"]
+        assert stats["failed"] == 1
+
+    def test_system_message_keyed_by_origin(self):
+        assert dispatch_key(_msg("system", "telegram:42", "done")) == "telegram:42"
+        assert dispatch_key(_msg("telegram", "42", "hi")) == "telegram:42"
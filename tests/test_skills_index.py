@@ -0,0 +1,127 @@
+"""
+技能索引缓存测试。
+
+测试覆盖:
+1. 共享索引 — 同一技能目录的 SkillsLoader 共用索引，未变化时不重复读取 SKILL.md
+2. 增量重载 — 修改 / 新增 / 删除单个技能只影响对应条目
+3. 要求检查缓存 — PATH 探测结果在 TTL 内复用，过期后重新检查
+4. 摘要与常驻技能 — 不变时直接复用，技能变化后重新生成
+
+运行: python -m pytest tests/test_skills_index.py -v
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import solopreneur.agent.core.skills as skills_module
+from solopreneur.agent.core.skills import SkillsLoader
+
+
+def _write_skill(root: Path, name: str, description: str, metadata: str = "", body: str = "Body") -> Path:
+    skill_file = root / "skills" / name / "SKILL.md"
+    skill_file.parent.mkdir(parents=True, exist_ok=True)
+    before = skill_file.stat().st_mtime_ns if skill_file.exists() else 0
+    front = f"---\nname: {name}\ndescription: {description}\n"
+    if metadata:
+        front += f"metadata: {metadata}\n"
+    skill_file.write_text(f"{front}---\n\n{body}\n", encoding="utf-8")
+    # 推进 mtime，避免同一时间戳下判定为未变化
+    mtime = max(before + 10**9, skill_file.stat().st_mtime_ns)
+    os.utime(skill_file, ns=(mtime, mtime))
+    return skill_file
+
+
+def _loader(tmp_path: Path) -> SkillsLoader:
+    return SkillsLoader(tmp_path, builtin_skills_dir=tmp_path / "no-builtin")
+
+
+def _count_reads(monkeypatch) -> list[str]:
+    reads: list[str] = []
+    original = Path.read_text
+
+    def counting(self, *args, **kwargs):
+        if self.name == "SKILL.md":
+            reads.append(self.parent.name)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "read_text", counting)
+    return reads
+
+
+class TestSkillsIndex:
+    def test_loaders_share_index_without_rereading(self, tmp_path: Path, monkeypatch):
+        _write_skill(tmp_path, "alpha", "first")
+        _write_skill(tmp_path, "beta", "second")
+        first = _loader(tmp_path)
+        assert [s["name"] for s in first.list_skills()] == ["alpha", "beta"]
+
+        reads = _count_reads(monkeypatch)
+        second = _loader(tmp_path)
+        assert second.index is first.index
+        second.index.refresh(force=True)
+        assert second.get_skill_metadata("alpha")["description"] == "first"
+        assert second.build_skills_summary()
+        assert second.load_skills_for_context(["beta"]) == "### 技能：beta\n\nBody"
+        assert reads == []
+
+    def test_only_changed_skill_is_reread(self, tmp_path: Path, monkeypatch):
+        _write_skill(tmp_path, "alpha", "first")
+        _write_skill(tmp_path, "beta", "second")
+        loader = _loader(tmp_path)
+        loader.list_skills()
+        reads = _count_reads(monkeypatch)
+
+        _write_skill(tmp_path, "alpha", "edited")
+        _write_skill(tmp_path, "gamma", "third")
+        (tmp_path / "skills" / "beta" / "SKILL.md").unlink()
+        assert loader.index.refresh(force=True) is True
+
+        assert sorted(reads) == ["alpha", "gamma"]
+        assert loader.get_skill_metadata("alpha")["description"] == "edited"
+        assert [s["name"] for s in loader.list_skills()] == ["alpha", "gamma"]
+
+    def test_requirement_checks_cached_with_ttl(self, tmp_path: Path, monkeypatch):
+        _write_skill(tmp_path, "tool", "needs a binary", '{"solopreneur": {"requires": {"bins": ["fake-bin"]}}}')
+        loader = _loader(tmp_path)
+        probes: list[str] = []
+        monkeypatch.setattr(skills_module.shutil, "which", lambda b: probes.append(b) or None)
+
+        assert loader.list_skills() == []
+        assert "<requires>CLI: fake-bin</requires>" in loader.build_skills_summary()
+        assert probes == ["fake-bin"]
+
+        clock = [skills_module.time.monotonic()]
+        monkeypatch.setattr(skills_module.time, "monotonic", lambda: clock[0])
+        clock[0] += skills_module.REQUIREMENTS_TTL + 1
+        monkeypatch.setattr(skills_module.shutil, "which", lambda b: probes.append(b) or "/usr/bin/" + b)
+        assert [s["name"] for s in loader.list_skills()] == ["tool"]
+        assert probes == ["fake-bin", "fake-bin"]
+        assert 'available="true"' in loader.build_skills_summary()
+
+
+class TestDerivedCache:
+    def test_summary_and_always_skills_memoized(self, tmp_path: Path, monkeypatch):
+        _write_skill(tmp_path, "core", "always on", '{"solopreneur": {"always": true}}')
+        _write_skill(tmp_path, "extra", "on demand")
+        loader = _loader(tmp_path)
+        renders: list[int] = []
+        original = SkillsLoader._render_skills_summary
+
+        def counting(self):
+            renders.append(1)
+            return original(self)
+
+        monkeypatch.setattr(SkillsLoader, "_render_skills_summary", counting)
+
+        summary = loader.build_skills_summary()
+        assert loader.build_skills_summary() == summary
+        assert loader.get_always_skills() == ["core"]
+        assert len(renders) == 1
+
+        _write_skill(tmp_path, "extra", "now always", '{"solopreneur": {"always": true}}')
+        loader.index.refresh(force=True)
+        assert "now always" in loader.build_skills_summary()
+        assert loader.get_always_skills() == ["core", "extra"]
+        assert len(renders) == 2
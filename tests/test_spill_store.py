@@ -0,0 +1,99 @@
+"""
+工具输出溢出存储测试。
+
+测试覆盖:
+1. 去重 — 相同内容只落盘一份，key 由内容哈希决定
+2. 压缩 — 压缩存储可完整读回，重启后按目录重建索引
+3. 容量上限 — 超过 max_bytes 时淘汰最久未访问的条目
+4. 分段读取 — 按行分页、超长行截断，read_spill 工具返回下一页偏移
+5. 微压缩 — 冷工具结果替换为 spill key 引用，重复输出不重复落盘
+
+运行: python -m pytest tests/test_spill_store.py -v
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from pathlib import Path
+
+from solopreneur.agent.core.compaction import MICRO_HOT_TAIL, CompactionEngine
+from solopreneur.agent.core.spill_store import MAX_PAGE_CHARS, SpillStore
+from solopreneur.agent.core.tools.spill import ReadSpillTool
+
+
+def _files(root: Path) -> list[Path]:
+    return [p for p in root.glob("*/*") if p.is_file()]
+
+
+class TestSpillStore:
+    def test_dedup_by_content(self, tmp_path: Path):
+        store = SpillStore(tmp_path / "spill")
+        first = store.put("same output\n" * 100)
+        second = store.put("same output\n" * 100)
+        other = store.put("different output")
+
+        assert first.key == second.key != other.key
+        assert first.lines == 101
+        assert len(_files(tmp_path / "spill")) == 2
+
+    def test_compressed_roundtrip_and_reindex(self, tmp_path: Path):
+        content = "line of text\n" * 1000
+        store = SpillStore(tmp_path / "spill")
+        ref = store.put(content)
+        assert store.stats()["bytes"] < len(content) // 4
+
+        restarted = SpillStore(tmp_path / "spill")
+        assert restarted.get(ref.key) == content
+        assert restarted.stats()["entries"] == 1
+
+        plain = SpillStore(tmp_path / "plain", compress=False)
+        assert plain.get(plain.put("abc").key) == "abc"
+
+    def test_evicts_least_recently_used(self, tmp_path: Path):
+        store = SpillStore(tmp_path / "spill", max_bytes=2500, compress=False)
+        a = store.put("a" * 1000)
+        b = store.put("b" * 1000)
+        # 把 b 的访问时间调早，使其成为最久未访问
+        store._index[b.key] = (*store._index[b.key][:2], 1.0)
+        os.utime(store._index[b.key][0], (1, 1))
+        store.put("c" * 1000)
+
+        assert store.get(a.key) is not None
+        assert store.get(b.key) is None
+        assert store.stats()["bytes"] <= 2500
+
+    def test_ranged_read(self, tmp_path: Path):
+        store = SpillStore(tmp_path / "spill")
+        ref = store.put("\n".join(f"row {i}" for i in range(50)))
+
+        page = store.read(ref.key, offset=10, limit=5)
+        assert page.text.splitlines() == [f"row {i}" for i in range(10, 15)]
+        assert (page.offset, page.end, page.total_lines, page.next_offset) == (10, 15, 50, 15)
+        assert store.read(ref.key, offset=45, limit=10).next_offset is None
+
+        long_ref = store.put("x" * (MAX_PAGE_CHARS * 2) + "\ntail")
+        long_page = store.read(long_ref.key)
+        assert long_page.text.endswith("<line truncated>")
+        assert long_page.next_offset == 1
+
+        tool = ReadSpillTool(store)
+        out = asyncio.run(tool.execute(key=ref.key, offset=48, limit=5))
+        assert "row 49" in out and "[end of output]" in out
+        assert "not found" in asyncio.run(tool.execute(key="missing"))
+
+
+class TestMicrocompactSpill:
+    def test_cold_results_replaced_with_spill_reference(self, tmp_path: Path):
+        engine = CompactionEngine(provider=None, workspace=tmp_path, spill_store=SpillStore(tmp_path / "spill"))
+        big = "file content line\n" * 1000
+        messages = [{"role": "tool", "name": "read_file", "content": big} for _ in range(3)]
+        messages += [{"role": "tool", "name": "echo", "content": "small"} for _ in range(MICRO_HOT_TAIL)]
+
+        compacted = engine.microcompact(messages)
+
+        key = engine.spill_store.key_for(big)
+        assert all(f"spill key: {key}" in m["content"] for m in compacted[:3])
+        assert "read_spill" in compacted[0]["content"]
+        assert len(_files(tmp_path / "spill")) == 1
+        assert engine.spill_store.get(key) == big
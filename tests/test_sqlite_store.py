@@ -0,0 +1,289 @@
+"""
+SQLiteStore 持久化测试。
+
+测试覆盖:
+1. Trace 请求摘要 — 写入时增量维护、清理与压缩（按 id 续扫，事件循环中维护在线程执行）
+2. 指标查询 — epoch 时间戳列、索引范围过滤、回填迁移
+3. 用量汇总表 — 增量维护、任意桶宽查询、与原始表一致
+4. 缓冲用量记录 — 批量落库、未落库尾部计入查询、失败重试
+
+运行: python -m pytest tests/test_sqlite_store.py -v
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from solopreneur.storage.services import (
+    MetricsQueryService,
+    TracePersistence,
+    TraceRetentionPolicy,
+)
+from solopreneur.storage.sqlite_store import SQLiteStore
+from solopreneur.storage.usage_recorder import UsageRecorder
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> SQLiteStore:
+    return SQLiteStore(tmp_path / "test.db")
+
+
+def _event(request_id: str, event_type: str, **data) -> dict:
+    return {
+        "session_key": "web:s1",
+        "request_id": request_id,
+        "event_type": event_type,
+        "data": {"event": event_type, **data},
+    }
+
+
+# ── 1. Trace Lifecycle Tests ────────────────────────────────────────
+
+class TestTraceRequests:
+    def test_summary_maintained_on_write(self, store: SQLiteStore):
+        store.save_trace_events_batch([
+            _event("r1", "start"),
+            _event("r1", "llm_end", prompt_tokens=10, completion_tokens=5, total_tokens=15),
+            _event("r1", "tool_end", tool_name="read_file"),
+        ])
+        store.save_trace_event("web:s1", "r1", "end", {"event": "end"})
+        store.save_trace_event("web:s1", "r2", "start", {"event": "start"})
+
+        requests = store.list_trace_requests("web:s1")
+        assert [r["request_id"] for r in requests] == ["r2", "r1"]
+
+        r1 = store.get_trace_request("web:s1", "r1")
+        assert r1["event_count"] == 4
+        assert r1["llm_calls"] == 1
+        assert r1["tool_calls"] == 1
+        assert r1["total_tokens"] == 15
+        assert r1["status"] == "completed"
+        assert store.get_trace_request("web:s1", "r2")["status"] == "running"
+
+    def test_backfill_from_existing_events(self, tmp_path: Path):
+        db_path = tmp_path / "legacy.db"
+        store = SQLiteStore(db_path)
+        store.save_trace_events_batch([_event("r1", "start"), _event("r1", "end")])
+        with store._connect() as conn:
+            conn.execute("DELETE FROM trace_requests")
+
+        reopened = SQLiteStore(db_path)
+        summary = reopened.get_trace_request("web:s1", "r1")
+        assert summary["event_count"] == 2
+        assert summary["status"] == "completed"
+
+    def test_prune_by_size_keeps_summaries(self, store: SQLiteStore):
+        store.save_trace_events_batch([_event("r1", "start"), _event("r1", "end")])
+        store.save_trace_events_batch([_event("r2", "start"), _event("r2", "end")])
+
+        deleted = store.prune_trace_events(max_events=2)
+
+        assert deleted == 2
+        assert store.load_trace_events("web:s1", "r1") == []
+        assert store.get_trace_request("web:s1", "r1")["raw_pruned"] is True
+        assert store.get_trace_request("web:s1", "r2")["raw_pruned"] is False
+
+    def test_compressed_events_still_load(self, store: SQLiteStore):
+        store.save_trace_events_batch([
+            {**_event("r1", "tool_end", result_preview="x" * 100), "created_at": "2000-01-01T00:00:00"},
+        ])
+
+        assert store.compress_trace_events(older_than_days=1) == 1
+        events = store.load_trace_events("web:s1", "r1")
+        assert events[0]["data"]["result_preview"] == "x" * 100
+
+    def test_compression_resumes_after_mark(self, store: SQLiteStore):
+        old = {"created_at": "2000-01-01T00:00:00"}
+        store.save_trace_events_batch([{**_event("r1", "start"), **old}, {**_event("r1", "end"), **old}])
+        assert store.compress_trace_events(older_than_days=1) == 2
+        mark = store._trace_compress_mark
+
+        assert store.compress_trace_events(older_than_days=1) == 0
+        store.save_trace_events_batch([{**_event("r2", "start"), **old}])
+        assert store.compress_trace_events(older_than_days=1) == 1
+        assert store._trace_compress_mark > mark
+
+    def test_delete_removes_summary(self, store: SQLiteStore):
+        store.save_trace_events_batch([_event("r1", "start")])
+        assert store.delete_trace_events("web:s1", "r1") == 1
+        assert store.get_trace_request("web:s1", "r1") is None
+
+    def test_persistence_runs_periodic_maintenance(self, store: SQLiteStore):
+        svc = TracePersistence(
+            store,
+            retention=TraceRetentionPolicy(
+                retention_days=0, max_events=3, compress_after_days=0, maintenance_every=4,
+            ),
+        )
+        svc.save_batch([_event("r1", "start"), _event("r1", "end")])
+        svc.save_batch([_event("r2", "start"), _event("r2", "end")])
+
+        assert len(svc.load("web:s1")) == 3
+
+    def test_maintenance_off_event_loop(self, store: SQLiteStore):
+        svc = TracePersistence(store, retention=TraceRetentionPolicy(maintenance_every=1))
+        threads: list[threading.Thread] = []
+        svc.run_maintenance = lambda: threads.append(threading.current_thread()) or {}
+
+        async def scenario():
+            svc.save_batch([_event("r1", "start")])
+            await svc._maintenance_task
+
+        asyncio.run(scenario())
+        assert threads and threads[0] is not threading.main_thread()
+
+
+# ── 2. Metrics Query Tests ──────────────────────────────────────────
+
+class TestMetricsQueries:
+    def test_usage_filters_on_epoch_column(self, store: SQLiteStore):
+        store.record_llm_usage("web:a", "m1", 10, 5, 15, duration_ms=100)
+        store.record_llm_usage("web:b", "m2", 20, 10, 30, duration_ms=300, is_stream=True)
+        with store._connect() as conn:
+            conn.execute(
+                "INSERT INTO llm_usage(session_key, model, total_tokens, created_at, created_ts) "
+                "VALUES('web:a', 'm1', 999, '2000-01-01T00:00:00', 946684800)"
+            )
+        store.rebuild_rollups()
+
+        svc = MetricsQueryService(store)
+        summary = svc.usage_summary(days=7)
+        assert summary["calls"] == 2
+        assert summary["total_tokens"] == 45
+        assert summary["avg_duration_ms"] == 200
+        assert summary["stream_calls"] == 1
+        assert svc.usage_summary(days=7, model="m2")["calls"] == 1
+        assert svc.usage_totals()["total_tokens"] == 1044
+        assert svc.requests_today() == 2
+
+    def test_query_plan_uses_index(self, store: SQLiteStore):
+        with store._connect() as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM llm_usage WHERE created_ts >= ?",
+                (0,),
+            ).fetchall()
+        assert any("idx_llm_usage" in row[3] for row in plan)
+
+    def test_epoch_column_backfilled(self, tmp_path: Path):
+        db_path = tmp_path / "legacy.db"
+        store = SQLiteStore(db_path)
+        with store._connect() as conn:
+            conn.execute(
+                "INSERT INTO llm_usage(session_key, model, created_at) "
+                "VALUES('web:a', 'm1', '2024-05-01T12:00:00')"
+            )
+
+        SQLiteStore(db_path)
+        with store._connect() as conn:
+            ts = conn.execute("SELECT created_ts FROM llm_usage").fetchone()[0]
+        assert ts == int(datetime(2024, 5, 1, 12, 0, 0).timestamp())
+
+    def test_task_summary(self, store: SQLiteStore):
+        store.upsert_subagent_task("t1", "a", "task", "web", "c", "completed")
+        store.upsert_subagent_task("t2", "b", "task", "web", "c", "failed")
+        summary = MetricsQueryService(store).task_summary(days=1)
+        assert summary == {"total": 2, "by_status": {"completed": 1, "failed": 1}}
+
+
+# ── 3. Usage Rollup Tests ───────────────────────────────────────────
+
+class TestUsageRollups:
+    def test_rollups_match_raw_aggregates(self, store: SQLiteStore):
+        store.record_llm_usage("web:a", "m1", 10, 5, 15, duration_ms=100)
+        store.record_llm_usage("cli:b", "m1", 20, 10, 30, duration_ms=300, is_stream=True)
+        store.record_llm_usage("web:c", "m2", 1, 1, 2)
+
+        svc = MetricsQueryService(store)
+        buckets = svc.usage_buckets(svc.since_days(1), 86400, group_by="session_prefix")
+        by_prefix = {row["session_prefix"]: row for row in buckets["rows"]}
+        assert by_prefix["web"]["calls"] == 2
+        assert by_prefix["cli"]["total_tokens"] == 30
+        assert svc.usage_totals() == {"calls": 3, "total_tokens": 47}
+        assert svc.usage_daily(days=1)[0]["calls"] == 3
+
+        rebuilt = SQLiteStore(store.db_path)
+        rebuilt.rebuild_rollups()
+        assert MetricsQueryService(rebuilt).usage_totals() == {"calls": 3, "total_tokens": 47}
+
+    def test_hourly_buckets_by_model(self, store: SQLiteStore):
+        store.record_llm_usage("web:a", "m1", 1, 1, 2)
+        store.record_llm_usage("web:a", "m2", 1, 1, 2)
+        svc = MetricsQueryService(store)
+        rows = svc.usage_buckets(svc.since_days(1), 5400, group_by="model")["rows"]
+        assert sorted(row["model"] for row in rows) == ["m1", "m2"]
+
+    def test_task_rollup_moves_between_statuses(self, store: SQLiteStore):
+        store.upsert_subagent_task("t1", "a", "task", "web", "c", "running")
+        store.upsert_subagent_task("t1", "a", "task", "web", "c", "completed")
+        svc = MetricsQueryService(store)
+        assert svc.task_summary(days=1) == {"total": 1, "by_status": {"completed": 1}}
+        assert [row["status"] for row in svc.task_daily(days=1)] == ["completed"]
+
+
+# ── 4. Buffered Usage Recorder Tests ────────────────────────────────
+
+class TestUsageRecorder:
+    def test_batch_flush_and_tail_in_queries(self, store: SQLiteStore):
+        recorder = UsageRecorder(store, flush_interval=3600)
+        svc = MetricsQueryService(store, recorder=recorder)
+
+        async def scenario():
+            recorder.record("web:a", "m1", 10, 5, 15, duration_ms=100)
+            recorder.record("cli:b", "m2", 1, 1, 2, is_stream=True)
+            assert recorder.pending_count() == 2
+            assert store.query_usage_summary(0)["calls"] == 0
+            assert svc.usage_totals() == {"calls": 2, "total_tokens": 17}
+            assert svc.usage_summary(days=1)["stream_calls"] == 1
+            assert svc.usage_summary(days=1, session_key="web:a")["total_tokens"] == 15
+            assert svc.requests_today() == 2
+
+            assert await recorder.flush() == 2
+            await recorder.close()
+
+        asyncio.run(scenario())
+        assert recorder.pending_count() == 0
+        assert store.query_usage_summary(0)["calls"] == 2
+        assert svc.usage_totals() == {"calls": 2, "total_tokens": 17}
+        rows = svc.usage_buckets(svc.since_days(1), 86400, group_by="session_prefix")["rows"]
+        assert {row["session_prefix"]: row["calls"] for row in rows} == {"cli": 1, "web": 1}
+
+    def test_full_batch_wakes_flusher(self, store: SQLiteStore):
+        recorder = UsageRecorder(store, flush_interval=3600, max_batch=3)
+
+        async def scenario():
+            for _ in range(3):
+                recorder.record("web:a", "m1", 1, 1, 2)
+            for _ in range(50):
+                if recorder.pending_count() == 0:
+                    break
+                await asyncio.sleep(0.01)
+            await recorder.close()
+
+        asyncio.run(scenario())
+        assert store.query_usage_summary(0)["calls"] == 3
+
+    def test_failed_flush_requeues(self, store: SQLiteStore, monkeypatch):
+        recorder = UsageRecorder(store, flush_interval=3600)
+
+        def fail(records):
+            raise RuntimeError("disk full")
+
+        async def scenario():
+            recorder.record("web:a", "m1", 1, 1, 2)
+            monkeypatch.setattr(store, "record_llm_usage_batch", fail)
+            assert await recorder.flush() == 0
+            assert recorder.pending_count() == 1
+            monkeypatch.undo()
+            await recorder.close()
+
+        asyncio.run(scenario())
+        assert store.query_usage_summary(0)["calls"] == 1
+
+    def test_record_without_loop_writes_through(self, store: SQLiteStore):
+        UsageRecorder(store).record("web:a", "m1", 1, 1, 2)
+        assert store.query_usage_summary(0)["calls"] == 1
@@ -0,0 +1,98 @@
+"""
+Token 计数测试。
+
+测试覆盖:
+1. HeuristicTokenizer — 中英混合文本 / 代码上与 BPE 计数误差在合理范围内
+2. get_tokenizer — 未知名称回退到启发式估算；注册的分词器可按名称获取
+3. MessageTokenCounter — 只对新增或内容变化的消息分词
+4. CompactionEngine — should_compact 使用配置的分词器计数
+
+运行: python -m pytest tests/test_tokenizer.py -v
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+from solopreneur.agent.core.compaction import CompactionEngine
+from solopreneur.agent.core.tokenizer import (
+    HeuristicTokenizer,
+    MessageTokenCounter,
+    get_tokenizer,
+    register_tokenizer,
+)
+
+SAMPLE = (
+    "请帮我把用户登录模块重构一下，保持接口兼容。\n"
+    "def login(username: str, password: str) -> dict:\n"
+    "    user = db.query(User).filter_by(name=username).first()\n"
+    '    return {"ok": user is not None, "token": issue_token(user)}\n'
+    "The refactor should keep the public API stable and add unit tests.\n"
+)
+
+
+class _CountingTokenizer:
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def count(self, text: str) -> int:
+        self.calls += 1
+        return len(text.split())
+
+
+class TestTokenizers:
+    def test_heuristic_close_to_bpe(self):
+        bpe = get_tokenizer("tiktoken")
+        if isinstance(bpe, HeuristicTokenizer):
+            return  # 环境中无 BPE 词表，跳过对比
+        exact = bpe.count(SAMPLE * 4)
+        estimate = HeuristicTokenizer().count(SAMPLE * 4)
+        assert abs(estimate - exact) / exact < 0.25
+
+    def test_unknown_name_falls_back(self):
+        assert isinstance(get_tokenizer("no-such-tokenizer"), HeuristicTokenizer)
+        assert get_tokenizer("") is not None
+
+        custom = _CountingTokenizer()
+        register_tokenizer("test-counting", lambda: custom)
+        assert get_tokenizer("test-counting") is custom
+
+
+class TestMessageTokenCounter:
+    def test_only_new_or_changed_messages_tokenized(self):
+        tokenizer = _CountingTokenizer()
+        counter = MessageTokenCounter(tokenizer)
+        messages = [
+            {"role": "system", "content": "you are helpful"},
+            {"role": "user", "content": "hello there"},
+        ]
+
+        first = counter.count(messages)
+        assert tokenizer.calls == 2
+        assert counter.count(messages) == first
+        assert tokenizer.calls == 2
+
+        messages.append({
+            "role": "assistant", "content": "",
+            "tool_calls": [{"function": {"name": "read_file", "arguments": '{"path": "a"}'}}],
+        })
+        counter.count(messages)
+        assert tokenizer.calls == 2 + 3  # 空内容 + 工具名 + 参数
+
+        messages[1]["content"] = "hello again friend"
+        assert counter.count(messages) > first
+        assert tokenizer.calls == 6
+
+
+class TestCompactionTokenizer:
+    def test_should_compact_uses_tokenizer(self, tmp_path: Path):
+        tokenizer = _CountingTokenizer()
+        engine = CompactionEngine(provider=None, workspace=tmp_path, tokenizer=tokenizer)
+        messages = [{"role": "user", "content": "word " * 100}]
+
+        assert engine.estimate_tokens(messages) == 100 + 4
+        assert engine.should_compact(messages, token_threshold=120)
+        assert not engine.should_compact(messages, token_threshold=200)
+        assert tokenizer.calls == 1
@@ -0,0 +1,85 @@
+"""
+ToolRouter 测试。
+
+测试覆盖:
+1. 小注册表 — 工具数不超过阈值时原样返回
+2. 筛选 — 核心工具 + 已用工具 + 关键词匹配，保持注册顺序且不超过上限
+3. request_more_tools — 解锁的工具在下一轮出现
+
+运行: python -m pytest tests/test_tool_router.py -v
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from solopreneur.agent.core.tools.base import Tool
+from solopreneur.agent.core.tools.registry import ToolRegistry
+from solopreneur.agent.core.tools.router import RequestMoreToolsTool, ToolRouter
+
+
+class _NamedTool(Tool):
+    def __init__(self, name: str, description: str):
+        self._name = name
+        self._description = description
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> str:
+        return self._description
+
+    @property
+    def parameters(self) -> dict[str, Any]:
+        return {"type": "object", "properties": {}}
+
+    async def execute(self, **kwargs: Any) -> str:
+        return self._name
+
+
+def _registry(router: ToolRouter) -> ToolRegistry:
+    registry = ToolRegistry()
+    registry.register(_NamedTool("read_file", "Read a file"))
+    for i in range(10):
+        registry.register(_NamedTool(f"mcp_misc_{i}", f"Unrelated helper number {i}"))
+    registry.register(_NamedTool("mcp_postgres_query", "Run a SQL query against the postgres database"))
+    registry.register(_NamedTool("mcp_jira_create", "Create a Jira issue 创建工单"))
+    registry.register(RequestMoreToolsTool(router, registry))
+    return registry
+
+
+def _names(definitions: list[dict[str, Any]]) -> list[str]:
+    return [d["function"]["name"] for d in definitions]
+
+
+class TestToolRouter:
+    def test_small_registry_passes_through(self):
+        router = ToolRouter(core_tools=["read_file"], max_tools=3, min_tools=100)
+        registry = _registry(router)
+        assert router.select(registry, "anything") == registry.get_definitions()
+
+    def test_selects_core_recent_and_matches(self):
+        router = ToolRouter(core_tools=["read_file"], max_tools=4, min_tools=5)
+        registry = _registry(router)
+        router.begin_request()
+
+        names = _names(router.select(registry, "query the postgres database", recent=["mcp_misc_3"]))
+
+        assert names == ["read_file", "mcp_misc_3", "mcp_postgres_query", "request_more_tools"]
+        # CJK text is matched by bigrams
+        assert "mcp_jira_create" in _names(router.select(registry, "帮我创建工单"))
+
+    def test_request_more_tools_unlocks(self):
+        router = ToolRouter(core_tools=[], max_tools=2, min_tools=5)
+        registry = _registry(router)
+
+        async def scenario() -> list[str]:
+            router.begin_request()
+            result = await registry.execute("request_more_tools", {"names": ["mcp_misc_7"]})
+            assert "mcp_misc_7" in result
+            return _names(router.select(registry, "hello"))
+
+        assert asyncio.run(scenario()) == ["mcp_misc_7", "request_more_tools"]
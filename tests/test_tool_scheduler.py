@@ -0,0 +1,88 @@
+"""
+ToolScheduler 测试。
+
+测试覆盖:
+1. 分组 — 连续只读调用成组，写操作/未知工具单独成组
+2. 执行 — 只读调用并发、写操作串行、结果按调用顺序返回
+
+运行: python -m pytest tests/test_tool_scheduler.py -v
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from solopreneur.agent.core.tools.base import Tool
+from solopreneur.agent.core.tools.registry import ToolRegistry
+from solopreneur.agent.core.tools.scheduler import ToolScheduler
+from solopreneur.providers.base import ToolCallRequest
+
+
+class _SleepTool(Tool):
+    def __init__(self, name: str, read_only: bool, log: list[str]):
+        self._name = name
+        self.read_only = read_only
+        self._log = log
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> str:
+        return "test"
+
+    @property
+    def parameters(self) -> dict[str, Any]:
+        return {"type": "object", "properties": {"delay": {"type": "number"}}}
+
+    async def execute(self, delay: float = 0.0, **kwargs: Any) -> str:
+        self._log.append(f"start:{self._name}")
+        await asyncio.sleep(delay)
+        self._log.append(f"end:{self._name}")
+        return f"{self._name}:{delay}"
+
+
+def _registry(log: list[str]) -> ToolRegistry:
+    registry = ToolRegistry()
+    registry.register(_SleepTool("read_a", True, log))
+    registry.register(_SleepTool("read_b", True, log))
+    registry.register(_SleepTool("write", False, log))
+    return registry
+
+
+def _call(i: int, name: str, delay: float = 0.0) -> ToolCallRequest:
+    return ToolCallRequest(id=f"c{i}", name=name, arguments={"delay": delay})
+
+
+class TestToolScheduler:
+    def test_plan_groups_read_only_runs(self):
+        scheduler = ToolScheduler(_registry([]))
+        calls = [
+            _call(0, "read_a"), _call(1, "read_b"), _call(2, "write"),
+            _call(3, "read_a"), _call(4, "missing"), _call(5, "read_b"),
+        ]
+        assert scheduler.plan(calls) == [[0, 1], [2], [3], [4], [5]]
+
+    def test_results_in_call_order(self):
+        log: list[str] = []
+        scheduler = ToolScheduler(_registry(log))
+        calls = [_call(0, "read_a", 0.03), _call(1, "read_b", 0.0), _call(2, "write")]
+
+        results = asyncio.run(scheduler.run(calls))
+
+        assert results == ["read_a:0.03", "read_b:0.0", "write:0.0"]
+        # read_b finishes while read_a is still running; write waits for both
+        assert log.index("end:read_b") < log.index("end:read_a") < log.index("start:write")
+
+    def test_runner_errors_become_results(self):
+        scheduler = ToolScheduler(_registry([]))
+
+        async def runner(index: int, call: Any) -> str:
+            if index == 0:
+                raise RuntimeError("boom")
+            return "ok"
+
+        results = asyncio.run(scheduler.run([_call(0, "read_a"), _call(1, "read_b")], runner))
+        assert results == ["Error executing read_a: boom", "ok"]
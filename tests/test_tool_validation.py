@@ -86,3 +86,38 @@ async def test_registry_returns_validation_error() -> None:
     reg.register(SampleTool())
     result = await reg.execute("sample", {"query": "hi"})
     assert "Invalid parameters" in result
+
+
+class CountingTool(SampleTool):
+    def __init__(self, name: str = "counting", dynamic: bool = False):
+        self._name = name
+        self.dynamic_schema = dynamic
+        self.renders = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def to_schema(self) -> dict[str, Any]:
+        self.renders += 1
+        return super().to_schema()
+
+
+def test_registry_caches_definitions_until_changed() -> None:
+    reg = ToolRegistry()
+    static, dynamic = CountingTool("static"), CountingTool("dynamic", dynamic=True)
+    reg.register(static)
+    reg.register(dynamic)
+
+    first = reg.get_definitions()
+    second = reg.get_definitions()
+    assert first == second
+    assert [d["function"]["name"] for d in first] == ["static", "dynamic"]
+    assert static.renders == 1
+    assert dynamic.renders == 2
+
+    version = reg.version
+    reg.unregister("dynamic")
+    assert reg.version > version
+    assert [d["function"]["name"] for d in reg.get_definitions()] == ["static"]
+    assert static.renders == 2
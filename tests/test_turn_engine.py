@@ -0,0 +1,208 @@
+"""
+TurnEngine 测试。
+
+测试覆盖:
+1. 工具调用 → 完成 — 工具结果回填、used_tools / tool_counts / token 统计
+2. on_final 继续提示 — 保留助手回复并注入继续提示后再次迭代
+3. 重试 — 可重试异常按策略重试，不可重试异常交给 on_llm_error
+4. 迭代上限 — 返回 max_iterations 停止原因
+5. 后台压缩 — 超过软阈值时后台压缩并在迭代边界换入；到达硬阈值时等待进行中的压缩
+
+运行: python -m pytest tests/test_turn_engine.py -v
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from solopreneur.agent.core.engine import (
+    STOP_COMPLETE,
+    STOP_LLM_ERROR,
+    STOP_MAX_ITERATIONS,
+    RetryPolicy,
+    TurnEngine,
+    TurnHooks,
+)
+from solopreneur.agent.core.tokenizer import HeuristicTokenizer, MessageTokenCounter
+from solopreneur.agent.core.tools.base import Tool
+from solopreneur.agent.core.tools.registry import ToolRegistry
+from solopreneur.providers.base import LLMProvider, LLMResponse, ToolCallRequest
+
+
+class _EchoTool(Tool):
+    read_only = True
+
+    @property
+    def name(self) -> str:
+        return "echo"
+
+    @property
+    def description(self) -> str:
+        return "Echo text"
+
+    @property
+    def parameters(self) -> dict[str, Any]:
+        return {"type": "object", "properties": {"text": {"type": "string"}}}
+
+    async def execute(self, text: str = "", **kwargs: Any) -> str:
+        return f"echo:{text}"
+
+
+class _ScriptedProvider(LLMProvider):
+    """按顺序返回预设响应；元素为异常时抛出。"""
+
+    def __init__(self, script: list[Any], delay: float = 0):
+        super().__init__()
+        self.script = list(script)
+        self.delay = delay
+        self.calls: list[list[dict[str, Any]]] = []
+
+    async def chat(self, messages, tools=None, model=None, max_tokens=4096, temperature=0.7) -> LLMResponse:
+        self.calls.append([dict(m) for m in messages])
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        item = self.script.pop(0) if self.script else LLMResponse(content="done")
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def get_default_model(self) -> str:
+        return "test-model"
+
+
+def _engine(provider: LLMProvider, **kwargs: Any) -> TurnEngine:
+    tools = ToolRegistry()
+    tools.register(_EchoTool())
+    kwargs.setdefault("retry", RetryPolicy(max_attempts=3, base_delay=0, max_delay=0))
+    return TurnEngine(provider, tools, "test-model", **kwargs)
+
+
+def _messages() -> list[dict[str, Any]]:
+    return [{"role": "system", "content": "sys"}, {"role": "user", "content": "hi"}]
+
+
+def _tool_call(text: str) -> LLMResponse:
+    return LLMResponse(
+        content=None,
+        tool_calls=[ToolCallRequest(id="c1", name="echo", arguments={"text": text})],
+        usage={"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+    )
+
+
+class TestTurnEngine:
+    def test_tool_call_then_complete(self):
+        provider = _ScriptedProvider([_tool_call("x"), LLMResponse(content="final")])
+        events: list[str] = []
+
+        async def on_trace(event: dict[str, Any]) -> None:
+            events.append(event["event"])
+
+        result = asyncio.run(_engine(provider).run(_messages(), TurnHooks(on_trace=on_trace)))
+
+        assert result.stop_reason == STOP_COMPLETE
+        assert result.content == "final"
+        assert result.state.iteration == 2
+        assert result.state.used_tools == ["echo"]
+        assert result.state.tool_counts["echo"] == 1
+        assert result.state.prompt_tokens >= 10
+        assert result.messages[-1] == {"role": "tool", "tool_call_id": "c1", "name": "echo", "content": "echo:x"}
+        assert events == ["llm_start", "llm_end", "tool_start", "tool_end", "llm_start", "llm_end"]
+
+    def test_on_final_continuation(self):
+        provider = _ScriptedProvider([LLMResponse(content="draft"), LLMResponse(content="final")])
+        prompts = ["keep going"]
+
+        async def on_final(response: LLMResponse, state: Any) -> str | None:
+            return prompts.pop() if prompts else None
+
+        result = asyncio.run(_engine(provider).run(_messages(), TurnHooks(on_final=on_final)))
+
+        assert result.content == "final"
+        assert provider.calls[1][-2:] == [
+            {"role": "assistant", "content": "draft"},
+            {"role": "user", "content": "keep going"},
+        ]
+
+    def test_retry_then_llm_error(self):
+        provider = _ScriptedProvider([TimeoutError("slow"), LLMResponse(content="ok")])
+        result = asyncio.run(_engine(provider).run(_messages()))
+        assert result.content == "ok"
+        assert len(provider.calls) == 2
+
+        provider = _ScriptedProvider([ValueError("bad request")])
+        engine = _engine(provider, retry=RetryPolicy(max_attempts=3, base_delay=0, retry_on=(TimeoutError,)))
+
+        async def on_llm_error(e: Exception, state: Any) -> str:
+            return f"failed: {e}"
+
+        result = asyncio.run(engine.run(_messages(), TurnHooks(on_llm_error=on_llm_error)))
+        assert result.stop_reason == STOP_LLM_ERROR
+        assert result.content == "failed: bad request"
+        assert len(provider.calls) == 1
+
+    def test_max_iterations(self):
+        provider = _ScriptedProvider([_tool_call(str(i)) for i in range(5)])
+        result = asyncio.run(_engine(provider, max_iterations=3).run(_messages()))
+        assert result.stop_reason == STOP_MAX_ITERATIONS
+        assert result.content is None
+        assert result.state.tool_counts["echo"] == 3
+
+
+class _StubCompaction:
+    """每条消息计 10 token；auto_compact 把快照压成 [system, 摘要] 并记录快照长度。"""
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.snapshots: list[int] = []
+        self.token_counter = MessageTokenCounter(HeuristicTokenizer())
+
+    def should_compact(self, messages, token_threshold, usage_ratio=0.78) -> bool:
+        return len(messages) * 10 > token_threshold * usage_ratio
+
+    def microcompact(self, messages):
+        return messages
+
+    async def auto_compact(self, messages, focus_hint="", session_key=None):
+        self.snapshots.append(len(messages))
+        await asyncio.sleep(self.delay)
+        return [messages[0], {"role": "user", "content": f"SUMMARY of {len(messages)}"}]
+
+
+class TestBackgroundCompaction:
+    def _run(self, compaction: _StubCompaction, events: list[str]):
+        script = [_tool_call("a"), _tool_call("b"), _tool_call("c"), LLMResponse(content="final")]
+        provider = _ScriptedProvider(script, delay=0.05)
+        engine = _engine(provider, compaction=compaction, max_session_tokens=100, background_compaction_ratio=0.5)
+
+        async def on_trace(event: dict[str, Any]) -> None:
+            if event["event"] == "compaction":
+                events.append(event["type"])
+
+        result = asyncio.run(engine.run(_messages(), TurnHooks(on_trace=on_trace)))
+        return provider, result
+
+    def test_swapped_in_at_iteration_boundary(self):
+        compaction = _StubCompaction()
+        events: list[str] = []
+        provider, result = self._run(compaction, events)
+
+        assert result.content == "final"
+        # 第 3 轮前（6 条消息）越过软阈值开始后台压缩，第 4 轮前换入，并保留快照之后的工具结果
+        assert compaction.snapshots[0] == 6
+        assert events == ["background"]
+        fourth = provider.calls[3]
+        assert fourth[1]["content"] == "SUMMARY of 6"
+        assert fourth[-1]["content"] == "echo:c"
+        assert len(fourth) == 4
+
+    def test_hard_limit_waits_for_background_task(self):
+        compaction = _StubCompaction(delay=0.5)
+        events: list[str] = []
+        provider, result = self._run(compaction, events)
+
+        # 第 4 轮前到达硬阈值：等待进行中的后台压缩而不是另起一次同步压缩
+        assert compaction.snapshots == [6]
+        assert events == ["proactive"]
+        assert provider.calls[3][1]["content"] == "SUMMARY of 6"
+        assert len(provider.calls[3]) == 4